@@ -18,6 +18,7 @@ from api.serializers.sales_serializers import (
 )
 from products.models import Product
 from sales.models import Sale
+from reports.utils import date_range_filter
 
 
 class ProductListView(generics.ListAPIView):
@@ -153,7 +154,7 @@ def dashboard_stats(request):
         "low_stock_products": low_stock_count,
         "total_sales": Sale.objects.count(),
         "today_sales": Sale.objects.filter(
-            sale_date__date=timezone.now().date()
+            **date_range_filter("sale_date", timezone.localdate())
         ).count(),
     }
     return Response(stats)
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.8 on 2026-10-19 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("customers", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="customer",
+            index=models.Index(
+                fields=["business", "first_name", "last_name", "id"],
+                name="customers_customer_list_idx",
+            ),
+        ),
+    ]
@@ -34,6 +34,13 @@ class Customer(models.Model):
         ordering = ["first_name", "last_name"]
         # Ensure customer email is unique per business
         unique_together = ("business", "email")
+        indexes = [
+            # Keyset pages of the customer list
+            models.Index(
+                fields=["business", "first_name", "last_name", "id"],
+                name="customers_customer_list_idx",
+            ),
+        ]
 
     def __str__(self) -> str:  # type: ignore
         return f"{self.first_name} {self.last_name}"  # type: ignore
@@ -1,16 +1,31 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.urls import reverse
 from .models import Customer
 from .forms import CustomerForm
 from superadmin.middleware import get_current_business
 from authentication.utils import check_user_permission
+from utils.pagination import page_json_response, paginate, wants_json
 
 
 @login_required
 def customer_list(request):
     customers = Customer.objects.business_specific().filter(is_active=True)
-    return render(request, "customers/list.html", {"customers": customers})
+    page = paginate(request, customers, ["first_name", "last_name", "id"])
+    if wants_json(request):
+        return page_json_response(page, _customer_row)
+    return render(request, "customers/list.html", {"customers": page, "page": page})
+
+
+def _customer_row(customer):
+    return {
+        "id": customer.id,
+        "name": customer.full_name,
+        "email": customer.email or "",
+        "phone": customer.phone or "",
+        "url": reverse("customers:detail", args=[customer.pk]),
+    }
 
 
 @login_required
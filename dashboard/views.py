@@ -19,13 +19,18 @@ from datetime import date, datetime
 
 # Add this import for search functionality
 from django.db.models import Q
+from products.search import search_products
 
 # Import AuditLog for recent activities
 from settings.models import AuditLog
+from reports.utils import date_range_filter
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
+# Rows shown per section of the global search results
+SEARCH_RESULTS_LIMIT = 50
+
 
 @login_required
 def dashboard_view(request):
@@ -152,13 +157,14 @@ def dashboard_view(request):
     total_purchases = purchases.count()
 
     # Today's sales
-    today = timezone.now().date()
-    today_sales = sales.filter(sale_date__date=today).count()
+    today = timezone.localdate()
+    todays_sales = sales.filter(**date_range_filter("sale_date", today))
+    today_sales = todays_sales.count()
 
     # Today's sales amount
-    today_sales_amount = sales.filter(sale_date__date=today).aggregate(
-        total_amount=Sum("total_amount")
-    )["total_amount"] or Decimal("0")
+    today_sales_amount = todays_sales.aggregate(total_amount=Sum("total_amount"))[
+        "total_amount"
+    ] or Decimal("0")
 
     # Low stock products
     low_stock_products = products.filter(quantity__lte=F("reorder_level"))
@@ -180,7 +186,7 @@ def dashboard_view(request):
     total_profit = Decimal("0")
 
     # Calculate today's profit
-    today_sales_objects = sales.filter(sale_date__date=today).prefetch_related("items")
+    today_sales_objects = todays_sales.prefetch_related("items")
     for sale in today_sales_objects:
         for item in sale.items.all():
             # Use unit_price instead of selling_price
@@ -233,7 +239,9 @@ def dashboard_view(request):
     # Fast vs Slow moving products (based on actual sales data)
     # Calculate product sales frequency over the last 30 days
     thirty_days_ago = today - timedelta(days=30)
-    recent_sales = sales.filter(sale_date__gte=thirty_days_ago)
+    recent_sales = sales.filter(
+        **date_range_filter("sale_date", thirty_days_ago, today)
+    )
 
     # Get product sales counts
     product_sales_data = list(
@@ -286,15 +294,16 @@ def dashboard_view(request):
     daily_sales_data = []
     for i in range(6, -1, -1):  # Last 7 days including today
         date_point = today - timedelta(days=i)
-        day_sales = sales.filter(sale_date__date=date_point).count()
+        day_queryset = sales.filter(**date_range_filter("sale_date", date_point))
+        day_sales = day_queryset.count()
         daily_sales_data.append(
             {
                 "date": date_point.strftime("%a"),  # Day name (Mon, Tue, etc.)
                 "sales": day_sales,  # Number of sales
                 "value": float(
-                    sales.filter(sale_date__date=date_point).aggregate(
-                        total_value=Sum("total_amount")
-                    )["total_value"]
+                    day_queryset.aggregate(total_value=Sum("total_amount"))[
+                        "total_value"
+                    ]
                     or 0
                 ),  # Actual sales value
             }
@@ -530,13 +539,12 @@ def search_view(request):
             {"query": query, "results": {}, "error": "No business context found"},
         )
 
-    # Search products
-    products = Product.objects.business_specific().filter(
-        Q(name__icontains=query)
-        | Q(sku__icontains=query)
-        | Q(description__icontains=query)
-        | Q(category__name__icontains=query)
-    )
+    # Search products (indexed, best matches first)
+    products = search_products(
+        Product.objects.business_specific().select_related("category", "unit"),
+        query,
+        also=Q(category__name__icontains=query),
+    )[:SEARCH_RESULTS_LIMIT]
 
     # Search sales - Fixed the customer name search by using first_name and last_name fields
     sales = (
@@ -547,7 +555,7 @@ def search_view(request):
             | Q(customer__phone__icontains=query)
             | Q(transaction_id__icontains=query)
         )
-        .select_related("customer")
+        .select_related("customer")[:SEARCH_RESULTS_LIMIT]
     )
 
     # Search customers
@@ -556,7 +564,7 @@ def search_view(request):
         | Q(last_name__icontains=query)
         | Q(email__icontains=query)
         | Q(phone__icontains=query)
-    )
+    )[:SEARCH_RESULTS_LIMIT]
 
     # Search suppliers
     suppliers = Supplier.objects.business_specific().filter(
@@ -564,12 +572,12 @@ def search_view(request):
         | Q(email__icontains=query)
         | Q(phone__icontains=query)
         | Q(company__icontains=query)
-    )
+    )[:SEARCH_RESULTS_LIMIT]
 
     # Search categories
     categories = Category.objects.business_specific().filter(
         Q(name__icontains=query) | Q(description__icontains=query)
-    )
+    )[:SEARCH_RESULTS_LIMIT]
 
     context = {
         "query": query,
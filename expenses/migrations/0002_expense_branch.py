@@ -0,0 +1,26 @@
+# Generated by Django 5.2.8 on 2026-10-19 10:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("expenses", "0001_initial"),
+        ("superadmin", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="expense",
+            name="branch",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="expenses",
+                to="superadmin.branch",
+            ),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-19 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("expenses", "0002_expense_branch"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="expense",
+            index=models.Index(
+                fields=["business", "-date", "-id"], name="expenses_expense_list_idx"
+            ),
+        ),
+    ]
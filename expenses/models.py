@@ -1,5 +1,5 @@
 from django.db import models
-from superadmin.models import Business
+from superadmin.models import Business, Branch
 from superadmin.managers import BusinessSpecificManager
 
 
@@ -34,6 +34,15 @@ class Expense(models.Model):
     business = models.ForeignKey(
         Business, on_delete=models.CASCADE, related_name="expenses", null=True
     )
+
+    # Add branch relationship for multi-branch support
+    branch = models.ForeignKey(
+        Branch,
+        on_delete=models.SET_NULL,
+        related_name="expenses",
+        null=True,
+        blank=True,
+    )
     category = models.ForeignKey(ExpenseCategory, on_delete=models.CASCADE)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     date = models.DateField()
@@ -44,6 +53,12 @@ class Expense(models.Model):
 
     class Meta:
         ordering = ["-date"]
+        indexes = [
+            # Keyset pages of the expense list
+            models.Index(
+                fields=["business", "-date", "-id"], name="expenses_expense_list_idx"
+            ),
+        ]
 
     def __str__(self):
         return f"{self.category.name} - ${self.amount}"
@@ -1,16 +1,32 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.urls import reverse
 from .models import Expense, ExpenseCategory
 from .forms import ExpenseForm, ExpenseCategoryForm
-from superadmin.middleware import get_current_business
+from superadmin.middleware import get_current_business, get_current_branch
 from authentication.utils import check_user_permission
+from utils.pagination import page_json_response, paginate, wants_json
 
 
 @login_required
 def expense_list(request):
-    expenses = Expense.objects.business_specific().all()
-    return render(request, "expenses/list.html", {"expenses": expenses})
+    expenses = Expense.objects.business_specific().select_related("category")
+    page = paginate(request, expenses, ["-date", "-id"])
+    if wants_json(request):
+        return page_json_response(page, _expense_row)
+    return render(request, "expenses/list.html", {"expenses": page, "page": page})
+
+
+def _expense_row(expense):
+    return {
+        "id": expense.id,
+        "date": expense.date.isoformat(),
+        "category": expense.category.name,
+        "description": expense.description or "",
+        "amount": float(expense.amount),
+        "url": reverse("expenses:detail", args=[expense.pk]),
+    }
 
 
 @login_required
@@ -31,6 +47,10 @@ def expense_create(request):
                 # Save the expense with business context
                 expense = form.save(commit=False)
                 expense.business = current_business
+                # Expenses without a branch would drop out of every branch's lists
+                expense.branch = (
+                    get_current_branch() or current_business.get_main_branch()
+                )
                 expense.save()
                 messages.success(request, "Expense created successfully!")
                 return redirect("expenses:list")
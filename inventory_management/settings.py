@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
 import os
+import sys
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -213,6 +214,101 @@ else:
     if not os.path.exists(MEDIA_ROOT):
         os.makedirs(MEDIA_ROOT, exist_ok=True)
 
+# Caches
+# Report results are cached in their own alias so the backend can be chosen
+# per deployment: "file" (processes on one host) or "redis". Writes
+# invalidate cached reports by bumping a version stored in the same cache,
+# so it must be shared by every web worker and management command; "locmem"
+# is per process and only suits a single process. Tests use "locmem" so
+# they never read entries left by an earlier run, whose ids repeat.
+REPORT_CACHE_BACKENDS = {
+    "locmem": "django.core.cache.backends.locmem.LocMemCache",
+    "file": "django.core.cache.backends.filebased.FileBasedCache",
+    "redis": "django.core.cache.backends.redis.RedisCache",
+}
+REPORT_CACHE_BACKEND = (
+    "locmem"
+    if "test" in sys.argv[1:2]
+    else os.environ.get("REPORT_CACHE_BACKEND", "file")
+)
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "reports": {
+        "BACKEND": REPORT_CACHE_BACKENDS.get(
+            REPORT_CACHE_BACKEND, REPORT_CACHE_BACKEND
+        ),
+        "LOCATION": os.environ.get(
+            "REPORT_CACHE_LOCATION",
+            {
+                "file": os.path.join(BASE_DIR, "cache", "reports"),
+                "redis": "redis://127.0.0.1:6379/1",
+            }.get(REPORT_CACHE_BACKEND, "reports"),
+        ),
+        "TIMEOUT": int(os.environ.get("REPORT_CACHE_TIMEOUT", 900)),
+    },
+}
+
+# Background report jobs (see reports/jobs.py and the run_report_jobs command)
+REPORT_JOB_RETENTION_HOURS = int(os.environ.get("REPORT_JOB_RETENTION_HOURS", 72))
+REPORT_JOB_CHUNK_DAYS = int(os.environ.get("REPORT_JOB_CHUNK_DAYS", 31))
+# Minutes without progress after which a running job is taken to belong to a
+# dead worker and requeued; keep it above the time one chunk takes
+REPORT_JOB_STALE_MINUTES = int(os.environ.get("REPORT_JOB_STALE_MINUTES", 15))
+
+# Log retention (see superadmin/retention.py and the archive_logs command).
+# Days rows stay in each table unless a RetentionPolicy overrides it, and
+# where gzip JSONL archives are written.
+LOG_RETENTION_DAYS = {
+    "audit_log": 365,
+    "stock_movement": 730,
+    "notification": 90,
+    "system_log": 90,
+    "security_event": 365,
+    "api_request_log": 30,
+}
+LOG_ARCHIVE_ROOT = os.environ.get(
+    "LOG_ARCHIVE_ROOT", os.path.join(BASE_DIR, "archives")
+)
+LOG_ARCHIVE_BATCH_SIZE = int(os.environ.get("LOG_ARCHIVE_BATCH_SIZE", 5000))
+
+# Number of businesses check_stock_alerts processes in parallel
+STOCK_ALERT_WORKERS = int(os.environ.get("STOCK_ALERT_WORKERS", 4))
+
+# Overdue credit sale reminders (see sales/reminders.py and the
+# send_credit_reminders command). SMS_GATEWAY is the dotted path of the
+# gateway class; sales.sms.FileGateway writes messages to SMS_FILE_PATH
+# instead of sending them. Each business sends at most
+# CREDIT_REMINDER_RATE_PER_MINUTE messages (0 for no limit) and a customer
+# is reminded at most once every CREDIT_REMINDER_INTERVAL_DAYS days.
+SMS_GATEWAY = os.environ.get("SMS_GATEWAY", "sales.sms.LogGateway")
+SMS_FILE_PATH = os.environ.get(
+    "SMS_FILE_PATH", os.path.join(BASE_DIR, "sms_outbox.jsonl")
+)
+CREDIT_REMINDER_WORKERS = int(os.environ.get("CREDIT_REMINDER_WORKERS", 4))
+CREDIT_REMINDER_RATE_PER_MINUTE = int(
+    os.environ.get("CREDIT_REMINDER_RATE_PER_MINUTE", 60)
+)
+CREDIT_REMINDER_INTERVAL_DAYS = int(os.environ.get("CREDIT_REMINDER_INTERVAL_DAYS", 7))
+
+# Product CSV uploads up to this size are imported during the request;
+# larger ones are queued for the run_import_jobs worker
+PRODUCT_IMPORT_INLINE_MAX_BYTES = int(
+    os.environ.get("PRODUCT_IMPORT_INLINE_MAX_BYTES", 256 * 1024)
+)
+# Minutes without progress after which a running import is taken to belong
+# to a dead worker and requeued
+PRODUCT_IMPORT_STALE_MINUTES = int(os.environ.get("PRODUCT_IMPORT_STALE_MINUTES", 15))
+
+# Serve POS product typeahead from an in-memory prefix index per business
+# (see products/search.py). Product edits invalidate it through the default
+# cache, which must be shared between processes when this is enabled.
+PRODUCT_SEARCH_PREFIX_INDEX = (
+    os.environ.get("PRODUCT_SEARCH_PREFIX_INDEX", "False").lower() == "true"
+)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
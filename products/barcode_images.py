@@ -0,0 +1,128 @@
+"""
+Cached barcode and QR code images.
+
+Images are not rendered when a product is saved. They are stored under a
+content address, a hash of the image kind, barcode format, encoded data
+and render options (which follow ``BarcodeSettings``), and rendered on
+first request by the image views or ahead of time by
+``python manage.py render_barcodes``. A changed barcode or changed
+settings give a new address, so stale images are never served and
+unchanged ones are never rendered twice.
+"""
+
+import hashlib
+import json
+import logging
+import os
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from .utils import get_product_url, render_barcode_png, render_qr_png
+
+logger = logging.getLogger(__name__)
+
+IMAGE_ROOT = "barcodes"
+# Bump to re-render every image after changing the renderers
+RENDER_VERSION = 1
+
+
+def get_render_options():
+    """Barcode render options derived from the barcode settings"""
+    from settings.models import BarcodeSettings
+
+    display_text = (
+        BarcodeSettings.objects.order_by("id")
+        .values_list("display_text", flat=True)
+        .first()
+    )
+    return {"write_text": True if display_text is None else display_text}
+
+
+def image_key(kind, barcode_format, data, options=None):
+    """Content address of an image"""
+    payload = json.dumps(
+        [RENDER_VERSION, kind, barcode_format, data, options or {}], sort_keys=True
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def image_path(key):
+    return os.path.join(IMAGE_ROOT, key[:2], f"{key}.png")
+
+
+def render_image(kind, barcode_format, data, options=None):
+    """Render an image and return the PNG bytes (safe in worker processes)"""
+    if kind == "qr":
+        return render_qr_png(data)
+    return render_barcode_png(data, barcode_format, options)
+
+
+def image_spec(item, kind, options=None):
+    """
+    Return ``(kind, barcode_format, data, options)`` describing the image of
+    a product or variant, or None if it has nothing to render
+    """
+    if kind == "qr":
+        return ("qr", None, get_product_url(item), None)
+    if not item.barcode:
+        return None
+    if options is None:
+        options = get_render_options()
+    return ("barcode", item.barcode_format, item.barcode, options)
+
+
+def store_image(key, content):
+    """Save rendered PNG bytes under their content address"""
+    path = image_path(key)
+    if default_storage.exists(path):
+        return path
+    saved = default_storage.save(path, ContentFile(content))
+    if saved != path:
+        # Another process stored the same image first
+        default_storage.delete(saved)
+    return path
+
+
+def get_image(item, kind="barcode", options=None):
+    """
+    Return ``(key, path)`` of the stored barcode or QR image of a product
+    or variant, rendering it if it is not cached yet, or None.
+    """
+    spec = image_spec(item, kind, options)
+    if spec is None:
+        return None
+
+    key = image_key(*spec)
+    path = image_path(key)
+    if not default_storage.exists(path):
+        content = render_image(*spec)
+        if not content:
+            return None
+        store_image(key, content)
+        logger.info("Rendered %s image for %s", kind, item)
+    return key, path
+
+
+def render_spec(spec):
+    """``render_image`` taking an ``image_spec`` tuple, for process pools"""
+    return render_image(*spec)
+
+
+def find_missing_images(items, kinds=("barcode",), options=None):
+    """
+    Return ``{key: spec}`` for the images of ``items`` not stored yet.
+    Items sharing an image (e.g. the same code) are rendered once.
+    """
+    if options is None:
+        options = get_render_options()
+    missing = {}
+    for item in items:
+        for kind in kinds:
+            spec = image_spec(item, kind, options)
+            if spec is None:
+                continue
+            key = image_key(*spec)
+            if key not in missing and not default_storage.exists(image_path(key)):
+                missing[key] = spec
+    return missing
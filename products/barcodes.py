@@ -0,0 +1,119 @@
+"""
+Barcode allocation.
+
+Generated barcodes are numbers drawn from a per-business counter
+(``BarcodeCounter``) and formatted for the product's barcode format with
+the check digit computed in memory. Numbers are reserved in blocks with a
+single UPDATE of the counter row, so a bulk import gets all its codes for
+the same few queries as a single product. Codes that clash with manually
+entered barcodes are dropped with one lookup per batch.
+
+Generated codes start with ``GENERATED_PREFIX``, the GS1 prefix reserved
+for in-store numbering, so they do not collide with manufacturer codes.
+The unique constraints on ``(business, barcode)`` are the final guard.
+"""
+
+from django.db import transaction
+from django.db.models import F
+
+from .models import BarcodeCounter, Product, ProductVariant
+
+GENERATED_PREFIX = "2"
+BLOCK_SIZE = 100
+# Barcodes checked against existing ones per query
+LOOKUP_BATCH_SIZE = 500
+
+
+def ean13_check_digit(digits):
+    """Check digit of the first 12 digits of an EAN-13 code"""
+    odd_sum = sum(int(digit) for digit in digits[0:12:2])
+    even_sum = sum(int(digit) for digit in digits[1:12:2])
+    return str((10 - (odd_sum + even_sum * 3) % 10) % 10)
+
+
+def upca_check_digit(digits):
+    """Check digit of the first 11 digits of a UPC-A code"""
+    odd_sum = sum(int(digit) for digit in digits[0:11:2])
+    even_sum = sum(int(digit) for digit in digits[1:11:2])
+    return str((10 - (odd_sum * 3 + even_sum) % 10) % 10)
+
+
+def format_barcode(number, barcode_format="code128"):
+    """Format an allocated number as a barcode of the given format"""
+    if barcode_format == "ean13":
+        digits = GENERATED_PREFIX + str(number).zfill(11)
+        return digits + ean13_check_digit(digits)
+    if barcode_format == "upca":
+        digits = GENERATED_PREFIX + str(number).zfill(10)
+        return digits + upca_check_digit(digits)
+    # Code 128 has its own check character added when it is rendered
+    return GENERATED_PREFIX + str(number).zfill(11)
+
+
+def reserve_numbers(business, count):
+    """Reserve ``count`` consecutive numbers for a business, return the first"""
+    with transaction.atomic():
+        BarcodeCounter._base_manager.get_or_create(business=business)
+        counter = BarcodeCounter._base_manager.filter(business=business)
+        # The UPDATE locks the row until the transaction ends, so concurrent
+        # reservations get disjoint ranges
+        counter.update(next_value=F("next_value") + count)
+        next_value = counter.values_list("next_value", flat=True).get()
+    return next_value - count
+
+
+def _taken_barcodes(business, barcodes):
+    """Barcodes already used by a product or variant of the business"""
+    taken = set()
+    for start in range(0, len(barcodes), LOOKUP_BATCH_SIZE):
+        batch = barcodes[start : start + LOOKUP_BATCH_SIZE]
+        for model in (Product, ProductVariant):
+            taken.update(
+                model._base_manager.filter(business=business, barcode__in=batch)
+                .order_by()
+                .values_list("barcode", flat=True)
+            )
+    return taken
+
+
+class BarcodeAllocator:
+    """
+    Hand out generated barcodes for one business, reserving numbers
+    ``block_size`` at a time. Numbers left over when the allocator is
+    discarded are simply skipped.
+    """
+
+    def __init__(self, business, block_size=BLOCK_SIZE):
+        self.business = business
+        self.block_size = block_size
+        self._next = self._end = 0
+
+    def _take_numbers(self, count):
+        if self._end - self._next < count:
+            # Leftovers of the current block are skipped
+            size = max(count, self.block_size)
+            self._next = reserve_numbers(self.business, size)
+            self._end = self._next + size
+        numbers = range(self._next, self._next + count)
+        self._next += count
+        return numbers
+
+    def allocate(self, count, barcode_format="code128"):
+        """Return ``count`` unused barcodes of the given format"""
+        barcodes = []
+        while len(barcodes) < count:
+            candidates = [
+                format_barcode(number, barcode_format)
+                for number in self._take_numbers(count - len(barcodes))
+            ]
+            taken = _taken_barcodes(self.business, candidates)
+            barcodes += [barcode for barcode in candidates if barcode not in taken]
+        return barcodes
+
+    def next(self, barcode_format="code128"):
+        return self.allocate(1, barcode_format)[0]
+
+
+def allocate_barcodes(business, count=1, barcode_format="code128"):
+    """Allocate ``count`` barcodes for a business without keeping a block"""
+    return BarcodeAllocator(business, block_size=count).allocate(count, barcode_format)
@@ -0,0 +1,373 @@
+"""
+High-throughput product loading for tenant onboarding.
+
+``BulkProductLoader`` loads catalogues of millions of rows, which the
+chunked ORM importer (``products.imports``) would take hours over:
+
+- the file is cut into byte ranges at line ends and the ranges are parsed
+  and validated by a pool of worker processes;
+- valid rows are streamed into a temporary staging table, with ``COPY``
+  on PostgreSQL and batched ``executemany`` elsewhere;
+- one set-based pass then drops repeated SKUs (the last row wins) and
+  rows whose barcode clashes, fills in generated barcodes, updates the
+  existing products and inserts the new ones.
+
+Ranges are cut at line ends, so fields with embedded line breaks are not
+supported here; files like that should go through the default importer.
+Rows that fail validation or clash are collected with the same messages
+as ``ProductImporter`` and written to the error report.
+"""
+
+import csv
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .barcodes import GENERATED_PREFIX
+from .imports import ProductImporter, RowError, parse_row
+from .models import Category, Unit
+
+# Bytes of CSV parsed per worker task
+LOAD_CHUNK_BYTES = 8 * 1024 * 1024
+STAGING_TABLE = "products_product_staging"
+BARCODES_TABLE = "products_product_staging_barcodes"
+STAGING_COLUMNS = (
+    "line",
+    "sku",
+    "name",
+    "barcode",
+    "category_id",
+    "unit_id",
+    "description",
+    "cost_price",
+    "selling_price",
+    "quantity",
+    "reorder_level",
+    "expiry_date",
+)
+
+
+def split_file(path, chunk_bytes=LOAD_CHUNK_BYTES):
+    """
+    ``(start, end, first_line)`` byte ranges of about ``chunk_bytes`` each
+    covering a CSV file after its header, cut at line ends
+    """
+    ranges = []
+    with open(path, "rb") as source:
+        source.readline()
+        start = source.tell()
+        line_number = 2
+        while True:
+            block = source.read(chunk_bytes)
+            if not block:
+                break
+            block += source.readline()
+            end = start + len(block)
+            ranges.append((start, end, line_number))
+            line_number += block.count(b"\n")
+            start = end
+    return ranges
+
+
+def parse_range(task):
+    """
+    Parse one byte range of a CSV file in a worker process. Returns the
+    valid rows as tuples ordered like ``STAGING_COLUMNS`` (with category
+    and unit names in place of ids), the row errors and the number of
+    rows read.
+    """
+    path, start, end, first_line = task
+    with open(path, "rb") as source:
+        source.seek(start)
+        text = source.read(end - start).decode("utf-8")
+
+    rows = []
+    errors = []
+    processed = 0
+    reader = csv.reader(io.StringIO(text, newline=""))
+    for row in reader:
+        if not any(cell.strip() for cell in row):
+            continue
+        processed += 1
+        line_number = first_line + reader.line_num - 1
+        try:
+            values = parse_row(row)
+        except RowError as e:
+            errors.append((line_number, row[1] if len(row) > 1 else "", str(e)))
+            continue
+        rows.append(
+            (
+                line_number,
+                values["sku"],
+                values["name"],
+                values["barcode"] or None,
+                values["category"],
+                values["unit"],
+                values["description"] or None,
+                values["cost_price"],
+                values["selling_price"],
+                values["quantity"],
+                values["reorder_level"],
+                values["expiry_date"],
+            )
+        )
+    return rows, errors, processed
+
+
+def copy_rows(cursor, table, columns, rows):
+    """Append rows to a table: ``COPY`` on PostgreSQL, ``executemany`` elsewhere"""
+    if not rows:
+        return
+    if connection.vendor == "postgresql":
+        buffer = io.StringIO()
+        # Empty unquoted CSV fields are read back as NULL
+        csv.writer(buffer).writerows(rows)
+        buffer.seek(0)
+        cursor.copy_expert(
+            f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)",
+            buffer,
+        )
+    else:
+        placeholders = ", ".join(["%s"] * len(columns))
+        cursor.executemany(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})",
+            rows,
+        )
+
+
+class BulkProductLoader(ProductImporter):
+    """
+    Load a CSV file of products for one business through a staging table.
+    Categories, units, barcodes, the error list and ``finish`` are shared
+    with ``ProductImporter``.
+    """
+
+    def __init__(self, business, workers=None, chunk_bytes=LOAD_CHUNK_BYTES):
+        super().__init__(business)
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_bytes = chunk_bytes
+
+    def load(self, path, on_chunk=None):
+        """Load the file at ``path``, calling ``on_chunk`` after each range is staged"""
+        ranges = [
+            (path, start, end, first_line)
+            for start, end, first_line in split_file(path, self.chunk_bytes)
+        ]
+        with connection.cursor() as cursor:
+            self._create_staging(cursor)
+            try:
+                for rows, errors, processed in self._parse(ranges):
+                    self.rows_processed += processed
+                    self.errors.extend(errors)
+                    self._stage(cursor, rows)
+                    if on_chunk:
+                        on_chunk(self)
+                with transaction.atomic():
+                    self._merge(cursor)
+            finally:
+                cursor.execute(f"DROP TABLE IF EXISTS {BARCODES_TABLE}")
+                cursor.execute(f"DROP TABLE IF EXISTS {STAGING_TABLE}")
+
+    def _parse(self, tasks):
+        if self.workers <= 1 or len(tasks) <= 1:
+            yield from map(parse_range, tasks)
+            return
+        # Spawned workers share nothing with this process, in particular
+        # not its database connection
+        with ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=django.setup,
+        ) as executor:
+            yield from executor.map(parse_range, tasks)
+
+    def _create_staging(self, cursor):
+        cursor.execute(f"""
+            CREATE TEMPORARY TABLE {STAGING_TABLE} (
+                line integer PRIMARY KEY,
+                sku varchar(100) NOT NULL,
+                name varchar(200) NOT NULL,
+                barcode varchar(100),
+                category_id bigint NOT NULL,
+                unit_id bigint NOT NULL,
+                description text,
+                cost_price numeric(10, 2) NOT NULL,
+                selling_price numeric(10, 2) NOT NULL,
+                quantity numeric(10, 2) NOT NULL,
+                reorder_level numeric(10, 2) NOT NULL,
+                expiry_date date,
+                generated_barcode varchar(100)
+            )
+            """)
+        cursor.execute(
+            f"CREATE TEMPORARY TABLE {BARCODES_TABLE} "
+            f"(line integer PRIMARY KEY, barcode varchar(100) NOT NULL)"
+        )
+
+    def _stage(self, cursor, rows):
+        self._resolve(
+            self.categories,
+            Category,
+            {row[4] for row in rows},
+            lambda name: {"description": f"Category for {name}"},
+        )
+        self._resolve(
+            self.units,
+            Unit,
+            {row[5] for row in rows},
+            lambda name: {"symbol": name[:3].upper()},
+        )
+        staged = []
+        for row in rows:
+            category_id = self.categories.get(row[4])
+            unit_id = self.units.get(row[5])
+            if category_id is None or unit_id is None:
+                self._error(row[0], row[1], "Could not create the category or unit")
+                continue
+            staged.append(row[:4] + (category_id, unit_id) + row[6:])
+        copy_rows(cursor, STAGING_TABLE, STAGING_COLUMNS, staged)
+
+    def _merge(self, cursor):
+        business_id = self.business.pk
+        cursor.execute(f"CREATE INDEX {STAGING_TABLE}_sku ON {STAGING_TABLE} (sku)")
+        # Partial, so rows without a barcode do not make it look unselective
+        cursor.execute(
+            f"CREATE INDEX {STAGING_TABLE}_barcode ON {STAGING_TABLE} (barcode) "
+            f"WHERE barcode IS NOT NULL"
+        )
+        cursor.execute(f"ANALYZE {STAGING_TABLE}")
+
+        # A SKU repeated in the file keeps its last row
+        cursor.execute(f"""
+            DELETE FROM {STAGING_TABLE} WHERE EXISTS (
+                SELECT 1 FROM {STAGING_TABLE} later
+                WHERE later.sku = {STAGING_TABLE}.sku
+                  AND later.line > {STAGING_TABLE}.line
+            )
+            """)
+
+        # Barcodes used by another SKU, in the file or already in the database
+        cursor.execute(
+            f"""
+            SELECT s.line, s.sku, s.barcode, earlier.sku
+            FROM {STAGING_TABLE} s
+            JOIN {STAGING_TABLE} earlier
+              ON earlier.barcode = s.barcode AND earlier.line < s.line
+            WHERE s.barcode IS NOT NULL
+            UNION ALL
+            SELECT s.line, s.sku, s.barcode, p.sku
+            FROM {STAGING_TABLE} s
+            JOIN products_product p
+              ON p.business_id = %s AND p.barcode = s.barcode AND p.sku <> s.sku
+            -- Lets the partial unique index on (business_id, barcode) be used
+            WHERE s.barcode IS NOT NULL AND p.barcode <> ''
+            UNION ALL
+            SELECT s.line, s.sku, s.barcode, 'variant ' || v.sku
+            FROM {STAGING_TABLE} s
+            JOIN products_productvariant v
+              ON v.business_id = %s AND v.barcode = s.barcode
+            WHERE s.barcode IS NOT NULL AND v.barcode <> ''
+            """,
+            [business_id, business_id],
+        )
+        clashes = {}
+        for line_number, sku, barcode, owner in cursor.fetchall():
+            clashes.setdefault(
+                line_number, (line_number, sku, f"Barcode {barcode} is used by {owner}")
+            )
+        if clashes:
+            self.errors.extend(clashes.values())
+            cursor.executemany(
+                f"DELETE FROM {STAGING_TABLE} WHERE line = %s",
+                [(line_number,) for line_number in clashes],
+            )
+
+        self._generate_barcodes(cursor)
+
+        now = connection.ops.adapt_datetimefield_value(timezone.now())
+        cursor.execute(
+            f"""
+            UPDATE products_product SET
+                name = s.name,
+                barcode = COALESCE(s.barcode, products_product.barcode),
+                category_id = s.category_id,
+                unit_id = s.unit_id,
+                description = s.description,
+                cost_price = s.cost_price,
+                selling_price = s.selling_price,
+                quantity = s.quantity,
+                reorder_level = s.reorder_level,
+                expiry_date = s.expiry_date,
+                updated_at = %s
+            FROM {STAGING_TABLE} s
+            WHERE products_product.business_id = %s
+              AND products_product.sku = s.sku
+            """,
+            [now, business_id],
+        )
+        self.updated += cursor.rowcount
+        cursor.execute(
+            f"""
+            INSERT INTO products_product (
+                business_id, name, sku, barcode, barcode_format, category_id,
+                unit_id, description, image, cost_price, selling_price,
+                quantity, reorder_level, expiry_date, is_active, has_variants,
+                created_at, updated_at
+            )
+            SELECT
+                %s, s.name, s.sku, COALESCE(s.barcode, s.generated_barcode),
+                'code128', s.category_id, s.unit_id, s.description, '',
+                s.cost_price, s.selling_price, s.quantity, s.reorder_level,
+                s.expiry_date, %s, %s, %s, %s
+            FROM {STAGING_TABLE} s
+            WHERE NOT EXISTS (
+                SELECT 1 FROM products_product p
+                WHERE p.business_id = %s AND p.sku = s.sku
+            )
+            ORDER BY s.line
+            """,
+            [business_id, True, False, now, now, business_id],
+        )
+        self.created += cursor.rowcount
+
+    def _generate_barcodes(self, cursor):
+        """Allocate barcodes for the new products that have none, as one block"""
+        cursor.execute(
+            f"""
+            SELECT s.line FROM {STAGING_TABLE} s
+            WHERE s.barcode IS NULL AND NOT EXISTS (
+                SELECT 1 FROM products_product p
+                WHERE p.business_id = %s AND p.sku = s.sku
+            )
+            ORDER BY s.line
+            """,
+            [self.business.pk],
+        )
+        lines = [line_number for (line_number,) in cursor.fetchall()]
+        if not lines:
+            return
+        # Generated codes must not clash with codes given in the file either
+        cursor.execute(
+            f"SELECT barcode FROM {STAGING_TABLE} WHERE barcode LIKE %s",
+            [GENERATED_PREFIX + "%"],
+        )
+        in_file = {barcode for (barcode,) in cursor.fetchall()}
+        barcodes = []
+        while len(barcodes) < len(lines):
+            barcodes += [
+                barcode
+                for barcode in self.barcodes.allocate(len(lines) - len(barcodes))
+                if barcode not in in_file
+            ]
+        copy_rows(
+            cursor, BARCODES_TABLE, ("line", "barcode"), list(zip(lines, barcodes))
+        )
+        cursor.execute(f"""
+            UPDATE {STAGING_TABLE} SET generated_barcode = b.barcode
+            FROM {BARCODES_TABLE} b WHERE b.line = {STAGING_TABLE}.line
+            """)
@@ -10,7 +10,9 @@ from .models import (
     VariantAttributeValue,
     ProductVariantAttribute,
     InventoryTransfer,
+    InventoryTransferLine,
 )
+from .transfers import check_transfer_lines, parse_transfer_lines
 from superadmin.models import Branch
 
 
@@ -370,32 +372,37 @@ class ProductVariantAttributeForm(forms.ModelForm):
 
 
 class InventoryTransferForm(forms.ModelForm):
-    """Form for creating inventory transfers between branches"""
+    """
+    Form for creating inventory transfers between branches. Its lines are
+    entered as one ``SKU, quantity`` per line, so a whole restock can be
+    pasted from a spreadsheet.
+    """
+
+    lines = forms.CharField(
+        widget=forms.Textarea(
+            attrs={"rows": 10, "placeholder": "SKU001, 12\nSKU002, 4.5"}
+        ),
+        help_text="One product or variant per line as SKU, quantity",
+    )
 
     class Meta:
         model = InventoryTransfer
         fields = [
             "from_branch",
             "to_branch",
-            "product",
-            "product_variant",
-            "quantity",
             "notes",
         ]
         widgets = {
             "notes": forms.Textarea(attrs={"rows": 3}),
-            "quantity": forms.NumberInput(attrs={"step": "0.01"}),
-        }
-        help_texts = {
-            "quantity": "Enter the quantity to transfer",
         }
 
     def __init__(self, *args, **kwargs):
         self.business = kwargs.pop("business", None)
         self.user = kwargs.pop("user", None)
         super().__init__(*args, **kwargs)
+        self.transfer_lines = []
 
-        # If we have a business context, filter branches, products and variants by business
+        # If we have a business context, filter branches by business
         if self.business:
             self.fields["from_branch"].queryset = Branch.objects.filter(
                 business=self.business, is_active=True
@@ -403,18 +410,10 @@ class InventoryTransferForm(forms.ModelForm):
             self.fields["to_branch"].queryset = Branch.objects.filter(
                 business=self.business, is_active=True
             )
-            self.fields["product"].queryset = Product.objects.filter(
-                business=self.business, is_active=True
-            )
-            self.fields["product_variant"].queryset = ProductVariant.objects.filter(
-                business=self.business, is_active=True
-            )
         else:
             # If no business context, show empty querysets
             self.fields["from_branch"].queryset = Branch.objects.none()
             self.fields["to_branch"].queryset = Branch.objects.none()
-            self.fields["product"].queryset = Product.objects.none()
-            self.fields["product_variant"].queryset = ProductVariant.objects.none()
 
         # Exclude the "from_branch" field from "to_branch" queryset to prevent self-transfers
         if "from_branch" in self.data:
@@ -429,46 +428,43 @@ class InventoryTransferForm(forms.ModelForm):
             self.fields["to_branch"].queryset = self.fields[
                 "to_branch"
             ].queryset.exclude(pk=self.instance.from_branch.pk)
+            self.initial["lines"] = "\n".join(
+                f"{(line.product_variant or line.product).sku}, {line.quantity}"
+                for line in self.instance.lines.select_related(
+                    "product", "product_variant"
+                )
+            )
+
+    def clean_lines(self):
+        lines, errors = parse_transfer_lines(self.business, self.cleaned_data["lines"])
+        if errors:
+            raise ValidationError(errors)
+        if not lines:
+            raise ValidationError("Enter at least one line.")
+        self.transfer_lines = lines
+        return self.cleaned_data["lines"]
 
     def clean(self):
         cleaned_data = super().clean()
         from_branch = cleaned_data.get("from_branch")
         to_branch = cleaned_data.get("to_branch")
-        product = cleaned_data.get("product")
-        product_variant = cleaned_data.get("product_variant")
-        quantity = cleaned_data.get("quantity")
 
         # Validate that from_branch and to_branch are different
         if from_branch and to_branch and from_branch == to_branch:
             raise ValidationError("Source and destination branches must be different.")
 
-        # Validate that either product or product_variant is selected, but not both
-        if not product and not product_variant:
-            raise ValidationError(
-                "Either a product or product variant must be selected."
-            )
-        if product and product_variant:
-            raise ValidationError(
-                "Only one of product or product variant can be selected."
-            )
-
-        # Validate quantity
-        if quantity and quantity <= 0:
-            raise ValidationError("Quantity must be greater than zero.")
-
-        # Check available stock for the selected product/variant
-        if product and from_branch:
-            if product.branch == from_branch and product.quantity < quantity:
-                raise ValidationError(
-                    f"Insufficient stock in {from_branch.name}. Available: {product.quantity}, Requested: {quantity}"
-                )
-        elif product_variant and from_branch:
-            if (
-                product_variant.branch == from_branch
-                and product_variant.quantity < quantity
-            ):
-                raise ValidationError(
-                    f"Insufficient stock in {from_branch.name}. Available: {product_variant.quantity}, Requested: {quantity}"
-                )
+        # Check available stock for every line
+        if from_branch and to_branch and self.transfer_lines:
+            errors = check_transfer_lines(from_branch, to_branch, self.transfer_lines)
+            if errors:
+                raise ValidationError(errors)
 
         return cleaned_data
+
+    def save_lines(self, transfer):
+        """Replace the lines of a saved ``transfer`` with the ones entered"""
+        transfer.lines.all().delete()
+        for line in self.transfer_lines:
+            line.transfer = transfer
+            line.business = transfer.business
+        InventoryTransferLine.objects.bulk_create(self.transfer_lines)
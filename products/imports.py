@@ -0,0 +1,532 @@
+"""
+Product CSV imports.
+
+Uploads are stored as ``ProductImportJob`` rows and processed by
+``ProductImporter``, inline for small files and by the
+``run_import_jobs`` worker command otherwise. The importer streams the
+file and handles it in chunks of ``IMPORT_CHUNK_SIZE`` rows. For each
+chunk it:
+
+- parses and validates the rows, collecting per-row errors;
+- resolves categories and units from a per-run cache, creating missing
+  ones in bulk;
+- looks up existing SKUs and barcode clashes with one query each;
+- allocates generated barcodes as one block;
+- creates new products with one ``bulk_create`` and updates changed ones
+  with one ``UPDATE`` each, skipping rows that change nothing.
+
+Bulk writes send no model signals. The side effects those signals had
+run once per import instead: one stock alert pass, one search index
+refresh, one branch stock level sync and one audit log entry. Rows that
+could not be imported are written to a CSV error report attached to the
+job.
+
+As with report jobs (see reports.jobs), a running import refreshes its
+``heartbeat_at`` after every chunk and ``requeue_stale_jobs`` puts imports
+left running by a dead worker back in the queue after
+``PRODUCT_IMPORT_STALE_MINUTES``. Rows are matched on SKU, so running a
+file again updates the products the first run created.
+"""
+
+import csv
+import datetime
+import io
+import logging
+import tempfile
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.files import File
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from superadmin.middleware import clear_current_business, set_current_business
+from .barcodes import BarcodeAllocator
+from .models import Category, Product, ProductImportJob, ProductVariant, Unit
+
+logger = logging.getLogger(__name__)
+
+IMPORT_COLUMNS = (
+    "name",
+    "sku",
+    "barcode",
+    "category",
+    "unit",
+    "description",
+    "cost_price",
+    "selling_price",
+    "quantity",
+    "reorder_level",
+    "expiry_date",
+)
+IMPORT_CHUNK_SIZE = 1000
+MAX_JOB_ATTEMPTS = 3
+DATE_FORMATS = ("%Y-%m-%d", "%d/%m/%Y", "%m/%d/%Y")
+# Largest value the products' decimal(10, 2) columns hold
+MAX_DECIMAL = Decimal("99999999.99")
+# Fields an import overwrites on existing products
+UPDATE_FIELDS = [
+    "name",
+    "barcode",
+    "category",
+    "unit",
+    "description",
+    "cost_price",
+    "selling_price",
+    "quantity",
+    "reorder_level",
+    "expiry_date",
+    "updated_at",
+]
+
+
+def _field_values(product):
+    """The imported values of ``product``, to tell whether a row changes it"""
+    return tuple(
+        getattr(product, Product._meta.get_field(name).attname)
+        for name in UPDATE_FIELDS
+        if name != "updated_at"
+    )
+
+
+def _update(product):
+    # bulk_update builds a CASE per field per row, which costs far more
+    # Python time than a plain UPDATE per product
+    Product._base_manager.filter(pk=product.pk).update(
+        **{
+            Product._meta.get_field(name).attname: getattr(
+                product, Product._meta.get_field(name).attname
+            )
+            for name in UPDATE_FIELDS
+        }
+    )
+
+
+class RowError(ValueError):
+    """A CSV row that cannot be imported"""
+
+
+MAX_LENGTHS = {
+    "name": Product._meta.get_field("name").max_length,
+    "sku": Product._meta.get_field("sku").max_length,
+    "barcode": Product._meta.get_field("barcode").max_length,
+    "category": Category._meta.get_field("name").max_length,
+    "unit": Unit._meta.get_field("name").max_length,
+}
+
+
+def _decimal(value, label):
+    if not value:
+        return Decimal("0")
+    try:
+        number = Decimal(value)
+    except InvalidOperation:
+        raise RowError(f"Invalid {label}: {value}")
+    if not number.is_finite() or abs(number) > MAX_DECIMAL:
+        raise RowError(f"Invalid {label}: {value}")
+    return number
+
+
+def _date(value):
+    if not value:
+        return None
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(value, date_format).date()
+        except ValueError:
+            continue
+    raise RowError(f"Invalid expiry date: {value}")
+
+
+def parse_row(row):
+    """Validate a CSV row and return its values as a dict"""
+    if len(row) < len(IMPORT_COLUMNS):
+        raise RowError("Insufficient columns")
+    values = dict(zip(IMPORT_COLUMNS, (cell.strip() for cell in row)))
+    if not all(values[field] for field in ("name", "sku", "category", "unit")):
+        raise RowError("Missing required fields (name, sku, category, unit)")
+    for field in ("name", "sku", "barcode", "category", "unit"):
+        if len(values[field]) > MAX_LENGTHS[field]:
+            raise RowError(f"{field.capitalize()} is too long: {values[field]}")
+
+    for field in ("cost_price", "selling_price", "quantity", "reorder_level"):
+        values[field] = _decimal(values[field], field.replace("_", " "))
+    values["expiry_date"] = _date(values["expiry_date"])
+    return values
+
+
+class ProductImporter:
+    def __init__(self, business, chunk_size=IMPORT_CHUNK_SIZE):
+        self.business = business
+        self.chunk_size = chunk_size
+        self.categories = dict(
+            Category._base_manager.filter(business=business).values_list("name", "id")
+        )
+        self.units = dict(
+            Unit._base_manager.filter(business=business).values_list("name", "id")
+        )
+        self.barcodes = BarcodeAllocator(business)
+        self.rows_processed = 0
+        self.created = 0
+        self.updated = 0
+        # (line number, sku, message) of the rows not imported
+        self.errors = []
+
+    def import_rows(self, rows, on_chunk=None):
+        """Import ``(line_number, row)`` pairs, calling ``on_chunk`` after each chunk"""
+        chunk = []
+        for line_number, row in rows:
+            chunk.append((line_number, row))
+            if len(chunk) >= self.chunk_size:
+                self.import_chunk(chunk)
+                chunk = []
+                if on_chunk:
+                    on_chunk(self)
+        if chunk:
+            self.import_chunk(chunk)
+            if on_chunk:
+                on_chunk(self)
+
+    def _error(self, line_number, sku, message):
+        self.errors.append((line_number, sku, message))
+
+    def _resolve(self, cache, model, names, defaults):
+        """Ids of categories or units by name, creating the missing ones"""
+        missing = sorted(name for name in names if name not in cache)
+        if missing:
+            model._base_manager.bulk_create(
+                [
+                    model(business=self.business, name=name, **defaults(name))
+                    for name in missing
+                ],
+                ignore_conflicts=True,
+            )
+            cache.update(
+                model._base_manager.filter(
+                    business=self.business, name__in=missing
+                ).values_list("name", "id")
+            )
+
+    def _taken_barcodes(self, barcodes):
+        """Map barcodes already in use to the SKU using them"""
+        taken = dict(
+            Product._base_manager.filter(business=self.business, barcode__in=barcodes)
+            .order_by()
+            .values_list("barcode", "sku")
+        )
+        for barcode, sku in (
+            ProductVariant._base_manager.filter(
+                business=self.business, barcode__in=barcodes
+            )
+            .order_by()
+            .values_list("barcode", "sku")
+        ):
+            taken.setdefault(barcode, f"variant {sku}")
+        return taken
+
+    def import_chunk(self, chunk):
+        parsed = {}
+        for line_number, row in chunk:
+            self.rows_processed += 1
+            try:
+                values = parse_row(row)
+            except RowError as e:
+                self._error(line_number, row[1] if len(row) > 1 else "", str(e))
+                continue
+            # A SKU repeated in the file keeps its last row
+            parsed.pop(values["sku"], None)
+            parsed[values["sku"]] = (line_number, values)
+        if not parsed:
+            return
+
+        self._resolve(
+            self.categories,
+            Category,
+            {values["category"] for _, values in parsed.values()},
+            lambda name: {"description": f"Category for {name}"},
+        )
+        self._resolve(
+            self.units,
+            Unit,
+            {values["unit"] for _, values in parsed.values()},
+            lambda name: {"symbol": name[:3].upper()},
+        )
+        existing = {
+            product.sku: product
+            for product in Product._base_manager.filter(
+                business=self.business, sku__in=list(parsed)
+            )
+        }
+        taken = self._taken_barcodes(
+            [values["barcode"] for _, values in parsed.values() if values["barcode"]]
+        )
+
+        now = timezone.now()
+        to_create = []
+        to_update = []
+        for sku, (line_number, values) in parsed.items():
+            category_id = self.categories.get(values["category"])
+            unit_id = self.units.get(values["unit"])
+            if category_id is None or unit_id is None:
+                self._error(line_number, sku, "Could not create the category or unit")
+                continue
+
+            barcode = values["barcode"]
+            if barcode:
+                owner = taken.get(barcode)
+                if owner is not None and owner != sku:
+                    self._error(
+                        line_number, sku, f"Barcode {barcode} is used by {owner}"
+                    )
+                    continue
+                taken[barcode] = sku
+
+            product = existing.get(sku)
+            if product is None:
+                product = Product(business=self.business, sku=sku)
+                to_create.append((line_number, product))
+                before = None
+            else:
+                before = _field_values(product)
+            product.name = values["name"]
+            # Products keep their barcode when the row has none
+            product.barcode = barcode or product.barcode
+            product.category_id = category_id
+            product.unit_id = unit_id
+            product.description = values["description"]
+            product.cost_price = values["cost_price"]
+            product.selling_price = values["selling_price"]
+            product.quantity = values["quantity"]
+            product.reorder_level = values["reorder_level"]
+            product.expiry_date = values["expiry_date"]
+            if before is not None:
+                if _field_values(product) == before:
+                    self.updated += 1
+                    continue
+                to_update.append((line_number, product))
+            product.updated_at = now
+
+        without_barcode = [product for _, product in to_create if not product.barcode]
+        for product, barcode in zip(
+            without_barcode, self.barcodes.allocate(len(without_barcode))
+        ):
+            product.barcode = barcode
+
+        self._write(to_create, to_update)
+
+    def _write(self, to_create, to_update):
+        try:
+            with transaction.atomic():
+                Product._base_manager.bulk_create([product for _, product in to_create])
+                for _, product in to_update:
+                    _update(product)
+        except IntegrityError:
+            # A concurrent edit took a SKU or barcode; find the rows one by one
+            logger.info("Bulk write failed, importing chunk row by row")
+            self._write_rows(to_create, to_update)
+            return
+        self.created += len(to_create)
+        self.updated += len(to_update)
+
+    def _write_rows(self, to_create, to_update):
+        for line_number, product in to_create:
+            product.pk = None
+            try:
+                with transaction.atomic():
+                    Product._base_manager.bulk_create([product])
+                self.created += 1
+            except IntegrityError as e:
+                self._error(line_number, product.sku, str(e))
+        for line_number, product in to_update:
+            try:
+                with transaction.atomic():
+                    _update(product)
+                self.updated += 1
+            except IntegrityError as e:
+                self._error(line_number, product.sku, str(e))
+
+    def finish(self, user=None):
+        """Run the side effects the skipped model signals would have had"""
+        from settings.utils import log_activity
+        from .search import bump_search_version
+        from .stock_levels import sync_stock_levels
+        from .stock_monitoring import _check_low_stock_for_business
+
+        bump_search_version(self.business.pk)
+        _check_low_stock_for_business(self.business)
+        sync_stock_levels(self.business)
+        log_activity(
+            user=user,
+            action="CREATE",
+            model_name="Product",
+            object_repr=f"Product import ({self.created + self.updated} products)",
+            change_message=(
+                f"Imported {self.created} new and updated {self.updated} "
+                f"existing products; {len(self.errors)} rows failed"
+            ),
+        )
+
+    def write_error_report(self, output):
+        """Write the failed rows as CSV to a binary file"""
+        text = io.TextIOWrapper(output, encoding="utf-8", newline="")
+        writer = csv.writer(text)
+        writer.writerow(["line", "sku", "error"])
+        writer.writerows(sorted(self.errors, key=lambda error: error[0]))
+        text.flush()
+        text.detach()
+
+
+def read_rows(binary_file):
+    """Stream ``(line_number, row)`` pairs from a CSV file, skipping the header"""
+    text = io.TextIOWrapper(binary_file, encoding="utf-8-sig", newline="")
+    try:
+        reader = csv.reader(text)
+        next(reader, None)
+        for row in reader:
+            if any(cell.strip() for cell in row):
+                yield reader.line_num, row
+    finally:
+        # Leave the file open for its owner
+        text.detach()
+
+
+def submit_import_job(business, uploaded_file, user=None, branch=None):
+    """Store an uploaded CSV and queue it for import"""
+    job = ProductImportJob(
+        business=business,
+        branch=branch,
+        requested_by=user,
+        original_name=uploaded_file.name[:255],
+    )
+    job.source_file.save(uploaded_file.name, uploaded_file, save=False)
+    job.save()
+    return job
+
+
+def should_run_inline(job):
+    """Small files are imported in the request, larger ones by the worker"""
+    limit = getattr(settings, "PRODUCT_IMPORT_INLINE_MAX_BYTES", 256 * 1024)
+    return job.source_file.size <= limit
+
+
+def claim_next_job():
+    """Atomically claim the oldest pending import (see reports.jobs)"""
+    queryset = ProductImportJob._base_manager.filter(status="pending").order_by(
+        "created_at"
+    )
+    for job_id in queryset.values_list("id", flat=True)[:10]:
+        if claim_job(job_id):
+            return ProductImportJob._base_manager.get(id=job_id)
+    return None
+
+
+def claim_job(job_id):
+    now = timezone.now()
+    return ProductImportJob._base_manager.filter(id=job_id, status="pending").update(
+        status="running",
+        started_at=now,
+        heartbeat_at=now,
+        progress=0,
+        attempts=F("attempts") + 1,
+    )
+
+
+def requeue_stale_jobs():
+    """
+    Requeue running imports whose heartbeat is older than
+    ``PRODUCT_IMPORT_STALE_MINUTES``, failing those out of attempts.
+    Returns the number of imports requeued.
+    """
+    now = timezone.now()
+    stale_before = now - datetime.timedelta(
+        minutes=getattr(settings, "PRODUCT_IMPORT_STALE_MINUTES", 15)
+    )
+    stale = ProductImportJob._base_manager.filter(
+        Q(heartbeat_at__lt=stale_before)
+        | Q(heartbeat_at=None, started_at__lt=stale_before),
+        status="running",
+    )
+    failed = stale.filter(attempts__gte=MAX_JOB_ATTEMPTS).update(
+        status="failed",
+        error="The worker stopped before finishing the import.",
+        completed_at=now,
+    )
+    if failed:
+        logger.warning("Failed %s product import(s) out of attempts", failed)
+    requeued = stale.update(
+        status="pending", started_at=None, heartbeat_at=None, progress=0
+    )
+    if requeued:
+        logger.warning("Requeued %s stale product import(s)", requeued)
+    return requeued
+
+
+def run_import_job(job):
+    """Import a claimed job's file and store the results on the job"""
+    importer = ProductImporter(job.business)
+    size = job.source_file.size or 1
+
+    set_current_business(job.business)
+    try:
+        with job.source_file.open("rb") as source:
+
+            def record_progress(importer):
+                progress = min(int(source.tell() * 100 / size), 99)
+                ProductImportJob._base_manager.filter(id=job.id).update(
+                    progress=progress,
+                    rows_processed=importer.rows_processed,
+                    created_count=importer.created,
+                    updated_count=importer.updated,
+                    error_count=len(importer.errors),
+                    heartbeat_at=timezone.now(),
+                )
+
+            importer.import_rows(read_rows(source), on_chunk=record_progress)
+        importer.finish(user=job.requested_by)
+    finally:
+        clear_current_business()
+
+    if importer.errors:
+        with tempfile.TemporaryFile() as output:
+            importer.write_error_report(output)
+            output.seek(0)
+            job.error_file.save(
+                f"{job.business_id}/import_{job.id}_errors.csv",
+                File(output),
+                save=False,
+            )
+
+    job.status = "completed"
+    job.progress = 100
+    job.rows_processed = importer.rows_processed
+    job.created_count = importer.created
+    job.updated_count = importer.updated
+    job.error_count = len(importer.errors)
+    job.completed_at = timezone.now()
+    job.save(
+        update_fields=[
+            "status",
+            "progress",
+            "rows_processed",
+            "created_count",
+            "updated_count",
+            "error_count",
+            "error_file",
+            "completed_at",
+        ]
+    )
+    return job
+
+
+def process_job(job):
+    """Run a claimed job, marking it failed instead of raising"""
+    try:
+        return run_import_job(job)
+    except Exception as e:
+        logger.exception("Product import %s failed", job.id)
+        job.status = "failed"
+        job.error = str(e)
+        job.completed_at = timezone.now()
+        job.save(update_fields=["status", "error", "completed_at"])
+        return job
@@ -0,0 +1,303 @@
+"""
+Stock ledger queries.
+
+``StockMovement`` rows record every stock change with the quantity before
+and after it. ``take_stock_snapshot`` periodically stores the stock of every
+product of a business in ``StockSnapshot`` (missed dates can be backfilled);
+the stock at any date is then the nearest earlier snapshot plus the
+movements after it, instead of a replay of the whole ledger. Dates before the first snapshot are answered
+backwards from the current stock.
+
+Run ``python manage.py snapshot_stock`` nightly (or at least at every
+month end), ``python manage.py stock_as_of`` for a stock valuation at a
+date and ``python manage.py verify_stock_ledger`` to detect drift between
+the ledger and ``Product.quantity``.
+"""
+
+import logging
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import (
+    BigIntegerField,
+    DecimalField,
+    F,
+    Max,
+    Min,
+    OuterRef,
+    Subquery,
+    Sum,
+    Value,
+)
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from reports.utils import date_range_filter, local_day_bounds
+from .models import Product, StockMovement, StockSnapshot
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+
+
+def _net_change():
+    return Sum(F("new_quantity") - F("previous_quantity"))
+
+
+def _net_changes(movements):
+    """Net stock change per product of a movement queryset"""
+    return dict(
+        movements.values("product_id")
+        .annotate(change=_net_change())
+        .order_by()
+        .values_list("product_id", "change")
+    )
+
+
+def take_stock_snapshot(business, snapshot_date=None):
+    """
+    Store the stock of every product of a business at the close of
+    ``snapshot_date`` (today by default) and return the number of rows.
+
+    Today's snapshot is the current stock. A snapshot of an earlier date,
+    to backfill a missed night, is the current stock less the movements
+    recorded after that date, for the products that existed then. Either
+    way, quantities and movements are read in one statement, so on
+    PostgreSQL they come from the same consistent view of the database.
+    """
+    today = timezone.localdate()
+    if snapshot_date is None:
+        snapshot_date = today
+    if snapshot_date > today:
+        raise ValueError("Cannot snapshot the stock of a future date")
+
+    movements = StockMovement._base_manager.filter(business=business)
+    products = Product._base_manager.filter(business=business)
+    if snapshot_date == today:
+        newest_movement = movements.order_by("-id").values("id")[:1]
+        rows = products.annotate(
+            last_movement_id=Coalesce(
+                Subquery(newest_movement), 0, output_field=BigIntegerField()
+            ),
+            closing=F("quantity"),
+        )
+    else:
+        _, cutoff = local_day_bounds(snapshot_date)
+        # Snapshots are read forward from their last movement id, so the
+        # movements taken back out are exactly the ones after it
+        last_movement_id = (
+            movements.filter(created_at__lt=cutoff).aggregate(last=Max("id"))["last"]
+            or 0
+        )
+        later = (
+            movements.filter(product=OuterRef("pk"), id__gt=last_movement_id)
+            .order_by()
+            .values("product")
+            .annotate(change=_net_change())
+            .values("change")
+        )
+        rows = products.filter(created_at__lt=cutoff).annotate(
+            last_movement_id=Value(last_movement_id, output_field=BigIntegerField()),
+            closing=F("quantity")
+            - Coalesce(
+                Subquery(later),
+                Value(0),
+                output_field=DecimalField(max_digits=10, decimal_places=2),
+            ),
+        )
+    rows = rows.values_list("id", "branch_id", "closing", "last_movement_id").order_by()
+
+    now = timezone.now()
+    snapshots = [
+        StockSnapshot(
+            business=business,
+            branch_id=branch_id,
+            product_id=product_id,
+            snapshot_date=snapshot_date,
+            quantity=quantity,
+            last_movement_id=last_movement_id,
+            taken_at=now,
+        )
+        for product_id, branch_id, quantity, last_movement_id in rows.iterator(
+            chunk_size=BATCH_SIZE
+        )
+    ]
+    StockSnapshot._base_manager.bulk_create(
+        snapshots,
+        batch_size=BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=["product", "snapshot_date"],
+        update_fields=["branch", "quantity", "last_movement_id", "taken_at"],
+    )
+    logger.info(
+        "Stock snapshot of business %s for %s: %s products",
+        business.id,
+        snapshot_date,
+        len(snapshots),
+    )
+    return len(snapshots)
+
+
+def get_stock_as_of(business, as_of_date, branch=None):
+    """
+    Return ``{product_id: quantity}`` with the closing stock of every
+    product of a business (optionally of one branch) on ``as_of_date``.
+
+    Products covered by the latest snapshot on or before the date start from
+    it and add the movements after it; the others (created after the
+    snapshot, or dates before the first snapshot) start from the current
+    stock and subtract the movements after the date. The number of queries
+    does not depend on the number of products or movements.
+    """
+    _, cutoff = local_day_bounds(as_of_date)
+
+    products = Product._base_manager.filter(business=business, created_at__lt=cutoff)
+    if branch is not None:
+        products = products.filter(branch=branch)
+
+    snapshots = StockSnapshot._base_manager.filter(
+        business=business, product__in=products
+    )
+    snapshot_date = snapshots.filter(snapshot_date__lte=as_of_date).aggregate(
+        latest=Max("snapshot_date")
+    )["latest"]
+
+    stock = {}
+    if snapshot_date is not None:
+        rows = list(
+            snapshots.filter(snapshot_date=snapshot_date)
+            .values_list("product_id", "quantity", "last_movement_id")
+            .order_by()
+        )
+        stock = {product_id: quantity for product_id, quantity, _ in rows}
+        # Rows of one snapshot share the same last movement
+        last_movement_id = min(row[2] for row in rows)
+
+        forward = _net_changes(
+            StockMovement._base_manager.filter(
+                business=business,
+                product__in=products,
+                id__gt=last_movement_id,
+                created_at__lt=cutoff,
+            )
+        )
+        for product_id, change in forward.items():
+            if product_id in stock:
+                stock[product_id] += change
+
+    unsnapshotted = products
+    if snapshot_date is not None:
+        unsnapshotted = products.exclude(stock_snapshots__snapshot_date=snapshot_date)
+    current = dict(unsnapshotted.values_list("id", "quantity"))
+    if current:
+        backward = _net_changes(
+            StockMovement._base_manager.filter(
+                business=business, product__in=unsnapshotted, created_at__gte=cutoff
+            )
+        )
+        for product_id, quantity in current.items():
+            stock[product_id] = quantity - backward.get(product_id, Decimal("0"))
+
+    return stock
+
+
+def get_movement_summary(business, start_date, end_date, branch=None):
+    """
+    Summarise stock movements per product between two dates (inclusive).
+
+    Returns ``{product_id: {"opening", "closing", "movements"}}`` where
+    ``movements`` maps each movement type to its net change.
+    """
+    opening = get_stock_as_of(business, start_date - timedelta(days=1), branch)
+    closing = get_stock_as_of(business, end_date, branch)
+
+    movements = StockMovement._base_manager.filter(
+        business=business, **date_range_filter("created_at", start_date, end_date)
+    )
+    if branch is not None:
+        movements = movements.filter(product__branch=branch)
+
+    summary = {
+        product_id: {
+            "opening": opening.get(product_id, Decimal("0")),
+            "closing": quantity,
+            "movements": {},
+        }
+        for product_id, quantity in closing.items()
+    }
+    rows = (
+        movements.values("product_id", "movement_type")
+        .annotate(change=_net_change())
+        .order_by()
+    )
+    for row in rows:
+        if row["product_id"] in summary:
+            summary[row["product_id"]]["movements"][row["movement_type"]] = row[
+                "change"
+            ]
+    return summary
+
+
+def find_ledger_drift(business):
+    """
+    Compare ``Product.quantity`` with the stock the ledger implies.
+
+    Products in the latest snapshot are checked against the snapshot plus
+    the movements since; other products against the quantity after their
+    newest movement. Products with variants are skipped because variant
+    movements are recorded against the parent product with the variant's
+    quantities.
+
+    Returns a list of ``{"product", "expected", "actual", "difference"}``.
+    """
+    products = Product._base_manager.filter(business=business, has_variants=False)
+    expected = {}
+
+    snapshot_date = StockSnapshot._base_manager.filter(business=business).aggregate(
+        latest=Max("snapshot_date")
+    )["latest"]
+    if snapshot_date is not None:
+        base = StockSnapshot._base_manager.filter(
+            business=business, snapshot_date=snapshot_date, product__in=products
+        )
+        expected = dict(base.values_list("product_id", "quantity"))
+        last_movement_id = base.aggregate(last=Min("last_movement_id"))["last"]
+        since = _net_changes(
+            StockMovement._base_manager.filter(
+                business=business, product__in=products, id__gt=last_movement_id
+            )
+        )
+        for product_id, change in since.items():
+            if product_id in expected:
+                expected[product_id] += change
+
+    unsnapshotted = products
+    if snapshot_date is not None:
+        unsnapshotted = products.exclude(stock_snapshots__snapshot_date=snapshot_date)
+    newest = (
+        StockMovement._base_manager.filter(business=business, product__in=unsnapshotted)
+        .values("product_id")
+        .annotate(last_id=Max("id"))
+        .values("last_id")
+    )
+    expected.update(
+        StockMovement._base_manager.filter(id__in=newest).values_list(
+            "product_id", "new_quantity"
+        )
+    )
+
+    drift = []
+    for product in products.order_by("name").iterator(chunk_size=BATCH_SIZE):
+        if product.id not in expected:
+            continue
+        difference = product.quantity - expected[product.id]
+        if difference:
+            drift.append(
+                {
+                    "product": product,
+                    "expected": expected[product.id],
+                    "actual": product.quantity,
+                    "difference": difference,
+                }
+            )
+    return drift
@@ -0,0 +1,266 @@
+"""
+Lot tracking and first-expiry-first-out (FEFO) consumption.
+
+Received stock is recorded as ``StockLot`` rows with a lot number and an
+expiry date. Sales consume the open lots of a product that expire first
+(lots that already expired are only used once the others run out), and
+``Product.expiry_date`` follows the earliest expiry among its open lots so
+existing screens and emails show the date that matters. Products without
+an open lot that has an expiry date keep their own.
+
+Expiry processing selects expiring stock with range queries on the open
+lots, served by the partial ``(business, expiry_date)`` index. Products
+without lots fall back to their own ``expiry_date``.
+"""
+
+import logging
+from decimal import Decimal
+
+from django.db import transaction
+from functools import reduce
+from operator import or_
+
+from django.db.models import Case, Count, DecimalField, Exists, F, Min, OuterRef, Q
+from django.db.models import Subquery, Sum, Value, When
+from django.utils import timezone
+
+from .models import Product, StockLot
+
+logger = logging.getLogger(__name__)
+
+
+def default_lot_number(expiry_date=None):
+    """Stock received on the same day with the same expiry shares a lot"""
+    received = timezone.localdate().strftime("%Y%m%d")
+    expiry = expiry_date.strftime("%Y%m%d") if expiry_date else "NOEXP"
+    return f"{received}-{expiry}"
+
+
+def sync_product_expiry(product_ids):
+    """Set ``Product.expiry_date`` to the earliest expiry of its open lots"""
+    dated_lots = StockLot._base_manager.filter(
+        product=OuterRef("pk"), is_open=True, expiry_date__isnull=False
+    )
+    # Lots without an expiry date say nothing about the product's, so they
+    # never clear it
+    Product._base_manager.filter(Exists(dated_lots), id__in=product_ids).update(
+        expiry_date=Subquery(
+            dated_lots.order_by("expiry_date").values("expiry_date")[:1]
+        )
+    )
+
+
+def receive_lot(
+    product, quantity, lot_number=None, expiry_date=None, branch=None, received_at=None
+):
+    """
+    Add received stock of a product to a lot, creating the lot if needed,
+    and return the lot. Only the lot is updated; the caller updates
+    ``Product.quantity`` as before.
+    """
+    quantity = Decimal(str(quantity))
+    if quantity <= 0:
+        raise ValueError("Received quantity must be positive")
+    lot_number = lot_number or default_lot_number(expiry_date)
+
+    with transaction.atomic():
+        lot, created = StockLot._base_manager.select_for_update().get_or_create(
+            product=product,
+            lot_number=lot_number,
+            defaults={
+                "business": product.business,
+                "branch": branch or product.branch,
+                "expiry_date": expiry_date,
+                "initial_quantity": quantity,
+                "quantity": quantity,
+                "received_at": received_at or timezone.now(),
+            },
+        )
+        if not created:
+            lot.quantity += quantity
+            lot.initial_quantity += quantity
+            lot.is_open = True
+            if expiry_date:
+                lot.expiry_date = expiry_date
+            lot.save(
+                update_fields=[
+                    "quantity",
+                    "initial_quantity",
+                    "is_open",
+                    "expiry_date",
+                    "updated_at",
+                ]
+            )
+        sync_product_expiry([product.id])
+        product.refresh_from_db(fields=["expiry_date"])
+    return lot
+
+
+def receive_lots(lots):
+    """
+    ``receive_lot`` for many lots at once: add the quantity of each unsaved
+    ``StockLot`` to the lot with the same product and lot number, creating
+    the missing lots, with a constant number of queries.
+    """
+    received = {}
+    for lot in lots:
+        if lot.quantity <= 0:
+            continue
+        key = (lot.product_id, lot.lot_number)
+        if key in received:
+            received[key].quantity += lot.quantity
+        else:
+            received[key] = lot
+    if not received:
+        return
+
+    with transaction.atomic():
+        StockLot._base_manager.bulk_create(
+            [
+                StockLot(
+                    business_id=lot.business_id,
+                    branch_id=lot.branch_id,
+                    product_id=lot.product_id,
+                    lot_number=lot.lot_number,
+                    expiry_date=lot.expiry_date,
+                    initial_quantity=0,
+                    quantity=0,
+                    received_at=lot.received_at,
+                )
+                for lot in received.values()
+            ],
+            ignore_conflicts=True,
+        )
+        added = Case(
+            *[
+                When(
+                    product_id=product_id,
+                    lot_number=lot_number,
+                    then=Value(lot.quantity),
+                )
+                for (product_id, lot_number), lot in received.items()
+            ],
+            output_field=DecimalField(max_digits=10, decimal_places=2),
+        )
+        StockLot._base_manager.filter(
+            reduce(
+                or_,
+                [
+                    Q(product_id=product_id, lot_number=lot_number)
+                    for product_id, lot_number in received
+                ],
+            )
+        ).update(
+            quantity=F("quantity") + added,
+            initial_quantity=F("initial_quantity") + added,
+            is_open=True,
+            updated_at=timezone.now(),
+        )
+        sync_product_expiry({product_id for product_id, _ in received})
+
+
+def consume_fefo(product, quantity):
+    """
+    Take ``quantity`` out of the open lots of a product, first expiry first
+    out, and return ``(consumed, shortfall)`` where ``consumed`` lists
+    ``(lot, quantity)`` pairs. A shortfall is stock sold that no lot
+    covered, e.g. stock received before lots were tracked.
+    """
+    remaining = Decimal(str(quantity))
+    if remaining <= 0:
+        return [], Decimal("0")
+
+    today = timezone.localdate()
+    consumed = []
+    with transaction.atomic():
+        lots = (
+            StockLot._base_manager.select_for_update()
+            .filter(product=product, is_open=True)
+            .order_by(
+                # Sell stock that is still good before expired stock
+                Case(When(expiry_date__lt=today, then=Value(1)), default=Value(0)),
+                F("expiry_date").asc(nulls_last=True),
+                "received_at",
+                "id",
+            )
+        )
+        now = timezone.now()
+        for lot in lots:
+            if remaining <= 0:
+                break
+            taken = min(lot.quantity, remaining)
+            lot.quantity -= taken
+            lot.is_open = lot.quantity > 0
+            lot.updated_at = now
+            remaining -= taken
+            consumed.append((lot, taken))
+
+        if consumed:
+            StockLot._base_manager.bulk_update(
+                [lot for lot, _ in consumed], ["quantity", "is_open", "updated_at"]
+            )
+            sync_product_expiry([product.id])
+            product.refresh_from_db(fields=["expiry_date"])
+
+    if remaining > 0:
+        logger.info("Sale of %s exceeded its lots by %s", product, remaining)
+    return consumed, remaining
+
+
+def _range_filter(field, start, end):
+    filters = {}
+    if start is not None:
+        filters[f"{field}__gte"] = start
+    if end is not None:
+        filters[f"{field}__lte"] = end
+    return filters
+
+
+def expiring_lots(business, start=None, end=None):
+    """Open lots of a business expiring between two dates (inclusive)"""
+    return StockLot._base_manager.filter(
+        business=business,
+        is_open=True,
+        expiry_date__isnull=False,
+        **_range_filter("expiry_date", start, end),
+    )
+
+
+def expiring_products(products, start=None, end=None):
+    """
+    Narrow a product queryset to products with stock expiring between two
+    dates (inclusive): an open lot in the range, or, for products without
+    open lots, their own expiry date.
+    """
+    open_lots = StockLot._base_manager.filter(product=OuterRef("pk"), is_open=True)
+    in_range = open_lots.filter(
+        expiry_date__isnull=False, **_range_filter("expiry_date", start, end)
+    )
+    return products.filter(
+        Exists(in_range)
+        | (
+            Q(expiry_date__isnull=False, **_range_filter("expiry_date", start, end))
+            & ~Exists(open_lots)
+        )
+    )
+
+
+def summarise_expiring_lots(business, start=None, end=None):
+    """
+    Return ``{product_id: {"quantity", "lots", "earliest"}}`` for the open
+    lots expiring between two dates, computed in one grouped query.
+    """
+    rows = (
+        expiring_lots(business, start, end)
+        .values("product_id")
+        .annotate(total=Sum("quantity"), lots=Count("id"), earliest=Min("expiry_date"))
+        .order_by()
+    )
+    return {
+        row["product_id"]: {
+            "quantity": row["total"],
+            "lots": row["lots"],
+            "earliest": row["earliest"],
+        }
+        for row in rows
+    }
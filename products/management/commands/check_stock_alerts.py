@@ -1,15 +1,26 @@
+from django.conf import settings
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 from products.stock_monitoring import (
     check_low_stock_alerts,
     check_abnormal_reduction,
     check_expired_products,
+    get_businesses_to_check,
+    run_for_businesses,
 )
+from superadmin.models import Business
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+def check_business(business):
+    """Run every stock check for the business in the current context"""
+    check_low_stock_alerts()
+    check_abnormal_reduction()
+    check_expired_products()
+
+
 class Command(BaseCommand):
     help = "Check for stock alerts and create notifications"
 
@@ -19,6 +30,12 @@ class Command(BaseCommand):
             type=int,
             help="Business ID to check alerts for (optional - checks all if not provided)",
         )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=getattr(settings, "STOCK_ALERT_WORKERS", 4),
+            help="Number of businesses to check in parallel (default: 4)",
+        )
 
     def handle(self, *args, **options):
         business_id = options.get("business_id")
@@ -30,17 +47,17 @@ class Command(BaseCommand):
         )
 
         try:
-            # Check for low stock alerts
-            self.stdout.write("Checking for low stock alerts...")
-            check_low_stock_alerts()
-
-            # Check for abnormal reductions
-            self.stdout.write("Checking for abnormal stock reductions...")
-            check_abnormal_reduction()
+            if business_id:
+                businesses = list(Business.objects.filter(id=business_id))
+            else:
+                businesses = get_businesses_to_check()
 
-            # Check for expired products
-            self.stdout.write("Checking for expired products...")
-            check_expired_products()
+            # Low stock, abnormal reduction and expiry checks run per business
+            self.stdout.write(
+                f"Checking low stock, abnormal reductions and expired products "
+                f"for {len(businesses)} businesses..."
+            )
+            run_for_businesses(check_business, businesses, options["workers"])
 
             self.stdout.write(
                 self.style.SUCCESS(
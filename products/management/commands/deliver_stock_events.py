@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from products.stock_events import deliver_stock_events, DELIVERY_BATCH_SIZE
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Deliver stock alert events that were not delivered when they were recorded"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=DELIVERY_BATCH_SIZE,
+            help=f"Maximum number of events to deliver (default: {DELIVERY_BATCH_SIZE})",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            delivered = deliver_stock_events(limit=options["limit"])
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'[{timezone.now().strftime("%Y-%m-%d %H:%M:%S")}] Delivered {delivered} stock alert events'
+                )
+            )
+        except Exception as e:
+            logger.error(f"Error delivering stock alert events: {e}")
+            self.stdout.write(
+                self.style.ERROR(f"Error delivering stock alert events: {e}")
+            )
@@ -1,7 +1,8 @@
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 from django.contrib.auth import get_user_model
-from django.db.models import F
+from django.db.models import Exists, F, OuterRef
+from products.lots import expiring_products
 from products.models import Product
 from notifications.models import Notification
 from settings.models import BusinessSettings
@@ -38,92 +39,77 @@ class Command(BaseCommand):
             self.style.SUCCESS("Successfully generated automatic notifications")
         )
 
+    def unread_notifications(self, notification_type, **filters):
+        """Unread notifications of a type about the product of the outer query"""
+        return Notification.objects.filter(
+            notification_type=notification_type,
+            related_product=OuterRef("pk"),
+            is_read=False,
+            **filters,
+        )
+
     def generate_low_stock_notifications(self):
         """Generate notifications for products with low stock"""
         low_stock_products = Product.objects.filter(
             is_active=True, quantity__lte=F("reorder_level")
-        )
+        ).filter(~Exists(self.unread_notifications("low_stock")))
 
         for product in low_stock_products:
-            # Check if notification already exists for this product
-            existing_notification = Notification.objects.filter(
-                notification_type="low_stock", related_product=product, is_read=False
-            ).exists()
-
-            if not existing_notification:
-                Notification.create_for_all_users(
-                    title=f"Low Stock Alert: {product.name}",
-                    message=f'The product "{product.name}" is low on stock. Current quantity: {product.quantity}, Reorder level: {product.reorder_level}',
-                    notification_type="low_stock",
-                    related_product=product,
-                )
+            Notification.create_for_all_users(
+                title=f"Low Stock Alert: {product.name}",
+                message=f'The product "{product.name}" is low on stock. Current quantity: {product.quantity}, Reorder level: {product.reorder_level}',
+                notification_type="low_stock",
+                related_product=product,
+            )
 
     def generate_expired_product_notifications(self):
         """Generate notifications for expired products"""
         today = timezone.now().date()
-        expired_products = Product.objects.filter(is_active=True, expiry_date__lt=today)
+        expired_products = expiring_products(
+            Product.objects.filter(is_active=True), end=today - timedelta(days=1)
+        ).filter(~Exists(self.unread_notifications("expired_product")))
 
         for product in expired_products:
-            # Check if notification already exists for this product
-            existing_notification = Notification.objects.filter(
+            Notification.create_for_all_users(
+                title=f"Expired Product: {product.name}",
+                message=f'The product "{product.name}" has expired. Expiry date: {product.expiry_date}',
                 notification_type="expired_product",
                 related_product=product,
-                is_read=False,
-            ).exists()
-
-            if not existing_notification:
-                Notification.create_for_all_users(
-                    title=f"Expired Product: {product.name}",
-                    message=f'The product "{product.name}" has expired. Expiry date: {product.expiry_date}',
-                    notification_type="expired_product",
-                    related_product=product,
-                )
+            )
 
     def generate_near_expiry_notifications(self, days_threshold):
         """Generate notifications for products nearing expiry (early warning)"""
         today = timezone.now().date()
         near_expiry_date = today + timedelta(days=days_threshold)
-        near_expiry_products = Product.objects.filter(
-            is_active=True, expiry_date__gte=today, expiry_date__lte=near_expiry_date
-        )
+        near_expiry_products = expiring_products(
+            Product.objects.filter(is_active=True), today, near_expiry_date
+        ).filter(~Exists(self.unread_notifications("near_expiry")))
 
         for product in near_expiry_products:
-            # Check if notification already exists for this product
-            existing_notification = Notification.objects.filter(
-                notification_type="near_expiry", related_product=product, is_read=False
-            ).exists()
-
-            if not existing_notification:
-                days_until_expiry = (product.expiry_date - today).days
-                Notification.create_for_all_users(
-                    title=f"Product Nearing Expiry: {product.name}",
-                    message=f'The product "{product.name}" will expire in {days_until_expiry} days. Expiry date: {product.expiry_date}',
-                    notification_type="near_expiry",
-                    related_product=product,
-                )
+            days_until_expiry = (product.expiry_date - today).days
+            Notification.create_for_all_users(
+                title=f"Product Nearing Expiry: {product.name}",
+                message=f'The product "{product.name}" will expire in {days_until_expiry} days. Expiry date: {product.expiry_date}',
+                notification_type="near_expiry",
+                related_product=product,
+            )
 
     def generate_urgent_expiry_notifications(self, days_threshold):
         """Generate urgent notifications for products very close to expiry"""
         today = timezone.now().date()
         urgent_expiry_date = today + timedelta(days=days_threshold)
-        urgent_expiry_products = Product.objects.filter(
-            is_active=True, expiry_date__gte=today, expiry_date__lte=urgent_expiry_date
+        urgent_expiry_products = expiring_products(
+            Product.objects.filter(is_active=True), today, urgent_expiry_date
+        ).filter(
+            # Urgent notifications use the near expiry type with an urgent title
+            ~Exists(self.unread_notifications("near_expiry", title__icontains="Urgent"))
         )
 
         for product in urgent_expiry_products:
-            # Check if urgent notification already exists for this product
-            existing_notification = Notification.objects.filter(
-                notification_type="near_expiry",  # Using same type but with urgent message
+            days_until_expiry = (product.expiry_date - today).days
+            Notification.create_for_all_users(
+                title=f"Urgent: Product Expiring Soon: {product.name}",
+                message=f'URGENT: The product "{product.name}" will expire in {days_until_expiry} days. Expiry date: {product.expiry_date}. Please take immediate action.',
+                notification_type="near_expiry",
                 related_product=product,
-                is_read=False,
-                title__icontains="Urgent",  # Check if urgent notification exists
-            ).exists()
-
-            if not existing_notification:
-                days_until_expiry = (product.expiry_date - today).days
-                Notification.create_for_all_users(
-                    title=f"Urgent: Product Expiring Soon: {product.name}",
-                    message=f'URGENT: The product "{product.name}" will expire in {days_until_expiry} days. Expiry date: {product.expiry_date}. Please take immediate action.',
-                    notification_type="near_expiry",
-                    related_product=product,
-                )
+            )
@@ -0,0 +1,88 @@
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+from products.models import Product, VariantAttribute, VariantAttributeValue
+from products.variant_matrix import generate_variant_matrix
+
+
+def decimal_argument(value):
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        raise ValueError(value)
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate the variants of a product for every combination of attribute "
+        'values, e.g. --attribute "Size=S,M,L" --attribute "Color=Red,Blue"'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("product_id", type=int, help="Product to add variants to")
+        parser.add_argument(
+            "--attribute",
+            action="append",
+            required=True,
+            help="Attribute and its values as Name=value1,value2 (repeatable); "
+            "missing attributes and values are created",
+        )
+        parser.add_argument("--cost-price", type=decimal_argument)
+        parser.add_argument("--selling-price", type=decimal_argument)
+        parser.add_argument("--quantity", type=decimal_argument, default=Decimal("0"))
+        parser.add_argument(
+            "--reorder-level", type=decimal_argument, default=Decimal("0")
+        )
+
+    def handle(self, *args, **options):
+        try:
+            product = Product._base_manager.select_related("business").get(
+                pk=options["product_id"]
+            )
+        except Product.DoesNotExist:
+            raise CommandError(f"Product with ID {options['product_id']} not found")
+        business = product.business
+
+        value_sets = []
+        for spec in options["attribute"]:
+            name, _, raw_values = spec.partition("=")
+            names = list(
+                dict.fromkeys(
+                    value.strip() for value in raw_values.split(",") if value.strip()
+                )
+            )
+            if not name.strip() or not names:
+                raise CommandError(
+                    f"Invalid attribute {spec!r}, use Name=value1,value2"
+                )
+            attribute, _ = VariantAttribute._base_manager.get_or_create(
+                business=business, name=name.strip()
+            )
+            VariantAttributeValue._base_manager.bulk_create(
+                [
+                    VariantAttributeValue(
+                        business=business, attribute=attribute, value=value
+                    )
+                    for value in names
+                ],
+                ignore_conflicts=True,
+            )
+            values = {
+                value.value: value
+                for value in VariantAttributeValue._base_manager.filter(
+                    business=business, attribute=attribute, value__in=names
+                )
+            }
+            value_sets.append([values[value] for value in names])
+
+        variants = generate_variant_matrix(
+            product,
+            value_sets,
+            cost_price=options["cost_price"],
+            selling_price=options["selling_price"],
+            quantity=options["quantity"],
+            reorder_level=options["reorder_level"],
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f"Created {len(variants)} variants of {product.name}")
+        )
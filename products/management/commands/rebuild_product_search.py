@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from products.search import create_sqlite_fts
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Recreate the SQLite product search table and its triggers, e.g. after "
+        "a migration remade products_product and dropped the triggers"
+    )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            self.stdout.write("Product search only keeps an FTS table on SQLite")
+            return
+        if not create_sqlite_fts():
+            self.stdout.write(self.style.ERROR("SQLite FTS5 is not available"))
+            return
+        self.stdout.write(self.style.SUCCESS("Product search index rebuilt"))
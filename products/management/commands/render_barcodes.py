@@ -0,0 +1,63 @@
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from products.barcode_images import find_missing_images, render_spec, store_image
+from products.models import Product, ProductVariant
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Render the barcode (and QR code) images that are not cached yet"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--business-id",
+            type=int,
+            help="Business ID to render images for (optional - renders all if not provided)",
+        )
+        parser.add_argument(
+            "--qr",
+            action="store_true",
+            help="Also render QR codes",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Number of rendering processes (default: number of CPUs)",
+        )
+
+    def handle(self, *args, **options):
+        kinds = ("barcode", "qr") if options["qr"] else ("barcode",)
+
+        missing = {}
+        for model in (Product, ProductVariant):
+            items = model._base_manager.only("id", "barcode", "barcode_format")
+            if options.get("business_id"):
+                items = items.filter(business_id=options["business_id"])
+            missing.update(find_missing_images(items.iterator(chunk_size=1000), kinds))
+        self.stdout.write(f"{len(missing)} images to render")
+
+        keys, specs = list(missing), list(missing.values())
+        if options["workers"] > 1 and len(specs) > 1:
+            # Rendering is CPU bound; images are stored by this process
+            with ProcessPoolExecutor(max_workers=options["workers"]) as executor:
+                rendered = executor.map(render_spec, specs, chunksize=50)
+                stored = self.store(keys, rendered)
+        else:
+            stored = self.store(keys, map(render_spec, specs))
+
+        self.stdout.write(self.style.SUCCESS(f"Rendered {stored} images"))
+
+    def store(self, keys, rendered):
+        stored = 0
+        for key, content in zip(keys, rendered):
+            if not content:
+                logger.warning("Could not render image %s", key)
+                continue
+            store_image(key, content)
+            stored += 1
+        return stored
@@ -0,0 +1,60 @@
+import time
+from django.core.management.base import BaseCommand
+from products.imports import claim_next_job, process_job, requeue_stale_jobs
+
+
+class Command(BaseCommand):
+    help = "Run queued product CSV imports"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Process the imports currently queued and exit instead of polling",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=5.0,
+            help="Seconds to wait between polls when the queue is empty (default: 5)",
+        )
+        parser.add_argument(
+            "--max-jobs",
+            type=int,
+            default=0,
+            help="Exit after processing this many imports (default: no limit)",
+        )
+
+    def handle(self, *args, **options):
+        processed = 0
+        max_jobs = options["max_jobs"]
+
+        while True:
+            requeued = requeue_stale_jobs()
+            if requeued:
+                self.stdout.write(f"Requeued {requeued} stale import(s)")
+
+            job = claim_next_job()
+            if job is None:
+                if options["once"]:
+                    break
+                time.sleep(options["poll_interval"])
+                continue
+
+            self.stdout.write(f"Running product import #{job.id}: {job}")
+            job = process_job(job)
+            if job.status == "completed":
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f"  ✓ {job.created_count} created, {job.updated_count} "
+                        f"updated, {job.error_count} failed"
+                    )
+                )
+            else:
+                self.stdout.write(self.style.ERROR(f"  ✗ Failed: {job.error}"))
+
+            processed += 1
+            if max_jobs and processed >= max_jobs:
+                break
+
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} import(s)"))
@@ -4,6 +4,7 @@ from django.core.mail import send_mail
 from django.template.loader import render_to_string
 from django.conf import settings
 from django.db.models import F
+from products.lots import expiring_products
 from products.models import Product
 from settings.models import BusinessSettings
 from authentication.models import User
@@ -65,14 +66,16 @@ class Command(BaseCommand):
     def get_expired_products(self):
         """Get all expired products"""
         today = timezone.now().date()
-        return Product.objects.filter(is_active=True, expiry_date__lt=today)
+        return expiring_products(
+            Product.objects.filter(is_active=True), end=today - timedelta(days=1)
+        )
 
     def get_near_expiry_products(self, days_threshold):
         """Get products nearing expiry"""
         today = timezone.now().date()
         near_expiry_date = today + timedelta(days=days_threshold)
-        return Product.objects.filter(
-            is_active=True, expiry_date__gte=today, expiry_date__lte=near_expiry_date
+        return expiring_products(
+            Product.objects.filter(is_active=True), today, near_expiry_date
         )
 
     def get_low_stock_products(self):
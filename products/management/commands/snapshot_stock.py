@@ -0,0 +1,55 @@
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from products.ledger import take_stock_snapshot
+from products.stock_monitoring import get_businesses_to_check
+from superadmin.models import Business
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Store a snapshot of the stock of every product at the end of a day"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--business-id",
+            type=int,
+            help="Business ID to snapshot (optional - snapshots all if not provided)",
+        )
+        parser.add_argument(
+            "--date",
+            help="Date to snapshot the closing stock of (YYYY-MM-DD, default: today)",
+        )
+
+    def handle(self, *args, **options):
+        snapshot_date = timezone.localdate()
+        if options.get("date"):
+            try:
+                snapshot_date = datetime.strptime(options["date"], "%Y-%m-%d").date()
+            except ValueError:
+                raise CommandError("Invalid date format. Use YYYY-MM-DD")
+            if snapshot_date > timezone.localdate():
+                raise CommandError("Cannot snapshot the stock of a future date")
+
+        if options.get("business_id"):
+            businesses = list(Business.objects.filter(id=options["business_id"]))
+        else:
+            businesses = get_businesses_to_check()
+
+        for business in businesses:
+            try:
+                count = take_stock_snapshot(business, snapshot_date)
+                self.stdout.write(
+                    f"{business.company_name}: {count} products snapshotted for {snapshot_date}"
+                )
+            except Exception as e:
+                logger.error(
+                    f"Error taking stock snapshot for business {business.id}: {e}"
+                )
+                self.stdout.write(
+                    self.style.ERROR(f"Error snapshotting {business.company_name}: {e}")
+                )
+
+        self.stdout.write(self.style.SUCCESS("Stock snapshots completed"))
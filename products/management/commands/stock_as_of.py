@@ -0,0 +1,78 @@
+import csv
+from decimal import Decimal
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from products.ledger import get_stock_as_of
+from products.models import Product
+from superadmin.models import Business
+
+
+class Command(BaseCommand):
+    help = (
+        "Export the stock of every product on a given date as CSV, valued at "
+        "the current cost price"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--business-id", type=int, required=True)
+        parser.add_argument(
+            "--date", required=True, help="Closing date of the stock (YYYY-MM-DD)"
+        )
+        parser.add_argument("--branch-id", type=int, help="Limit to one branch")
+        parser.add_argument(
+            "--output", help="File to write the CSV to (default: standard output)"
+        )
+
+    def handle(self, *args, **options):
+        try:
+            as_of_date = datetime.strptime(options["date"], "%Y-%m-%d").date()
+        except ValueError:
+            raise CommandError("Invalid date format. Use YYYY-MM-DD")
+
+        business = Business.objects.filter(id=options["business_id"]).first()
+        if business is None:
+            raise CommandError(f"Business {options['business_id']} not found")
+
+        branch = None
+        if options.get("branch_id"):
+            branch = business.branches.filter(id=options["branch_id"]).first()
+            if branch is None:
+                raise CommandError(f"Branch {options['branch_id']} not found")
+
+        stock = get_stock_as_of(business, as_of_date, branch)
+        products = Product._base_manager.filter(business=business)
+        if branch is not None:
+            products = products.filter(branch=branch)
+        products = products.select_related("branch").order_by("name")
+
+        output = (
+            open(options["output"], "w", newline="")
+            if options.get("output")
+            else self.stdout
+        )
+        try:
+            writer = csv.writer(output)
+            writer.writerow(
+                ["SKU", "Product", "Branch", "Quantity", "Cost Price", "Stock Value"]
+            )
+            total_value = Decimal("0.00")
+            for product in products.iterator(chunk_size=1000):
+                if product.id not in stock:
+                    continue
+                quantity = stock[product.id]
+                value = (quantity * product.cost_price).quantize(Decimal("0.01"))
+                total_value += value
+                writer.writerow(
+                    [
+                        product.sku,
+                        product.name,
+                        product.branch.name if product.branch else "",
+                        quantity,
+                        product.cost_price,
+                        value,
+                    ]
+                )
+            writer.writerow(["", "Total", "", "", "", total_value])
+        finally:
+            if options.get("output"):
+                output.close()
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from products.stock_levels import sync_stock_levels
+from products.stock_monitoring import get_businesses_to_check
+from superadmin.models import Business
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Create missing branch stock levels and correct the ones that drifted "
+        "from Product.quantity (after bulk updates made without saves)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--business-id",
+            type=int,
+            help="Business ID to sync (optional - syncs all if not provided)",
+        )
+
+    def handle(self, *args, **options):
+        if options.get("business_id"):
+            businesses = list(Business.objects.filter(id=options["business_id"]))
+        else:
+            businesses = get_businesses_to_check()
+
+        for business in businesses:
+            try:
+                created, updated = sync_stock_levels(business)
+                self.stdout.write(
+                    f"{business.company_name}: {created} stock levels created, "
+                    f"{updated} corrected"
+                )
+            except Exception as e:
+                logger.error(
+                    f"Error syncing stock levels for business {business.id}: {e}"
+                )
+                self.stdout.write(
+                    self.style.ERROR(f"Error syncing {business.company_name}: {e}")
+                )
+
+        self.stdout.write(self.style.SUCCESS("Stock level sync completed"))
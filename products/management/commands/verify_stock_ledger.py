@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from products.ledger import find_ledger_drift
+from products.stock_monitoring import get_businesses_to_check
+from superadmin.models import Business
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Report products whose stock differs from what the stock ledger implies"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--business-id",
+            type=int,
+            help="Business ID to verify (optional - verifies all if not provided)",
+        )
+
+    def handle(self, *args, **options):
+        if options.get("business_id"):
+            businesses = list(Business.objects.filter(id=options["business_id"]))
+        else:
+            businesses = get_businesses_to_check()
+
+        total = 0
+        for business in businesses:
+            drift = find_ledger_drift(business)
+            total += len(drift)
+            for row in drift:
+                self.stdout.write(
+                    self.style.WARNING(
+                        f"{business.company_name}: {row['product'].name} "
+                        f"({row['product'].sku}) has {row['actual']} in stock, "
+                        f"ledger says {row['expected']} "
+                        f"(difference {row['difference']:+})"
+                    )
+                )
+
+        if total:
+            logger.warning(f"Stock ledger drift found for {total} products")
+            self.stdout.write(
+                self.style.WARNING(f"Stock ledger drift found for {total} products")
+            )
+        else:
+            self.stdout.write(self.style.SUCCESS("Stock ledger matches product stock"))
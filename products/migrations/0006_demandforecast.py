@@ -0,0 +1,84 @@
+# Generated by Django 5.2.8 on 2026-10-19 10:40
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0005_add_inventory_transfer_model"),
+        ("superadmin", "0004_subscriptionplan_can_access_customers_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DemandForecast",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "avg_daily_demand",
+                    models.DecimalField(decimal_places=4, max_digits=12),
+                ),
+                ("demand_std", models.DecimalField(decimal_places=4, max_digits=12)),
+                (
+                    "days_of_cover",
+                    models.DecimalField(
+                        blank=True, decimal_places=2, max_digits=12, null=True
+                    ),
+                ),
+                (
+                    "reorder_point",
+                    models.DecimalField(decimal_places=2, max_digits=12),
+                ),
+                (
+                    "reorder_quantity",
+                    models.DecimalField(decimal_places=2, max_digits=12),
+                ),
+                ("is_fast_moving", models.BooleanField(default=False)),
+                ("method", models.CharField(default="ema", max_length=10)),
+                ("history_days", models.PositiveIntegerField(default=56)),
+                ("lead_time_days", models.PositiveIntegerField(default=7)),
+                (
+                    "computed_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                (
+                    "business",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="demand_forecasts",
+                        to="superadmin.business",
+                    ),
+                ),
+                (
+                    "product",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="demand_forecast",
+                        to="products.product",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Demand Forecast",
+                "verbose_name_plural": "Demand Forecasts",
+                "ordering": ["days_of_cover"],
+                "indexes": [
+                    models.Index(
+                        fields=["business", "reorder_quantity"],
+                        name="products_forecast_reorder_idx",
+                    )
+                ],
+            },
+        ),
+    ]
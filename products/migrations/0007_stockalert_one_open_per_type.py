@@ -0,0 +1,40 @@
+# Generated by Django 5.2.8 on 2026-10-19 11:20
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def resolve_duplicate_open_alerts(apps, schema_editor):
+    """Keep only the newest open alert per product and alert type"""
+    StockAlert = apps.get_model("products", "StockAlert")
+    duplicates = (
+        StockAlert.objects.filter(is_resolved=False)
+        .values("product_id", "alert_type")
+        .annotate(count=Count("id"), newest=Max("id"))
+        .filter(count__gt=1)
+    )
+    for duplicate in duplicates:
+        StockAlert.objects.filter(
+            product_id=duplicate["product_id"],
+            alert_type=duplicate["alert_type"],
+            is_resolved=False,
+        ).exclude(id=duplicate["newest"]).update(is_resolved=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0006_demandforecast"),
+    ]
+
+    operations = [
+        migrations.RunPython(resolve_duplicate_open_alerts, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="stockalert",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("is_resolved", False)),
+                fields=("product", "alert_type"),
+                name="products_stockalert_one_open_per_type",
+            ),
+        ),
+    ]
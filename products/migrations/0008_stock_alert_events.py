@@ -0,0 +1,115 @@
+# Generated by Django 5.2.8 on 2026-10-19 12:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0007_stockalert_one_open_per_type"),
+        ("superadmin", "0004_subscriptionplan_can_access_customers_and_more"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="stockalert",
+            name="alert_type",
+            field=models.CharField(
+                choices=[
+                    ("low_stock", "Low Stock"),
+                    ("out_of_stock", "Out of Stock"),
+                    ("abnormal_reduction", "Abnormal Reduction"),
+                    ("fast_moving", "Fast Moving"),
+                    ("expired", "Expired Items"),
+                ],
+                max_length=20,
+            ),
+        ),
+        migrations.AddField(
+            model_name="stockalert",
+            name="product_variant",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="stock_alerts",
+                to="products.productvariant",
+            ),
+        ),
+        migrations.RemoveConstraint(
+            model_name="stockalert",
+            name="products_stockalert_one_open_per_type",
+        ),
+        migrations.AddConstraint(
+            model_name="stockalert",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("is_resolved", False), ("product_variant", None)),
+                fields=("product", "alert_type"),
+                name="products_stockalert_one_open_per_type",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="stockalert",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(
+                    ("is_resolved", False), ("product_variant__isnull", False)
+                ),
+                fields=("product_variant", "alert_type"),
+                name="products_stockalert_variant_one_open_per_type",
+            ),
+        ),
+        migrations.CreateModel(
+            name="StockAlertEvent",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "event_type",
+                    models.CharField(
+                        choices=[("opened", "Opened"), ("resolved", "Resolved")],
+                        max_length=10,
+                    ),
+                ),
+                ("delivered_at", models.DateTimeField(blank=True, null=True)),
+                ("attempts", models.PositiveIntegerField(default=0)),
+                ("last_error", models.TextField(blank=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "alert",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="events",
+                        to="products.stockalert",
+                    ),
+                ),
+                (
+                    "business",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="stock_alert_events",
+                        to="superadmin.business",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Stock Alert Event",
+                "verbose_name_plural": "Stock Alert Events",
+                "ordering": ["created_at"],
+                "indexes": [
+                    models.Index(
+                        fields=["delivered_at", "created_at"],
+                        name="products_alert_event_pend_idx",
+                    )
+                ],
+            },
+        ),
+    ]
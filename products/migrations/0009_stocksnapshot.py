@@ -0,0 +1,80 @@
+# Generated by Django 5.2.8 on 2026-10-19 13:30
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0008_stock_alert_events"),
+        ("superadmin", "0004_subscriptionplan_can_access_customers_and_more"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="stockmovement",
+            index=models.Index(
+                fields=["business", "created_at"],
+                name="products_move_biz_created_idx",
+            ),
+        ),
+        migrations.CreateModel(
+            name="StockSnapshot",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("snapshot_date", models.DateField()),
+                ("quantity", models.DecimalField(decimal_places=2, max_digits=10)),
+                ("last_movement_id", models.BigIntegerField(default=0)),
+                ("taken_at", models.DateTimeField(default=django.utils.timezone.now)),
+                (
+                    "branch",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="stock_snapshots",
+                        to="superadmin.branch",
+                    ),
+                ),
+                (
+                    "business",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="stock_snapshots",
+                        to="superadmin.business",
+                    ),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="stock_snapshots",
+                        to="products.product",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Stock Snapshot",
+                "verbose_name_plural": "Stock Snapshots",
+                "ordering": ["-snapshot_date"],
+                "indexes": [
+                    models.Index(
+                        fields=["business", "snapshot_date"],
+                        name="products_snapshot_date_idx",
+                    )
+                ],
+                "unique_together": {("product", "snapshot_date")},
+            },
+        ),
+    ]
@@ -0,0 +1,125 @@
+# Generated by Django 5.2.8 on 2026-10-19 14:50
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def create_opening_lots(apps, schema_editor):
+    """Give every product in stock with an expiry date an opening lot"""
+    Product = apps.get_model("products", "Product")
+    StockLot = apps.get_model("products", "StockLot")
+    products = Product.objects.filter(expiry_date__isnull=False, quantity__gt=0)
+    lots = [
+        StockLot(
+            business_id=product.business_id,
+            branch_id=product.branch_id,
+            product_id=product.id,
+            lot_number="OPENING",
+            expiry_date=product.expiry_date,
+            initial_quantity=product.quantity,
+            quantity=product.quantity,
+        )
+        for product in products.iterator(chunk_size=1000)
+    ]
+    StockLot.objects.bulk_create(lots, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0009_stocksnapshot"),
+        ("superadmin", "0004_subscriptionplan_can_access_customers_and_more"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="stockalert",
+            name="alert_type",
+            field=models.CharField(
+                choices=[
+                    ("low_stock", "Low Stock"),
+                    ("out_of_stock", "Out of Stock"),
+                    ("abnormal_reduction", "Abnormal Reduction"),
+                    ("fast_moving", "Fast Moving"),
+                    ("expired", "Expired Items"),
+                    ("near_expiry", "Near Expiry"),
+                ],
+                max_length=20,
+            ),
+        ),
+        migrations.CreateModel(
+            name="StockLot",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("lot_number", models.CharField(max_length=100)),
+                ("expiry_date", models.DateField(blank=True, null=True)),
+                (
+                    "initial_quantity",
+                    models.DecimalField(decimal_places=2, max_digits=10),
+                ),
+                ("quantity", models.DecimalField(decimal_places=2, max_digits=10)),
+                ("is_open", models.BooleanField(default=True)),
+                (
+                    "received_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "branch",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="stock_lots",
+                        to="superadmin.branch",
+                    ),
+                ),
+                (
+                    "business",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="stock_lots",
+                        to="superadmin.business",
+                    ),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="lots",
+                        to="products.product",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Stock Lot",
+                "verbose_name_plural": "Stock Lots",
+                "ordering": ["expiry_date", "received_at"],
+                "indexes": [
+                    models.Index(
+                        condition=models.Q(("is_open", True)),
+                        fields=["business", "expiry_date"],
+                        name="products_lot_open_expiry_idx",
+                    ),
+                    models.Index(
+                        condition=models.Q(("is_open", True)),
+                        fields=["product", "expiry_date", "received_at"],
+                        name="products_lot_fefo_idx",
+                    ),
+                ],
+                "unique_together": {("product", "lot_number")},
+            },
+        ),
+        migrations.RunPython(create_opening_lots, migrations.RunPython.noop),
+    ]
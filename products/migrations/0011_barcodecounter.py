@@ -0,0 +1,107 @@
+# Generated by Django 5.2.8 on 2026-10-19 15:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def _generated_barcode(number, barcode_format):
+    """Same numbering as products.barcodes.format_barcode"""
+    if barcode_format == "ean13":
+        digits = "2" + str(number).zfill(11)
+        odd, even = digits[0:12:2], digits[1:12:2]
+        weights = (1, 3)
+    elif barcode_format == "upca":
+        digits = "2" + str(number).zfill(10)
+        odd, even = digits[0:11:2], digits[1:11:2]
+        weights = (3, 1)
+    else:
+        return "2" + str(number).zfill(11)
+    total = sum(map(int, odd)) * weights[0] + sum(map(int, even)) * weights[1]
+    return digits + str((10 - total % 10) % 10)
+
+
+def reassign_duplicate_barcodes(apps, schema_editor):
+    """
+    Give every product or variant sharing a barcode with an older one of its
+    business a generated barcode, so the unique constraints can be added
+    """
+    BarcodeCounter = apps.get_model("products", "BarcodeCounter")
+    for model_name in ("Product", "ProductVariant"):
+        model = apps.get_model("products", model_name)
+        duplicates = (
+            model.objects.exclude(barcode__isnull=True)
+            .exclude(barcode="")
+            .values("business_id", "barcode")
+            .annotate(rows=Count("id"), first_id=Min("id"))
+            .filter(rows__gt=1)
+        )
+        for duplicate in duplicates:
+            rows = model.objects.filter(
+                business_id=duplicate["business_id"], barcode=duplicate["barcode"]
+            ).exclude(id=duplicate["first_id"])
+            for row in rows:
+                counter, _ = BarcodeCounter.objects.get_or_create(
+                    business_id=row.business_id
+                )
+                barcode = _generated_barcode(counter.next_value, row.barcode_format)
+                counter.next_value += 1
+                counter.save(update_fields=["next_value"])
+                model.objects.filter(id=row.id).update(barcode=barcode)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0010_stocklot"),
+        ("superadmin", "0005_retentionpolicy"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BarcodeCounter",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("next_value", models.BigIntegerField(default=1)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "business",
+                    models.OneToOneField(
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="barcode_counter",
+                        to="superadmin.business",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Barcode Counter",
+                "verbose_name_plural": "Barcode Counters",
+            },
+        ),
+        migrations.RunPython(reassign_duplicate_barcodes, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="product",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("barcode", ""), _negated=True),
+                fields=("business", "barcode"),
+                name="products_product_unique_barcode",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="productvariant",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("barcode", ""), _negated=True),
+                fields=("business", "barcode"),
+                name="products_variant_unique_barcode",
+            ),
+        ),
+    ]
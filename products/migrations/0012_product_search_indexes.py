@@ -0,0 +1,91 @@
+# Generated by Django 5.2.8 on 2026-10-19 16:10
+
+import logging
+
+from django.db import DatabaseError, migrations, transaction
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = "products_product_fts"
+
+# The FTS5 table used for word prefix search on SQLite, with the triggers
+# keeping it in sync with products_product
+SQLITE_FTS_STATEMENTS = (
+    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+    "name, sku, description, content='products_product', content_rowid='id')",
+    "CREATE TRIGGER products_product_fts_ai AFTER INSERT ON products_product "
+    f"BEGIN INSERT INTO {FTS_TABLE}(rowid, name, sku, description) "
+    "VALUES (new.id, new.name, new.sku, new.description); END",
+    "CREATE TRIGGER products_product_fts_ad AFTER DELETE ON products_product "
+    f"BEGIN INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, sku, description) "
+    "VALUES ('delete', old.id, old.name, old.sku, old.description); END",
+    "CREATE TRIGGER products_product_fts_au AFTER UPDATE ON products_product "
+    f"BEGIN INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, sku, description) "
+    "VALUES ('delete', old.id, old.name, old.sku, old.description); "
+    f"INSERT INTO {FTS_TABLE}(rowid, name, sku, description) "
+    "VALUES (new.id, new.name, new.sku, new.description); END",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+)
+
+TRIGRAM_INDEXES = (
+    ("products_product_name_trgm", "name"),
+    ("products_product_sku_trgm", "sku"),
+    ("products_product_desc_trgm", "description"),
+)
+
+
+def create_search_indexes(apps, schema_editor):
+    """
+    PostgreSQL: trigram GIN indexes on ``UPPER(column)``, the expression
+    Django compiles ``icontains``/``istartswith`` to.
+    SQLite: the FTS5 table used for word prefix search in development.
+    """
+    connection = schema_editor.connection
+    if connection.vendor == "sqlite":
+        try:
+            with transaction.atomic(using=connection.alias):
+                for statement in SQLITE_FTS_STATEMENTS:
+                    schema_editor.execute(statement)
+        except DatabaseError:
+            logger.warning("SQLite FTS5 is not available; product search uses LIKE")
+        return
+    if connection.vendor != "postgresql":
+        return
+
+    try:
+        with transaction.atomic(using=connection.alias):
+            schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    except DatabaseError:
+        # Managed databases may not let the app role create extensions;
+        # search still works, unindexed
+        logger.warning("pg_trgm is not available; product search is not indexed")
+        return
+    for index_name, column in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {index_name} ON products_product "
+            f"USING gin ((UPPER({column}::text)) gin_trgm_ops)"
+        )
+
+
+def drop_search_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == "sqlite":
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+        for suffix in ("ai", "ad", "au"):
+            schema_editor.execute(
+                f"DROP TRIGGER IF EXISTS products_product_fts_{suffix}"
+            )
+    elif connection.vendor == "postgresql":
+        for index_name, _ in TRIGRAM_INDEXES:
+            schema_editor.execute(f"DROP INDEX IF EXISTS {index_name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0011_barcodecounter"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
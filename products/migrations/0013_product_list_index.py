@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-19 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0012_product_search_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["business", "name", "id"], name="products_product_list_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,119 @@
+# Generated by Django 5.2.8 on 2026-10-19 17:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def create_stock_levels(apps, schema_editor):
+    """
+    Give every product a stock level at its own branch holding its current
+    quantity. Stock kept in per-branch copies of a product becomes the
+    stock level of that copy's branch.
+    """
+    Product = apps.get_model("products", "Product")
+    StockLevel = apps.get_model("products", "StockLevel")
+    batch = []
+    rows = Product._base_manager.values_list(
+        "id", "business_id", "branch_id", "quantity"
+    ).order_by("id")
+    for product_id, business_id, branch_id, quantity in rows.iterator(
+        chunk_size=BATCH_SIZE
+    ):
+        batch.append(
+            StockLevel(
+                business_id=business_id,
+                product_id=product_id,
+                branch_id=branch_id,
+                quantity=quantity,
+            )
+        )
+        if len(batch) >= BATCH_SIZE:
+            StockLevel._base_manager.bulk_create(batch)
+            batch = []
+    StockLevel._base_manager.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0014_productimportjob"),
+        ("superadmin", "0005_retentionpolicy"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StockLevel",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "quantity",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=10),
+                ),
+                (
+                    "reserved",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=10),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "branch",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="stock_levels",
+                        to="superadmin.branch",
+                    ),
+                ),
+                (
+                    "business",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="stock_levels",
+                        to="superadmin.business",
+                    ),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="stock_levels",
+                        to="products.product",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Stock Level",
+                "verbose_name_plural": "Stock Levels",
+                "indexes": [
+                    models.Index(
+                        fields=["product", "branch", "quantity", "reserved"],
+                        name="products_stocklevel_avail_idx",
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        condition=models.Q(("branch__isnull", False)),
+                        fields=("product", "branch"),
+                        name="products_stocklevel_unique_branch",
+                    ),
+                    models.UniqueConstraint(
+                        condition=models.Q(("branch__isnull", True)),
+                        fields=("product",),
+                        name="products_stocklevel_unique_unassigned",
+                    ),
+                ],
+            },
+        ),
+        migrations.RunPython(create_stock_levels, migrations.RunPython.noop),
+    ]
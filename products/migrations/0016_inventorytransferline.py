@@ -0,0 +1,142 @@
+# Generated by Django 5.2.8 on 2026-10-19 18:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def create_transfer_lines(apps, schema_editor):
+    """
+    Move the product and quantity of every existing transfer into its first
+    line. Completed transfers were dispatched and received when last saved.
+    """
+    InventoryTransfer = apps.get_model("products", "InventoryTransfer")
+    InventoryTransferLine = apps.get_model("products", "InventoryTransferLine")
+    batch = []
+    rows = InventoryTransfer._base_manager.values_list(
+        "id", "business_id", "product_id", "product_variant_id", "quantity"
+    ).order_by("id")
+    for transfer_id, business_id, product_id, variant_id, quantity in rows.iterator(
+        chunk_size=BATCH_SIZE
+    ):
+        if not product_id and not variant_id:
+            continue
+        batch.append(
+            InventoryTransferLine(
+                business_id=business_id,
+                transfer_id=transfer_id,
+                product_id=None if variant_id else product_id,
+                product_variant_id=variant_id,
+                quantity=quantity,
+            )
+        )
+        if len(batch) >= BATCH_SIZE:
+            InventoryTransferLine._base_manager.bulk_create(batch)
+            batch = []
+    InventoryTransferLine._base_manager.bulk_create(batch)
+
+    InventoryTransfer._base_manager.filter(status="completed").update(
+        dispatched_at=models.F("updated_at"), received_at=models.F("updated_at")
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0015_stocklevel"),
+        ("superadmin", "0005_retentionpolicy"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="InventoryTransferLine",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("quantity", models.DecimalField(decimal_places=2, max_digits=10)),
+                (
+                    "business",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="inventory_transfer_lines",
+                        to="superadmin.business",
+                    ),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="products.product",
+                    ),
+                ),
+                (
+                    "product_variant",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="products.productvariant",
+                    ),
+                ),
+                (
+                    "transfer",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="lines",
+                        to="products.inventorytransfer",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["id"],
+            },
+        ),
+        migrations.AddField(
+            model_name="inventorytransfer",
+            name="dispatched_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="inventorytransfer",
+            name="received_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name="inventorytransfer",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("pending", "Pending"),
+                    ("in_transit", "In Transit"),
+                    ("completed", "Completed"),
+                    ("cancelled", "Cancelled"),
+                ],
+                default="pending",
+                max_length=20,
+            ),
+        ),
+        migrations.RunPython(create_transfer_lines, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name="inventorytransfer",
+            name="product",
+        ),
+        migrations.RemoveField(
+            model_name="inventorytransfer",
+            name="product_variant",
+        ),
+        migrations.RemoveField(
+            model_name="inventorytransfer",
+            name="quantity",
+        ),
+    ]
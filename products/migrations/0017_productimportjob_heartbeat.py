@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-19 14:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0016_inventorytransferline"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="productimportjob",
+            name="attempts",
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="productimportjob",
+            name="heartbeat_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
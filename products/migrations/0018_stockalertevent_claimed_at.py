@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 14:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0017_productimportjob_heartbeat"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="stockalertevent",
+            name="claimed_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
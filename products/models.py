@@ -1,12 +1,8 @@
-from django.db import models
+from django.db import models, transaction
 from django.urls import reverse
+from django.utils import timezone
 from django.core.exceptions import ValidationError
 from decimal import Decimal
-import uuid
-import os
-import re
-from io import BytesIO
-from django.core.files.base import ContentFile
 from typing import TYPE_CHECKING
 from superadmin.models import Business, Branch
 from superadmin.managers import BusinessSpecificManager
@@ -69,7 +65,30 @@ class Unit(models.Model):
         return f"{self.name} ({self.symbol})"  # type: ignore
 
 
-class Product(models.Model):
+class StockLevelTrackingMixin:
+    """
+    Remember the quantity and reorder level an instance was loaded with, so
+    the stock alert receivers only evaluate saves that change them (see
+    products.stock_events).
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_stock_level = (
+            instance.__dict__.get("quantity"),
+            instance.__dict__.get("reorder_level"),
+        )
+        return instance
+
+    def save(self, *args, **kwargs):
+        # The stock alert receiver runs inside this transaction, so alerts
+        # open and resolve atomically with the stock update
+        with transaction.atomic(using=kwargs.get("using")):
+            super().save(*args, **kwargs)
+
+
+class Product(StockLevelTrackingMixin, models.Model):
     if TYPE_CHECKING:
         objects: "Manager"
 
@@ -118,10 +137,43 @@ class Product(models.Model):
         ordering = ["name"]
         # Ensure SKU is unique per business
         unique_together = ("business", "sku")
+        constraints = [
+            models.UniqueConstraint(
+                fields=["business", "barcode"],
+                condition=~models.Q(barcode=""),
+                name="products_product_unique_barcode",
+            ),
+        ]
+        indexes = [
+            # Keyset pages of the product list
+            models.Index(
+                fields=["business", "name", "id"], name="products_product_list_idx"
+            ),
+        ]
 
     def __str__(self) -> str:  # type: ignore
         return str(self.name)  # type: ignore
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Searchable fields as loaded, so saves that leave them unchanged keep
+        # the search prefix indexes (see products.search)
+        instance._loaded_search_fields = instance.search_fields()
+        # Stock as loaded, so saves that leave it unchanged skip the branch
+        # stock level (see products.stock_levels)
+        instance._loaded_branch_stock = instance.branch_stock()
+        return instance
+
+    def search_fields(self):
+        return tuple(
+            self.__dict__.get(field)
+            for field in ("name", "sku", "barcode", "is_active")
+        )
+
+    def branch_stock(self):
+        return (self.__dict__.get("quantity"), self.__dict__.get("branch_id"))
+
     def save(self, *args, **kwargs):
         # Auto-generate barcode if not provided
         # Ensure category and unit exist before inserting (tests may create products without them)
@@ -146,154 +198,26 @@ class Product(models.Model):
                 # Fallback: leave as-is
                 pass
 
-        is_new = self.pk is None
-
         # Auto-generate barcode if not provided
         if not self.barcode:
             self.barcode = self.generate_barcode()
 
+        # The barcode image is rendered on first use (see
+        # products.barcode_images), not while saving
         super().save(*args, **kwargs)
 
-        # Generate barcode image after saving (so we have a pk)
-        if is_new:
-            self.generate_barcode_image()
-
     def generate_barcode(self):
         """Generate a unique barcode for the product based on selected format"""
-        # Use SKU as base, or generate a unique identifier if SKU is not suitable
-        if self.sku:
-            # Create a simple numeric barcode from SKU
-            # Extract digits from SKU and ensure it's unique
-            sku_str = str(self.sku)  # Convert to string to ensure it's iterable
-            base_code = "".join([char for char in sku_str if char.isdigit()])
-
-            # If no digits in SKU, generate a unique code
-            if not base_code:
-                base_code = str(uuid.uuid4().int)[:12]
-        else:
-            # Generate a unique 12-digit code
-            base_code = str(uuid.uuid4().int)[:12]
-
-        # Format the barcode according to the selected format
-        if self.barcode_format == "ean13":
-            # EAN-13 requires 12 digits + 1 check digit = 13 total
-            base_code = re.sub(r"\D", "", base_code)[:12].ljust(12, "0")
-            barcode = self._generate_ean13(base_code)
-        elif self.barcode_format == "upca":
-            # UPC-A requires 11 digits + 1 check digit = 12 total
-            base_code = re.sub(r"\D", "", base_code)[:11].ljust(11, "0")
-            barcode = self._generate_upca(base_code)
-        else:
-            # Code128 can handle variable length and alphanumeric
-            barcode = base_code[:20]  # Limit to 20 characters for Code128
-
-        # Ensure the barcode is unique within the business
-        counter = 1
-        original_barcode = barcode
-        while (
-            Product.objects.filter(business=self.business, barcode=barcode)
-            .exclude(pk=self.pk)
-            .exists()
-        ):
-            # If we've tried too many times, generate a completely new base
-            if counter > 100:
-                base_code = str(uuid.uuid4().int)[:12]
-                if self.barcode_format == "ean13":
-                    base_code = re.sub(r"\D", "", base_code)[:12].ljust(12, "0")
-                    barcode = self._generate_ean13(base_code)
-                elif self.barcode_format == "upca":
-                    base_code = re.sub(r"\D", "", base_code)[:11].ljust(11, "0")
-                    barcode = self._generate_upca(base_code)
-                else:
-                    barcode = base_code[:20]
-                counter = 1
-                original_barcode = barcode
-            else:
-                # Append counter to make it unique
-                if self.barcode_format == "ean13":
-                    # For EAN-13, we need to regenerate with a different base
-                    modified_base = base_code[:-2] + str(counter).zfill(2)
-                    barcode = self._generate_ean13(
-                        re.sub(r"\D", "", modified_base)[:12].ljust(12, "0")
-                    )
-                elif self.barcode_format == "upca":
-                    # For UPC-A, we need to regenerate with a different base
-                    modified_base = base_code[:-2] + str(counter).zfill(2)
-                    barcode = self._generate_upca(
-                        re.sub(r"\D", "", modified_base)[:11].ljust(11, "0")
-                    )
-                else:
-                    # For Code128, we can just append the counter
-                    barcode = original_barcode + str(counter)
-            counter += 1
-
-        return barcode
-
-    def _generate_ean13(self, base_code):
-        """Generate a valid EAN-13 barcode with check digit"""
-        # Ensure base code is 12 digits
-        base_code = base_code[:12].ljust(12, "0")
-
-        # Calculate check digit
-        # Sum odd positions (1st, 3rd, 5th, etc.)
-        odd_sum = sum(int(base_code[i]) for i in range(0, 12, 2))
-        # Sum even positions (2nd, 4th, 6th, etc.) and multiply by 3
-        even_sum = sum(int(base_code[i]) for i in range(1, 12, 2)) * 3
-        # Total sum
-        total = odd_sum + even_sum
-        # Check digit is the number needed to make total divisible by 10
-        check_digit = (10 - (total % 10)) % 10
-
-        return base_code + str(check_digit)
-
-    def _generate_upca(self, base_code):
-        """Generate a valid UPC-A barcode with check digit"""
-        # Ensure base code is 11 digits
-        base_code = base_code[:11].ljust(11, "0")
-
-        # Calculate check digit
-        # Sum odd positions (1st, 3rd, 5th, etc.) and multiply by 3
-        odd_sum = sum(int(base_code[i]) for i in range(0, 11, 2)) * 3
-        # Sum even positions (2nd, 4th, 6th, etc.)
-        even_sum = sum(int(base_code[i]) for i in range(1, 11, 2))
-        # Total sum
-        total = odd_sum + even_sum
-        # Check digit is the number needed to make total divisible by 10
-        check_digit = (10 - (total % 10)) % 10
-
-        return base_code + str(check_digit)
-
-    def generate_barcode_image(self):
-        """Generate and save a barcode image for the product"""
-        if not self.barcode:
-            return None
-
-        try:
-            from .utils import generate_product_barcode_image
+        from .barcodes import allocate_barcodes
 
-            barcode_buffer = generate_product_barcode_image(self)
+        return allocate_barcodes(self.business, 1, self.barcode_format)[0]
 
-            if barcode_buffer:
-                # Ensure the barcodes directory exists
-                from django.conf import settings
-
-                barcodes_dir = os.path.join(settings.MEDIA_ROOT, "barcodes")
-                os.makedirs(barcodes_dir, exist_ok=True)
-
-                # Save the barcode image to the media directory
-                filename = f"barcode_{self.pk}.png"
-                filepath = os.path.join("barcodes", filename)
-
-                # Save the image file
-                from django.core.files.storage import default_storage
-
-                default_storage.save(filepath, ContentFile(barcode_buffer.getvalue()))
-
-                return filepath
-        except Exception as e:
-            print(f"Error generating barcode image: {e}")
+    def generate_barcode_image(self):
+        """Return the storage path of the product's barcode image, rendering it if needed"""
+        from .barcode_images import get_image
 
-        return None
+        image = get_image(self)
+        return image[1] if image else None
 
     def get_absolute_url(self):
         return reverse("products:detail", kwargs={"pk": self.pk})
@@ -447,9 +371,11 @@ class StockAlert(models.Model):
 
     ALERT_TYPE_CHOICES = [
         ("low_stock", "Low Stock"),
+        ("out_of_stock", "Out of Stock"),
         ("abnormal_reduction", "Abnormal Reduction"),
         ("fast_moving", "Fast Moving"),
         ("expired", "Expired Items"),
+        ("near_expiry", "Near Expiry"),
     ]
 
     SEVERITY_CHOICES = [
@@ -468,6 +394,14 @@ class StockAlert(models.Model):
     product = models.ForeignKey(
         Product, on_delete=models.CASCADE, related_name="stock_alerts"
     )
+    # Set for stock level alerts raised by a single variant of the product
+    product_variant = models.ForeignKey(
+        "ProductVariant",
+        on_delete=models.CASCADE,
+        related_name="stock_alerts",
+        null=True,
+        blank=True,
+    )
 
     # Alert details
     alert_type = models.CharField(max_length=20, choices=ALERT_TYPE_CHOICES)
@@ -504,6 +438,20 @@ class StockAlert(models.Model):
         verbose_name = "Stock Alert"
         verbose_name_plural = "Stock Alerts"
         ordering = ["-created_at"]
+        constraints = [
+            # A product, and each of its variants, has at most one open
+            # alert of each type
+            models.UniqueConstraint(
+                fields=["product", "alert_type"],
+                condition=models.Q(is_resolved=False, product_variant=None),
+                name="products_stockalert_one_open_per_type",
+            ),
+            models.UniqueConstraint(
+                fields=["product_variant", "alert_type"],
+                condition=models.Q(is_resolved=False, product_variant__isnull=False),
+                name="products_stockalert_variant_one_open_per_type",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.get_alert_type_display()} - {self.product.name}"
@@ -513,9 +461,11 @@ class StockAlert(models.Model):
         """Return appropriate icon for alert type"""
         icons = {
             "low_stock": "exclamation-triangle",
+            "out_of_stock": "box-open",
             "abnormal_reduction": "chart-line",
             "fast_moving": "bolt",
             "expired": "calendar-times",
+            "near_expiry": "hourglass-half",
         }
         try:
             icon = icons.get(self.alert_type)
@@ -539,6 +489,58 @@ class StockAlert(models.Model):
             return "secondary"
 
 
+class StockAlertEvent(models.Model):
+    """
+    Outbox of stock alert transitions.
+
+    Events are written in the same transaction as the stock update that
+    opened or resolved the alert and delivered as notifications once it
+    commits (see products.stock_events).
+    """
+
+    # Use business-specific manager
+    objects = BusinessSpecificManager()
+
+    EVENT_TYPE_CHOICES = [
+        ("opened", "Opened"),
+        ("resolved", "Resolved"),
+    ]
+
+    business = models.ForeignKey(
+        Business,
+        on_delete=models.CASCADE,
+        related_name="stock_alert_events",
+        null=True,
+    )
+    alert = models.ForeignKey(
+        StockAlert, on_delete=models.CASCADE, related_name="events"
+    )
+    event_type = models.CharField(max_length=10, choices=EVENT_TYPE_CHOICES)
+
+    # Delivery state. A worker holds an event from ``claimed_at`` until it
+    # is delivered or the claim lease runs out.
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    delivered_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Stock Alert Event"
+        verbose_name_plural = "Stock Alert Events"
+        ordering = ["created_at"]
+        indexes = [
+            models.Index(
+                fields=["delivered_at", "created_at"],
+                name="products_alert_event_pend_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.alert} {self.event_type}"
+
+
 class StockMovement(models.Model):
     """Model for tracking stock movements for analysis"""
 
@@ -584,11 +586,325 @@ class StockMovement(models.Model):
         verbose_name = "Stock Movement"
         verbose_name_plural = "Stock Movements"
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(
+                fields=["business", "created_at"],
+                name="products_move_biz_created_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.get_movement_type_display()} - {self.product.name} ({self.quantity})"
 
 
+class StockSnapshot(models.Model):
+    """
+    Stock of a product at the moment a periodic snapshot was taken.
+
+    All products of a business are snapshotted together. ``last_movement_id``
+    is the newest stock movement already reflected in ``quantity``, so the
+    stock at a later date is the snapshot plus the movements after it (see
+    products.ledger).
+    """
+
+    # Use business-specific manager
+    objects = BusinessSpecificManager()
+
+    business = models.ForeignKey(
+        Business, on_delete=models.CASCADE, related_name="stock_snapshots", null=True
+    )
+    branch = models.ForeignKey(
+        Branch,
+        on_delete=models.CASCADE,
+        related_name="stock_snapshots",
+        null=True,
+        blank=True,
+    )
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="stock_snapshots"
+    )
+
+    snapshot_date = models.DateField()
+    quantity = models.DecimalField(max_digits=10, decimal_places=2)
+    last_movement_id = models.BigIntegerField(default=0)
+    taken_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = "Stock Snapshot"
+        verbose_name_plural = "Stock Snapshots"
+        ordering = ["-snapshot_date"]
+        unique_together = ("product", "snapshot_date")
+        indexes = [
+            models.Index(
+                fields=["business", "snapshot_date"],
+                name="products_snapshot_date_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.product.name} on {self.snapshot_date}: {self.quantity}"
+
+
+class StockLot(models.Model):
+    """
+    A batch of a product received together, sharing a lot number and an
+    expiry date. Sales consume open lots first-expiry-first-out (see
+    products.lots) and expiry processing works on the open lots.
+    """
+
+    # Use business-specific manager
+    objects = BusinessSpecificManager()
+
+    business = models.ForeignKey(
+        Business, on_delete=models.CASCADE, related_name="stock_lots", null=True
+    )
+    branch = models.ForeignKey(
+        Branch,
+        on_delete=models.CASCADE,
+        related_name="stock_lots",
+        null=True,
+        blank=True,
+    )
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="lots")
+
+    lot_number = models.CharField(max_length=100)
+    expiry_date = models.DateField(null=True, blank=True)
+    initial_quantity = models.DecimalField(max_digits=10, decimal_places=2)
+    # Quantity of the lot still in stock
+    quantity = models.DecimalField(max_digits=10, decimal_places=2)
+    is_open = models.BooleanField(default=True)  # type: ignore
+
+    received_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Stock Lot"
+        verbose_name_plural = "Stock Lots"
+        ordering = ["expiry_date", "received_at"]
+        unique_together = ("product", "lot_number")
+        indexes = [
+            # Expiry processing: open lots of a business by expiry date
+            models.Index(
+                fields=["business", "expiry_date"],
+                condition=models.Q(is_open=True),
+                name="products_lot_open_expiry_idx",
+            ),
+            # FEFO consumption: open lots of a product by expiry date
+            models.Index(
+                fields=["product", "expiry_date", "received_at"],
+                condition=models.Q(is_open=True),
+                name="products_lot_fefo_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.product.name} lot {self.lot_number}"
+
+    @property
+    def is_expired(self):
+        return self.expiry_date is not None and self.expiry_date < timezone.localdate()
+
+
+class StockLevel(models.Model):
+    """
+    Stock of a product at one branch (see products.stock_levels).
+
+    ``Product.quantity`` is the stock at the product's own branch and is
+    mirrored into that branch's row; stock moved to other branches lives
+    only here. Rows without a branch hold the stock of products that are
+    not assigned to one.
+    """
+
+    # Use business-specific manager
+    objects = BusinessSpecificManager()
+
+    business = models.ForeignKey(
+        Business, on_delete=models.CASCADE, related_name="stock_levels", null=True
+    )
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="stock_levels"
+    )
+    branch = models.ForeignKey(
+        Branch,
+        on_delete=models.CASCADE,
+        related_name="stock_levels",
+        null=True,
+        blank=True,
+    )
+    quantity = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    # Held for pending transfers and orders, not available to sell
+    reserved = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Stock Level"
+        verbose_name_plural = "Stock Levels"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["product", "branch"],
+                condition=models.Q(branch__isnull=False),
+                name="products_stocklevel_unique_branch",
+            ),
+            models.UniqueConstraint(
+                fields=["product"],
+                condition=models.Q(branch__isnull=True),
+                name="products_stocklevel_unique_unassigned",
+            ),
+        ]
+        indexes = [
+            # Availability of a product across branches from the index alone
+            models.Index(
+                fields=["product", "branch", "quantity", "reserved"],
+                name="products_stocklevel_avail_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.product} at {self.branch or 'no branch'}: {self.quantity}"
+
+    @property
+    def available(self):
+        return self.quantity - self.reserved
+
+
+class BarcodeCounter(models.Model):
+    """
+    Next number to hand out as a generated barcode of a business, reserved
+    in blocks by products.barcodes
+    """
+
+    business = models.OneToOneField(
+        Business,
+        on_delete=models.CASCADE,
+        related_name="barcode_counter",
+        null=True,
+    )
+    next_value = models.BigIntegerField(default=1)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Barcode Counter"
+        verbose_name_plural = "Barcode Counters"
+
+    def __str__(self):
+        return f"Barcode counter of {self.business}: {self.next_value}"
+
+
+class ProductImportJob(models.Model):
+    """A product CSV import run off the request cycle (see products.imports)"""
+
+    objects = BusinessSpecificManager()
+
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("running", "Running"),
+        ("completed", "Completed"),
+        ("failed", "Failed"),
+    ]
+
+    business = models.ForeignKey(
+        Business, on_delete=models.CASCADE, related_name="product_import_jobs"
+    )
+    branch = models.ForeignKey(
+        Branch,
+        on_delete=models.SET_NULL,
+        related_name="product_import_jobs",
+        null=True,
+        blank=True,
+    )
+    requested_by = models.ForeignKey(
+        "authentication.User",
+        on_delete=models.SET_NULL,
+        related_name="product_import_jobs",
+        null=True,
+        blank=True,
+    )
+    source_file = models.FileField(upload_to="product_imports/")
+    original_name = models.CharField(max_length=255, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
+    progress = models.PositiveSmallIntegerField(default=0)  # type: ignore
+    rows_processed = models.PositiveIntegerField(default=0)  # type: ignore
+    created_count = models.PositiveIntegerField(default=0)  # type: ignore
+    updated_count = models.PositiveIntegerField(default=0)  # type: ignore
+    error_count = models.PositiveIntegerField(default=0)  # type: ignore
+    # CSV of the rows that were not imported and why
+    error_file = models.FileField(upload_to="product_imports/errors/", blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # Touched by the worker after every chunk; a running import whose
+    # heartbeat stops is requeued (see products.imports.requeue_stale_jobs)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)  # type: ignore
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(
+                fields=["status", "created_at"], name="products_import_status_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"Product import {self.original_name or self.pk} ({self.status})"
+
+    @property
+    def is_finished(self):
+        return self.status in ("completed", "failed")
+
+
+class DemandForecast(models.Model):
+    """Latest demand forecast and reorder suggestion for a product"""
+
+    # Use business-specific manager
+    objects = BusinessSpecificManager()
+
+    # Add business relationship for multi-tenancy
+    business = models.ForeignKey(
+        Business, on_delete=models.CASCADE, related_name="demand_forecasts"
+    )
+
+    product = models.OneToOneField(
+        Product, on_delete=models.CASCADE, related_name="demand_forecast"
+    )
+
+    # Demand figures are in product units per day
+    avg_daily_demand = models.DecimalField(max_digits=12, decimal_places=4)
+    demand_std = models.DecimalField(max_digits=12, decimal_places=4)
+
+    # Days the current stock lasts at the forecast demand (empty when there
+    # is no demand)
+    days_of_cover = models.DecimalField(
+        max_digits=12, decimal_places=2, null=True, blank=True
+    )
+    reorder_point = models.DecimalField(max_digits=12, decimal_places=2)
+    reorder_quantity = models.DecimalField(max_digits=12, decimal_places=2)
+    is_fast_moving = models.BooleanField(default=False)
+
+    # Parameters the forecast was computed with
+    method = models.CharField(max_length=10, default="ema")
+    history_days = models.PositiveIntegerField(default=56)
+    lead_time_days = models.PositiveIntegerField(default=7)
+
+    computed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = "Demand Forecast"
+        verbose_name_plural = "Demand Forecasts"
+        ordering = ["days_of_cover"]
+        indexes = [
+            models.Index(
+                fields=["business", "reorder_quantity"],
+                name="products_forecast_reorder_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"Forecast for {self.product.name}: {self.avg_daily_demand}/day"
+
+
 class VariantAttribute(models.Model):
     """Model for defining variant attributes like Size, Color, Version, etc."""
 
@@ -651,7 +967,7 @@ class VariantAttributeValue(models.Model):
         return f"{self.attribute.name}: {self.value}"  # type: ignore
 
 
-class ProductVariant(models.Model):
+class ProductVariant(StockLevelTrackingMixin, models.Model):
     """Model for product variants with specific attributes"""
 
     if TYPE_CHECKING:
@@ -704,6 +1020,13 @@ class ProductVariant(models.Model):
     class Meta:
         ordering = ["name"]
         unique_together = ("business", "sku")
+        constraints = [
+            models.UniqueConstraint(
+                fields=["business", "barcode"],
+                condition=~models.Q(barcode=""),
+                name="products_variant_unique_barcode",
+            ),
+        ]
 
     def __str__(self) -> str:  # type: ignore
         return str(self.name)  # type: ignore
@@ -713,149 +1036,22 @@ class ProductVariant(models.Model):
         if not self.barcode:
             self.barcode = self.generate_barcode()
 
+        # The barcode image is rendered on first use (see
+        # products.barcode_images), not while saving
         super().save(*args, **kwargs)
 
-        # Generate barcode image after saving (so we have a pk)
-        # Only generate on creation, not on updates
-        if self.pk and hasattr(self, "_state") and self._state.adding:
-            self.generate_barcode_image()
-
     def generate_barcode(self):
         """Generate a unique barcode for the product variant based on selected format"""
-        # Use SKU as base, or generate a unique identifier if SKU is not suitable
-        if self.sku:
-            # Create a simple numeric barcode from SKU
-            # Extract digits from SKU and ensure it's unique
-            sku_str = str(self.sku)  # Convert to string to ensure it's iterable
-            base_code = "".join([char for char in sku_str if char.isdigit()])
-
-            # If no digits in SKU, generate a unique code
-            if not base_code:
-                base_code = str(uuid.uuid4().int)[:12]
-        else:
-            # Generate a unique 12-digit code
-            base_code = str(uuid.uuid4().int)[:12]
-
-        # Format the barcode according to the selected format
-        if self.barcode_format == "ean13":
-            # EAN-13 requires 12 digits + 1 check digit = 13 total
-            base_code = re.sub(r"\D", "", base_code)[:12].ljust(12, "0")
-            barcode = self._generate_ean13(base_code)
-        elif self.barcode_format == "upca":
-            # UPC-A requires 11 digits + 1 check digit = 12 total
-            base_code = re.sub(r"\D", "", base_code)[:11].ljust(11, "0")
-            barcode = self._generate_upca(base_code)
-        else:
-            # Code128 can handle variable length and alphanumeric
-            barcode = base_code[:20]  # Limit to 20 characters for Code128
-
-        # Ensure the barcode is unique within the business
-        counter = 1
-        original_barcode = barcode
-        while (
-            ProductVariant.objects.filter(business=self.business, barcode=barcode)
-            .exclude(pk=self.pk)
-            .exists()
-        ):
-            # If we've tried too many times, generate a completely new base
-            if counter > 100:
-                base_code = str(uuid.uuid4().int)[:12]
-                if self.barcode_format == "ean13":
-                    base_code = re.sub(r"\D", "", base_code)[:12].ljust(12, "0")
-                    barcode = self._generate_ean13(base_code)
-                elif self.barcode_format == "upca":
-                    base_code = re.sub(r"\D", "", base_code)[:11].ljust(11, "0")
-                    barcode = self._generate_upca(base_code)
-                else:
-                    barcode = base_code[:20]
-                counter = 1
-                original_barcode = barcode
-            else:
-                # Append counter to make it unique
-                if self.barcode_format == "ean13":
-                    # For EAN-13, we need to regenerate with a different base
-                    modified_base = base_code[:-2] + str(counter).zfill(2)
-                    barcode = self._generate_ean13(
-                        re.sub(r"\D", "", modified_base)[:12].ljust(12, "0")
-                    )
-                elif self.barcode_format == "upca":
-                    # For UPC-A, we need to regenerate with a different base
-                    modified_base = base_code[:-2] + str(counter).zfill(2)
-                    barcode = self._generate_upca(
-                        re.sub(r"\D", "", modified_base)[:11].ljust(11, "0")
-                    )
-                else:
-                    # For Code128, we can just append the counter
-                    barcode = original_barcode + str(counter)
-            counter += 1
-
-        return barcode
-
-    def _generate_ean13(self, base_code):
-        """Generate a valid EAN-13 barcode with check digit"""
-        # Ensure base code is 12 digits
-        base_code = base_code[:12].ljust(12, "0")
-
-        # Calculate check digit
-        # Sum odd positions (1st, 3rd, 5th, etc.)
-        odd_sum = sum(int(base_code[i]) for i in range(0, 12, 2))
-        # Sum even positions (2nd, 4th, 6th, etc.) and multiply by 3
-        even_sum = sum(int(base_code[i]) for i in range(1, 12, 2)) * 3
-        # Total sum
-        total = odd_sum + even_sum
-        # Check digit is the number needed to make total divisible by 10
-        check_digit = (10 - (total % 10)) % 10
-
-        return base_code + str(check_digit)
-
-    def _generate_upca(self, base_code):
-        """Generate a valid UPC-A barcode with check digit"""
-        # Ensure base code is 11 digits
-        base_code = base_code[:11].ljust(11, "0")
-
-        # Calculate check digit
-        # Sum odd positions (1st, 3rd, 5th, etc.) and multiply by 3
-        odd_sum = sum(int(base_code[i]) for i in range(0, 11, 2)) * 3
-        # Sum even positions (2nd, 4th, 6th, etc.)
-        even_sum = sum(int(base_code[i]) for i in range(1, 11, 2))
-        # Total sum
-        total = odd_sum + even_sum
-        # Check digit is the number needed to make total divisible by 10
-        check_digit = (10 - (total % 10)) % 10
-
-        return base_code + str(check_digit)
-
-    def generate_barcode_image(self):
-        """Generate and save a barcode image for the product variant"""
-        if not self.barcode:
-            return None
-
-        try:
-            from .utils import generate_product_barcode_image
-
-            barcode_buffer = generate_product_barcode_image(self)
-
-            if barcode_buffer:
-                # Ensure the barcodes directory exists
-                from django.conf import settings
-
-                barcodes_dir = os.path.join(settings.MEDIA_ROOT, "barcodes")
-                os.makedirs(barcodes_dir, exist_ok=True)
+        from .barcodes import allocate_barcodes
 
-                # Save the barcode image to the media directory
-                filename = f"variant_barcode_{self.pk}.png"
-                filepath = os.path.join("barcodes", filename)
+        return allocate_barcodes(self.business, 1, self.barcode_format)[0]
 
-                # Save the image file
-                from django.core.files.storage import default_storage
-
-                default_storage.save(filepath, ContentFile(barcode_buffer.getvalue()))
-
-                return filepath
-        except Exception as e:
-            print(f"Error generating barcode image: {e}")
+    def generate_barcode_image(self):
+        """Return the storage path of the variant's barcode image, rendering it if needed"""
+        from .barcode_images import get_image
 
-        return None
+        image = get_image(self)
+        return image[1] if image else None
 
     @property
     def is_low_stock(self):
@@ -910,7 +1106,14 @@ class ProductVariantAttribute(models.Model):
 
 
 class InventoryTransfer(models.Model):
-    """Model for tracking inventory transfers between branches"""
+    """
+    Transfer document moving stock between branches, one
+    ``InventoryTransferLine`` per product or variant.
+
+    Stock leaves the source branch when the transfer is dispatched and
+    reaches the destination when it is received; in between the transfer
+    is in transit. Processing lives in products.transfers.
+    """
 
     if TYPE_CHECKING:
         objects: "Manager"
@@ -934,28 +1137,22 @@ class InventoryTransfer(models.Model):
         Branch, on_delete=models.CASCADE, related_name="incoming_transfers"
     )
 
-    # Product or variant being transferred
-    product = models.ForeignKey(
-        Product, on_delete=models.CASCADE, null=True, blank=True
-    )
-    product_variant = models.ForeignKey(
-        ProductVariant, on_delete=models.CASCADE, null=True, blank=True
-    )
-
     # Transfer details
-    quantity = models.DecimalField(max_digits=10, decimal_places=2)
     transfer_date = models.DateTimeField(auto_now_add=True)
     notes = models.TextField(blank=True, null=True)
 
     # Status tracking
     TRANSFER_STATUS_CHOICES = [
         ("pending", "Pending"),
+        ("in_transit", "In Transit"),
         ("completed", "Completed"),
         ("cancelled", "Cancelled"),
     ]
     status = models.CharField(
         max_length=20, choices=TRANSFER_STATUS_CHOICES, default="pending"
     )
+    dispatched_at = models.DateTimeField(null=True, blank=True)
+    received_at = models.DateTimeField(null=True, blank=True)
 
     # User who initiated the transfer
     created_by = models.ForeignKey(
@@ -969,104 +1166,61 @@ class InventoryTransfer(models.Model):
         ordering = ["-transfer_date"]
 
     def __str__(self) -> str:  # type: ignore
-        if self.product_variant:
-            return f"Transfer of {self.quantity} {self.product_variant.name} from {self.from_branch.name} to {self.to_branch.name}"
-        elif self.product:
-            return f"Transfer of {self.quantity} {self.product.name} from {self.from_branch.name} to {self.to_branch.name}"
         return f"Transfer from {self.from_branch.name} to {self.to_branch.name}"
 
+    def clean(self):
+        if self.from_branch_id and self.from_branch_id == self.to_branch_id:
+            raise ValidationError("Source and destination branches must be different.")
+
+    @property
+    def is_editable(self):
+        return self.status == "pending"
+
+
+class InventoryTransferLine(models.Model):
+    """A product or variant and the quantity moved by an inventory transfer"""
+
+    # Use business-specific manager
+    objects = BusinessSpecificManager()
+
+    business = models.ForeignKey(
+        Business,
+        on_delete=models.CASCADE,
+        related_name="inventory_transfer_lines",
+        null=True,
+    )
+    transfer = models.ForeignKey(
+        InventoryTransfer, on_delete=models.CASCADE, related_name="lines"
+    )
+
+    # Product or variant being transferred
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, null=True, blank=True
+    )
+    product_variant = models.ForeignKey(
+        ProductVariant, on_delete=models.CASCADE, null=True, blank=True
+    )
+    quantity = models.DecimalField(max_digits=10, decimal_places=2)
+
+    class Meta:
+        ordering = ["id"]
+
+    def __str__(self):
+        item = self.product_variant or self.product
+        return f"{self.quantity} {item.name if item else 'Unknown Product'}"
+
     def clean(self):
         # Ensure either product or product_variant is specified, but not both
-        if not self.product and not self.product_variant:
+        if not self.product_id and not self.product_variant_id:
             raise ValidationError(
                 "Either product or product variant must be specified."
             )
-        if self.product and self.product_variant:
+        if self.product_id and self.product_variant_id:
             raise ValidationError(
                 "Only one of product or product variant can be specified."
             )
-
-    def save(self, *args, **kwargs):
-        self.clean()
-        super().save(*args, **kwargs)
-
-        # If transfer is completed, update inventory levels
-        if self.status == "completed":
-            self.process_transfer()
-
-    def process_transfer(self):
-        """Process the inventory transfer by updating stock levels"""
-        if self.product:
-            # Reduce stock from source branch
-            if self.product.branch == self.from_branch:
-                self.product.quantity -= self.quantity
-                self.product.save(update_fields=["quantity"])
-
-            # Increase stock in destination branch
-            # Note: This assumes the product already exists in the destination branch
-            # In a real implementation, you might need to create the product in the destination branch
-            dest_product = Product.objects.filter(
-                business=self.business, branch=self.to_branch, sku=self.product.sku
-            ).first()
-
-            if dest_product:
-                dest_product.quantity += self.quantity
-                dest_product.save(update_fields=["quantity"])
-            else:
-                # Create the product in the destination branch if it doesn't exist
-                Product.objects.create(
-                    business=self.business,
-                    branch=self.to_branch,
-                    name=self.product.name,
-                    sku=self.product.sku,
-                    barcode=self.product.barcode,
-                    barcode_format=self.product.barcode_format,
-                    category=self.product.category,
-                    unit=self.product.unit,
-                    description=self.product.description,
-                    image=self.product.image,
-                    cost_price=self.product.cost_price,
-                    selling_price=self.product.selling_price,
-                    quantity=self.quantity,
-                    reorder_level=self.product.reorder_level,
-                    expiry_date=self.product.expiry_date,
-                    is_active=self.product.is_active,
-                )
-
-        elif self.product_variant:
-            # Reduce stock from source branch
-            if self.product_variant.branch == self.from_branch:
-                self.product_variant.quantity -= self.quantity
-                self.product_variant.save(update_fields=["quantity"])
-
-            # Increase stock in destination branch
-            # Note: This assumes the variant already exists in the destination branch
-            dest_variant = ProductVariant.objects.filter(
-                business=self.business,
-                branch=self.to_branch,
-                sku=self.product_variant.sku,
-            ).first()
-
-            if dest_variant:
-                dest_variant.quantity += self.quantity
-                dest_variant.save(update_fields=["quantity"])
-            else:
-                # Create the variant in the destination branch if it doesn't exist
-                ProductVariant.objects.create(
-                    business=self.business,
-                    branch=self.to_branch,
-                    product=self.product_variant.product,  # This assumes the product exists in the destination branch
-                    name=self.product_variant.name,
-                    sku=self.product_variant.sku,
-                    barcode=self.product_variant.barcode,
-                    barcode_format=self.product_variant.barcode_format,
-                    cost_price=self.product_variant.cost_price,
-                    selling_price=self.product_variant.selling_price,
-                    quantity=self.quantity,
-                    reorder_level=self.product_variant.reorder_level,
-                    image=self.product_variant.image,
-                    is_active=self.product_variant.is_active,
-                )
+        if self.quantity is not None and self.quantity <= 0:
+            raise ValidationError("Quantity must be greater than zero.")
 
 
 @receiver(post_save, sender=ProductVariant)
@@ -0,0 +1,320 @@
+"""
+Product search.
+
+``search_products`` answers a query in three steps:
+
+1. A query equal to a SKU or barcode returns that product straight away,
+   using the unique ``(business, sku)`` and ``(business, barcode)``
+   indexes. This is what scanners and typed-in codes need.
+2. Otherwise every word of the query must appear in the name, SKU or
+   description. On PostgreSQL the matching runs on trigram GIN indexes
+   (``pg_trgm``) over ``UPPER(column)``, which serve Django's
+   ``icontains``/``istartswith`` lookups. On SQLite an FTS5 table gives
+   word prefix matching for development.
+3. Matches are ranked: exact name, name prefix, SKU prefix, then the rest,
+   each by name.
+
+For POS typeahead, ``PRODUCT_SEARCH_PREFIX_INDEX = True`` keeps an
+in-memory prefix index of name words, SKUs and barcodes per business in
+each process. Lookups bisect a sorted list instead of querying, and
+product saves that change a searchable field invalidate it.
+The SQLite FTS table is kept current by triggers. If a table remake drops
+them, search falls back to LIKE until ``python manage.py
+rebuild_product_search`` recreates them.
+"""
+
+import logging
+import re
+import threading
+import time
+import uuid
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connection
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.expressions import RawSQL
+
+from .models import Product
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = "products_product_fts"
+# Columns indexed for search, with trigram indexes on PostgreSQL
+SEARCH_COLUMNS = ("name", "sku", "description")
+# Prefix index entries scanned per lookup at most, to bound typeahead time
+PREFIX_SCAN_LIMIT = 5000
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def split_terms(query):
+    """Lowercase words of a query"""
+    return _WORD_RE.findall((query or "").lower())
+
+
+def exact_match_filter(query):
+    """Products whose SKU or barcode is exactly the query"""
+    return Q(sku=query) | Q(barcode=query)
+
+
+def rank_expression(query):
+    """Lower is better: exact name, name prefix, SKU prefix, other matches"""
+    return Case(
+        When(name__iexact=query, then=Value(0)),
+        When(name__istartswith=query, then=Value(1)),
+        When(sku__istartswith=query, then=Value(2)),
+        default=Value(3),
+        output_field=IntegerField(),
+    )
+
+
+def fts_query(terms):
+    """FTS5 MATCH expression requiring a prefix match of every term"""
+    return " ".join('"{}"*'.format(term.replace('"', '""')) for term in terms)
+
+
+FTS_TRIGGERS = (
+    "products_product_fts_ai",
+    "products_product_fts_ad",
+    "products_product_fts_au",
+)
+
+# Result of sqlite_fts_ready, cached per process
+_sqlite_fts_ready = None
+
+
+def sqlite_fts_ready():
+    """
+    Whether the SQLite FTS5 table and its triggers exist, checked once per
+    process
+    """
+    global _sqlite_fts_ready
+    if _sqlite_fts_ready is not None:
+        return _sqlite_fts_ready
+
+    names = (FTS_TABLE,) + FTS_TRIGGERS
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE name IN (%s, %s, %s, %s)", names
+        )
+        found = {row[0] for row in cursor.fetchall()}
+    # Not migrated or SQLite without FTS5, or a table remake (e.g. an
+    # ``AlterField`` migration) dropped the triggers: search falls back to LIKE
+    _sqlite_fts_ready = found == set(names)
+    if FTS_TABLE in found and not _sqlite_fts_ready:
+        logger.warning(
+            "The product search triggers are missing; run "
+            "python manage.py rebuild_product_search"
+        )
+    return _sqlite_fts_ready
+
+
+def _text_filter(terms):
+    if connection.vendor == "sqlite" and sqlite_fts_ready():
+        matching_ids = RawSQL(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s",
+            [fts_query(terms)],
+        )
+        return Q(id__in=matching_ids)
+
+    # On PostgreSQL these lookups use the trigram indexes
+    text_filter = Q()
+    for term in terms:
+        term_filter = Q()
+        for column in SEARCH_COLUMNS:
+            term_filter |= Q(**{f"{column}__icontains": term})
+        text_filter &= term_filter
+    return text_filter
+
+
+def search_products(queryset, query, also=None):
+    """
+    Narrow a product queryset to the products matching ``query``, best
+    matches first. ``also`` is an optional ``Q`` of further products to
+    include (e.g. by category name).
+    """
+    query = " ".join((query or "").split())
+    terms = split_terms(query)
+    if not terms:
+        return queryset.none()
+
+    exact = queryset.filter(exact_match_filter(query))
+    if also is None and exact.exists():
+        return exact
+
+    condition = exact_match_filter(query) | _text_filter(terms)
+    if also is not None:
+        condition |= also
+    return (
+        queryset.filter(condition)
+        .annotate(search_rank=rank_expression(query))
+        .order_by("search_rank", "name")
+    )
+
+
+class PrefixIndex:
+    """
+    Sorted ``(key, product_id)`` pairs for the active products of one
+    business, keyed by lowercase name words, SKU and barcode.
+    """
+
+    def __init__(self, rows):
+        entries = []
+        for product_id, name, sku, barcode in rows:
+            keys = set(split_terms(name))
+            keys.add((sku or "").lower())
+            if barcode:
+                keys.add(barcode.lower())
+            entries.extend((key, product_id) for key in keys if key)
+        entries.sort()
+        self.keys = [key for key, _ in entries]
+        self.ids = [product_id for _, product_id in entries]
+        self.size = len(entries)
+
+    def _range(self, term):
+        start = bisect_left(self.keys, term)
+        # Every key starting with term sorts before term + the highest character
+        end = bisect_left(self.keys, term + "\U0010ffff", start)
+        return start, end
+
+    def lookup(self, query, limit=10):
+        """Ids of products with keys starting with every term of the query"""
+        terms = split_terms(query)
+        if not terms:
+            return []
+
+        ranges = sorted(
+            (self._range(term) for term in terms), key=lambda r: r[1] - r[0]
+        )
+        start, end = ranges[0]
+        end = min(end, start + PREFIX_SCAN_LIMIT)
+        # Ids matching the other terms are collected from their own ranges
+        others = [
+            set(self.ids[other_start : min(other_end, other_start + PREFIX_SCAN_LIMIT)])
+            for other_start, other_end in ranges[1:]
+        ]
+
+        found = []
+        seen = set()
+        for product_id in self.ids[start:end]:
+            if product_id in seen:
+                continue
+            seen.add(product_id)
+            if all(product_id in other for other in others):
+                found.append(product_id)
+                if len(found) >= limit:
+                    break
+        return found
+
+
+_prefix_indexes = {}
+_prefix_lock = threading.Lock()
+
+
+def _search_version_key(business_id):
+    return f"products:search-version:{business_id}"
+
+
+def get_search_version(business_id):
+    key = _search_version_key(business_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_search_version(business_id):
+    """Invalidate the prefix indexes of a business in every process"""
+    if business_id is None:
+        return
+    try:
+        cache.set(_search_version_key(business_id), uuid.uuid4().hex, timeout=None)
+    except Exception:
+        logger.exception("Failed to bump search version for %s", business_id)
+
+
+def get_prefix_index(business):
+    """Return the prefix index of a business, building it when stale"""
+    version = get_search_version(business.pk)
+    cached = _prefix_indexes.get(business.pk)
+    if cached and cached[0] == version:
+        return cached[1]
+
+    with _prefix_lock:
+        cached = _prefix_indexes.get(business.pk)
+        if cached and cached[0] == version:
+            return cached[1]
+        started = time.monotonic()
+        rows = (
+            Product._base_manager.filter(business=business, is_active=True)
+            .order_by()
+            .values_list("id", "name", "sku", "barcode")
+        )
+        index = PrefixIndex(rows.iterator(chunk_size=2000))
+        _prefix_indexes[business.pk] = (version, index)
+        logger.info(
+            "Built product prefix index for business %s: %s keys in %.3fs",
+            business.pk,
+            index.size,
+            time.monotonic() - started,
+        )
+        return index
+
+
+def typeahead(queryset, business, query, limit=10):
+    """
+    Products for a typeahead query, in ranked order. Uses the in-memory
+    prefix index when ``PRODUCT_SEARCH_PREFIX_INDEX`` is on, otherwise
+    ``search_products``.
+    """
+    if business is None or not getattr(settings, "PRODUCT_SEARCH_PREFIX_INDEX", False):
+        return list(search_products(queryset, query)[:limit])
+
+    query = " ".join((query or "").split())
+    exact = list(queryset.filter(exact_match_filter(query))[:limit])
+    if exact:
+        return exact
+
+    ids = get_prefix_index(business).lookup(query, limit)
+    products = queryset.filter(id__in=ids).in_bulk()
+    return [products[product_id] for product_id in ids if product_id in products]
+
+
+def create_sqlite_fts(using=None):
+    """
+    Create (or recreate) the SQLite FTS5 table with the triggers keeping it
+    in sync with ``products_product``, and index the existing products.
+    Returns False if SQLite was built without FTS5.
+    """
+    global _sqlite_fts_ready
+    using = using or connection
+    statements = [
+        f"DROP TABLE IF EXISTS {FTS_TABLE}",
+        f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+        "name, sku, description, content='products_product', content_rowid='id')",
+        *(f"DROP TRIGGER IF EXISTS {trigger}" for trigger in FTS_TRIGGERS),
+        "CREATE TRIGGER products_product_fts_ai AFTER INSERT ON products_product "
+        f"BEGIN INSERT INTO {FTS_TABLE}(rowid, name, sku, description) "
+        "VALUES (new.id, new.name, new.sku, new.description); END",
+        "CREATE TRIGGER products_product_fts_ad AFTER DELETE ON products_product "
+        f"BEGIN INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, sku, description) "
+        "VALUES ('delete', old.id, old.name, old.sku, old.description); END",
+        "CREATE TRIGGER products_product_fts_au AFTER UPDATE ON products_product "
+        f"BEGIN INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, sku, description) "
+        "VALUES ('delete', old.id, old.name, old.sku, old.description); "
+        f"INSERT INTO {FTS_TABLE}(rowid, name, sku, description) "
+        "VALUES (new.id, new.name, new.sku, new.description); END",
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+    ]
+    try:
+        with using.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+    except DatabaseError:
+        logger.warning("SQLite FTS5 is not available; product search uses LIKE")
+        return False
+    _sqlite_fts_ready = None
+    return True
@@ -1,32 +1,19 @@
-from django.db.models.signals import post_save, post_delete, pre_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.db import transaction
 from django.utils import timezone
 from sales.models import SaleItem
-from purchases.models import PurchaseItem
-from products.models import Product, StockMovement
-from notifications.models import Notification
+from products.models import Product, ProductVariant, StockMovement
+from products.stock_events import evaluate_stock_level
+from products.lots import consume_fefo
+from products.search import bump_search_version
+from products.stock_levels import record_stock_level
+from django.conf import settings
 import logging
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
-# Store original received_quantity values to calculate differences
-original_received_quantities = {}
-
-
-@receiver(pre_save, sender=PurchaseItem)
-def store_original_received_quantity(sender, instance, **kwargs):
-    """
-    Store the original received_quantity before saving a PurchaseItem
-    """
-    if instance.pk:
-        try:
-            old_instance = PurchaseItem.objects.get(pk=instance.pk)
-            original_received_quantities[instance.pk] = old_instance.received_quantity
-        except PurchaseItem.DoesNotExist:
-            pass
-
 
 @receiver(post_save, sender=SaleItem)
 def update_product_stock_on_sale(sender, instance, created, **kwargs):
@@ -88,91 +75,15 @@ def update_product_stock_on_sale(sender, instance, created, **kwargs):
 
                 logger.info(f"New stock after sale: {product.quantity}")
 
-                # Check if product is now low stock
-                if product.quantity <= product.reorder_level:
-                    # Create low stock notification for users in the same business
-                    Notification.create_for_all_users(
-                        title=f"Low Stock Alert: {product.name}",
-                        message=f'The product "{product.name}" is low on stock after a sale. Current quantity: {product.quantity}, Reorder level: {product.reorder_level}',
-                        notification_type="low_stock",
-                        related_product=product_parent,  # Reference the parent product
-                    )
-        except Exception as e:
-            # Log the error or handle it appropriately
-            logger.error(f"Error updating product stock: {str(e)}")
-
+                # Variants are not lot tracked
+                if not instance.is_product_variant:
+                    consume_fefo(product, quantity_sold)
 
-@receiver(post_save, sender=PurchaseItem)
-def update_product_stock_on_purchase_receive(sender, instance, created, **kwargs):
-    """
-    Update product stock when purchase items are received.
-    For new items, no stock update is needed.
-    For existing items, update stock based on received_quantity changes.
-    """
-    # For new items, no stock update is needed at creation
-    if created:
-        return
-
-    # For existing items, calculate the difference in received quantity
-    if instance.pk:
-        try:
-            # Get the original received_quantity
-            original_quantity = original_received_quantities.get(instance.pk, 0)
-
-            # Calculate the difference in received quantity
-            quantity_difference = instance.received_quantity - original_quantity
-
-            # Remove the stored original value
-            if instance.pk in original_received_quantities:
-                del original_received_quantities[instance.pk]
-
-            if quantity_difference > 0:
-                with transaction.atomic():  # type: ignore
-                    # Handle product variants
-                    if (
-                        hasattr(instance, "is_product_variant")
-                        and instance.is_product_variant
-                        and hasattr(instance, "product_variant")
-                        and instance.product_variant
-                    ):
-                        product = instance.product_variant
-                        product_parent = instance.product_variant.product
-                    else:
-                        product = instance.product
-                        product_parent = instance.product
-
-                    # Track the stock movement before updating
-                    previous_quantity = product.quantity
-                    # Convert to the same type to avoid type errors
-                    from decimal import Decimal
-
-                    quantity_received = Decimal(str(quantity_difference))
-                    new_quantity = previous_quantity + quantity_received
-
-                    # Track stock movement for analysis
-                    StockMovement.objects.create(
-                        business=product.business,
-                        product=product_parent,  # Always reference the parent product
-                        movement_type="purchase",
-                        quantity=quantity_received,
-                        previous_quantity=previous_quantity,
-                        new_quantity=new_quantity,
-                        reference_id=str(instance.purchase.id),
-                        reference_model="Purchase",
-                        created_by=(
-                            instance.purchase.created_by
-                            if hasattr(instance.purchase, "created_by")
-                            else None
-                        ),
-                    )
-
-                    # Increase product quantity by the received amount
-                    product.quantity = new_quantity
-                    product.save()
+                # Low stock and out of stock alerts are raised by
+                # evaluate_stock_level_alerts when the product is saved
         except Exception as e:
             # Log the error or handle it appropriately
-            logger.error(f"Error updating product stock on purchase receive: {e}")
-            print(f"Error updating product stock on purchase receive: {e}")
+            logger.error(f"Error updating product stock: {str(e)}")
 
 
 @receiver(post_delete, sender=SaleItem)
@@ -246,3 +157,54 @@ def set_default_values_for_product(sender, instance, created, **kwargs):
         if instance.selling_price is None:
             instance.selling_price = 0
         instance.save()
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=ProductVariant)
+def evaluate_stock_level_alerts(sender, instance, raw=False, **kwargs):
+    """
+    Open or resolve low stock and out of stock alerts when a save moves the
+    stock across the reorder level or zero.
+    """
+    if raw:
+        return
+    try:
+        evaluate_stock_level(instance)
+    except Exception as e:
+        logger.error(f"Error evaluating stock alerts for {instance}: {e}")
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_search_index(sender, instance, raw=False, **kwargs):
+    """
+    Rebuild the search prefix indexes of a business when a product is
+    added, deleted or has a searchable field changed.
+    """
+    if raw or not getattr(settings, "PRODUCT_SEARCH_PREFIX_INDEX", False):
+        return
+    fields = instance.search_fields()
+    if kwargs.get("created") is False and (
+        getattr(instance, "_loaded_search_fields", None) == fields
+    ):
+        return
+    bump_search_version(instance.business_id)
+    instance._loaded_search_fields = fields
+
+
+@receiver(post_save, sender=Product)
+def record_branch_stock_level(
+    sender, instance, created, raw=False, update_fields=None, **kwargs
+):
+    """Mirror a product's quantity into the stock level of its branch"""
+    if raw:
+        return
+    if update_fields is not None and not {"quantity", "branch"} & set(update_fields):
+        return
+    loaded = getattr(instance, "_loaded_branch_stock", None)
+    if not created and loaded == instance.branch_stock():
+        return
+    try:
+        record_stock_level(instance, previous_branch_id=loaded[1] if loaded else None)
+    except Exception as e:
+        logger.error(f"Error recording the stock level of {instance}: {e}")
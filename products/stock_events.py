@@ -0,0 +1,205 @@
+"""
+Event-driven stock level alerts.
+
+Every save of a ``Product`` or ``ProductVariant`` that changes its quantity
+or reorder level is evaluated inside the save's transaction: crossing the
+reorder level or zero opens the matching low stock / out of stock alert,
+crossing back resolves it. Each transition is written to the
+``StockAlertEvent`` outbox in the same transaction and delivered as
+notifications once the transaction commits. Events whose delivery failed
+are retried by ``python manage.py deliver_stock_events``.
+
+Code that changes stock with bulk UPDATEs, which send no save signals,
+calls ``evaluate_stock_levels`` with the ids it changed once its
+transaction commits. ``check_stock_alerts`` reconciles the alerts of a
+whole business for anything else changed without a model save.
+"""
+
+import logging
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.db.models.expressions import Combinable
+from django.utils import timezone
+
+from .models import Product, ProductVariant, StockAlert, StockAlertEvent
+from .stock_monitoring import (
+    STOCK_LEVEL_ALERT_TYPES,
+    build_stock_level_alert,
+    get_effective_reorder_level,
+    get_stock_level_alert_type,
+)
+
+logger = logging.getLogger(__name__)
+
+MAX_DELIVERY_ATTEMPTS = 5
+DELIVERY_BATCH_SIZE = 500
+# How long a claimed event is held by the worker delivering it. Events
+# claimed by a worker that died are picked up again once this runs out.
+CLAIM_LEASE = timedelta(minutes=5)
+
+
+def evaluate_stock_level(item):
+    """
+    Open or resolve the stock level alerts of a product or variant that was
+    just saved. Returns the outbox events written, if any.
+    """
+    is_variant = isinstance(item, ProductVariant)
+
+    # Stock updated with F() expressions only knows its new value in the
+    # database
+    if isinstance(item.quantity, Combinable) or isinstance(
+        item.reorder_level, Combinable
+    ):
+        item.refresh_from_db(fields=["quantity", "reorder_level"])
+
+    current = (item.quantity, item.reorder_level)
+    if getattr(item, "_loaded_stock_level", None) == current:
+        return []
+    item._loaded_stock_level = current
+
+    if is_variant:
+        product, variant, threshold = item.product, item, item.reorder_level
+        target = {"product_variant": item}
+    else:
+        product, variant, threshold = item, None, get_effective_reorder_level(item)
+        target = {"product": item, "product_variant": None}
+
+    alert_type = None
+    # Products with variants keep their stock on the variants
+    if item.is_active and not (not is_variant and item.has_variants):
+        alert_type = get_stock_level_alert_type(item.quantity, threshold)
+
+    events = []
+    with transaction.atomic():
+        open_alerts = StockAlert._base_manager.filter(
+            is_resolved=False, alert_type__in=STOCK_LEVEL_ALERT_TYPES, **target
+        )
+
+        stale = [alert for alert in open_alerts if alert.alert_type != alert_type]
+        if stale:
+            StockAlert._base_manager.filter(
+                pk__in=[alert.pk for alert in stale]
+            ).update(is_resolved=True, resolved_at=timezone.now())
+            events += [
+                StockAlertEvent(
+                    business_id=alert.business_id, alert=alert, event_type="resolved"
+                )
+                for alert in stale
+            ]
+
+        if alert_type and not open_alerts.filter(alert_type=alert_type).exists():
+            alert = build_stock_level_alert(
+                item.business, product, alert_type, item.quantity, threshold, variant
+            )
+            try:
+                # A concurrent save may have opened the same alert
+                with transaction.atomic():
+                    alert.save()
+            except IntegrityError:
+                logger.info("Stock alert for %s was already opened", item)
+            else:
+                events.append(
+                    StockAlertEvent(
+                        business_id=alert.business_id, alert=alert, event_type="opened"
+                    )
+                )
+
+        if events:
+            StockAlertEvent._base_manager.bulk_create(events)
+
+    event_ids = [event.pk for event in events if event.pk]
+    if event_ids:
+        transaction.on_commit(lambda: deliver_stock_events(event_ids))
+    return events
+
+
+def evaluate_stock_levels(product_ids=(), variant_ids=()):
+    """
+    ``evaluate_stock_level`` for products and variants whose stock was
+    changed without a save. Returns the outbox events written.
+    """
+    items = []
+    if product_ids:
+        items += Product._base_manager.filter(pk__in=list(product_ids)).select_related(
+            "business"
+        )
+    if variant_ids:
+        items += ProductVariant._base_manager.filter(
+            pk__in=list(variant_ids)
+        ).select_related("business", "product")
+
+    events = []
+    for item in items:
+        # The stock was changed in the database, not through this instance
+        item._loaded_stock_level = None
+        events += evaluate_stock_level(item)
+    return events
+
+
+def deliver_stock_events(event_ids=None, limit=DELIVERY_BATCH_SIZE):
+    """
+    Deliver pending outbox events, oldest first, and return how many were
+    delivered.
+
+    Each event is claimed with a conditional UPDATE of ``claimed_at``
+    before it is delivered, so the on-commit hook and the retry command
+    never deliver it at the same time. ``delivered_at`` is only set once
+    delivery succeeded. A failed delivery releases the claim and is retried
+    up to ``MAX_DELIVERY_ATTEMPTS`` times; a claim left by a worker that
+    died expires after ``CLAIM_LEASE``.
+    """
+    now = timezone.now()
+    claimable = Q(claimed_at=None) | Q(claimed_at__lt=now - CLAIM_LEASE)
+    pending = StockAlertEvent._base_manager.filter(
+        claimable, delivered_at=None, attempts__lt=MAX_DELIVERY_ATTEMPTS
+    )
+    if event_ids is not None:
+        pending = pending.filter(id__in=event_ids)
+
+    delivered = 0
+    for event_id in pending.order_by("created_at").values_list("id", flat=True)[:limit]:
+        claimed = StockAlertEvent._base_manager.filter(
+            claimable, id=event_id, delivered_at=None
+        ).update(claimed_at=timezone.now(), attempts=F("attempts") + 1)
+        if not claimed:
+            continue
+
+        event = StockAlertEvent._base_manager.select_related(
+            "alert__product__business"
+        ).get(id=event_id)
+        try:
+            _deliver(event)
+        except Exception as e:
+            logger.exception("Failed to deliver stock alert event %s", event_id)
+            StockAlertEvent._base_manager.filter(id=event_id).update(
+                claimed_at=None, last_error=str(e)
+            )
+        else:
+            StockAlertEvent._base_manager.filter(id=event_id).update(
+                delivered_at=timezone.now()
+            )
+            delivered += 1
+    return delivered
+
+
+def _deliver(event):
+    """Notify the business users about an opened alert"""
+    # Resolved alerts disappear from the alert lists; only openings notify
+    if event.event_type != "opened":
+        return
+
+    from notifications.models import Notification
+
+    alert = event.alert
+    if alert.alert_type == "out_of_stock":
+        title = f"Out of Stock: {alert.product.name}"
+    else:
+        title = f"Low Stock Alert: {alert.product.name}"
+    Notification.create_for_all_users(
+        title=title,
+        message=alert.message,
+        notification_type="low_stock",
+        related_product=alert.product,
+    )
@@ -0,0 +1,147 @@
+"""
+Branch stock levels.
+
+``StockLevel`` holds the stock of each product at each branch, so "how
+many units of SKU X are there across all branches" is one indexed query
+instead of SKU matching over product copies. ``Product.quantity`` stays
+the stock at the product's own branch: every save that changes it is
+mirrored into that branch's row, and stock moved to other branches
+(see products.transfers) lives only in their rows.
+
+Writes that skip model saves (bulk imports, loaders) leave the mirror
+behind; ``sync_stock_levels`` brings it up to date with set-based
+queries and is run after imports and by ``python manage.py
+sync_stock_levels``.
+"""
+
+import logging
+
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, F, OuterRef, Subquery
+from django.db.models.expressions import Combinable
+from django.utils import timezone
+
+from .models import Product, StockLevel
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+
+
+def _levels(product, branch_id):
+    return StockLevel._base_manager.filter(product=product, branch_id=branch_id)
+
+
+def record_stock_level(product, previous_branch_id=None):
+    """Mirror ``product.quantity`` into the stock level of its branch"""
+    if isinstance(product.quantity, Combinable):
+        product.refresh_from_db(fields=["quantity"])
+    if previous_branch_id != product.branch_id and previous_branch_id is not None:
+        # The product's stock moved with it to its new branch
+        _levels(product, previous_branch_id).filter(reserved=0).delete()
+
+    product._loaded_branch_stock = product.branch_stock()
+
+    if _levels(product, product.branch_id).update(
+        quantity=product.quantity, updated_at=timezone.now()
+    ):
+        return
+    try:
+        with transaction.atomic():
+            StockLevel._base_manager.create(
+                business_id=product.business_id,
+                product=product,
+                branch_id=product.branch_id,
+                quantity=product.quantity,
+            )
+    except IntegrityError:
+        # Created concurrently
+        _levels(product, product.branch_id).update(
+            quantity=product.quantity, updated_at=timezone.now()
+        )
+
+
+def get_availability(business, product=None, sku=None):
+    """
+    Stock of a product (or of the product with ``sku``) at every branch,
+    as dicts ordered by branch name, read with one query
+    """
+    levels = StockLevel._base_manager.filter(product__business=business)
+    if product is not None:
+        levels = levels.filter(product=product)
+    else:
+        levels = levels.filter(product__sku=sku)
+    return [
+        {
+            "branch_id": level["branch_id"],
+            "branch": level["branch__name"],
+            "quantity": level["quantity"],
+            "reserved": level["reserved"],
+            "available": level["quantity"] - level["reserved"],
+        }
+        for level in levels.order_by("branch__name").values(
+            "branch_id", "branch__name", "quantity", "reserved"
+        )
+    ]
+
+
+def sync_stock_levels(business, product_ids=None):
+    """
+    Bring the mirrored stock levels of a business (or of the products in
+    ``product_ids``) in line with ``Product.quantity``: create the missing
+    rows and correct the stale ones. Returns ``(created, updated)``.
+    """
+    products = Product._base_manager.filter(business=business)
+    if product_ids is not None:
+        products = products.filter(pk__in=product_ids)
+    home_level = StockLevel._base_manager.filter(product=OuterRef("pk"))
+    missing_sets = (
+        products.filter(branch__isnull=False).exclude(
+            Exists(home_level.filter(branch_id=OuterRef("branch_id")))
+        ),
+        products.filter(branch__isnull=True).exclude(
+            Exists(home_level.filter(branch__isnull=True))
+        ),
+    )
+    created = 0
+    for missing in missing_sets:
+        batch = []
+        rows = missing.values_list("id", "branch_id", "quantity").order_by()
+        for product_id, branch_id, quantity in rows.iterator(chunk_size=BATCH_SIZE):
+            batch.append(
+                StockLevel(
+                    business=business,
+                    product_id=product_id,
+                    branch_id=branch_id,
+                    quantity=quantity,
+                )
+            )
+            if len(batch) >= BATCH_SIZE:
+                StockLevel._base_manager.bulk_create(batch, ignore_conflicts=True)
+                created += len(batch)
+                batch = []
+        StockLevel._base_manager.bulk_create(batch, ignore_conflicts=True)
+        created += len(batch)
+
+    product_quantity = Subquery(
+        Product._base_manager.filter(pk=OuterRef("product_id")).values("quantity")[:1]
+    )
+    levels = StockLevel._base_manager.filter(product__business=business)
+    if product_ids is not None:
+        levels = levels.filter(product_id__in=product_ids)
+    updated = 0
+    for stale in (
+        levels.filter(branch__isnull=False, branch_id=F("product__branch_id")),
+        levels.filter(branch__isnull=True, product__branch__isnull=True),
+    ):
+        updated += stale.exclude(quantity=F("product__quantity")).update(
+            quantity=product_quantity, updated_at=timezone.now()
+        )
+
+    logger.info(
+        "Stock levels of business %s: %s created, %s corrected",
+        getattr(business, "id", None),
+        created,
+        updated,
+    )
+    return created, updated
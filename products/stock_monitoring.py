@@ -1,13 +1,49 @@
+from concurrent.futures import ThreadPoolExecutor
+from django.db import connections
 from django.utils import timezone
-from django.db.models import Avg, Count, Q, F
-from .models import Product, StockAlert, StockMovement
-from superadmin.middleware import get_current_business
+from django.db.models import (
+    Case,
+    CharField,
+    DecimalField,
+    Exists,
+    F,
+    OuterRef,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce, Greatest
+from .models import Product, ProductVariant, StockAlert, StockMovement, DemandForecast
+from .forecasting import load_demand_matrix
+from .lots import expiring_products, summarise_expiring_lots
+from superadmin.middleware import get_current_business, get_current_branch
 from superadmin.middleware import set_current_business, clear_current_business
 from datetime import timedelta
+from decimal import Decimal
 import logging
+import numpy as np
 
 logger = logging.getLogger(__name__)
 
+ALERT_BATCH_SIZE = 1000
+
+# Alerts that follow a product's stock level. They are opened and resolved
+# as stock changes (see products.stock_events) and reconciled by
+# check_low_stock_alerts.
+STOCK_LEVEL_ALERT_TYPES = ("low_stock", "out_of_stock")
+
+# Abnormal reduction detection: today's sales are compared with the previous
+# ABNORMAL_BASELINE_DAYS days. A product alerts when its robust z-score
+# reaches ABNORMAL_Z_THRESHOLD, it sold at least ABNORMAL_MIN_QUANTITY today
+# and it had sales on at least ABNORMAL_MIN_ACTIVE_DAYS baseline days (so
+# new products do not alert on their first busy day).
+ABNORMAL_BASELINE_DAYS = 28
+ABNORMAL_Z_THRESHOLD = 3.5
+ABNORMAL_MIN_QUANTITY = 3
+ABNORMAL_MIN_ACTIVE_DAYS = 3
+
+# Near expiry window of businesses without settings
+DEFAULT_NEAR_EXPIRY_DAYS = 30
+
 
 def create_stock_alert(
     product,
@@ -77,38 +113,108 @@ def track_stock_movement(
         return None
 
 
-def check_low_stock_alerts():
-    """Check for low stock products and create alerts"""
+def get_effective_reorder_level(product):
+    """
+    Return the stock level at which a product should be reordered: the
+    manual reorder level or the forecast reorder point, whichever is higher.
+    """
+    try:
+        forecast_point = product.demand_forecast.reorder_point
+    except DemandForecast.DoesNotExist:
+        return product.reorder_level
+    return max(product.reorder_level, forecast_point)
+
+
+def get_businesses_to_check(model=Product):
+    """Return the businesses that have rows in ``model``, fetched in one query"""
+    from superadmin.models import Business
+
+    return list(
+        Business.objects.filter(
+            id__in=model._base_manager.exclude(business=None).values("business")
+        ).order_by("id")
+    )
+
+
+def run_for_businesses(check, businesses, workers=1):
+    """
+    Run ``check(business)`` for each business with its business context set.
+
+    With ``workers`` > 1 businesses are processed in a thread pool. The
+    business context is thread-local and every thread uses its own database
+    connection, which is closed when the thread's work is done.
+    """
+
+    def run(business):
+        set_current_business(business)
+        try:
+            return check(business)
+        except Exception:
+            logger.exception(
+                "Error running %s for business %s", check.__name__, business.id
+            )
+            return None
+        finally:
+            clear_current_business()
+            if workers > 1:
+                connections.close_all()
+
+    if workers <= 1:
+        return [run(business) for business in businesses]
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(run, businesses))
+
+
+def get_stock_level_alert_type(quantity, threshold):
+    """Return the stock level alert a quantity calls for, or None"""
+    if quantity <= 0:
+        return "out_of_stock"
+    if quantity <= threshold:
+        return "low_stock"
+    return None
+
+
+def build_stock_level_alert(
+    business, product, alert_type, quantity, threshold, variant=None
+):
+    """Build (without saving) a low stock or out of stock alert"""
+    item = variant or product
+    unit = product.unit.symbol if product.unit else ""
+    if alert_type == "out_of_stock":
+        # Create an out of stock alert
+        message = f"⛔ {item.name} is out of stock. Current stock: {quantity} {unit}"
+        severity = "critical"
+    else:
+        # Create a new low stock alert with the specific message format requested
+        message = f"⚠️ Low stock – possible missing items for {item.name}. Current stock: {quantity} {unit}"
+        severity = "high" if quantity <= threshold / 2 else "medium"
+
+    return StockAlert(
+        business=business,
+        product=product,
+        product_variant=variant,
+        alert_type=alert_type,
+        severity=severity,
+        message=message,
+        current_stock=quantity,
+        threshold=threshold,
+    )
+
+
+def check_low_stock_alerts(workers=1):
+    """Reconcile low stock and out of stock alerts with current stock levels"""
     try:
         business = get_current_business()
 
-        # If no business is set in the thread-local context, try to run the
-        # check for each business present in the products table so tests that
+        # If no business is set in the thread-local context, run the check
+        # for each business present in the products table so tests that
         # create products without setting the thread-local business still
         # get alerts created.
         if not business:
-            # Use the base manager to avoid BusinessSpecificManager filtering
-            product_business_ids = Product._base_manager.values_list(
-                "business", flat=True
-            ).distinct()
-            for biz_id in product_business_ids:
-                if not biz_id:
-                    continue
-                try:
-                    from superadmin.models import Business
-
-                    biz = Business.objects.get(id=biz_id)
-                    set_current_business(biz)
-
-                    # Run the low stock check for this specific business
-                    _check_low_stock_for_business(biz)
-                except Exception:
-                    logger.exception(
-                        "Error processing low stock for business %s", biz_id
-                    )
-                finally:
-                    clear_current_business()
-
+            run_for_businesses(
+                _check_low_stock_for_business, get_businesses_to_check(), workers
+            )
             return
 
         # Delegate to helper when business is present
@@ -117,189 +223,365 @@ def check_low_stock_alerts():
         logger.error(f"Error checking low stock alerts: {e}")
 
 
+def _stock_state(threshold):
+    """SQL expression of ``get_stock_level_alert_type`` for a queryset"""
+    return Case(
+        When(quantity__lte=0, then=Value("out_of_stock")),
+        When(quantity__lte=threshold, then=Value("low_stock")),
+        default=None,
+        output_field=CharField(),
+    )
+
+
+def _reconcile_stock_level_alerts(business, items, threshold, field):
+    """
+    Bring the open stock level alerts of ``items`` (products or variants,
+    ``field`` naming the alert's foreign key to them) in line with their
+    stock: alerts whose item left that state are resolved with one UPDATE,
+    missing alerts are found with one anti-join and inserted in bulk.
+
+    Returns ``(created, resolved)``.
+    """
+    is_variant = field == "product_variant"
+    items = items.annotate(threshold=threshold, stock_state=_stock_state(threshold))
+    open_alerts = StockAlert._base_manager.filter(
+        business=business,
+        is_resolved=False,
+        alert_type__in=STOCK_LEVEL_ALERT_TYPES,
+        product_variant__isnull=not is_variant,
+    )
+
+    still_valid = items.filter(
+        pk=OuterRef(f"{field}_id"), stock_state=OuterRef("alert_type")
+    )
+    resolved = open_alerts.filter(~Exists(still_valid)).update(
+        is_resolved=True, resolved_at=timezone.now()
+    )
+
+    matching_alert = open_alerts.filter(
+        **{field: OuterRef("pk")}, alert_type=OuterRef("stock_state")
+    )
+    missing = (
+        items.filter(stock_state__isnull=False)
+        .filter(~Exists(matching_alert))
+        .select_related("product__unit" if is_variant else "unit")
+        .order_by()
+    )
+
+    alerts = [
+        build_stock_level_alert(
+            business,
+            item.product if is_variant else item,
+            item.stock_state,
+            item.quantity,
+            item.threshold,
+            variant=item if is_variant else None,
+        )
+        for item in missing.iterator(chunk_size=ALERT_BATCH_SIZE)
+    ]
+    StockAlert._base_manager.bulk_create(
+        alerts, batch_size=ALERT_BATCH_SIZE, ignore_conflicts=True
+    )
+    return len(alerts), resolved
+
+
 def _check_low_stock_for_business(business):
-    """Internal helper to process low-stock checks for a single business."""
-    # Get all active products with low stock for this business
-    low_stock_products = Product.objects.filter(
-        business=business, is_active=True, quantity__lte=F("reorder_level")
+    """
+    Internal helper to reconcile stock level alerts for a single business.
+
+    Alerts are opened and resolved as stock changes (see
+    products.stock_events), so this pass only catches changes made without
+    a model save, such as bulk updates and imports. The partial unique
+    constraints on open alerts make concurrent runs skip alerts that already
+    exist instead of duplicating them.
+
+    Products with a demand forecast are also low when stock reaches the
+    forecast reorder point (see products.forecasting). Products with variants
+    keep their stock on the variants, which are checked separately.
+    """
+    products = Product._base_manager.filter(
+        business=business, is_active=True, has_variants=False
+    )
+    product_threshold = Greatest(
+        F("reorder_level"),
+        Coalesce(F("demand_forecast__reorder_point"), Value(Decimal("0"))),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+    created, resolved = _reconcile_stock_level_alerts(
+        business, products, product_threshold, "product"
+    )
+
+    variants = ProductVariant._base_manager.filter(
+        business=business, is_active=True, product__is_active=True
+    )
+    variants_created, variants_resolved = _reconcile_stock_level_alerts(
+        business, variants, F("reorder_level"), "product_variant"
     )
+
+    created += variants_created
+    resolved += variants_resolved
     logger.info(
-        "Low stock check for business %s: found %s products",
+        "Low stock check for business %s: %s new alerts, %s resolved",
         getattr(business, "id", None),
-        low_stock_products.count(),
+        created,
+        resolved,
     )
+    return created
 
-    for product in low_stock_products:
-        # Check if an alert already exists for this product
-        existing_alert = StockAlert.objects.filter(
-            business=business,
-            product=product,
-            alert_type="low_stock",
-            is_resolved=False,
-        ).first()
 
-        if not existing_alert:
-            # Create a new low stock alert with the specific message format requested
-            message = f"⚠️ Low stock – possible missing items for {product.name}. Current stock: {product.quantity} {product.unit.symbol if product.unit else ''}"
-            severity = (
-                "high" if product.quantity <= product.reorder_level / 2 else "medium"
-            )
+def detect_abnormal_reductions(
+    demand,
+    z_threshold=ABNORMAL_Z_THRESHOLD,
+    min_quantity=ABNORMAL_MIN_QUANTITY,
+    min_active_days=ABNORMAL_MIN_ACTIVE_DAYS,
+):
+    """
+    Flag products whose sales in the last column of a ``products x days``
+    matrix are abnormal compared with the days before it.
+
+    The baseline of every product is the median of its daily sales since
+    its first sale in the window, and the spread is the median absolute
+    deviation (MAD) scaled to be comparable with a standard deviation. The
+    spread is floored at the standard deviation, the mean and one unit, so
+    steady and intermittent sellers do not alert on an ordinary busy day.
+
+    Returns ``(abnormal, today, baseline_mean, z_scores)`` arrays.
+    """
+    history, today = demand[:, :-1], demand[:, -1]
+
+    # Days before a product's first sale in the window say nothing about
+    # its demand (it may not have been stocked yet)
+    sold = history > 0
+    first_sale = np.argmax(sold, axis=1)
+    history = np.where(
+        np.arange(history.shape[1]) >= first_sale[:, None], history, np.nan
+    )
+
+    median = np.nanmedian(history, axis=1)
+    mad = np.nanmedian(np.abs(history - median[:, None]), axis=1) * 1.4826
+    baseline_mean = np.nanmean(history, axis=1)
+    scale = np.maximum.reduce(
+        [mad, np.nanstd(history, axis=1), baseline_mean, np.ones(len(today))]
+    )
+    z_scores = (today - median) / scale
+
+    abnormal = (
+        (z_scores >= z_threshold)
+        & (today >= min_quantity)
+        & (sold.sum(axis=1) >= min_active_days)
+    )
+    return abnormal, today, baseline_mean, z_scores
 
-            # Create the alert directly (don't rely on get_current_business inside)
-            try:
-                StockAlert.objects.create(
-                    business=business,
-                    product=product,
-                    alert_type="low_stock",
-                    severity=severity,
-                    message=message,
-                    current_stock=product.quantity,
-                    threshold=product.reorder_level,
-                )
-            except Exception:
-                logger.exception(
-                    "Failed to create low stock alert for product %s", product
-                )
-
-
-def check_abnormal_reduction():
+
+def check_abnormal_reduction(workers=1):
     """Check for abnormal stock reductions"""
     try:
         business = get_current_business()
         if not business:
-            # Similar fallback as low stock: iterate over businesses with recent movements
-            # Use base manager to avoid business-specific filtering
-            movement_business_ids = StockMovement._base_manager.values_list(
-                "business", flat=True
-            ).distinct()
-            for biz_id in movement_business_ids:
-                if not biz_id:
-                    continue
-                try:
-                    from superadmin.models import Business
-
-                    biz = Business.objects.get(id=biz_id)
-                    set_current_business(biz)
-                    _check_abnormal_for_business(biz)
-                except Exception:
-                    logger.exception(
-                        "Error processing abnormal reduction for business %s", biz_id
-                    )
-                finally:
-                    clear_current_business()
-
+            # Similar fallback as low stock: run for every business with
+            # stock movements
+            run_for_businesses(
+                _check_abnormal_for_business,
+                get_businesses_to_check(StockMovement),
+                workers,
+            )
             return
 
-        _check_abnormal_for_business(business)
+        _check_abnormal_for_business(business, get_current_branch())
     except Exception as e:
         logger.error(f"Error checking abnormal reductions: {e}")
 
 
-def _check_abnormal_for_business(business):
-    """Internal helper to detect abnormal reductions for a single business."""
-    twenty_four_hours_ago = timezone.now() - timedelta(hours=24)
-    recent_movements = StockMovement.objects.filter(
-        business=business, created_at__gte=twenty_four_hours_ago, movement_type="sale"
-    ).select_related("product")
-
-    # Group movements by product
-    product_movements = {}
-    for movement in recent_movements:
-        if movement.product.id not in product_movements:
-            product_movements[movement.product.id] = {
-                "product": movement.product,
-                "movements": [],
-            }
-        product_movements[movement.product.id]["movements"].append(movement)
-
-    # Check each product for abnormal patterns
-    for product_data in product_movements.values():
-        product = product_data["product"]
-        movements = product_data["movements"]
-
-        # Calculate average daily sales for this product over the last week
-        one_week_ago = timezone.now() - timedelta(days=7)
-        weekly_movements = StockMovement.objects.filter(
+def _check_abnormal_for_business(business, branch=None):
+    """
+    Internal helper to detect abnormal reductions for a single business.
+
+    Today's sales of every product (or of every product in ``branch``) are
+    compared with that product's own daily sales over the previous
+    ``ABNORMAL_BASELINE_DAYS`` days. Products belong to a branch, so each
+    baseline is specific to the branch the product is stocked in.
+    """
+    product_ids, stock, demand = load_demand_matrix(
+        business,
+        timezone.localdate(),
+        ABNORMAL_BASELINE_DAYS + 1,
+        branch=branch,
+    )
+    if not len(product_ids):
+        return 0
+
+    abnormal, today, baseline_mean, _ = detect_abnormal_reductions(demand)
+    candidates = {
+        int(product_ids[i]): (today[i], baseline_mean[i])
+        for i in np.flatnonzero(abnormal)
+    }
+    if not candidates:
+        return 0
+
+    already_alerted = set(
+        StockAlert._base_manager.filter(
             business=business,
-            product=product,
-            movement_type="sale",
-            created_at__gte=one_week_ago,
+            alert_type="abnormal_reduction",
+            is_resolved=False,
+            product_id__in=candidates,
+        ).values_list("product_id", flat=True)
+    )
+
+    alerts = []
+    products = Product._base_manager.filter(
+        id__in=[pk for pk in candidates if pk not in already_alerted]
+    ).select_related("branch")
+    for product in products:
+        today_sales, avg_daily_sales = candidates[product.id]
+        # Create an abnormal reduction alert with the specific message format requested
+        message = f"⚠️ Product {product.name} reducing abnormally. Today's sales: {today_sales:g}, Average daily sales: {avg_daily_sales:.2f}"
+        if product.branch:
+            message += f" ({product.branch.name})"
+        alerts.append(
+            StockAlert(
+                business=business,
+                product=product,
+                alert_type="abnormal_reduction",
+                severity="high",
+                message=message,
+                current_stock=product.quantity,
+                previous_stock=product.quantity + Decimal(str(today_sales)),
+            )
         )
 
-        if weekly_movements.count() > 0:
-            avg_daily_sales = weekly_movements.aggregate(avg_quantity=Avg("quantity"))[
-                "avg_quantity"
-            ]
-
-            # Calculate today's sales
-            today_sales = sum([movement.quantity for movement in movements])
-
-            # Check if today's sales are significantly higher than average
-            if (
-                avg_daily_sales and today_sales > avg_daily_sales * 3
-            ):  # 3x average is abnormal
-                # Check if an alert already exists for this product
-                existing_alert = StockAlert.objects.filter(
-                    business=business,
-                    product=product,
-                    alert_type="abnormal_reduction",
-                    is_resolved=False,
-                ).first()
-
-                if not existing_alert:
-                    # Create an abnormal reduction alert with the specific message format requested
-                    message = f"⚠️ Product {product.name} reducing abnormally. Today's sales: {today_sales}, Average daily sales: {avg_daily_sales:.2f}"
-                    try:
-                        StockAlert.objects.create(
-                            business=business,
-                            product=product,
-                            alert_type="abnormal_reduction",
-                            severity="high",
-                            message=message,
-                            current_stock=product.quantity,
-                            previous_stock=product.quantity + today_sales,
-                        )
-                    except Exception:
-                        logger.exception(
-                            "Failed to create abnormal reduction alert for product %s",
-                            product,
-                        )
-
-
-def check_expired_products():
-    """Check for expired products and create alerts"""
+    StockAlert._base_manager.bulk_create(
+        alerts, batch_size=ALERT_BATCH_SIZE, ignore_conflicts=True
+    )
+    logger.info(
+        "Abnormal reduction check for business %s: %s new alerts",
+        getattr(business, "id", None),
+        len(alerts),
+    )
+    return len(alerts)
+
+
+def check_expired_products(workers=1):
+    """Reconcile expired and near expiry alerts with the stock on hand"""
     try:
         business = get_current_business()
         if not business:
-            logger.warning("No business context found when checking expired products")
+            run_for_businesses(
+                _check_expiry_for_business, get_businesses_to_check(), workers
+            )
             return
 
-        # Get products with expiry dates that have passed
-        expired_products = Product.objects.business_specific().filter(
-            is_active=True, expiry_date__lt=timezone.now().date()
-        )
+        _check_expiry_for_business(business)
+    except Exception as e:
+        logger.error(f"Error checking expired products: {e}")
+
+
+def get_near_expiry_days(business):
+    """Days before expiry a business wants near expiry alerts"""
+    from settings.models import BusinessSettings
+
+    days = (
+        BusinessSettings.objects.filter(business=business)
+        .values_list("near_expiry_alert_days", flat=True)
+        .first()
+    )
+    return DEFAULT_NEAR_EXPIRY_DAYS if days is None else days
+
 
-        for product in expired_products:
-            # Check if an alert already exists for this product
-            existing_alert = StockAlert.objects.filter(
+def _sync_expiry_alerts(business, alert_type, start, end, today):
+    """
+    Bring the open ``alert_type`` alerts of a business in line with the
+    stock expiring between ``start`` and ``end``: one UPDATE resolves alerts
+    of products whose expiring stock is gone, one grouped query sums the
+    expiring lots and one anti-join finds the products still missing an
+    alert, which are inserted in bulk.
+
+    Returns ``(created, resolved)``.
+    """
+    products = expiring_products(
+        Product._base_manager.filter(business=business, is_active=True), start, end
+    )
+    open_alerts = StockAlert._base_manager.filter(
+        business=business,
+        alert_type=alert_type,
+        is_resolved=False,
+        product_variant=None,
+    )
+    resolved = open_alerts.exclude(product__in=products).update(
+        is_resolved=True, resolved_at=timezone.now()
+    )
+
+    lots = summarise_expiring_lots(business, start, end)
+    missing = products.filter(
+        ~Exists(open_alerts.filter(product=OuterRef("pk")))
+    ).order_by()
+
+    alerts = []
+    for product in missing.iterator(chunk_size=ALERT_BATCH_SIZE):
+        expiring = lots.get(product.id)
+        expiry_date = expiring["earliest"] if expiring else product.expiry_date
+        quantity = expiring["quantity"] if expiring else product.quantity
+        if alert_type == "expired":
+            severity = "high"
+            message = (
+                f"⚠️ Product {product.name} has expired. Expiry date: {expiry_date}"
+            )
+        else:
+            days_left = (expiry_date - today).days
+            severity = "high" if days_left <= 7 else "medium"
+            message = (
+                f"⏳ {product.name} expires in {days_left} days. "
+                f"Expiry date: {expiry_date}"
+            )
+        if expiring:
+            message += f" ({quantity} in {expiring['lots']} lot(s))"
+        alerts.append(
+            StockAlert(
                 business=business,
                 product=product,
-                alert_type="expired",
-                is_resolved=False,
-            ).first()
-
-            if not existing_alert:
-                # Create an expired product alert
-                message = f"⚠️ Product {product.name} has expired. Expiry date: {product.expiry_date}"
-                create_stock_alert(
-                    product=product,
-                    alert_type="expired",
-                    severity="high",
-                    message=message,
-                    current_stock=product.quantity,
-                )
-    except Exception as e:
-        logger.error(f"Error checking expired products: {e}")
+                alert_type=alert_type,
+                severity=severity,
+                message=message,
+                current_stock=quantity,
+            )
+        )
+    StockAlert._base_manager.bulk_create(
+        alerts, batch_size=ALERT_BATCH_SIZE, ignore_conflicts=True
+    )
+    return len(alerts), resolved
+
+
+def _check_expiry_for_business(business):
+    """
+    Internal helper to reconcile expiry alerts for a single business.
+
+    Expiring stock is selected with date range queries on the open lots
+    (see products.lots), so the number of queries does not depend on the
+    number of products. Stock that expired raises an "expired" alert and
+    stock expiring within the business's near expiry window a
+    "near_expiry" alert; both are resolved once the stock is sold, written
+    off or, for near expiry, has expired.
+    """
+    today = timezone.localdate()
+    created, resolved = _sync_expiry_alerts(
+        business, "expired", None, today - timedelta(days=1), today
+    )
+    near_created, near_resolved = _sync_expiry_alerts(
+        business,
+        "near_expiry",
+        today,
+        today + timedelta(days=get_near_expiry_days(business)),
+        today,
+    )
+
+    created += near_created
+    resolved += near_resolved
+    logger.info(
+        "Expiry check for business %s: %s new alerts, %s resolved",
+        getattr(business, "id", None),
+        created,
+        resolved,
+    )
+    return created
 
 
 def resolve_alert(alert_id, resolved_by=None):
@@ -1,10 +1,88 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 from django.utils import timezone
+from datetime import timedelta
 from decimal import Decimal
-from products.models import Product, StockAlert, StockMovement
-from products.stock_monitoring import check_low_stock_alerts, check_abnormal_reduction
+import numpy as np
+from products.forecasting import compute_forecast, forecast_business
+from products.barcode_images import find_missing_images, get_image
+from products.barcodes import (
+    BarcodeAllocator,
+    ean13_check_digit,
+    format_barcode,
+    upca_check_digit,
+)
+from products.models import (
+    BarcodeCounter,
+    Product,
+    ProductImportJob,
+    ProductVariant,
+    ProductVariantAttribute,
+    InventoryTransfer,
+    InventoryTransferLine,
+    StockAlert,
+    StockAlertEvent,
+    StockLevel,
+    StockLot,
+    StockMovement,
+    StockSnapshot,
+    DemandForecast,
+    VariantAttribute,
+    VariantAttributeValue,
+)
+from products.ledger import (
+    find_ledger_drift,
+    get_movement_summary,
+    get_stock_as_of,
+    take_stock_snapshot,
+)
+from products.bulk_load import BulkProductLoader, split_file
+from products.imports import (
+    MAX_JOB_ATTEMPTS,
+    ProductImporter,
+    claim_job,
+    claim_next_job,
+    process_job,
+    requeue_stale_jobs,
+    submit_import_job,
+)
+from products.lots import consume_fefo, receive_lot
+from products import search
+from products.search import get_search_version, search_products, typeahead
+from products.stock_levels import get_availability, sync_stock_levels
+from products.transfers import (
+    cancel_transfer,
+    complete_transfer,
+    dispatch_transfer,
+    receive_transfer,
+)
+from products.variant_matrix import generate_variant_matrix
+from utils.pagination import KeysetPaginator
+from products.stock_events import CLAIM_LEASE, deliver_stock_events
+from products.stock_monitoring import (
+    check_low_stock_alerts,
+    check_abnormal_reduction,
+    detect_abnormal_reductions,
+    _check_expiry_for_business,
+    _check_low_stock_for_business,
+)
+from settings.models import AuditLog, BarcodeSettings
+from superadmin.middleware import clear_current_business, set_current_business
 from superadmin.models import Business
 from authentication.models import User
+from notifications.models import Notification
 
 
 class StockAlertTestCase(TestCase):
@@ -55,9 +133,9 @@ class StockAlertTestCase(TestCase):
 
     def test_abnormal_reduction_detection(self):
         """Test that abnormal stock reductions are detected"""
-        # Create some normal sales movements
+        # Create some normal sales movements, one per day over the last days
         for i in range(5):
-            StockMovement.objects.create(
+            movement = StockMovement.objects.create(
                 business=self.business,
                 product=self.product,
                 movement_type="sale",
@@ -66,6 +144,9 @@ class StockAlertTestCase(TestCase):
                 new_quantity=Decimal("100") - ((i + 1) * 5),
                 created_by=self.user,
             )
+            StockMovement.objects.filter(id=movement.id).update(
+                created_at=timezone.now() - timedelta(days=i + 1)
+            )
 
         # Create an abnormal sale (much higher than average)
         StockMovement.objects.create(
@@ -93,3 +174,1532 @@ class StockAlertTestCase(TestCase):
         alert = alerts.first()
         self.assertEqual(alert.severity, "high")
         self.assertIn("⚠️ Product Test Product reducing abnormally", alert.message)
+
+    def test_busy_day_within_normal_spread_is_not_abnormal(self):
+        """A product with a volatile history does not alert on a busy day"""
+        demand = np.array(
+            [
+                [2, 30, 4, 25, 3, 28, 5, 35],
+                [5, 5, 5, 5, 5, 5, 5, 50],
+                [0, 0, 0, 0, 0, 0, 0, 50],
+            ],
+            dtype=float,
+        )
+
+        abnormal, today, baseline_mean, z_scores = detect_abnormal_reductions(demand)
+
+        # Volatile seller, steady seller with a spike, product without history
+        self.assertEqual(abnormal.tolist(), [False, True, False])
+        self.assertEqual(today.tolist(), [35, 50, 50])
+        self.assertAlmostEqual(baseline_mean[1], 5.0)
+
+    def test_abnormal_detection_is_branch_specific(self):
+        """Baselines belong to the branch a product is stocked in"""
+        from superadmin.models import Branch
+
+        branches = [
+            Branch.objects.create(business=self.business, name=name, address="x")
+            for name in ("Quiet Branch", "Busy Branch")
+        ]
+        products = []
+        for branch, daily in zip(branches, (1, 40)):
+            product = Product.objects.create(
+                business=self.business,
+                branch=branch,
+                name=f"Branch Product {branch.name}",
+                sku=f"BR{branch.id}",
+                quantity=Decimal("500"),
+                cost_price=Decimal("1.00"),
+                selling_price=Decimal("2.00"),
+            )
+            products.append(product)
+            for days_ago in range(1, 8):
+                movement = StockMovement.objects.create(
+                    business=self.business,
+                    product=product,
+                    movement_type="sale",
+                    quantity=Decimal(daily),
+                    previous_quantity=Decimal("500"),
+                    new_quantity=Decimal(500 - daily),
+                )
+                StockMovement.objects.filter(id=movement.id).update(
+                    created_at=timezone.now() - timedelta(days=days_ago)
+                )
+            # Both branches sell 40 today: normal for one, abnormal for the other
+            StockMovement.objects.create(
+                business=self.business,
+                product=product,
+                movement_type="sale",
+                quantity=Decimal("40"),
+                previous_quantity=Decimal("500"),
+                new_quantity=Decimal("460"),
+            )
+
+        check_abnormal_reduction()
+
+        alerts = StockAlert.objects.filter(
+            business=self.business, alert_type="abnormal_reduction"
+        )
+        self.assertEqual(
+            list(alerts.values_list("product", flat=True)), [products[0].id]
+        )
+        self.assertIn("Quiet Branch", alerts.get().message)
+
+
+class LowStockAlertBatchTestCase(TestCase):
+    def setUp(self):
+        self.businesses = [
+            Business.objects.create(
+                company_name=f"Batch Business {i}",
+                email=f"batch{i}@example.com",
+                business_type="retail",
+            )
+            for i in range(2)
+        ]
+        for business in self.businesses:
+            for i in range(5):
+                Product.objects.create(
+                    business=business,
+                    name=f"Low Product {i}",
+                    sku=f"LOW{i:03d}",
+                    quantity=Decimal("100"),
+                    reorder_level=Decimal("10"),
+                    cost_price=Decimal("1.00"),
+                    selling_price=Decimal("2.00"),
+                )
+        # A bulk update bypasses the save-time alerts, leaving the
+        # reconciliation pass to raise them
+        Product.objects.filter(business__in=self.businesses).update(
+            quantity=Decimal("1")
+        )
+
+    def test_alerts_are_created_once_for_every_business(self):
+        check_low_stock_alerts()
+        check_low_stock_alerts()
+
+        for business in self.businesses:
+            self.assertEqual(
+                StockAlert.objects.filter(
+                    business=business, alert_type="low_stock"
+                ).count(),
+                5,
+            )
+
+    def test_query_count_does_not_grow_with_products(self):
+        business = self.businesses[0]
+        # Products: one resolving update, one anti-join select and one bulk
+        # insert. Variants: one update and one select.
+        with self.assertNumQueries(5):
+            created = _check_low_stock_for_business(business)
+        self.assertEqual(created, 5)
+
+        # Nothing left to insert on the second run
+        with self.assertNumQueries(4):
+            created = _check_low_stock_for_business(business)
+        self.assertEqual(created, 0)
+
+    def test_only_one_open_alert_per_product_and_type(self):
+        product = Product.objects.filter(business=self.businesses[0]).first()
+        alert = {
+            "business": self.businesses[0],
+            "product": product,
+            "alert_type": "low_stock",
+            "message": "Low",
+            "current_stock": Decimal("1"),
+        }
+        StockAlert.objects.create(**alert)
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            StockAlert.objects.create(**alert)
+
+        # A resolved alert does not block a new open one
+        StockAlert.objects.filter(product=product).update(is_resolved=True)
+        StockAlert.objects.create(**alert)
+
+
+class StockLevelEventTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="eventowner", email="owner@example.com", password="testpass123"
+        )
+        self.business = Business.objects.create(
+            company_name="Event Business",
+            email="events@example.com",
+            business_type="retail",
+            owner=self.user,
+        )
+        self.product = Product.objects.create(
+            business=self.business,
+            name="Event Product",
+            sku="EVT001",
+            quantity=Decimal("100"),
+            reorder_level=Decimal("20"),
+            cost_price=Decimal("1.00"),
+            selling_price=Decimal("2.00"),
+        )
+
+    def open_alert_types(self, **target):
+        return list(
+            StockAlert.objects.filter(is_resolved=False, **target).values_list(
+                "alert_type", flat=True
+            )
+        )
+
+    def set_quantity(self, item, quantity):
+        item.quantity = Decimal(quantity)
+        item.save()
+
+    def test_alerts_follow_quantity_transitions(self):
+        self.set_quantity(self.product, "10")
+        self.assertEqual(self.open_alert_types(product=self.product), ["low_stock"])
+
+        self.set_quantity(self.product, "0")
+        self.assertEqual(self.open_alert_types(product=self.product), ["out_of_stock"])
+
+        self.set_quantity(self.product, "50")
+        self.assertEqual(self.open_alert_types(product=self.product), [])
+
+        events = StockAlertEvent.objects.order_by("id")
+        self.assertEqual(
+            [(e.alert.alert_type, e.event_type) for e in events],
+            [
+                ("low_stock", "opened"),
+                ("low_stock", "resolved"),
+                ("out_of_stock", "opened"),
+                ("out_of_stock", "resolved"),
+            ],
+        )
+
+    def test_saves_without_stock_changes_are_not_evaluated(self):
+        self.set_quantity(self.product, "10")
+        StockAlert.objects.all().delete()
+
+        self.product.name = "Renamed Product"
+        self.product.save()
+        self.assertEqual(StockAlert.objects.count(), 0)
+
+    def test_expression_updates_are_evaluated(self):
+        self.product.quantity = F("quantity") - 95
+        self.product.save()
+
+        self.assertEqual(self.product.quantity, Decimal("5"))
+        self.assertEqual(self.open_alert_types(product=self.product), ["low_stock"])
+
+    def test_variants_have_their_own_alerts(self):
+        variant = ProductVariant.objects.create(
+            business=self.business,
+            product=self.product,
+            name="Event Product - Red",
+            sku="EVT001-R",
+            cost_price=Decimal("1.00"),
+            selling_price=Decimal("2.00"),
+            quantity=Decimal("5"),
+            reorder_level=Decimal("2"),
+        )
+        self.set_quantity(variant, "1")
+
+        self.assertEqual(self.open_alert_types(product_variant=variant), ["low_stock"])
+        self.assertEqual(
+            self.open_alert_types(product=self.product, product_variant=None), []
+        )
+
+    def test_events_are_delivered_once_the_update_commits(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self.set_quantity(self.product, "0")
+                self.assertEqual(Notification.objects.count(), 0)
+
+        notification = Notification.objects.get(recipient=self.user)
+        self.assertEqual(notification.related_product, self.product)
+        self.assertIn("Out of Stock", notification.title)
+        self.assertFalse(StockAlertEvent.objects.filter(delivered_at=None).exists())
+
+        # Delivered events are not delivered again
+        self.assertEqual(deliver_stock_events(), 0)
+        self.assertEqual(Notification.objects.count(), 1)
+
+    def test_events_claimed_by_a_dead_worker_are_delivered_after_the_lease(self):
+        # Without running the on-commit hook the event stays in the outbox
+        self.set_quantity(self.product, "0")
+        event = StockAlertEvent.objects.get(event_type="opened")
+
+        # Another worker claimed the event and died before delivering it
+        StockAlertEvent.objects.filter(id=event.id).update(
+            claimed_at=timezone.now(), attempts=1
+        )
+        self.assertEqual(deliver_stock_events(), 0)
+        self.assertEqual(Notification.objects.count(), 0)
+
+        StockAlertEvent.objects.filter(id=event.id).update(
+            claimed_at=timezone.now() - CLAIM_LEASE - timedelta(minutes=1)
+        )
+        self.assertEqual(deliver_stock_events(), 1)
+        self.assertEqual(Notification.objects.count(), 1)
+        event.refresh_from_db()
+        self.assertIsNotNone(event.delivered_at)
+        self.assertEqual(event.attempts, 2)
+
+    def test_reconciliation_resolves_alerts_missed_by_bulk_updates(self):
+        self.set_quantity(self.product, "10")
+        Product.objects.filter(id=self.product.id).update(quantity=Decimal("0"))
+
+        check_low_stock_alerts()
+
+        self.assertEqual(self.open_alert_types(product=self.product), ["out_of_stock"])
+
+
+class StockLedgerTestCase(TestCase):
+    def setUp(self):
+        self.business = Business.objects.create(
+            company_name="Ledger Business",
+            email="ledger@example.com",
+            business_type="retail",
+        )
+        self.product = Product.objects.create(
+            business=self.business,
+            name="Ledger Product",
+            sku="LED001",
+            quantity=Decimal("100"),
+            reorder_level=Decimal("0"),
+            cost_price=Decimal("1.00"),
+            selling_price=Decimal("2.00"),
+        )
+        self.today = timezone.localdate()
+        Product.objects.filter(id=self.product.id).update(
+            created_at=timezone.now() - timedelta(days=10)
+        )
+
+        self.move("sale", "100", "90", days_ago=5)
+        self.move("purchase", "90", "120", days_ago=3)
+        self.move("sale", "120", "115", days_ago=1)
+
+    def move(self, movement_type, previous, new, days_ago=0):
+        movement = StockMovement.objects.create(
+            business=self.business,
+            product=self.product,
+            movement_type=movement_type,
+            quantity=abs(Decimal(new) - Decimal(previous)),
+            previous_quantity=Decimal(previous),
+            new_quantity=Decimal(new),
+        )
+        if days_ago:
+            StockMovement.objects.filter(id=movement.id).update(
+                created_at=timezone.now() - timedelta(days=days_ago)
+            )
+        Product.objects.filter(id=self.product.id).update(quantity=Decimal(new))
+
+    def stock_on(self, days_ago):
+        return get_stock_as_of(self.business, self.today - timedelta(days=days_ago))[
+            self.product.id
+        ]
+
+    def test_stock_as_of_without_snapshots_replays_back_from_current_stock(self):
+        self.assertEqual(self.stock_on(6), Decimal("100"))
+        self.assertEqual(self.stock_on(4), Decimal("90"))
+        self.assertEqual(self.stock_on(0), Decimal("115"))
+
+    def test_stock_as_of_starts_from_the_nearest_snapshot(self):
+        self.assertEqual(take_stock_snapshot(self.business), 1)
+        self.move("sale", "115", "110")
+
+        with self.assertNumQueries(4):
+            self.assertEqual(self.stock_on(0), Decimal("110"))
+        # Dates before the snapshot are still answered
+        self.assertEqual(self.stock_on(4), Decimal("90"))
+
+    def test_snapshot_of_a_past_date_takes_back_later_movements(self):
+        take_stock_snapshot(self.business, self.today - timedelta(days=4))
+
+        snapshot = StockSnapshot.objects.get(product=self.product)
+        self.assertEqual(snapshot.quantity, Decimal("90"))
+        self.assertEqual(self.stock_on(4), Decimal("90"))
+        self.assertEqual(self.stock_on(2), Decimal("120"))
+        self.assertEqual(self.stock_on(0), Decimal("115"))
+
+        with self.assertRaises(ValueError):
+            take_stock_snapshot(self.business, self.today + timedelta(days=1))
+
+    def test_movement_summary(self):
+        summary = get_movement_summary(
+            self.business,
+            self.today - timedelta(days=5),
+            self.today - timedelta(days=1),
+        )[self.product.id]
+
+        self.assertEqual(summary["opening"], Decimal("100"))
+        self.assertEqual(summary["closing"], Decimal("115"))
+        self.assertEqual(
+            summary["movements"], {"sale": Decimal("-15"), "purchase": Decimal("30")}
+        )
+
+    def test_drift_between_ledger_and_product_stock_is_reported(self):
+        self.assertEqual(find_ledger_drift(self.business), [])
+
+        take_stock_snapshot(self.business)
+        Product.objects.filter(id=self.product.id).update(quantity=Decimal("200"))
+
+        drift = find_ledger_drift(self.business)
+        self.assertEqual(len(drift), 1)
+        self.assertEqual(drift[0]["expected"], Decimal("115"))
+        self.assertEqual(drift[0]["difference"], Decimal("85"))
+
+
+class BarcodeAllocationTestCase(TestCase):
+    def setUp(self):
+        self.business = Business.objects.create(
+            company_name="Barcode Business",
+            email="barcodes@example.com",
+            business_type="retail",
+        )
+
+    def create_product(self, sku, **kwargs):
+        return Product.objects.create(
+            business=self.business,
+            name=f"Product {sku}",
+            sku=sku,
+            cost_price=Decimal("1.00"),
+            selling_price=Decimal("2.00"),
+            **kwargs,
+        )
+
+    def test_check_digits(self):
+        self.assertEqual(ean13_check_digit("400638133393"), "1")
+        self.assertEqual(upca_check_digit("03600029145"), "2")
+        self.assertEqual(format_barcode(7, "ean13"), "2000000000077")
+        self.assertEqual(format_barcode(7, "upca"), "200000000073")
+        self.assertEqual(format_barcode(7), "200000000007")
+
+    def test_products_get_sequential_barcodes_skipping_manual_ones(self):
+        # Shared digits in SKUs no longer lead to retries
+        self.create_product("SKU-1", barcode=format_barcode(2))
+        first = self.create_product("SKU-11")
+        second = self.create_product("SKU-111")
+
+        self.assertEqual(first.barcode, format_barcode(1))
+        self.assertEqual(second.barcode, format_barcode(3))
+
+    def test_bulk_allocation_reserves_blocks(self):
+        allocator = BarcodeAllocator(self.business, block_size=100)
+        allocator.allocate(1)
+
+        with self.assertNumQueries(2):
+            barcodes = allocator.allocate(50)
+        with self.assertNumQueries(7):
+            barcodes += allocator.allocate(250)
+
+        self.assertEqual(len(set(barcodes)), 300)
+        self.assertEqual(BarcodeCounter.objects.get().next_value, 351)
+
+    def test_duplicate_barcodes_are_rejected(self):
+        self.create_product("SKU-1", barcode="12345")
+        with self.assertRaises(IntegrityError):
+            with transaction.atomic():
+                self.create_product("SKU-2", barcode="12345")
+
+
+class BarcodeImageCacheTestCase(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.business = Business.objects.create(
+            company_name="Image Business",
+            email="images@example.com",
+            business_type="retail",
+        )
+        self.product = Product.objects.create(
+            business=self.business,
+            name="Image Product",
+            sku="IMG001",
+            cost_price=Decimal("1.00"),
+            selling_price=Decimal("2.00"),
+        )
+
+    def stored_images(self):
+        return sorted(
+            name for _, _, files in os.walk(self.media_root) for name in files
+        )
+
+    def test_saving_a_product_renders_nothing(self):
+        self.assertEqual(self.stored_images(), [])
+
+    def test_images_are_rendered_once_per_code_and_settings(self):
+        key, path = get_image(self.product)
+        self.assertEqual(self.stored_images(), [f"{key}.png"])
+        self.assertEqual(get_image(self.product), (key, path))
+
+        # The same code and settings share the image
+        self.assertEqual(len(self.stored_images()), 1)
+
+        BarcodeSettings.objects.create(display_text=False)
+        new_key, _ = get_image(self.product)
+        self.assertNotEqual(new_key, key)
+        self.assertEqual(len(self.stored_images()), 2)
+
+    def test_render_command_fills_the_cache(self):
+        call_command("render_barcodes", "--qr", "--workers", "1", stdout=StringIO())
+
+        self.assertEqual(len(self.stored_images()), 2)
+        self.assertEqual(find_missing_images([self.product], ("barcode", "qr")), {})
+
+
+class ProductSearchTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        search._prefix_indexes.clear()
+        self.business = Business.objects.create(
+            company_name="Search Business",
+            email="search@example.com",
+            business_type="retail",
+        )
+        self.powder = self.create_product("Milk Powder", "MLK-001")
+        self.fresh = self.create_product("Fresh Milk", "FRS-002")
+        self.bread = self.create_product(
+            "Bread", "BRD-003", description="Baked with milk"
+        )
+        self.products = Product.objects.filter(business=self.business)
+
+    def create_product(self, name, sku, description=""):
+        return Product.objects.create(
+            business=self.business,
+            name=name,
+            sku=sku,
+            description=description,
+            cost_price=Decimal("1.00"),
+            selling_price=Decimal("2.00"),
+        )
+
+    def test_exact_sku_or_barcode_returns_that_product(self):
+        self.assertEqual(list(search_products(self.products, "FRS-002")), [self.fresh])
+        self.assertEqual(
+            list(search_products(self.products, self.bread.barcode)), [self.bread]
+        )
+
+    def test_matches_are_ranked_by_prefix_then_name(self):
+        results = list(search_products(self.products, "milk"))
+        self.assertEqual(results, [self.powder, self.bread, self.fresh])
+
+        # Every term must match the start of a word
+        self.assertEqual(list(search_products(self.products, "fre mil")), [self.fresh])
+        self.assertEqual(list(search_products(self.products, "ilk")), [])
+        self.assertEqual(list(search_products(self.products, "  ")), [])
+
+    def test_index_follows_product_changes(self):
+        self.fresh.name = "Fresh Yoghurt"
+        self.fresh.save()
+
+        self.assertEqual(list(search_products(self.products, "yog")), [self.fresh])
+        self.assertNotIn(self.fresh, search_products(self.products, "milk"))
+
+    def test_fts_check_runs_once_and_never_repairs(self):
+        search._sqlite_fts_ready = None
+        self.addCleanup(setattr, search, "_sqlite_fts_ready", None)
+        list(search_products(self.products, "milk"))
+        with CaptureQueriesContext(connection) as queries:
+            list(search_products(self.products, "milk"))
+        self.assertFalse(
+            [q for q in queries.captured_queries if "sqlite_master" in q["sql"]]
+        )
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TRIGGER {search.FTS_TRIGGERS[2]}")
+        search._sqlite_fts_ready = None
+        with self.assertLogs("products.search", "WARNING"):
+            with CaptureQueriesContext(connection) as queries:
+                results = list(search_products(self.products, "milk"))
+        # Falls back to LIKE without touching the schema
+        self.assertEqual(results, [self.powder, self.bread, self.fresh])
+        self.assertFalse([q for q in queries.captured_queries if "TRIGGER" in q["sql"]])
+
+        call_command("rebuild_product_search", stdout=StringIO())
+        self.assertTrue(search.sqlite_fts_ready())
+
+    @override_settings(PRODUCT_SEARCH_PREFIX_INDEX=True)
+    def test_prefix_index_typeahead(self):
+        self.assertEqual(
+            typeahead(self.products, self.business, "mil pow"), [self.powder]
+        )
+        self.assertEqual(
+            typeahead(self.products, self.business, "BRD-003"), [self.bread]
+        )
+        version = get_search_version(self.business.pk)
+
+        # Stock updates keep the index; renames rebuild it
+        product = Product.objects.get(pk=self.fresh.pk)
+        product.quantity = Decimal("5")
+        product.save()
+        self.assertEqual(get_search_version(self.business.pk), version)
+
+        product.name = "Fresh Cream"
+        product.save()
+        self.assertNotEqual(get_search_version(self.business.pk), version)
+        self.assertEqual(typeahead(self.products, self.business, "cre"), [self.fresh])
+
+
+class KeysetPaginationTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.business = Business.objects.create(
+            company_name="Paging Business",
+            email="paging@example.com",
+            business_type="retail",
+        )
+        # Equal names check the id tie-breaker
+        for number in range(7):
+            Product.objects.create(
+                business=self.business,
+                name=f"Item {number // 2}",
+                sku=f"PG{number:03d}",
+                cost_price=Decimal("1.00"),
+                selling_price=Decimal("2.00"),
+            )
+        self.products = Product.objects.filter(business=self.business)
+        self.expected = list(self.products.order_by("name", "id"))
+        self.paginator = KeysetPaginator(self.products, ["name", "id"], per_page=3)
+
+    def test_pages_cover_every_row_once(self):
+        seen = []
+        cursor = None
+        while True:
+            with self.assertNumQueries(1):
+                page = self.paginator.get_page(after=cursor)
+            seen += list(page)
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        self.assertEqual(seen, self.expected)
+
+    def test_previous_page_and_descending_order(self):
+        second = self.paginator.get_page(after=self.paginator.get_page().next_cursor)
+        first = self.paginator.get_page(before=second.previous_cursor)
+        self.assertEqual(list(first), self.expected[:3])
+        self.assertFalse(first.has_previous)
+        self.assertTrue(first.has_next)
+
+        newest_first = KeysetPaginator(self.products, ["-name", "-id"], per_page=4)
+        page = newest_first.get_page()
+        rest = newest_first.get_page(after=page.next_cursor)
+        self.assertEqual(list(page) + list(rest), self.expected[::-1])
+
+    def test_bad_cursor_returns_first_page_and_count_is_cached(self):
+        page = self.paginator.get_page(after="not-a-cursor")
+        self.assertEqual(list(page), self.expected[:3])
+
+        self.assertEqual(page.count, 7)
+        with self.assertNumQueries(0):
+            self.assertEqual(KeysetPaginator(self.products, ["name", "id"]).count, 7)
+
+
+class ProductImportTestCase(TestCase):
+    HEADER = (
+        "name,sku,barcode,category,unit,description,cost_price,selling_price,"
+        "quantity,reorder_level,expiry_date\n"
+    )
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.business = Business.objects.create(
+            company_name="Import Business",
+            email="import@example.com",
+            business_type="retail",
+        )
+        self.existing = Product.objects.create(
+            business=self.business,
+            name="Old Name",
+            sku="EX1",
+            barcode="111",
+            cost_price=Decimal("1.00"),
+            selling_price=Decimal("2.00"),
+        )
+
+    def upload(self, lines):
+        content = (self.HEADER + "".join(lines)).encode("utf-8")
+        job = submit_import_job(
+            self.business, SimpleUploadedFile("products.csv", content)
+        )
+        self.assertTrue(claim_job(job.id))
+        job.refresh_from_db()
+        return process_job(job)
+
+    def rows(self, count, prefix="P"):
+        return [
+            f"Item {n},{prefix}{n},,Food,Piece,,1.50,2.50,10,2,2030-01-31\n"
+            for n in range(count)
+        ]
+
+    def test_import_creates_updates_and_reports_failed_rows(self):
+        job = self.upload(
+            self.rows(3)
+            + [
+                "New Name,EX1,,Drinks,Piece,,3,4,5,1,\n",
+                "Bad Price,B1,,Food,Piece,,abc,4,5,1,\n",
+                "Clash,C1,111,Food,Piece,,3,4,5,1,\n",
+                ",M1,,Food,Piece,,3,4,5,1,\n",
+            ]
+        )
+
+        self.assertEqual(job.status, "completed")
+        self.assertEqual(job.progress, 100)
+        self.assertEqual((job.created_count, job.updated_count), (3, 1))
+        self.assertEqual(job.error_count, 3)
+
+        self.existing.refresh_from_db()
+        self.assertEqual(self.existing.name, "New Name")
+        self.assertEqual(self.existing.category.name, "Drinks")
+        # The barcode is kept when the row has none
+        self.assertEqual(self.existing.barcode, "111")
+
+        created = Product.objects.filter(business=self.business, sku__startswith="P")
+        self.assertEqual(created.count(), 3)
+        self.assertTrue(all(product.barcode for product in created))
+        self.assertEqual(created.values("category").distinct().count(), 1)
+        self.assertEqual(
+            created.first().expiry_date, timezone.datetime(2030, 1, 31).date()
+        )
+
+        with job.error_file.open("rb") as report:
+            lines = report.read().decode("utf-8").splitlines()
+        self.assertEqual(lines[0], "line,sku,error")
+        self.assertEqual([line.split(",")[1] for line in lines[1:]], ["B1", "C1", "M1"])
+        self.assertIn("Barcode 111 is used by EX1", lines[2])
+
+        # One audit entry for the whole import
+        entry = AuditLog.objects.get(model_name="Product")
+        self.assertIn("Imported 3 new and updated 1", entry.change_message)
+
+    def test_queries_do_not_grow_with_rows(self):
+        def count_queries(rows, prefix):
+            importer = ProductImporter(self.business)
+            with CaptureQueriesContext(connection) as queries:
+                importer.import_rows(
+                    (line, row.strip().split(","))
+                    for line, row in enumerate(self.rows(rows, prefix), start=2)
+                )
+            self.assertEqual(importer.created, rows)
+            return len(queries)
+
+        self.assertEqual(count_queries(20, "A"), count_queries(400, "B"))
+
+    def test_imports_left_running_by_a_dead_worker_are_requeued(self):
+        content = (self.HEADER + "".join(self.rows(2))).encode("utf-8")
+        job = submit_import_job(
+            self.business, SimpleUploadedFile("products.csv", content)
+        )
+        self.assertTrue(claim_job(job.id))
+        self.assertEqual(requeue_stale_jobs(), 0)
+
+        stale = timezone.now() - timedelta(minutes=30)
+        ProductImportJob._base_manager.filter(id=job.id).update(heartbeat_at=stale)
+        with override_settings(PRODUCT_IMPORT_STALE_MINUTES=15):
+            self.assertEqual(requeue_stale_jobs(), 1)
+
+        job = process_job(claim_next_job())
+        self.assertEqual(job.status, "completed")
+        self.assertEqual(job.attempts, 2)
+        self.assertEqual(job.created_count, 2)
+
+        # An import that keeps killing its worker is failed instead
+        ProductImportJob._base_manager.filter(id=job.id).update(
+            status="running", heartbeat_at=stale, attempts=MAX_JOB_ATTEMPTS
+        )
+        self.assertEqual(requeue_stale_jobs(), 0)
+        job.refresh_from_db()
+        self.assertEqual(job.status, "failed")
+
+
+class BulkProductLoadTestCase(TestCase):
+    def setUp(self):
+        self.business = Business.objects.create(
+            company_name="Bulk Business",
+            email="bulk@example.com",
+            business_type="retail",
+        )
+        Product.objects.create(
+            business=self.business,
+            name="Old Name",
+            sku="EX1",
+            barcode="111",
+            cost_price=Decimal("1.00"),
+            selling_price=Decimal("2.00"),
+        )
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, "catalogue.csv")
+
+    def write(self, lines):
+        with open(self.path, "w", encoding="utf-8") as csv_file:
+            csv_file.write(ProductImportTestCase.HEADER + "".join(lines))
+
+    def load(self, workers=1):
+        loader = BulkProductLoader(self.business, workers=workers, chunk_bytes=64)
+        loader.load(self.path)
+        return loader
+
+    def test_split_file_cuts_at_line_ends(self):
+        self.write([f"Item {n},P{n},,Food,Piece,,1,2,3,1,\n" for n in range(20)])
+        ranges = split_file(self.path, 64)
+        self.assertGreater(len(ranges), 1)
+        with open(self.path, "rb") as csv_file:
+            content = csv_file.read()
+        for start, end, first_line in ranges:
+            self.assertEqual(content[end - 1 : end], b"\n")
+            self.assertEqual(content[:start].count(b"\n") + 1, first_line)
+        self.assertEqual(ranges[-1][1], len(content))
+
+    def test_load_upserts_and_reports_failed_rows(self):
+        self.write(
+            [
+                f"Item {n},P{n},,Food,Piece,,1.50,2.50,10,2,2030-01-31\n"
+                for n in range(5)
+            ]
+            + [
+                "New Name,EX1,,Drinks,Piece,,3,4,5,1,\n",
+                "Bad Price,B1,,Food,Piece,,abc,4,5,1,\n",
+                "Clash,C1,111,Food,Piece,,3,4,5,1,\n",
+                "First,D1,999,Food,Piece,,3,4,5,1,\n",
+                "Second,D2,999,Food,Piece,,3,4,5,1,\n",
+                "Repeated,P0,,Food,Piece,,9,9,9,1,\n",
+            ]
+        )
+        loader = self.load()
+
+        self.assertEqual((loader.created, loader.updated), (6, 1))
+        self.assertEqual(loader.rows_processed, 11)
+        self.assertEqual(
+            sorted(loader.errors),
+            [
+                (8, "B1", "Invalid cost price: abc"),
+                (9, "C1", "Barcode 111 is used by EX1"),
+                (11, "D2", "Barcode 999 is used by D1"),
+            ],
+        )
+
+        products = Product.objects.filter(business=self.business)
+        existing = products.get(sku="EX1")
+        self.assertEqual(existing.name, "New Name")
+        self.assertEqual(existing.category.name, "Drinks")
+        self.assertEqual(existing.barcode, "111")
+        # The last row of a repeated SKU wins
+        self.assertEqual(products.get(sku="P0").name, "Repeated")
+        self.assertEqual(products.get(sku="P1").expiry_date.isoformat(), "2030-01-31")
+        barcodes = list(products.values_list("barcode", flat=True))
+        self.assertTrue(all(barcodes))
+        self.assertEqual(len(set(barcodes)), len(barcodes))
+
+        # Loading again updates in place
+        reload = self.load()
+        self.assertEqual((reload.created, reload.updated), (0, 7))
+        self.assertEqual(products.count(), 7)
+
+    def test_parallel_workers(self):
+        self.write(
+            [f"Item {n},P{n},,Food,Piece,,1,2,3,1,\n" for n in range(40)]
+            + ["Bad,B1,,Food,Piece,,1,2,x,1,\n"]
+        )
+        loader = self.load(workers=2)
+        self.assertEqual(loader.created, 40)
+        self.assertEqual(loader.errors, [(42, "B1", "Invalid quantity: x")])
+
+
+class VariantMatrixTestCase(TestCase):
+    def setUp(self):
+        self.business = Business.objects.create(
+            company_name="Matrix Business",
+            email="matrix@example.com",
+            business_type="retail",
+        )
+        self.product = Product.objects.create(
+            business=self.business,
+            name="T-Shirt",
+            sku="TS",
+            cost_price=Decimal("5.00"),
+            selling_price=Decimal("9.00"),
+        )
+
+    def values(self, attribute_name, names):
+        attribute = VariantAttribute.objects.create(
+            business=self.business, name=attribute_name
+        )
+        return [
+            VariantAttributeValue.objects.create(
+                business=self.business, attribute=attribute, value=name
+            )
+            for name in names
+        ]
+
+    def test_generates_every_combination(self):
+        sizes = self.values("Size", ["S", "M", "L"])
+        colours = self.values("Color", ["Red", "Blue", "Navy Blue", "Green"])
+
+        variants = generate_variant_matrix(self.product, [sizes, colours])
+
+        self.assertEqual(len(variants), 12)
+        stored = ProductVariant.objects.filter(product=self.product)
+        self.assertEqual(stored.count(), 12)
+        variant = stored.get(sku="TS-M-NAVYBLUE")
+        self.assertEqual(variant.name, "T-Shirt - M - Navy Blue")
+        self.assertEqual(variant.selling_price, Decimal("9.00"))
+        self.assertEqual(
+            set(variant.attributes.values_list("attribute_value__value", flat=True)),
+            {"M", "Navy Blue"},
+        )
+        self.assertEqual(
+            ProductVariantAttribute.objects.filter(
+                product_variant__product=self.product
+            ).count(),
+            24,
+        )
+        barcodes = set(stored.values_list("barcode", flat=True))
+        self.assertEqual(len(barcodes), 12)
+        self.assertTrue(all(barcodes))
+        self.product.refresh_from_db()
+        self.assertTrue(self.product.has_variants)
+
+        # Only the new combinations are added
+        sizes += self.values("Fit", ["XL"])
+        self.assertEqual(
+            len(generate_variant_matrix(self.product, [sizes, colours])), 4
+        )
+
+    def test_queries_do_not_grow_with_the_matrix(self):
+        def count_queries(product, size_count, colour_count):
+            sizes = self.values(f"Size {product.sku}", map(str, range(size_count)))
+            colours = self.values(
+                f"Color {product.sku}", [f"C{n}" for n in range(colour_count)]
+            )
+            with CaptureQueriesContext(connection) as queries:
+                generate_variant_matrix(product, [sizes, colours])
+            return len(queries)
+
+        other = Product.objects.create(
+            business=self.business,
+            name="Hoodie",
+            sku="HD",
+            cost_price=Decimal("5.00"),
+            selling_price=Decimal("9.00"),
+        )
+        self.assertEqual(count_queries(self.product, 2, 2), count_queries(other, 4, 6))
+
+    def test_alerts_are_evaluated_for_the_new_variants_after_commit(self):
+        self.assertTrue(
+            StockAlert.objects.filter(product=self.product, is_resolved=False).exists()
+        )
+        other = Product.objects.create(
+            business=self.business,
+            name="Hoodie",
+            sku="HD",
+            cost_price=Decimal("5.00"),
+            selling_price=Decimal("9.00"),
+            quantity=Decimal("10"),
+        )
+        # Not in the matrix, left to the reconcile pass
+        Product.objects.filter(pk=other.pk).update(quantity=Decimal("0"))
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            variants = generate_variant_matrix(
+                self.product, [self.values("Size", ["S", "M"])]
+            )
+        for callback in callbacks:
+            callback()
+
+        self.assertEqual(
+            set(
+                StockAlert.objects.filter(is_resolved=False).values_list(
+                    "product_variant", "alert_type"
+                )
+            ),
+            {(variant.pk, "out_of_stock") for variant in variants},
+        )
+        self.assertFalse(StockAlert.objects.filter(product=other).exists())
+
+    def test_command_creates_attributes_and_variants(self):
+        out = StringIO()
+        call_command(
+            "generate_variants",
+            str(self.product.pk),
+            "--attribute",
+            "Size=S,M",
+            "--attribute",
+            "Color=Red,Blue,Red",
+            "--selling-price",
+            "12.50",
+            stdout=out,
+        )
+        self.assertIn("Created 4 variants", out.getvalue())
+        variant = ProductVariant.objects.get(sku="TS-S-RED")
+        self.assertEqual(variant.selling_price, Decimal("12.50"))
+
+
+class StockLevelTestCase(TestCase):
+    def setUp(self):
+        from superadmin.models import Branch
+
+        self.business = Business.objects.create(
+            company_name="Branch Business",
+            email="branches@example.com",
+            business_type="retail",
+        )
+        self.main, self.east, self.west = [
+            Branch.objects.create(business=self.business, name=name, address="x")
+            for name in ("Main", "East", "West")
+        ]
+        self.product = Product.objects.create(
+            business=self.business,
+            branch=self.main,
+            name="Rice",
+            sku="RICE",
+            cost_price=Decimal("1.00"),
+            selling_price=Decimal("2.00"),
+            quantity=Decimal("50"),
+        )
+
+    def levels(self):
+        return dict(
+            StockLevel.objects.filter(product=self.product).values_list(
+                "branch__name", "quantity"
+            )
+        )
+
+    def transfer(self, from_branch, to_branch, quantity):
+        transfer = InventoryTransfer.objects.create(
+            business=self.business, from_branch=from_branch, to_branch=to_branch
+        )
+        transfer.lines.create(
+            business=self.business, product=self.product, quantity=Decimal(quantity)
+        )
+        complete_transfer(transfer)
+
+    def test_saves_mirror_the_product_quantity(self):
+        self.assertEqual(self.levels(), {"Main": Decimal("50")})
+
+        self.product.quantity = F("quantity") - 5
+        self.product.save()
+        self.assertEqual(self.levels(), {"Main": Decimal("45")})
+
+        product = Product.objects.get(pk=self.product.pk)
+        with CaptureQueriesContext(connection) as queries:
+            product.save(update_fields=["name"])
+        self.assertFalse(
+            [q for q in queries.captured_queries if "products_stocklevel" in q["sql"]]
+        )
+
+    def test_completed_transfer_moves_stock_without_copying_the_product(self):
+        transfer = InventoryTransfer.objects.create(
+            business=self.business, from_branch=self.main, to_branch=self.east
+        )
+        transfer.lines.create(
+            business=self.business, product=self.product, quantity=Decimal("10")
+        )
+        complete_transfer(transfer)
+
+        self.assertEqual(Product.objects.filter(sku="RICE").count(), 1)
+        self.assertEqual(self.levels()["East"], Decimal("10"))
+
+        transfer = InventoryTransfer.objects.create(
+            business=self.business, from_branch=self.east, to_branch=self.west
+        )
+        transfer.lines.create(
+            business=self.business, product=self.product, quantity=Decimal("500")
+        )
+        with self.assertRaises(ValidationError):
+            complete_transfer(transfer)
+        transfer.refresh_from_db()
+        self.assertEqual(transfer.status, "pending")
+
+    def test_availability_is_one_query(self):
+        self.transfer(self.main, self.east, "20")
+        StockLevel.objects.filter(product=self.product, branch=self.east).update(
+            reserved=Decimal("4")
+        )
+
+        with self.assertNumQueries(1):
+            levels = get_availability(self.business, sku="RICE")
+
+        self.assertEqual(
+            [(level["branch"], level["available"]) for level in levels],
+            [("East", Decimal("16")), ("Main", Decimal("30"))],
+        )
+
+    def test_availability_view(self):
+        self.transfer(self.main, self.west, "8")
+        user = User.objects.create_user(
+            username="branches", password="testpass123", role="admin"
+        )
+        self.client.force_login(user)
+        set_current_business(self.business)
+        self.addCleanup(clear_current_business)
+
+        response = self.client.get(
+            reverse("products:stock_availability"), {"sku": "RICE"}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["available"], 50.0)
+        self.assertEqual(
+            [(level["branch"], level["quantity"]) for level in data["branches"]],
+            [("Main", 42.0), ("West", 8.0)],
+        )
+
+    def test_sync_after_bulk_writes(self):
+        Product.objects.filter(pk=self.product.pk).update(quantity=Decimal("7"))
+        Product._base_manager.bulk_create(
+            [
+                Product(
+                    business=self.business,
+                    name="Beans",
+                    sku="BEANS",
+                    category=self.product.category,
+                    unit=self.product.unit,
+                    cost_price=Decimal("1.00"),
+                    selling_price=Decimal("2.00"),
+                    quantity=Decimal("3"),
+                )
+            ]
+        )
+
+        self.assertEqual(sync_stock_levels(self.business), (1, 1))
+        self.assertEqual(self.levels(), {"Main": Decimal("7")})
+        beans = StockLevel.objects.get(product__sku="BEANS")
+        self.assertIsNone(beans.branch)
+        self.assertEqual(beans.quantity, Decimal("3"))
+        self.assertEqual(sync_stock_levels(self.business), (0, 0))
+
+
+class InventoryTransferTestCase(TestCase):
+    def setUp(self):
+        from superadmin.models import Branch
+
+        self.business = Business.objects.create(
+            company_name="Transfer Business",
+            email="transfers@example.com",
+            business_type="retail",
+        )
+        self.main, self.east = [
+            Branch.objects.create(business=self.business, name=name, address="x")
+            for name in ("Main", "East")
+        ]
+        self.products = [
+            Product.objects.create(
+                business=self.business,
+                branch=self.main,
+                name=f"Item {number}",
+                sku=f"ITEM{number:03d}",
+                cost_price=Decimal("1.00"),
+                selling_price=Decimal("2.00"),
+                quantity=Decimal("20"),
+            )
+            for number in range(5)
+        ]
+
+    def create_transfer(self, quantities, from_branch=None, to_branch=None):
+        transfer = InventoryTransfer.objects.create(
+            business=self.business,
+            from_branch=from_branch or self.main,
+            to_branch=to_branch or self.east,
+        )
+        InventoryTransferLine.objects.bulk_create(
+            [
+                InventoryTransferLine(
+                    business=self.business,
+                    transfer=transfer,
+                    product=product,
+                    quantity=Decimal(quantity),
+                )
+                for product, quantity in zip(self.products, quantities)
+            ]
+        )
+        return transfer
+
+    def quantities(self):
+        return [
+            quantity
+            for quantity in Product.objects.order_by("sku").values_list(
+                "quantity", flat=True
+            )
+        ]
+
+    def east_levels(self):
+        return dict(
+            StockLevel.objects.filter(branch=self.east).values_list(
+                "product__sku", "quantity"
+            )
+        )
+
+    def test_dispatch_and_receive(self):
+        transfer = self.create_transfer(["5", "6", "7", "8", "9"])
+
+        self.assertTrue(dispatch_transfer(transfer))
+        transfer.refresh_from_db()
+        self.assertEqual(transfer.status, "in_transit")
+        self.assertIsNotNone(transfer.dispatched_at)
+        self.assertEqual(
+            self.quantities(), [Decimal(n) for n in ("15", "14", "13", "12", "11")]
+        )
+        self.assertEqual(self.east_levels(), {})
+        main_level = StockLevel.objects.get(product=self.products[0], branch=self.main)
+        self.assertEqual(main_level.quantity, Decimal("15"))
+
+        self.assertTrue(receive_transfer(transfer))
+        transfer.refresh_from_db()
+        self.assertEqual(transfer.status, "completed")
+        self.assertEqual(self.east_levels()["ITEM004"], Decimal("9"))
+
+        movements = StockMovement.objects.filter(reference_model="InventoryTransfer")
+        self.assertEqual(movements.count(), 5)
+        movement = movements.get(product=self.products[1])
+        self.assertEqual(
+            (movement.previous_quantity, movement.new_quantity),
+            (Decimal("20"), Decimal("14")),
+        )
+
+    def test_processing_is_idempotent(self):
+        transfer = self.create_transfer(["5"])
+        self.assertTrue(complete_transfer(transfer))
+
+        stale = InventoryTransfer.objects.get(pk=transfer.pk)
+        stale.status = "pending"  # A copy loaded before the transfer completed
+        self.assertFalse(dispatch_transfer(stale))
+        self.assertFalse(complete_transfer(transfer))
+        self.assertFalse(cancel_transfer(transfer))
+        transfer.notes = "Checked"
+        transfer.save()
+
+        self.assertEqual(self.quantities()[0], Decimal("15"))
+        self.assertEqual(self.east_levels(), {"ITEM000": Decimal("5")})
+
+    def test_short_stock_rolls_back_every_line(self):
+        transfer = self.create_transfer(["5", "25", "5", "30", "5"])
+
+        with self.assertRaises(ValidationError) as error:
+            dispatch_transfer(transfer)
+
+        self.assertEqual(
+            error.exception.messages,
+            [
+                "Not enough stock of Item 1 at the source branch.",
+                "Not enough stock of Item 3 at the source branch.",
+            ],
+        )
+        transfer.refresh_from_db()
+        self.assertEqual(transfer.status, "pending")
+        self.assertEqual(self.quantities(), [Decimal("20")] * 5)
+        self.assertFalse(StockMovement.objects.exists())
+
+    def test_transfer_between_other_branches_uses_stock_levels(self):
+        complete_transfer(self.create_transfer(["10", "10"]))
+        from superadmin.models import Branch
+
+        west = Branch.objects.create(business=self.business, name="West", address="x")
+        transfer = self.create_transfer(
+            ["4", "12"], from_branch=self.east, to_branch=west
+        )
+
+        with self.assertRaises(ValidationError):
+            dispatch_transfer(transfer)
+        InventoryTransferLine.objects.filter(product=self.products[1]).update(
+            quantity=Decimal("3")
+        )
+        complete_transfer(transfer)
+
+        self.assertEqual(
+            self.east_levels(), {"ITEM000": Decimal("6"), "ITEM001": Decimal("7")}
+        )
+        self.assertEqual(
+            StockLevel.objects.get(product=self.products[1], branch=west).quantity,
+            Decimal("3"),
+        )
+        self.assertEqual(self.quantities()[:2], [Decimal("10"), Decimal("10")])
+
+    def test_cancel_in_transit_returns_the_stock(self):
+        transfer = self.create_transfer(["5", "5"])
+        dispatch_transfer(transfer)
+
+        self.assertTrue(cancel_transfer(transfer))
+
+        transfer.refresh_from_db()
+        self.assertEqual(transfer.status, "cancelled")
+        self.assertEqual(self.quantities(), [Decimal("20")] * 5)
+
+    def test_alerts_are_evaluated_for_the_transferred_products_after_commit(self):
+        Product.objects.filter(pk=self.products[0].pk).update(
+            reorder_level=Decimal("18")
+        )
+        # Not on the transfer, left to the reconcile pass
+        Product.objects.filter(pk=self.products[1].pk).update(
+            reorder_level=Decimal("25")
+        )
+        transfer = self.create_transfer(["5"])
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            dispatch_transfer(transfer)
+        self.assertFalse(StockAlert.objects.exists())
+        for callback in callbacks:
+            callback()
+
+        alert = StockAlert.objects.get()
+        self.assertEqual(alert.product, self.products[0])
+        self.assertEqual(alert.alert_type, "low_stock")
+        self.assertTrue(
+            StockAlertEvent.objects.filter(alert=alert, event_type="opened").exists()
+        )
+
+    def test_query_count_does_not_grow_with_lines(self):
+        def count_queries(size):
+            for product in self.products:
+                product.refresh_from_db()
+            transfer = self.create_transfer(["1"] * size)
+            with CaptureQueriesContext(connection) as queries:
+                complete_transfer(transfer)
+            return len(queries.captured_queries)
+
+        self.assertEqual(count_queries(2), count_queries(5))
+
+    def test_create_view_with_pasted_lines(self):
+        user = User.objects.create_user(
+            username="transfers", password="testpass123", role="admin"
+        )
+        self.client.force_login(user)
+        set_current_business(self.business)
+        self.addCleanup(clear_current_business)
+
+        response = self.client.post(
+            reverse("products:inventory_transfer_create"),
+            {
+                "from_branch": self.main.pk,
+                "to_branch": self.east.pk,
+                "lines": "SKU,Quantity\nITEM000, 2\nITEM001\t3\nITEM000,1\n",
+            },
+        )
+
+        transfer = InventoryTransfer.objects.get()
+        self.assertRedirects(
+            response,
+            reverse("products:inventory_transfer_detail", args=[transfer.pk]),
+            fetch_redirect_response=False,
+        )
+        self.assertEqual(
+            sorted(transfer.lines.values_list("product__sku", "quantity")),
+            [("ITEM000", Decimal("3")), ("ITEM001", Decimal("3"))],
+        )
+
+        response = self.client.post(
+            reverse("products:inventory_transfer_complete", args=[transfer.pk])
+        )
+        self.client.post(
+            reverse("products:inventory_transfer_complete", args=[transfer.pk])
+        )
+        self.assertEqual(self.quantities()[:2], [Decimal("17"), Decimal("17")])
+
+        response = self.client.post(
+            reverse("products:inventory_transfer_create"),
+            {
+                "from_branch": self.main.pk,
+                "to_branch": self.east.pk,
+                "lines": "ITEM000, 100\nNOPE, 1",
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(InventoryTransfer.objects.count(), 1)
+
+
+class StockLotTestCase(TestCase):
+    def setUp(self):
+        self.business = Business.objects.create(
+            company_name="Lot Business",
+            email="lots@example.com",
+            business_type="retail",
+        )
+        self.today = timezone.localdate()
+        self.product = self.create_product("Lot Product", "LOT001", "15")
+        self.expired_lot = receive_lot(
+            self.product, 5, "L-EXP", self.today - timedelta(days=2)
+        )
+        self.near_lot = receive_lot(
+            self.product, 5, "L-NEAR", self.today + timedelta(days=10)
+        )
+        self.later_lot = receive_lot(
+            self.product, 5, "L-LATER", self.today + timedelta(days=60)
+        )
+
+    def create_product(self, name, sku, quantity, expiry_date=None):
+        return Product.objects.create(
+            business=self.business,
+            name=name,
+            sku=sku,
+            quantity=Decimal(quantity),
+            reorder_level=Decimal("0"),
+            cost_price=Decimal("1.00"),
+            selling_price=Decimal("2.00"),
+            expiry_date=expiry_date,
+        )
+
+    def lot_quantities(self):
+        return dict(
+            StockLot.objects.filter(product=self.product).values_list(
+                "lot_number", "quantity"
+            )
+        )
+
+    def test_receiving_tracks_the_earliest_expiry_on_the_product(self):
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.expiry_date, self.today - timedelta(days=2))
+
+        receive_lot(self.product, 3, "L-LATER")
+        self.assertEqual(self.lot_quantities()["L-LATER"], Decimal("8"))
+
+    def test_sales_consume_good_stock_first_expiry_first(self):
+        consumed, shortfall = consume_fefo(self.product, 7)
+
+        self.assertEqual(shortfall, Decimal("0"))
+        self.assertEqual(
+            [(lot.lot_number, quantity) for lot, quantity in consumed],
+            [("L-NEAR", Decimal("5")), ("L-LATER", Decimal("2"))],
+        )
+        self.assertEqual(
+            self.lot_quantities(),
+            {"L-EXP": Decimal("5"), "L-NEAR": Decimal("0"), "L-LATER": Decimal("3")},
+        )
+        self.assertFalse(StockLot.objects.get(lot_number="L-NEAR").is_open)
+
+        # Expired stock goes last, then the shortfall is reported
+        consumed, shortfall = consume_fefo(self.product, 10)
+        self.assertEqual(shortfall, Decimal("2"))
+        self.assertFalse(StockLot.objects.filter(is_open=True).exists())
+
+    def test_expiry_alerts_are_created_in_bulk_and_resolved(self):
+        self.create_product(
+            "Legacy Expired", "LOT002", "4", self.today - timedelta(days=1)
+        )
+        self.create_product("Fresh", "LOT003", "4", self.today + timedelta(days=90))
+
+        with self.assertNumQueries(9):
+            self.assertEqual(_check_expiry_for_business(self.business), 3)
+        # A second pass finds nothing missing
+        self.assertEqual(_check_expiry_for_business(self.business), 0)
+
+        alerts = StockAlert.objects.filter(is_resolved=False)
+        self.assertEqual(
+            sorted(alerts.values_list("product__name", "alert_type")),
+            [
+                ("Legacy Expired", "expired"),
+                ("Lot Product", "expired"),
+                ("Lot Product", "near_expiry"),
+            ],
+        )
+        near = alerts.get(alert_type="near_expiry")
+        self.assertEqual(near.current_stock, Decimal("5"))
+        self.assertIn("expires in 10 days", near.message)
+
+        # Selling the near expiry lot resolves its alert
+        consume_fefo(self.product, 5)
+        _check_expiry_for_business(self.business)
+        self.assertTrue(StockAlert.objects.get(alert_type="near_expiry").is_resolved)
+
+
+class DemandForecastTestCase(TestCase):
+    def setUp(self):
+        self.business = Business.objects.create(
+            company_name="Forecast Business",
+            email="forecast@example.com",
+            business_type="retail",
+        )
+        self.fast = Product.objects.create(
+            business=self.business,
+            name="Fast Product",
+            sku="FAST001",
+            quantity=Decimal("30"),
+            reorder_level=Decimal("0"),
+            cost_price=Decimal("1.00"),
+            selling_price=Decimal("2.00"),
+        )
+        self.slow = Product.objects.create(
+            business=self.business,
+            name="Slow Product",
+            sku="SLOW001",
+            quantity=Decimal("500"),
+            reorder_level=Decimal("0"),
+            cost_price=Decimal("1.00"),
+            selling_price=Decimal("2.00"),
+        )
+        self.end_date = timezone.localdate() - timedelta(days=1)
+
+        # 10 units a day of the fast product and 1 of the slow one for 4 weeks
+        for days_ago in range(28):
+            for product, quantity in ((self.fast, 10), (self.slow, 1)):
+                movement = StockMovement.objects.create(
+                    business=self.business,
+                    product=product,
+                    movement_type="sale",
+                    quantity=Decimal(quantity),
+                    previous_quantity=Decimal("1000"),
+                    new_quantity=Decimal(1000 - quantity),
+                )
+                StockMovement.objects.filter(id=movement.id).update(
+                    created_at=timezone.now() - timedelta(days=days_ago + 1)
+                )
+
+    def test_compute_forecast_is_vectorised_over_products(self):
+        demand = np.array([[10.0] * 28, [0.0] * 28, [0.0, 20.0] * 14])
+        stock = np.array([30.0, 5.0, 500.0])
+
+        forecast = compute_forecast(
+            demand, stock, method="sma", lead_time_days=7, review_days=14
+        )
+
+        np.testing.assert_allclose(forecast["avg_daily_demand"], [10.0, 0.0, 10.0])
+        np.testing.assert_allclose(forecast["demand_std"], [0.0, 0.0, 10.0], atol=1e-9)
+        self.assertAlmostEqual(forecast["reorder_point"][0], 70.0)
+        # Order up to reorder point + 14 days of demand
+        self.assertEqual(forecast["reorder_quantity"][0], 180.0)
+        self.assertEqual(forecast["reorder_quantity"][1], 0)
+        self.assertAlmostEqual(forecast["days_of_cover"][0], 3.0)
+        self.assertTrue(np.isnan(forecast["days_of_cover"][1]))
+
+    def test_forecast_business_persists_results_and_flags_fast_movers(self):
+        stats = forecast_business(
+            self.business, end_date=self.end_date, history_days=28, method="sma"
+        )
+
+        self.assertEqual(stats["products"], 2)
+        fast = DemandForecast.objects.get(product=self.fast)
+        slow = DemandForecast.objects.get(product=self.slow)
+        self.assertEqual(fast.avg_daily_demand, Decimal("10"))
+        self.assertEqual(fast.days_of_cover, Decimal("3"))
+        self.assertGreater(fast.reorder_quantity, 0)
+        self.assertTrue(fast.is_fast_moving)
+        self.assertFalse(slow.is_fast_moving)
+        self.assertEqual(slow.reorder_quantity, 0)
+
+        alerts = StockAlert.objects.filter(
+            business=self.business, alert_type="fast_moving", is_resolved=False
+        )
+        self.assertEqual(list(alerts.values_list("product", flat=True)), [self.fast.id])
+
+        # Re-running updates rows in place and does not duplicate alerts
+        forecast_business(
+            self.business, end_date=self.end_date, history_days=28, method="sma"
+        )
+        self.assertEqual(
+            DemandForecast.objects.filter(business=self.business).count(), 2
+        )
+        self.assertEqual(alerts.count(), 1)
+
+    def test_low_stock_check_uses_forecast_reorder_point(self):
+        forecast_business(
+            self.business, end_date=self.end_date, history_days=28, method="sma"
+        )
+
+        check_low_stock_alerts()
+
+        alert = StockAlert.objects.get(business=self.business, alert_type="low_stock")
+        self.assertEqual(alert.product, self.fast)
+        self.assertEqual(alert.threshold, Decimal("70"))
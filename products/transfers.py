@@ -0,0 +1,474 @@
+"""
+Inventory transfer processing.
+
+An ``InventoryTransfer`` document moves any number of products and
+variants (its lines) between two branches. It is pending until
+dispatched, in transit until received, then completed:
+
+- ``dispatch_transfer`` takes the stock of every line from the source;
+- ``receive_transfer`` adds it at the destination;
+- ``complete_transfer`` does both in one transaction;
+- ``cancel_transfer`` drops a pending transfer, or returns the stock of
+  one in transit to the source.
+
+Each step first claims the transfer with a conditional status UPDATE, so
+running it twice (a double submit, two users) moves the stock once.
+Stock is changed with conditional, set-based UPDATEs, a constant number
+of queries per batch of lines rather than a save per line; if the source
+cannot cover every line the whole step is rolled back and the
+``ValidationError`` names each short line.
+
+Where a product's stock is kept follows products.stock_levels: at its own
+branch in ``Product.quantity``, elsewhere in ``StockLevel``. Variants keep
+stock only at their own branch, which must be the source or the
+destination; the other side of a variant line is not tracked.
+
+Changes to ``Product.quantity`` are recorded as ``transfer`` stock
+movements with ``bulk_create``, and the side effects saves would have
+triggered (stock level mirror, report cache) run once per step. The
+stock alerts of the changed products and variants are evaluated once the
+step commits (see products.stock_events).
+"""
+
+import csv
+import io
+import logging
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, Value, When
+from django.utils import timezone
+
+from reports.cache import bump_data_version
+from .models import (
+    InventoryTransfer,
+    InventoryTransferLine,
+    Product,
+    ProductVariant,
+    StockLevel,
+    StockMovement,
+)
+from .stock_levels import sync_stock_levels
+from .stock_events import evaluate_stock_levels
+
+logger = logging.getLogger(__name__)
+
+# Lines changed per UPDATE, keeping the CASE and IN lists within the
+# query parameter limits of every backend
+BATCH_SIZE = 250
+
+# Largest quantity a line can hold (max_digits=10, decimal_places=2)
+MAX_QUANTITY = Decimal("99999999.99")
+
+
+class _Short(Exception):
+    """A batch of lines the stock could not cover"""
+
+
+def _quantity_of(quantities, field):
+    """CASE expression giving the quantity of each key of ``quantities``"""
+    return Case(
+        *[
+            When(**{field: key}, then=Value(quantity))
+            for key, quantity in quantities.items()
+        ],
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    )
+
+
+def _batches(quantities):
+    items = list(quantities.items())
+    for start in range(0, len(items), BATCH_SIZE):
+        yield dict(items[start : start + BATCH_SIZE])
+
+
+def parse_transfer_lines(business, text):
+    """
+    Lines of a transfer from text with one ``SKU, quantity`` per line, as
+    pasted from a spreadsheet or a CSV file. Products and variants are
+    looked up by SKU with one query each and repeated SKUs are added up.
+    Returns ``(lines, errors)`` with unsaved ``InventoryTransferLine``s.
+    """
+    quantities = {}
+    errors = []
+    rows = csv.reader(io.StringIO(text.replace("\t", ",")))
+    for number, row in enumerate(rows, start=1):
+        cells = [cell.strip() for cell in row]
+        if not any(cells):
+            continue
+        if number == 1 and cells[0].lower() == "sku":
+            continue  # Header row
+        if len(cells) < 2 or not cells[0]:
+            errors.append(f"Line {number}: expected SKU, quantity.")
+            continue
+        try:
+            quantity = Decimal(cells[1])
+        except InvalidOperation:
+            errors.append(f"Line {number}: invalid quantity {cells[1]!r}.")
+            continue
+        if not quantity.is_finite() or not 0 < quantity <= MAX_QUANTITY:
+            errors.append(f"Line {number}: quantity must be greater than zero.")
+            continue
+        quantities[cells[0]] = quantities.get(cells[0], Decimal("0")) + quantity
+
+    products = {
+        product.sku: product
+        for product in Product._base_manager.filter(
+            business=business, sku__in=list(quantities), is_active=True
+        ).select_related("branch")
+    }
+    variants = {
+        variant.sku: variant
+        for variant in ProductVariant._base_manager.filter(
+            business=business,
+            sku__in=[sku for sku in quantities if sku not in products],
+            is_active=True,
+        ).select_related("branch")
+    }
+
+    lines = []
+    for sku, quantity in quantities.items():
+        if sku in products:
+            lines.append(
+                InventoryTransferLine(
+                    business=business, product=products[sku], quantity=quantity
+                )
+            )
+        elif sku in variants:
+            lines.append(
+                InventoryTransferLine(
+                    business=business, product_variant=variants[sku], quantity=quantity
+                )
+            )
+        else:
+            errors.append(f"Unknown SKU {sku!r}.")
+    return lines, errors
+
+
+def check_transfer_lines(from_branch, to_branch, lines):
+    """
+    Problems that would stop ``lines`` (with their products and variants
+    loaded) from being dispatched from ``from_branch`` now, as messages
+    """
+    away = [
+        line.product_id
+        for line in lines
+        if line.product_id and line.product.branch_id != from_branch.pk
+    ]
+    available_away = dict(
+        StockLevel._base_manager.filter(branch=from_branch, product_id__in=away)
+        .annotate(free=F("quantity") - F("reserved"))
+        .values_list("product_id", "free")
+    )
+
+    errors = []
+    for line in lines:
+        if line.product_variant_id:
+            variant = line.product_variant
+            if variant.branch_id not in (from_branch.pk, to_branch.pk):
+                errors.append(
+                    f"{variant.name} is only stocked at its own branch, which "
+                    "is neither the source nor the destination."
+                )
+                continue
+            name = variant.name
+            available = (
+                variant.quantity if variant.branch_id == from_branch.pk else None
+            )
+        else:
+            name = line.product.name
+            if line.product.branch_id == from_branch.pk:
+                available = line.product.quantity
+            else:
+                available = available_away.get(line.product_id, Decimal("0"))
+        if available is not None and available < line.quantity:
+            errors.append(
+                f"Insufficient stock of {name} in {from_branch.name}. "
+                f"Available: {available}, Requested: {line.quantity}"
+            )
+    return errors
+
+
+def _load_lines(transfer):
+    """
+    Total quantity per product as ``{id: (home branch id, name, quantity)}``
+    and per variant as ``{id: (branch id, name, quantity)}``
+    """
+    products = {}
+    variants = {}
+    rows = InventoryTransferLine._base_manager.filter(transfer=transfer).values_list(
+        "product_id",
+        "product__branch_id",
+        "product__name",
+        "product_variant_id",
+        "product_variant__branch_id",
+        "product_variant__name",
+        "quantity",
+    )
+    for (
+        product_id,
+        product_branch_id,
+        product_name,
+        variant_id,
+        variant_branch_id,
+        variant_name,
+        quantity,
+    ) in rows:
+        if variant_id:
+            _, _, total = variants.get(variant_id, (None, None, Decimal("0")))
+            variants[variant_id] = (variant_branch_id, variant_name, total + quantity)
+            if variant_branch_id not in (
+                transfer.from_branch_id,
+                transfer.to_branch_id,
+            ):
+                raise ValidationError(
+                    f"{variant_name} is only stocked at its own branch, which is "
+                    "neither the source nor the destination."
+                )
+        else:
+            _, _, total = products.get(product_id, (None, None, Decimal("0")))
+            products[product_id] = (product_branch_id, product_name, total + quantity)
+    if not products and not variants:
+        raise ValidationError("The transfer has no lines.")
+    return products, variants
+
+
+def _split(lines, branch_id):
+    """Quantities of the lines kept in the item's own row at ``branch_id``"""
+    at_branch = {}
+    elsewhere = {}
+    for pk, (home_id, _, quantity) in lines.items():
+        (at_branch if home_id == branch_id else elsewhere)[pk] = quantity
+    return at_branch, elsewhere
+
+
+def _take_batch(queryset, batch, field, reserved=False):
+    """
+    Decrement the rows of ``batch`` in ``queryset`` if every one of them
+    has the stock (less any reserved) to cover it. Returns the keys that
+    could not be covered, with the batch rolled back.
+    """
+    needed = _quantity_of(batch, field)
+    covered = queryset.filter(
+        **{f"{field}__in": list(batch)},
+        quantity__gte=F("reserved") + needed if reserved else needed,
+    )
+    try:
+        with transaction.atomic():
+            if covered.update(quantity=F("quantity") - needed) < len(batch):
+                raise _Short
+    except _Short:
+        keys = set(covered.values_list(field, flat=True))
+        return [key for key in batch if key not in keys]
+    return []
+
+
+def _take(transfer, branch_id, products, variants):
+    """
+    Take the stock of the lines from ``branch_id``. Returns the ids of the
+    products whose ``Product.quantity`` changed and the number of variants.
+    """
+    home, away = _split(products, branch_id)
+    own_variants, _ = _split(variants, branch_id)
+    short = []
+    for batch in _batches(home):
+        short += [
+            products[pk][1]
+            for pk in _take_batch(Product._base_manager.all(), batch, "pk")
+        ]
+    for batch in _batches(away):
+        levels = StockLevel._base_manager.filter(branch_id=branch_id)
+        short += [
+            products[pk][1]
+            for pk in _take_batch(levels, batch, "product_id", reserved=True)
+        ]
+    for batch in _batches(own_variants):
+        short += [
+            variants[pk][1]
+            for pk in _take_batch(ProductVariant._base_manager.all(), batch, "pk")
+        ]
+    if short:
+        raise ValidationError(
+            [f"Not enough stock of {name} at the source branch." for name in short]
+        )
+    return home, own_variants
+
+
+def _put(transfer, branch_id, products, variants):
+    """Add the stock of the lines at ``branch_id``, like ``_take``"""
+    home, away = _split(products, branch_id)
+    own_variants, _ = _split(variants, branch_id)
+    now = timezone.now()
+    for batch in _batches(home):
+        Product._base_manager.filter(pk__in=list(batch)).update(
+            quantity=F("quantity") + _quantity_of(batch, "pk")
+        )
+    for batch in _batches(away):
+        StockLevel._base_manager.bulk_create(
+            [
+                StockLevel(
+                    business_id=transfer.business_id,
+                    product_id=product_id,
+                    branch_id=branch_id,
+                )
+                for product_id in batch
+            ],
+            ignore_conflicts=True,
+        )
+        StockLevel._base_manager.filter(
+            branch_id=branch_id, product_id__in=list(batch)
+        ).update(
+            quantity=F("quantity") + _quantity_of(batch, "product_id"),
+            updated_at=now,
+        )
+    for batch in _batches(own_variants):
+        ProductVariant._base_manager.filter(pk__in=list(batch)).update(
+            quantity=F("quantity") + _quantity_of(batch, "pk")
+        )
+    return home, own_variants
+
+
+def _record_movements(transfer, changes, direction, user):
+    """
+    Bulk insert the stock movements of ``changes``, the quantities taken
+    (``direction`` -1) or added (+1) to ``Product.quantity``
+    """
+    if not changes:
+        return
+    new_quantities = dict(
+        Product._base_manager.filter(pk__in=list(changes)).values_list("id", "quantity")
+    )
+    StockMovement._base_manager.bulk_create(
+        [
+            StockMovement(
+                business_id=transfer.business_id,
+                product_id=product_id,
+                movement_type="transfer",
+                quantity=quantity,
+                previous_quantity=new_quantities[product_id] - direction * quantity,
+                new_quantity=new_quantities[product_id],
+                reference_id=str(transfer.pk),
+                reference_model="InventoryTransfer",
+                created_by=user,
+            )
+            for product_id, quantity in changes.items()
+        ],
+        batch_size=BATCH_SIZE,
+    )
+
+
+def _after_stock_change(transfer, product_changes, variant_changes):
+    """What saves of the changed products and variants would have triggered"""
+    business = transfer.business
+    if product_changes:
+        sync_stock_levels(business, product_ids=list(product_changes))
+        bump_data_version(business)
+    if product_changes or variant_changes:
+        product_ids, variant_ids = list(product_changes), list(variant_changes)
+        transaction.on_commit(lambda: evaluate_stock_levels(product_ids, variant_ids))
+
+
+def _claim(transfer, statuses, status, timestamp=None):
+    """
+    Move the transfer from one of ``statuses`` to ``status``. Returns
+    ``False`` if it is no longer in one of them, e.g. already processed.
+    """
+    now = timezone.now()
+    fields = {"status": status, "updated_at": now}
+    if timestamp:
+        fields[timestamp] = now
+    claimed = InventoryTransfer._base_manager.filter(
+        pk=transfer.pk, status__in=statuses
+    ).update(**fields)
+    if claimed:
+        for field, value in fields.items():
+            setattr(transfer, field, value)
+    return bool(claimed)
+
+
+def _move(transfer, statuses, status, timestamp, branch_id, take, user):
+    with transaction.atomic():
+        if not _claim(transfer, statuses, status, timestamp):
+            return False
+        products, variants = _load_lines(transfer)
+        if take:
+            product_changes, variant_changes = _take(
+                transfer, branch_id, products, variants
+            )
+        else:
+            product_changes, variant_changes = _put(
+                transfer, branch_id, products, variants
+            )
+        _record_movements(transfer, product_changes, -1 if take else 1, user)
+        _after_stock_change(transfer, product_changes, variant_changes)
+    logger.info(
+        "Inventory transfer %s %s: %s products, %s variants",
+        transfer.pk,
+        status,
+        len(products),
+        len(variants),
+    )
+    return True
+
+
+def dispatch_transfer(transfer, user=None):
+    """
+    Take the stock of a pending transfer from the source branch and mark it
+    in transit. Returns ``False`` if it was not pending. Raises
+    ``ValidationError``, leaving it pending, if the stock is short.
+    """
+    return _move(
+        transfer,
+        ("pending",),
+        "in_transit",
+        "dispatched_at",
+        transfer.from_branch_id,
+        True,
+        user,
+    )
+
+
+def receive_transfer(transfer, user=None):
+    """
+    Add the stock of a transfer in transit at the destination branch and
+    mark it completed. Returns ``False`` if it was not in transit.
+    """
+    return _move(
+        transfer,
+        ("in_transit",),
+        "completed",
+        "received_at",
+        transfer.to_branch_id,
+        False,
+        user,
+    )
+
+
+def complete_transfer(transfer, user=None):
+    """
+    Dispatch (if pending) and receive a transfer in one transaction.
+    Returns ``False`` if it was already completed or cancelled.
+    """
+    with transaction.atomic():
+        dispatch_transfer(transfer, user)
+        return receive_transfer(transfer, user)
+
+
+def cancel_transfer(transfer, user=None):
+    """
+    Cancel a pending transfer, or one in transit with its stock returned to
+    the source branch. Returns ``False`` if it was completed or cancelled.
+    """
+    with transaction.atomic():
+        if _claim(transfer, ("pending",), "cancelled"):
+            return True
+        return _move(
+            transfer,
+            ("in_transit",),
+            "cancelled",
+            None,
+            transfer.from_branch_id,
+            False,
+            user,
+        )
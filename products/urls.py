@@ -10,9 +10,22 @@ urlpatterns = [
     path("<int:pk>/update/", views.product_update, name="update"),
     path("<int:pk>/delete/", views.product_delete, name="delete"),
     path("<int:pk>/json/", views.product_json, name="json"),
+    path("<int:pk>/barcode.png", views.product_barcode_image, name="barcode_image"),
+    path("<int:pk>/qr.png", views.product_qr_code_image, name="qr_code_image"),
     path("bulk-upload/", views.bulk_upload, name="bulk_upload"),
+    path(
+        "imports/<int:job_id>/status/",
+        views.import_job_status,
+        name="import_job_status",
+    ),
+    path(
+        "imports/<int:job_id>/errors/",
+        views.import_job_errors,
+        name="import_job_errors",
+    ),
     path("download-template/", views.download_template, name="download_template"),
     path("search/", views.product_search_ajax, name="search_ajax"),
+    path("availability/", views.stock_availability, name="stock_availability"),
     # Variant management URLs
     path("<int:product_pk>/variants/", views.product_variant_list, name="variant_list"),
     path(
@@ -20,7 +33,22 @@ urlpatterns = [
         views.product_variant_create,
         name="variant_create",
     ),
+    path(
+        "<int:product_pk>/variants/matrix/",
+        views.product_variant_matrix,
+        name="variant_matrix",
+    ),
     path("variants/<int:pk>/", views.product_variant_detail, name="variant_detail"),
+    path(
+        "variants/<int:pk>/barcode.png",
+        views.product_variant_barcode_image,
+        name="variant_barcode_image",
+    ),
+    path(
+        "variants/<int:pk>/qr.png",
+        views.product_variant_qr_code_image,
+        name="variant_qr_code_image",
+    ),
     path(
         "variants/<int:pk>/update/", views.product_variant_update, name="variant_update"
     ),
@@ -82,6 +110,16 @@ urlpatterns = [
         views.inventory_transfer_update,
         name="inventory_transfer_update",
     ),
+    path(
+        "transfers/<int:pk>/dispatch/",
+        views.inventory_transfer_dispatch,
+        name="inventory_transfer_dispatch",
+    ),
+    path(
+        "transfers/<int:pk>/receive/",
+        views.inventory_transfer_receive,
+        name="inventory_transfer_receive",
+    ),
     path(
         "transfers/<int:pk>/complete/",
         views.inventory_transfer_complete,
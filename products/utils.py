@@ -1,54 +1,48 @@
 import qrcode
 import qrcode.constants
 from io import BytesIO
-from django.core.files.base import ContentFile
-from django.core.files.storage import default_storage
 from django.urls import reverse
-from django.contrib.sites.shortcuts import get_current_site
-from django.conf import settings
-import os
 
 
-def generate_product_qr_code(product):
-    """
-    Generate a QR code for a product and return the image URL
-    """
-    # Generate the product detail URL
-    # In a real application, you would use the request object to get the full URL
-    # For now, we'll create a relative URL
-    product_url = reverse("products:detail", kwargs={"pk": product.pk})
-
-    # Create QR code instance
+def render_qr_png(data):
+    """Render a QR code for ``data`` and return the PNG bytes"""
     qr = qrcode.QRCode(
         version=1,
         error_correction=qrcode.constants.ERROR_CORRECT_L,
         box_size=10,
         border=4,
     )
-
-    # Add product URL to QR code
-    qr.add_data(product_url)
+    qr.add_data(data)
     qr.make(fit=True)
 
     # Create QR code image
     img = qr.make_image(fill_color="black", back_color="white")
 
-    # Save to BytesIO object
     buffer = BytesIO()
     img.save(buffer, "PNG")
+    return buffer.getvalue()
 
-    # Return the image data
-    buffer.seek(0)
-    return buffer
 
+# Options of barcode images, tuned for scanning. BarcodeSettings can turn
+# the text under the barcode off (see products.barcode_images).
+BARCODE_RENDER_OPTIONS = {
+    "module_width": 0.2,  # Default: 0.2
+    "module_height": 15.0,  # Default: 15.0 - Increase height for better scanning
+    "quiet_zone": 6.5,  # Default: 6.5 - Quiet zone for scanners
+    "font_size": 10,  # Default: 10
+    "text_distance": 5.0,  # Default: 5.0
+    "background": "white",  # Default: 'white'
+    "foreground": "black",  # Default: 'black'
+    "write_text": True,  # Default: True - Include text under barcode
+}
 
-def generate_product_barcode_image(product):
+
+def render_barcode_png(code, barcode_format="code128", options=None):
     """
-    Generate a barcode image for a product with improved quality for scanning
+    Render a barcode and return the PNG bytes, or None if the code cannot
+    be rendered in that format. Uses no Django state, so it can run in
+    worker processes.
     """
-    if not product.barcode:
-        return None
-
     try:
         # Import the barcode module
         from barcode import get_barcode_class
@@ -62,32 +56,14 @@ def generate_product_barcode_image(product):
         }
 
         # Get the appropriate barcode class
-        barcode_format = format_map.get(product.barcode_format, "code128")
-        barcode_class = get_barcode_class(barcode_format)
-
-        # Create barcode instance with improved options for scanning
-        options = {
-            "module_width": 0.2,  # Default: 0.2
-            "module_height": 15.0,  # Default: 15.0 - Increase height for better scanning
-            "quiet_zone": 6.5,  # Default: 6.5 - Quiet zone for scanners
-            "font_size": 10,  # Default: 10
-            "text_distance": 5.0,  # Default: 5.0
-            "background": "white",  # Default: 'white'
-            "foreground": "black",  # Default: 'black'
-            "write_text": True,  # Default: True - Include text under barcode
-            "text": product.barcode,  # Text to display under barcode
-        }
+        barcode_class = get_barcode_class(format_map.get(barcode_format, "code128"))
 
-        # Create barcode instance
-        barcode_instance = barcode_class(product.barcode, writer=ImageWriter())
+        options = {**BARCODE_RENDER_OPTIONS, **(options or {}), "text": code}
+        barcode_instance = barcode_class(code, writer=ImageWriter())
 
-        # Save to BytesIO object
         buffer = BytesIO()
         barcode_instance.write(buffer, options)
-
-        # Return the image data
-        buffer.seek(0)
-        return buffer
+        return buffer.getvalue()
     except ImportError as e:
         print(f"Barcode module import error: {e}")
         return None
@@ -96,13 +72,44 @@ def generate_product_barcode_image(product):
         return None
 
 
+def get_product_url(product):
+    """Detail page of a product or variant, encoded in its QR code"""
+    from .models import ProductVariant
+
+    if isinstance(product, ProductVariant):
+        return reverse("products:variant_detail", kwargs={"pk": product.pk})
+    return reverse("products:detail", kwargs={"pk": product.pk})
+
+
+def generate_product_qr_code(product):
+    """
+    Generate a QR code for a product and return it as a BytesIO
+    """
+    # In a real application, you would use the request object to get the full URL
+    # For now, we'll create a relative URL
+    return BytesIO(render_qr_png(get_product_url(product)))
+
+
+def generate_product_barcode_image(product):
+    """
+    Generate a barcode image for a product with improved quality for scanning
+    """
+    if not product.barcode:
+        return None
+
+    content = render_barcode_png(product.barcode, product.barcode_format)
+    return BytesIO(content) if content else None
+
+
 def get_product_qr_code_url(product):
     """
     Get the URL for a product's QR code
     """
-    # In a real implementation, you would generate and save the QR code
-    # For now, we'll return a placeholder
-    return f"/media/qr/product_{product.pk}.png"
+    from .models import ProductVariant
+
+    if isinstance(product, ProductVariant):
+        return reverse("products:variant_qr_code_image", kwargs={"pk": product.pk})
+    return reverse("products:qr_code_image", kwargs={"pk": product.pk})
 
 
 def get_product_barcode_url(product):
@@ -111,4 +118,9 @@ def get_product_barcode_url(product):
     """
     if not product.barcode:
         return None
-    return f"/media/barcode/product_{product.pk}.png"
+
+    from .models import ProductVariant
+
+    if isinstance(product, ProductVariant):
+        return reverse("products:variant_barcode_image", kwargs={"pk": product.pk})
+    return reverse("products:barcode_image", kwargs={"pk": product.pk})
@@ -0,0 +1,147 @@
+"""
+Variant matrix generation.
+
+``generate_variant_matrix`` creates one variant of a product for every
+combination of the given attribute values (8 sizes x 12 colours gives 96
+variants) with a handful of queries whatever the size of the matrix:
+
+- combinations the product already has a variant for are skipped;
+- SKUs are built from the product's SKU and the values, made unique
+  against the business's SKUs with one lookup;
+- barcodes are allocated as one block (see products.barcodes);
+- variants and their ``ProductVariantAttribute`` links are written with
+  ``bulk_create``.
+
+Bulk inserts send no model signals, so their side effects run once for
+the whole matrix: ``Product.has_variants`` is set with one UPDATE and the
+stock level alerts of the product and its new variants are evaluated once
+the matrix commits. Barcode images are rendered on first use as usual.
+"""
+
+import itertools
+import re
+from decimal import Decimal
+
+from django.db import transaction
+
+from .barcodes import BarcodeAllocator
+from .models import Product, ProductVariant, ProductVariantAttribute
+from .stock_events import evaluate_stock_levels
+
+# Characters of a value kept in generated SKUs
+SKU_CODE_LENGTH = 10
+
+
+def sku_code(value):
+    """Short upper case code of an attribute value for SKUs"""
+    code = re.sub(r"[^A-Za-z0-9]+", "", value.value).upper()[:SKU_CODE_LENGTH]
+    return code or str(value.pk)
+
+
+def _unique_skus(business, prefix, skus):
+    """``skus``, all starting with ``prefix``, with a suffix added to any taken"""
+    taken = set(
+        ProductVariant._base_manager.filter(
+            business=business, sku__startswith=prefix
+        ).values_list("sku", flat=True)
+    )
+    unique = []
+    for sku in skus:
+        candidate, suffix = sku, 2
+        while candidate in taken:
+            candidate = f"{sku}-{suffix}"
+            suffix += 1
+        taken.add(candidate)
+        unique.append(candidate)
+    return unique
+
+
+def generate_variant_matrix(
+    product,
+    value_sets,
+    cost_price=None,
+    selling_price=None,
+    quantity=Decimal("0"),
+    reorder_level=Decimal("0"),
+    barcode_format=None,
+):
+    """
+    Create the variants of ``product`` for every combination of
+    ``value_sets``, a list with one list of ``VariantAttributeValue`` per
+    attribute. Prices default to the product's. Returns the new variants.
+    """
+    value_sets = [list(values) for values in value_sets if values]
+    if not value_sets:
+        return []
+    business = product.business
+    barcode_format = barcode_format or product.barcode_format
+
+    existing = {}
+    for variant_id, value_id in ProductVariantAttribute._base_manager.filter(
+        product_variant__product=product
+    ).values_list("product_variant_id", "attribute_value_id"):
+        existing.setdefault(variant_id, set()).add(value_id)
+    existing = {frozenset(value_ids) for value_ids in existing.values()}
+
+    combinations = []
+    for combination in itertools.product(*value_sets):
+        key = frozenset(value.pk for value in combination)
+        if key not in existing:
+            existing.add(key)
+            combinations.append(combination)
+    if not combinations:
+        return []
+
+    skus = _unique_skus(
+        business,
+        f"{product.sku}-",
+        [
+            "-".join([product.sku] + [sku_code(value) for value in combination])
+            for combination in combinations
+        ],
+    )
+    barcodes = BarcodeAllocator(business, block_size=len(combinations)).allocate(
+        len(combinations), barcode_format
+    )
+    variants = [
+        ProductVariant(
+            business=business,
+            branch=product.branch,
+            product=product,
+            name=" - ".join([product.name] + [value.value for value in combination]),
+            sku=sku,
+            barcode=barcode,
+            barcode_format=barcode_format,
+            cost_price=product.cost_price if cost_price is None else cost_price,
+            selling_price=(
+                product.selling_price if selling_price is None else selling_price
+            ),
+            quantity=quantity,
+            reorder_level=reorder_level,
+        )
+        for combination, sku, barcode in zip(combinations, skus, barcodes)
+    ]
+
+    with transaction.atomic():
+        ProductVariant._base_manager.bulk_create(variants)
+        ProductVariantAttribute._base_manager.bulk_create(
+            [
+                ProductVariantAttribute(
+                    business=business, product_variant=variant, attribute_value=value
+                )
+                for variant, combination in zip(variants, combinations)
+                for value in combination
+            ]
+        )
+        Product._base_manager.filter(pk=product.pk, has_variants=False).update(
+            has_variants=True
+        )
+    product.has_variants = True
+
+    # The product's own alerts resolve now that its stock is on the variants
+    transaction.on_commit(
+        lambda: evaluate_stock_levels(
+            [product.pk], [variant.pk for variant in variants]
+        )
+    )
+    return variants
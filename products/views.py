@@ -1,21 +1,25 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Q, F, Value
+from django.db.models import Count, Q, F, Sum, Value
 from django.db.models.query import QuerySet
-from django.http import HttpResponse, JsonResponse
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    HttpResponseNotModified,
+    JsonResponse,
+)
 from django.urls import reverse
 from django.core.files.storage import default_storage
 from django.core.files.base import ContentFile
 from django.conf import settings
 from django.views.decorators.http import require_http_methods
-from django.db import IntegrityError
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
 from django.utils import timezone
-from decimal import Decimal
-import datetime
-import qrcode
+from decimal import Decimal, InvalidOperation
 import csv
-import io
 from .models import (
     Product,
     Category,
@@ -28,6 +32,7 @@ from .models import (
     VariantAttributeValue,
     ProductVariantAttribute,
     InventoryTransfer,
+    ProductImportJob,
 )
 from .forms import (
     ProductForm,
@@ -42,8 +47,18 @@ from .forms import (
     InventoryTransferForm,
 )
 
-from .utils import generate_product_qr_code
+from .barcode_images import get_image
+from .search import search_products, typeahead
+from .stock_levels import get_availability
+from .transfers import (
+    cancel_transfer,
+    complete_transfer,
+    dispatch_transfer,
+    receive_transfer,
+)
+from .variant_matrix import generate_variant_matrix
 from authentication.utils import check_user_permission, require_permission
+from utils.pagination import page_json_response, paginate, wants_json
 
 
 @login_required
@@ -60,15 +75,9 @@ def product_list(request):
         .select_related("category", "unit")
     )
 
-    # Apply search filter
+    # Apply search filter (indexed, best matches first)
     if search_query:
-        # Build a single Q object with all search conditions to avoid type checking issues
-        search_filter = (
-            Q(name__icontains=search_query)
-            | Q(sku__icontains=search_query)
-            | Q(description__icontains=search_query)
-        )
-        products = products.filter(search_filter)
+        products = search_products(products, search_query)
 
     # Apply category filter
     if category_id:
@@ -83,11 +92,20 @@ def product_list(request):
         elif status == "inactive":
             products = products.filter(is_active=False)
 
+    # Keyset pages keep the search ranking when there is one
+    ordering = ["name", "id"]
+    if "search_rank" in products.query.annotations:
+        ordering.insert(0, "search_rank")
+    page = paginate(request, products, ordering)
+    if wants_json(request):
+        return page_json_response(page, _product_row)
+
     # Get categories for filter dropdown, filtered by business context
     categories = Category.objects.business_specific().all()
 
     context = {
-        "products": products,
+        "products": page,
+        "page": page,
         "categories": categories,
         "search_query": search_query,
         "selected_category": category_id,
@@ -97,6 +115,19 @@ def product_list(request):
     return render(request, "products/list.html", context)
 
 
+def _product_row(product):
+    return {
+        "id": product.id,
+        "name": product.name,
+        "sku": product.sku,
+        "category": product.category.name if product.category else "",
+        "selling_price": float(product.selling_price),
+        "quantity": float(product.quantity),
+        "unit": product.unit.symbol if product.unit else "",
+        "url": reverse("products:detail", args=[product.pk]),
+    }
+
+
 @login_required
 @require_http_methods(["GET"])
 def product_search_ajax(request):
@@ -109,18 +140,16 @@ def product_search_ajax(request):
     if len(search_query) < 1:
         return JsonResponse({"products": []})
 
-    # Build a single Q object with all search conditions to avoid type checking issues
-    search_filter = (
-        Q(name__icontains=search_query)
-        | Q(sku__icontains=search_query)
-        | Q(description__icontains=search_query)
-    )
+    from superadmin.middleware import get_current_business
 
     # Search for products matching the query, filtered by business context
-    products = (
+    products = typeahead(
         Product.objects.business_specific()
-        .filter(search_filter)
-        .filter(is_active=True)[:10]
+        .filter(is_active=True)
+        .select_related("category", "unit"),
+        get_current_business(),
+        search_query,
+        limit=10,
     )  # Limit to 10 results for performance
 
     # Format products for JSON response
@@ -141,6 +170,44 @@ def product_search_ajax(request):
     return JsonResponse({"products": product_list})
 
 
+@login_required
+@require_http_methods(["GET"])
+def stock_availability(request):
+    """
+    Stock of a product at every branch, for ``?product=<id>`` or ``?sku=``
+    """
+    from superadmin.middleware import get_current_business
+
+    products = Product.objects.business_specific()
+    if request.GET.get("product", "").isdigit():
+        product = products.filter(pk=request.GET["product"]).first()
+    else:
+        product = products.filter(sku=request.GET.get("sku", "")).first()
+    if product is None:
+        return JsonResponse({"error": "Product not found"}, status=404)
+
+    levels = get_availability(get_current_business(), product=product)
+    return JsonResponse(
+        {
+            "product": product.id,
+            "sku": product.sku,
+            "name": product.name,
+            "quantity": float(sum(level["quantity"] for level in levels)),
+            "available": float(sum(level["available"] for level in levels)),
+            "branches": [
+                {
+                    "branch_id": level["branch_id"],
+                    "branch": level["branch"] or "Unassigned",
+                    "quantity": float(level["quantity"]),
+                    "reserved": float(level["reserved"]),
+                    "available": float(level["available"]),
+                }
+                for level in levels
+            ],
+        }
+    )
+
+
 @login_required
 @require_http_methods(["GET"])
 def product_json(request, pk):
@@ -235,18 +302,48 @@ def product_create(request):
 def product_detail(request, pk):
     product = get_object_or_404(Product.objects.business_specific(), pk=pk)
 
-    # Generate QR code for the product
-    qr_buffer = generate_product_qr_code(product)
-
+    # Barcode and QR images are served by their own views and rendered
+    # only when not cached yet
     context = {
         "product": product,
-        "qr_code_data": qr_buffer.getvalue() if qr_buffer else None,
         "MEDIA_URL": settings.MEDIA_URL,
     }
 
     return render(request, "products/detail.html", context)
 
 
+def _image_response(request, item, kind):
+    """Serve the cached barcode or QR image of a product or variant"""
+    image = get_image(item, kind)
+    if image is None:
+        raise Http404("No image available")
+
+    key, path = image
+    # The key changes with the code and the render settings
+    etag = f'"{key}"'
+    if request.headers.get("If-None-Match") == etag:
+        response = HttpResponseNotModified()
+    else:
+        response = FileResponse(
+            default_storage.open(path, "rb"), content_type="image/png"
+        )
+    response["ETag"] = etag
+    response["Cache-Control"] = "private, max-age=3600"
+    return response
+
+
+@login_required
+def product_barcode_image(request, pk):
+    product = get_object_or_404(Product.objects.business_specific(), pk=pk)
+    return _image_response(request, product, "barcode")
+
+
+@login_required
+def product_qr_code_image(request, pk):
+    product = get_object_or_404(Product.objects.business_specific(), pk=pk)
+    return _image_response(request, product, "qr")
+
+
 @login_required
 def product_update(request, pk):
     # Account owners have access to everything
@@ -455,6 +552,11 @@ def unit_create(request):
 
 @login_required
 def bulk_upload(request):
+    from superadmin.middleware import get_current_business, get_current_branch
+    from .imports import claim_job, process_job, should_run_inline, submit_import_job
+
+    current_business = get_current_business()
+
     if request.method == "POST":
         if "csv_file" in request.FILES:
             csv_file = request.FILES["csv_file"]
@@ -464,202 +566,102 @@ def bulk_upload(request):
                 messages.error(request, "Please upload a CSV file.")
                 return redirect("products:bulk_upload")
 
-            # Process the CSV file
-            try:
-                decoded_file = csv_file.read().decode("utf-8")
-                io_string = io.StringIO(decoded_file)
-                reader = csv.reader(io_string, delimiter=",")
-
-                # Skip header row
-                next(reader)
-
-                success_count = 0
-                update_count = 0
-                error_count = 0
-                errors = []
-
-                for i, row in enumerate(reader):
-                    try:
-                        # Extract data from CSV row
-                        # Expected columns: name, sku, barcode, category_name, unit_name,
-                        # description, cost_price, selling_price, quantity, reorder_level, expiry_date
-                        if len(row) < 11:
-                            errors.append(f"Row {i+2}: Insufficient columns")
-                            error_count += 1
-                            continue
-
-                        (
-                            name,
-                            sku,
-                            barcode,
-                            category_name,
-                            unit_name,
-                            description,
-                            cost_price,
-                            selling_price,
-                            quantity,
-                            reorder_level,
-                            expiry_date,
-                        ) = row
-
-                        # Validate required fields
-                        if not name or not sku or not category_name or not unit_name:
-                            errors.append(
-                                f"Row {i+2}: Missing required fields (name, sku, category, unit)"
-                            )
-                            error_count += 1
-                            continue
-
-                        # Get the current business from the request
-                        from superadmin.middleware import get_current_business
-
-                        current_business = get_current_business()
-                        if not current_business:
-                            errors.append(f"Row {i+2}: No business context found")
-                            error_count += 1
-                            continue
-
-                        # Get or create category
-                        category, _ = Category.objects.get_or_create(
-                            business=current_business,
-                            name=category_name,
-                            defaults={"description": f"Category for {category_name}"},
-                        )
-
-                        # Get or create unit
-                        unit, _ = Unit.objects.get_or_create(
-                            business=current_business,
-                            name=unit_name,
-                            defaults={"symbol": unit_name[:3].upper()},
-                        )
+            if not current_business:
+                messages.error(request, "No business context found.")
+                return redirect("products:bulk_upload")
 
-                        # Handle empty values
-                        barcode = barcode if barcode else None
-                        description = description if description else ""
-
-                        # Parse numeric values
-                        try:
-                            cost_price = (
-                                Decimal(cost_price) if cost_price else Decimal("0")
-                            )
-                        except:
-                            cost_price = Decimal("0")
-
-                        try:
-                            selling_price = (
-                                Decimal(selling_price)
-                                if selling_price
-                                else Decimal("0")
-                            )
-                        except:
-                            selling_price = Decimal("0")
-
-                        try:
-                            quantity = Decimal(quantity) if quantity else Decimal("0")
-                        except:
-                            quantity = Decimal("0")
-
-                        try:
-                            reorder_level = (
-                                Decimal(reorder_level)
-                                if reorder_level
-                                else Decimal("0")
-                            )
-                        except:
-                            reorder_level = Decimal("0")
-
-                        # Parse expiry date
-                        parsed_expiry_date = None
-                        if expiry_date:
-                            try:
-                                parsed_expiry_date = datetime.datetime.strptime(
-                                    expiry_date, "%Y-%m-%d"
-                                ).date()
-                            except ValueError:
-                                # Try other common date formats
-                                try:
-                                    parsed_expiry_date = datetime.datetime.strptime(
-                                        expiry_date, "%d/%m/%Y"
-                                    ).date()
-                                except ValueError:
-                                    try:
-                                        parsed_expiry_date = datetime.datetime.strptime(
-                                            expiry_date, "%m/%d/%Y"
-                                        ).date()
-                                    except ValueError:
-                                        parsed_expiry_date = None
-
-                        # Check if product with this SKU already exists
-                        existing_product = Product.objects.filter(
-                            business=current_business, sku=sku
-                        ).first()
-
-                        if existing_product:
-                            # Update existing product
-                            existing_product.name = name
-                            existing_product.barcode = barcode
-                            existing_product.category = category
-                            existing_product.unit = unit
-                            existing_product.description = description
-                            existing_product.cost_price = cost_price
-                            existing_product.selling_price = selling_price
-                            existing_product.quantity = quantity
-                            existing_product.reorder_level = reorder_level
-                            existing_product.expiry_date = parsed_expiry_date
-                            existing_product.save()
-                            update_count += 1
-                        else:
-                            # Create new product
-                            Product.objects.create(
-                                business=current_business,
-                                name=name,
-                                sku=sku,
-                                barcode=barcode,
-                                category=category,
-                                unit=unit,
-                                description=description,
-                                cost_price=cost_price,
-                                selling_price=selling_price,
-                                quantity=quantity,
-                                reorder_level=reorder_level,
-                                expiry_date=parsed_expiry_date,
-                            )
-                            success_count += 1
-
-                    except Exception as e:
-                        errors.append(f"Row {i+2}: {str(e)}")
-                        error_count += 1
-
-                # Prepare success message
-                success_message = ""
-                if success_count > 0:
-                    success_message += (
-                        f"Successfully imported {success_count} new products."
-                    )
-                if update_count > 0:
-                    success_message += f" Updated {update_count} existing products."
-
-                if success_message:
-                    messages.success(request, success_message.strip())
-
-                if error_count > 0:
-                    error_message = f"Failed to process {error_count} rows."
-                    if errors:
-                        error_message += " Errors: " + "; ".join(
-                            errors[:5]
-                        )  # Show first 5 errors
-                        if len(errors) > 5:
-                            error_message += f" ... and {len(errors) - 5} more."
-                    messages.error(request, error_message)
-
-            except Exception as e:
-                messages.error(request, f"Error processing CSV file: {str(e)}")
+            job = submit_import_job(
+                current_business,
+                csv_file,
+                user=request.user,
+                branch=get_current_branch(),
+            )
+            # Small files are imported right away, larger ones by the
+            # run_import_jobs worker
+            if should_run_inline(job) and claim_job(job.id):
+                job.refresh_from_db()
+                job = process_job(job)
+                _import_job_messages(request, job)
+            else:
+                messages.info(
+                    request,
+                    f"{job.original_name} was queued for import. Progress is shown below.",
+                )
         else:
             messages.error(request, "No file uploaded.")
 
         return redirect("products:bulk_upload")
 
-    return render(request, "products/bulk_upload.html")
+    jobs = ProductImportJob.objects.filter(business=current_business)[:10]
+    return render(request, "products/bulk_upload.html", {"import_jobs": jobs})
+
+
+def _import_job_messages(request, job):
+    if job.status == "failed":
+        messages.error(request, f"Error processing CSV file: {job.error}")
+        return
+
+    success_message = ""
+    if job.created_count > 0:
+        success_message += f"Successfully imported {job.created_count} new products."
+    if job.updated_count > 0:
+        success_message += f" Updated {job.updated_count} existing products."
+    if success_message:
+        messages.success(request, success_message.strip())
+    if job.error_count > 0:
+        messages.error(
+            request,
+            f"Failed to process {job.error_count} rows. "
+            "Download the error report below for details.",
+        )
+
+
+def _import_job_json(job):
+    return {
+        "id": job.id,
+        "name": job.original_name,
+        "status": job.status,
+        "progress": job.progress,
+        "rows_processed": job.rows_processed,
+        "created": job.created_count,
+        "updated": job.updated_count,
+        "errors": job.error_count,
+        "error": job.error,
+        "error_report_url": (
+            reverse("products:import_job_errors", args=[job.id])
+            if job.error_file
+            else None
+        ),
+    }
+
+
+@login_required
+@require_http_methods(["GET"])
+def import_job_status(request, job_id):
+    """Polling endpoint returning the progress of a product import"""
+    from superadmin.middleware import get_current_business
+
+    job = get_object_or_404(
+        ProductImportJob, id=job_id, business=get_current_business()
+    )
+    return JsonResponse(_import_job_json(job))
+
+
+@login_required
+def import_job_errors(request, job_id):
+    """Download the CSV of the rows a product import could not import"""
+    from superadmin.middleware import get_current_business
+
+    job = get_object_or_404(
+        ProductImportJob, id=job_id, business=get_current_business()
+    )
+    if not job.error_file:
+        raise Http404("This import has no error report")
+    return FileResponse(
+        job.error_file.open("rb"),
+        as_attachment=True,
+        filename=f"import_{job.id}_errors.csv",
+    )
 
 
 @login_required
@@ -1107,23 +1109,83 @@ def product_variant_create(request, product_pk):
     return render(request, "products/variants/form.html", context)
 
 
+@login_required
+def product_variant_matrix(request, product_pk):
+    """Create the variants of a product for every combination of chosen values"""
+    # Account owners have access to everything
+    if request.user.role != "admin" and not check_user_permission(
+        request.user, "can_create"
+    ):
+        messages.error(
+            request, "You do not have permission to create product variants."
+        )
+        return redirect("products:list")
+
+    product = get_object_or_404(Product.objects.business_specific(), pk=product_pk)
+    attributes = VariantAttribute.objects.filter(is_active=True).prefetch_related(
+        "values"
+    )
+
+    if request.method == "POST":
+        values = VariantAttributeValue.objects.filter(
+            pk__in=request.POST.getlist("values"), is_active=True
+        ).select_related("attribute")
+        value_sets = {}
+        for value in values:
+            value_sets.setdefault(value.attribute_id, []).append(value)
+
+        prices = {}
+        for field in ("cost_price", "selling_price"):
+            raw = request.POST.get(field, "").strip()
+            if raw:
+                try:
+                    prices[field] = Decimal(raw)
+                except InvalidOperation:
+                    messages.error(request, f"Invalid {field.replace('_', ' ')}.")
+                    return redirect("products:variant_matrix", product_pk=product.pk)
+
+        if not value_sets:
+            messages.error(request, "Select at least one attribute value.")
+        else:
+            variants = generate_variant_matrix(
+                product, list(value_sets.values()), **prices
+            )
+            messages.success(request, f"Created {len(variants)} product variants.")
+            return redirect("products:variant_list", product_pk=product.pk)
+
+    context = {
+        "product": product,
+        "attributes": attributes,
+    }
+
+    return render(request, "products/variants/matrix.html", context)
+
+
 @login_required
 def product_variant_detail(request, pk):
     """Display details of a specific product variant"""
     variant = get_object_or_404(ProductVariant.objects.business_specific(), pk=pk)
 
-    # Generate QR code for the variant
-    qr_buffer = generate_product_qr_code(variant)
-
     context = {
         "variant": variant,
-        "qr_code_data": qr_buffer.getvalue() if qr_buffer else None,
         "MEDIA_URL": settings.MEDIA_URL,
     }
 
     return render(request, "products/variants/detail.html", context)
 
 
+@login_required
+def product_variant_barcode_image(request, pk):
+    variant = get_object_or_404(ProductVariant.objects.business_specific(), pk=pk)
+    return _image_response(request, variant, "barcode")
+
+
+@login_required
+def product_variant_qr_code_image(request, pk):
+    variant = get_object_or_404(ProductVariant.objects.business_specific(), pk=pk)
+    return _image_response(request, variant, "qr")
+
+
 @login_required
 def product_variant_update(request, pk):
     """Update a specific product variant"""
@@ -1236,7 +1298,11 @@ def inventory_transfer_list(request):
         )
         return redirect("products:list")
 
-    transfers = InventoryTransfer.objects.business_specific()
+    transfers = (
+        InventoryTransfer.objects.business_specific()
+        .select_related("from_branch", "to_branch", "created_by")
+        .annotate(line_count=Count("lines"), total_quantity=Sum("lines__quantity"))
+    )
 
     # Filter by status if provided
     status = request.GET.get("status")
@@ -1278,11 +1344,15 @@ def inventory_transfer_create(request):
                     transfer = form.save(commit=False)
                     transfer.business = current_business
                     transfer.created_by = request.user
-                    transfer.save()
+                    with transaction.atomic():
+                        transfer.save()
+                        form.save_lines(transfer)
                     messages.success(
                         request, "Inventory transfer created successfully!"
                     )
-                    return redirect("products:inventory_transfer_list")
+                    return redirect(
+                        "products:inventory_transfer_detail", pk=transfer.pk
+                    )
                 except Exception as e:
                     messages.error(
                         request,
@@ -1314,9 +1384,12 @@ def inventory_transfer_create(request):
 def inventory_transfer_detail(request, pk):
     """Display details of a specific inventory transfer"""
     transfer = get_object_or_404(InventoryTransfer.objects.business_specific(), pk=pk)
+    lines = transfer.lines.select_related("product", "product_variant")
 
     context = {
         "transfer": transfer,
+        "lines": lines,
+        "total_quantity": sum(line.quantity for line in lines),
     }
 
     return render(request, "products/transfers/detail.html", context)
@@ -1335,6 +1408,9 @@ def inventory_transfer_update(request, pk):
         return redirect("products:list")
 
     transfer = get_object_or_404(InventoryTransfer.objects.business_specific(), pk=pk)
+    if not transfer.is_editable:
+        messages.error(request, "Only pending inventory transfers can be edited.")
+        return redirect("products:inventory_transfer_detail", pk=transfer.pk)
 
     # Get the current business from the request
     from superadmin.middleware import get_current_business
@@ -1354,7 +1430,9 @@ def inventory_transfer_update(request, pk):
                     transfer = form.save(commit=False)
                     transfer.business = current_business
                     transfer.created_by = request.user
-                    transfer.save()
+                    with transaction.atomic():
+                        transfer.save()
+                        form.save_lines(transfer)
                     messages.success(
                         request, "Inventory transfer updated successfully!"
                     )
@@ -1391,65 +1469,79 @@ def inventory_transfer_update(request, pk):
     return render(request, "products/transfers/form.html", context)
 
 
-@login_required
-def inventory_transfer_complete(request, pk):
-    """Complete a specific inventory transfer"""
+def _inventory_transfer_step(request, pk, process, done, stale):
+    """Run a processing step of a transfer on POST and report the outcome"""
     # Account owners have access to everything
     if request.user.role != "admin" and not check_user_permission(
         request.user, "can_edit"
     ):
         messages.error(
-            request, "You do not have permission to complete inventory transfers."
+            request, "You do not have permission to process inventory transfers."
         )
         return redirect("products:list")
 
     transfer = get_object_or_404(InventoryTransfer.objects.business_specific(), pk=pk)
 
     if request.method == "POST":
-        # Update the transfer status to completed
-        transfer.status = "completed"
-        transfer.save()
-
-        # Process the transfer to update inventory levels
-        transfer.process_transfer()
+        try:
+            if process(transfer, request.user):
+                messages.success(request, done)
+            else:
+                # Already processed, e.g. a double submit
+                messages.warning(request, stale)
+        except ValidationError as e:
+            for error in e.messages:
+                messages.error(request, error)
 
-        messages.success(request, "Inventory transfer completed successfully!")
-        return redirect("products:inventory_transfer_detail", pk=transfer.pk)
+    return redirect("products:inventory_transfer_detail", pk=transfer.pk)
 
-    context = {
-        "transfer": transfer,
-    }
 
-    return render(request, "products/transfers/confirm_complete.html", context)
+@login_required
+def inventory_transfer_dispatch(request, pk):
+    """Take the stock of a pending transfer from its source branch"""
+    return _inventory_transfer_step(
+        request,
+        pk,
+        dispatch_transfer,
+        "Inventory transfer dispatched, its stock is now in transit.",
+        "This transfer is no longer pending.",
+    )
 
 
 @login_required
-def inventory_transfer_cancel(request, pk):
-    """Cancel a specific inventory transfer"""
-    # Account owners have access to everything
-    if request.user.role != "admin" and not check_user_permission(
-        request.user, "can_edit"
-    ):
-        messages.error(
-            request, "You do not have permission to cancel inventory transfers."
-        )
-        return redirect("products:list")
-
-    transfer = get_object_or_404(InventoryTransfer.objects.business_specific(), pk=pk)
+def inventory_transfer_receive(request, pk):
+    """Receive the stock of a transfer in transit at its destination"""
+    return _inventory_transfer_step(
+        request,
+        pk,
+        receive_transfer,
+        "Inventory transfer received successfully!",
+        "This transfer is not in transit.",
+    )
 
-    if request.method == "POST":
-        # Update the transfer status to cancelled
-        transfer.status = "cancelled"
-        transfer.save()
 
-        messages.success(request, "Inventory transfer cancelled successfully!")
-        return redirect("products:inventory_transfer_detail", pk=transfer.pk)
+@login_required
+def inventory_transfer_complete(request, pk):
+    """Dispatch and receive a specific inventory transfer at once"""
+    return _inventory_transfer_step(
+        request,
+        pk,
+        complete_transfer,
+        "Inventory transfer completed successfully!",
+        "This transfer has already been completed or cancelled.",
+    )
 
-    context = {
-        "transfer": transfer,
-    }
 
-    return render(request, "products/transfers/confirm_cancel.html", context)
+@login_required
+def inventory_transfer_cancel(request, pk):
+    """Cancel a specific inventory transfer"""
+    return _inventory_transfer_step(
+        request,
+        pk,
+        cancel_transfer,
+        "Inventory transfer cancelled successfully!",
+        "This transfer has already been completed or cancelled.",
+    )
 
 
 # Variant Attribute Management Views
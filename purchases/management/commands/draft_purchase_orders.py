@@ -0,0 +1,70 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from products.forecasting import DEFAULT_REVIEW_DAYS
+from products.models import Product
+from purchases.replenishment import draft_replenishment_orders
+from superadmin.models import Business
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Draft a pending purchase order per supplier for the products at or "
+        "below their reorder point"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--business-id",
+            type=int,
+            help="Business ID to replenish (optional - replenishes all if not provided)",
+        )
+        parser.add_argument(
+            "--cover-days",
+            type=int,
+            default=DEFAULT_REVIEW_DAYS,
+            help=f"Days of forecast demand orders should cover (default: {DEFAULT_REVIEW_DAYS})",
+        )
+
+    def handle(self, *args, **options):
+        business_id = options.get("business_id")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'[{timezone.now().strftime("%Y-%m-%d %H:%M:%S")}] Drafting purchase orders...'
+            )
+        )
+
+        if business_id:
+            businesses = Business.objects.filter(id=business_id)
+        else:
+            businesses = Business.objects.filter(
+                id__in=Product._base_manager.filter(is_active=True).values("business")
+            )
+
+        for business in businesses:
+            try:
+                orders, unassigned = draft_replenishment_orders(
+                    business, cover_days=options["cover_days"]
+                )
+            except Exception as e:
+                logger.exception(
+                    "Drafting purchase orders failed for business %s", business.id
+                )
+                self.stdout.write(self.style.ERROR(f"  ✗ {business.company_name}: {e}"))
+                continue
+
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"  ✓ {business.company_name}: {len(orders)} purchase orders "
+                    f"drafted, {len(unassigned)} products without a supplier"
+                )
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'[{timezone.now().strftime("%Y-%m-%d %H:%M:%S")}] Purchase order drafting completed!'
+            )
+        )
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.8 on 2026-10-19 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("purchases", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="purchaseorder",
+            index=models.Index(
+                fields=["business", "-order_date", "-id"],
+                name="purchases_order_list_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.8 on 2026-10-19 18:55
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_order_totals(apps, schema_editor):
+    """Store the totals of existing purchase orders, computed from their items"""
+    PurchaseOrder = apps.get_model("purchases", "PurchaseOrder")
+    PurchaseItem = apps.get_model("purchases", "PurchaseItem")
+
+    def item_sum(quantity_field):
+        items = (
+            PurchaseItem._base_manager.filter(purchase_order=OuterRef("pk"))
+            .order_by()
+            .values("purchase_order")
+            .annotate(total=Sum(F(quantity_field) * F("unit_price")))
+            .values("total")
+        )
+        return Coalesce(
+            Subquery(items),
+            Value(0),
+            output_field=models.DecimalField(max_digits=12, decimal_places=2),
+        )
+
+    PurchaseOrder._base_manager.update(
+        total_amount=item_sum("quantity"),
+        received_amount=item_sum("received_quantity"),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("purchases", "0003_purchaseorder_partially_received"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="purchaseorder",
+            name="received_amount",
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name="purchaseorder",
+            name="total_amount",
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.RunPython(fill_order_totals, migrations.RunPython.noop),
+    ]
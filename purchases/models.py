@@ -12,6 +12,7 @@ class PurchaseOrder(models.Model):
     STATUS_CHOICES = (
         ("pending", "Pending"),
         ("ordered", "Ordered"),
+        ("partially_received", "Partially Received"),
         ("received", "Received"),
         ("cancelled", "Cancelled"),
     )
@@ -25,22 +26,30 @@ class PurchaseOrder(models.Model):
     expected_delivery_date = models.DateField(blank=True, null=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
     notes = models.TextField(blank=True, null=True)
+    # Kept in step with the items by purchases.totals, so lists and
+    # statements read them without loading items
+    total_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    received_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ["-order_date"]
+        indexes = [
+            # Keyset pages of the purchase order list
+            models.Index(
+                fields=["business", "-order_date", "-id"],
+                name="purchases_order_list_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"PO-{self.pk} - {self.supplier.name}"
 
     @property
-    def total_amount(self):
-        """Calculate total amount for this purchase order"""
-        total = 0
-        for item in self.items.all():
-            total += item.total_amount
-        return total
+    def outstanding_amount(self):
+        """Value of the items ordered but not received yet"""
+        return self.total_amount - self.received_amount
 
 
 class PurchaseItem(models.Model):
@@ -74,3 +83,8 @@ class PurchaseItem(models.Model):
     def is_fully_received(self):  # Add this property
         """Check if this item is fully received"""
         return self.received_quantity >= self.quantity
+
+    @property
+    def pending_quantity(self):
+        """Quantity ordered but not received yet"""
+        return max(self.quantity - self.received_quantity, 0)
@@ -0,0 +1,180 @@
+"""
+Purchase order receiving.
+
+``receive_purchase_items`` books everything received against a purchase
+order in one transaction, with a constant number of queries whatever the
+number of items:
+
+- the items are read (and locked) once to check the quantities against
+  what is still pending;
+- ``received_quantity`` and ``Product.quantity`` are incremented with
+  F-expression UPDATEs, so concurrent sales and receipts are not lost;
+- the stock movements are written with ``bulk_create`` and the received
+  stock is added to one lot per item and expiry date (see products.lots),
+  with the lot number and expiry date entered at receipt.
+
+Bulk writes send no model signals, so what item and product saves would
+have triggered runs once per receipt: the order totals and stock level
+mirror in the transaction, the stock alerts of the received products
+(see products.stock_events) and the report cache after it commits.
+"""
+
+import logging
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, Value, When
+from django.utils import timezone
+
+from products.lots import receive_lots
+from products.models import Product, StockLot, StockMovement
+from products.stock_levels import sync_stock_levels
+from products.stock_events import evaluate_stock_levels
+from reports.cache import bump_data_version
+from .models import PurchaseItem, PurchaseOrder
+from .totals import update_order_totals
+
+logger = logging.getLogger(__name__)
+
+
+def _quantity_of(quantities, field):
+    """CASE expression giving the quantity of each key of ``quantities``"""
+    return Case(
+        *[
+            When(**{field: key}, then=Value(quantity))
+            for key, quantity in quantities.items()
+        ],
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    )
+
+
+def receive_purchase_items(
+    purchase_order, quantities, user=None, lot_numbers=None, expiry_dates=None
+):
+    """
+    Receive ``quantities``, a dict of purchase item id to the quantity
+    received now, against ``purchase_order`` and update its status.
+    ``lot_numbers`` and ``expiry_dates``, also keyed by item id, describe
+    the lot each item was delivered in. Returns the number of items
+    received.
+
+    Raises ``ValidationError``, receiving nothing, if a quantity is
+    negative or more than what is still pending for its item.
+    """
+    received = {}
+    for item_id, quantity in quantities.items():
+        quantity = Decimal(str(quantity))
+        if not quantity.is_finite() or quantity < 0:
+            raise ValidationError("Received quantities must be positive numbers.")
+        if quantity > 0:
+            received[int(item_id)] = quantity
+    if not received:
+        return 0
+    lot_numbers = {int(key): value for key, value in (lot_numbers or {}).items()}
+    expiry_dates = {int(key): value for key, value in (expiry_dates or {}).items()}
+
+    business = purchase_order.business
+    now = timezone.now()
+    with transaction.atomic():
+        items = list(
+            PurchaseItem._base_manager.select_for_update()
+            .filter(purchase_order=purchase_order, pk__in=list(received))
+            .values_list(
+                "id",
+                "product_id",
+                "product__name",
+                "product__branch_id",
+                "quantity",
+                "received_quantity",
+            )
+        )
+        received = {item[0]: received[item[0]] for item in items}
+        if not received:
+            return 0
+        errors = [
+            f"Only {ordered - already} of {name} is still pending."
+            for item_id, _, name, _, ordered, already in items
+            if received[item_id] > ordered - already
+        ]
+        if errors:
+            raise ValidationError(errors)
+
+        by_product = {}
+        for item_id, product_id, *_ in items:
+            by_product[product_id] = (
+                by_product.get(product_id, Decimal("0")) + received[item_id]
+            )
+
+        PurchaseItem._base_manager.filter(pk__in=list(received)).update(
+            received_quantity=F("received_quantity") + _quantity_of(received, "pk"),
+            updated_at=now,
+        )
+        Product._base_manager.filter(pk__in=list(by_product)).update(
+            quantity=F("quantity") + _quantity_of(by_product, "pk")
+        )
+
+        new_quantities = dict(
+            Product._base_manager.filter(pk__in=list(by_product)).values_list(
+                "id", "quantity"
+            )
+        )
+        StockMovement._base_manager.bulk_create(
+            [
+                StockMovement(
+                    business=business,
+                    product_id=product_id,
+                    movement_type="purchase",
+                    quantity=quantity,
+                    previous_quantity=new_quantities[product_id] - quantity,
+                    new_quantity=new_quantities[product_id],
+                    reference_id=str(purchase_order.pk),
+                    reference_model="PurchaseOrder",
+                    created_by=user,
+                )
+                for product_id, quantity in by_product.items()
+            ]
+        )
+
+        # Each item's stock becomes a lot. Deliveries of an item with
+        # different expiry dates go to different lots.
+        lots = []
+        for item_id, product_id, _, branch_id, _, _ in items:
+            expiry_date = expiry_dates.get(item_id)
+            lot_number = lot_numbers.get(item_id)
+            if not lot_number:
+                lot_number = f"PO{purchase_order.pk}-{item_id}"
+                if expiry_date:
+                    lot_number += expiry_date.strftime("-%Y%m%d")
+            lots.append(
+                StockLot(
+                    business=business,
+                    branch_id=branch_id,
+                    product_id=product_id,
+                    lot_number=lot_number,
+                    expiry_date=expiry_date,
+                    quantity=received[item_id],
+                    received_at=now,
+                )
+            )
+        receive_lots(lots)
+
+        pending = PurchaseItem._base_manager.filter(
+            purchase_order=purchase_order, received_quantity__lt=F("quantity")
+        ).exists()
+        purchase_order.status = "partially_received" if pending else "received"
+        PurchaseOrder._base_manager.filter(pk=purchase_order.pk).update(
+            status=purchase_order.status, updated_at=now
+        )
+        update_order_totals([purchase_order.pk])
+
+        sync_stock_levels(business, product_ids=list(by_product))
+    # Stock alerts are evaluated for the received products only, once the
+    # receipt has committed and its row locks are released
+    transaction.on_commit(lambda: evaluate_stock_levels(product_ids=list(by_product)))
+    bump_data_version(business)
+
+    logger.info(
+        "Received %s items of purchase order %s", len(received), purchase_order.pk
+    )
+    return len(received)
@@ -0,0 +1,185 @@
+"""
+Purchase order drafting from reorder suggestions.
+
+``replenishment_suggestions`` finds, with one query per business, every
+active product at or below its reorder point: its reorder level or, when
+it has a demand forecast, the forecast reorder point if higher (the same
+threshold the low stock check uses, see products.stock_monitoring). Each
+product is assigned to the supplier it was last ordered from, and the
+quantity orders the stock up to a target cover:
+
+    target = reorder point + forecast daily demand x cover days
+
+Products without demand history order up to twice their reorder point.
+Quantities still pending on open purchase orders count as stock, so
+drafting twice does not order twice.
+
+``draft_replenishment_orders`` then drafts one pending ``PurchaseOrder``
+per supplier with ``bulk_create``. Products never ordered from a supplier
+are left out and reported.
+"""
+
+import logging
+import math
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from products.forecasting import DEFAULT_REVIEW_DAYS
+from products.models import Product
+from reports.cache import bump_data_version
+from suppliers.models import Supplier
+from .models import PurchaseItem, PurchaseOrder
+from .totals import update_order_totals
+
+logger = logging.getLogger(__name__)
+
+# Purchase orders whose pending quantities are already on the way
+OPEN_STATUSES = ("pending", "ordered", "partially_received")
+
+DRAFT_NOTE = "Drafted from reorder suggestions"
+
+
+def _decimal(expression):
+    return Coalesce(
+        expression,
+        Value(Decimal("0")),
+        output_field=DecimalField(max_digits=12, decimal_places=4),
+    )
+
+
+def replenishment_suggestions(business, cover_days=DEFAULT_REVIEW_DAYS):
+    """
+    Products to reorder, as ``(by_supplier, unassigned)``: a dict of
+    supplier to its list of suggestion dicts, and the suggestions for
+    products never ordered from a supplier.
+    """
+    history = PurchaseItem._base_manager.filter(
+        product=OuterRef("pk"), purchase_order__business=business
+    ).exclude(purchase_order__status="cancelled")
+    last_item = history.order_by("-purchase_order__order_date", "-id")
+    on_order = (
+        history.filter(purchase_order__status__in=OPEN_STATUSES)
+        .order_by()
+        .values("product")
+        .annotate(pending=Sum(F("quantity") - F("received_quantity")))
+        .values("pending")
+    )
+    rows = (
+        Product._base_manager.filter(business=business, is_active=True)
+        .filter(has_variants=False)
+        .annotate(
+            reorder_point=Greatest(
+                F("reorder_level"),
+                _decimal(F("demand_forecast__reorder_point")),
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            ),
+            daily_demand=_decimal(F("demand_forecast__avg_daily_demand")),
+            on_order=_decimal(Subquery(on_order)),
+            supplier_id=Subquery(last_item.values("purchase_order__supplier_id")[:1]),
+            last_unit_price=Subquery(last_item.values("unit_price")[:1]),
+        )
+        .filter(quantity__lte=F("reorder_point"))
+        .order_by("name")
+        .values(
+            "id",
+            "name",
+            "sku",
+            "quantity",
+            "cost_price",
+            "reorder_point",
+            "daily_demand",
+            "on_order",
+            "supplier_id",
+            "last_unit_price",
+        )
+    )
+
+    suggestions = []
+    for row in rows:
+        if row["daily_demand"] > 0:
+            target = row["reorder_point"] + row["daily_demand"] * cover_days
+        else:
+            target = row["reorder_point"] * 2
+        quantity = math.ceil(target - row["quantity"] - row["on_order"])
+        if quantity <= 0:
+            continue
+        row["order_quantity"] = Decimal(quantity)
+        row["unit_price"] = (
+            row["last_unit_price"]
+            if row["last_unit_price"] is not None
+            else row["cost_price"]
+        )
+        suggestions.append(row)
+
+    suppliers = Supplier._base_manager.in_bulk(
+        {row["supplier_id"] for row in suggestions if row["supplier_id"]}
+    )
+    by_supplier = {}
+    unassigned = []
+    for row in suggestions:
+        supplier = suppliers.get(row["supplier_id"])
+        if supplier is None:
+            unassigned.append(row)
+        else:
+            by_supplier.setdefault(supplier, []).append(row)
+    return by_supplier, unassigned
+
+
+def draft_replenishment_orders(business, cover_days=DEFAULT_REVIEW_DAYS):
+    """
+    Draft a pending purchase order per supplier for the products to
+    reorder. Returns ``(orders, unassigned)`` with the new orders and the
+    suggestions that have no supplier.
+    """
+    by_supplier, unassigned = replenishment_suggestions(business, cover_days)
+    if not by_supplier:
+        return [], unassigned
+
+    today = timezone.localdate()
+    suppliers = list(by_supplier)
+    with transaction.atomic():
+        orders = PurchaseOrder._base_manager.bulk_create(
+            [
+                PurchaseOrder(
+                    business=business,
+                    supplier=supplier,
+                    order_date=today,
+                    status="pending",
+                    notes=DRAFT_NOTE,
+                )
+                for supplier in suppliers
+            ]
+        )
+        PurchaseItem._base_manager.bulk_create(
+            [
+                PurchaseItem(
+                    purchase_order=order,
+                    product_id=row["id"],
+                    quantity=row["order_quantity"],
+                    unit_price=row["unit_price"],
+                )
+                for order, supplier in zip(orders, suppliers)
+                for row in by_supplier[supplier]
+            ]
+        )
+        update_order_totals([order.pk for order in orders])
+    bump_data_version(business)
+    orders = list(
+        PurchaseOrder._base_manager.filter(
+            pk__in=[order.pk for order in orders]
+        ).select_related("supplier")
+    )
+
+    logger.info(
+        "Drafted %s purchase orders for %s products of business %s, %s without "
+        "a supplier",
+        len(orders),
+        sum(len(rows) for rows in by_supplier.values()),
+        getattr(business, "id", None),
+        len(unassigned),
+    )
+    return orders, unassigned
@@ -0,0 +1,12 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import PurchaseItem
+from .totals import update_order_totals
+
+
+@receiver(post_save, sender=PurchaseItem)
+@receiver(post_delete, sender=PurchaseItem)
+def update_purchase_order_totals(sender, instance, **kwargs):
+    """Keep the stored totals of the item's purchase order up to date"""
+    update_order_totals([instance.purchase_order_id])
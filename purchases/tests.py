@@ -1,3 +1,375 @@
+from datetime import date
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from authentication.models import User
+from products.models import (
+    DemandForecast,
+    Product,
+    StockAlert,
+    StockAlertEvent,
+    StockLevel,
+    StockLot,
+    StockMovement,
+)
+from purchases.models import PurchaseItem, PurchaseOrder
+from purchases.receiving import receive_purchase_items
+from purchases.replenishment import (
+    draft_replenishment_orders,
+    replenishment_suggestions,
+)
+from superadmin.middleware import clear_current_business, set_current_business
+from superadmin.models import Business
+from suppliers.models import Supplier
+
+
+class PurchaseTestCase(TestCase):
+    def setUp(self):
+        self.business = Business.objects.create(
+            company_name="Purchase Business",
+            email="purchases@example.com",
+            business_type="retail",
+        )
+        self.supplier = Supplier.objects.create(business=self.business, name="Acme")
+        self.products = [
+            Product.objects.create(
+                business=self.business,
+                name=f"Item {number}",
+                sku=f"ITEM{number:03d}",
+                cost_price=Decimal("1.00"),
+                selling_price=Decimal("2.00"),
+                quantity=Decimal("5"),
+            )
+            for number in range(4)
+        ]
+
+    def create_order(self, quantities):
+        order = PurchaseOrder.objects.create(
+            business=self.business,
+            supplier=self.supplier,
+            order_date=timezone.localdate(),
+            status="ordered",
+        )
+        items = [
+            PurchaseItem.objects.create(
+                purchase_order=order,
+                product=product,
+                quantity=Decimal(quantity),
+                unit_price=Decimal("1.00"),
+            )
+            for product, quantity in zip(self.products, quantities)
+        ]
+        return order, items
+
+
+class ReceivePurchaseItemsTestCase(PurchaseTestCase):
+    def test_receive_updates_stock_movements_and_lots(self):
+        order, items = self.create_order(["10", "10"])
+
+        received = receive_purchase_items(
+            order, {items[0].pk: Decimal("10"), items[1].pk: Decimal("4")}
+        )
+
+        self.assertEqual(received, 2)
+        order.refresh_from_db()
+        self.assertEqual(order.status, "partially_received")
+        self.products[1].refresh_from_db()
+        self.assertEqual(self.products[1].quantity, Decimal("9"))
+        movement = StockMovement.objects.get(product=self.products[1])
+        self.assertEqual(
+            (movement.movement_type, movement.previous_quantity, movement.new_quantity),
+            ("purchase", Decimal("5"), Decimal("9")),
+        )
+        self.assertEqual(
+            StockLevel.objects.get(product=self.products[1]).quantity, Decimal("9")
+        )
+
+        receive_purchase_items(order, {items[1].pk: Decimal("6")})
+
+        order.refresh_from_db()
+        self.assertEqual(order.status, "received")
+        lot = StockLot.objects.get(product=self.products[1])
+        self.assertEqual(lot.lot_number, f"PO{order.pk}-{items[1].pk}")
+        self.assertEqual(lot.quantity, Decimal("10"))
+        items[1].refresh_from_db()
+        self.assertEqual(items[1].received_quantity, Decimal("10"))
+
+    def test_each_delivery_keeps_its_own_lot_and_expiry(self):
+        order, items = self.create_order(["10"])
+        product = self.products[0]
+        Product.objects.filter(pk=product.pk).update(expiry_date=date(2030, 6, 30))
+
+        # Without an expiry date the lot has none, and the product keeps its own
+        receive_purchase_items(order, {items[0].pk: Decimal("2")})
+        lot = StockLot.objects.get(product=product)
+        self.assertIsNone(lot.expiry_date)
+        product.refresh_from_db()
+        self.assertEqual(product.expiry_date, date(2030, 6, 30))
+
+        receive_purchase_items(
+            order,
+            {items[0].pk: Decimal("3")},
+            expiry_dates={items[0].pk: date(2031, 1, 31)},
+        )
+        receive_purchase_items(
+            order,
+            {items[0].pk: Decimal("5")},
+            lot_numbers={items[0].pk: "B-42"},
+            expiry_dates={items[0].pk: date(2030, 12, 31)},
+        )
+
+        self.assertEqual(
+            sorted(
+                StockLot.objects.filter(product=product).values_list(
+                    "lot_number", "expiry_date", "quantity"
+                )
+            ),
+            [
+                ("B-42", date(2030, 12, 31), Decimal("5")),
+                (f"PO{order.pk}-{items[0].pk}", None, Decimal("2")),
+                (
+                    f"PO{order.pk}-{items[0].pk}-20310131",
+                    date(2031, 1, 31),
+                    Decimal("3"),
+                ),
+            ],
+        )
+        product.refresh_from_db()
+        self.assertEqual(product.expiry_date, date(2030, 12, 31))
+
+    def test_over_receipt_receives_nothing(self):
+        order, items = self.create_order(["10", "10"])
+
+        with self.assertRaises(ValidationError):
+            receive_purchase_items(
+                order, {items[0].pk: Decimal("3"), items[1].pk: Decimal("11")}
+            )
+
+        self.assertFalse(StockMovement.objects.exists())
+        self.assertEqual(
+            list(PurchaseItem.objects.values_list("received_quantity", flat=True)),
+            [Decimal("0"), Decimal("0")],
+        )
+        self.products[0].refresh_from_db()
+        self.assertEqual(self.products[0].quantity, Decimal("5"))
+
+    def test_saving_an_item_does_not_move_stock(self):
+        order, items = self.create_order(["10"])
+        items[0].received_quantity = Decimal("10")
+        items[0].save()
+
+        self.products[0].refresh_from_db()
+        self.assertEqual(self.products[0].quantity, Decimal("5"))
+
+    def test_query_count_does_not_grow_with_items(self):
+        def count_queries(size):
+            order, items = self.create_order(["10"] * size)
+            with CaptureQueriesContext(connection) as queries:
+                receive_purchase_items(order, {item.pk: 2 for item in items})
+            return len(queries.captured_queries)
+
+        self.assertEqual(count_queries(2), count_queries(4))
+
+    def test_alerts_are_evaluated_for_the_received_products_after_commit(self):
+        order, items = self.create_order(["10"])
+        low = self.products[0]
+        low.reorder_level = Decimal("8")
+        low.save()
+        self.assertTrue(
+            StockAlert.objects.filter(product=low, is_resolved=False).exists()
+        )
+        # Stock changed without a save is left to the reconcile pass
+        Product.objects.filter(pk=self.products[1].pk).update(
+            reorder_level=Decimal("8")
+        )
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            receive_purchase_items(order, {items[0].pk: Decimal("10")})
+        self.assertTrue(
+            StockAlert.objects.filter(product=low, is_resolved=False).exists()
+        )
+        for callback in callbacks:
+            callback()
+
+        self.assertFalse(
+            StockAlert.objects.filter(product=low, is_resolved=False).exists()
+        )
+        self.assertTrue(
+            StockAlertEvent.objects.filter(
+                alert__product=low, event_type="resolved"
+            ).exists()
+        )
+        self.assertFalse(StockAlert.objects.filter(product=self.products[1]).exists())
+
+    def test_receive_view(self):
+        order, items = self.create_order(["10", "10"])
+        user = User.objects.create_user(
+            username="purchases", password="testpass123", role="admin"
+        )
+        self.client.force_login(user)
+        set_current_business(self.business)
+        self.addCleanup(clear_current_business)
+
+        response = self.client.post(
+            reverse("purchases:receive_items", args=[order.pk]),
+            {
+                f"received_{items[0].pk}": "2.5",
+                f"lot_{items[0].pk}": "LOT-7",
+                f"expiry_{items[0].pk}": "2031-03-01",
+                f"received_{items[1].pk}": "",
+            },
+        )
+
+        self.assertRedirects(
+            response,
+            reverse("purchases:detail", args=[order.pk]),
+            fetch_redirect_response=False,
+        )
+        self.products[0].refresh_from_db()
+        self.assertEqual(self.products[0].quantity, Decimal("7.5"))
+        self.assertEqual(StockMovement.objects.get().created_by, user)
+        lot = StockLot.objects.get(product=self.products[0])
+        self.assertEqual((lot.lot_number, lot.expiry_date), ("LOT-7", date(2031, 3, 1)))
+
+
+class PurchaseOrderTotalsTestCase(PurchaseTestCase):
+    def test_totals_follow_the_items(self):
+        order, items = self.create_order(["10", "4"])
+        order.refresh_from_db()
+        self.assertEqual(order.total_amount, Decimal("14.00"))
+        self.assertEqual(order.received_amount, Decimal("0"))
+
+        items[1].unit_price = Decimal("2.50")
+        items[1].save()
+        items[0].delete()
+        order.refresh_from_db()
+        self.assertEqual(order.total_amount, Decimal("10.00"))
+
+        receive_purchase_items(order, {items[1].pk: Decimal("2")})
+        order.refresh_from_db()
+        self.assertEqual(order.received_amount, Decimal("5.00"))
+        self.assertEqual(order.outstanding_amount, Decimal("5.00"))
+
+    def test_list_and_statement_queries_do_not_grow_with_orders(self):
+        user = User.objects.create_user(
+            username="totals", password="testpass123", role="admin"
+        )
+        self.client.force_login(user)
+        set_current_business(self.business)
+        self.addCleanup(clear_current_business)
+
+        def count_queries(url):
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.get(url).status_code, 200)
+            return len(queries.captured_queries)
+
+        list_url = reverse("purchases:list")
+        statement_url = reverse("suppliers:detail", args=[self.supplier.pk])
+        self.create_order(["10", "4"])
+        count_queries(list_url)  # Warm the per-session caches
+        counts = (count_queries(list_url), count_queries(statement_url))
+        for _ in range(3):
+            self.create_order(["1", "2", "3"])
+
+        self.assertEqual(
+            (count_queries(list_url), count_queries(statement_url)), counts
+        )
+        response = self.client.get(statement_url)
+        self.assertEqual(response.context["total_ordered"], Decimal("32.00"))
+
+
+class ReplenishmentTestCase(PurchaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.other_supplier = Supplier.objects.create(
+            business=self.business, name="Globex"
+        )
+        # Items 0 and 1 were last bought from Acme, item 2 from Globex;
+        # item 3 has never been ordered
+        for supplier, products, price in (
+            (self.other_supplier, self.products[:2], "0.50"),
+            (self.supplier, self.products[:2], "0.80"),
+            (self.other_supplier, self.products[2:3], "1.20"),
+        ):
+            order = PurchaseOrder.objects.create(
+                business=self.business,
+                supplier=supplier,
+                order_date=timezone.localdate(),
+                status="received",
+            )
+            for product in products:
+                PurchaseItem.objects.create(
+                    purchase_order=order,
+                    product=product,
+                    quantity=Decimal("1"),
+                    received_quantity=Decimal("1"),
+                    unit_price=Decimal(price),
+                )
+        Product.objects.filter(pk__in=[p.pk for p in self.products]).update(
+            reorder_level=Decimal("10")
+        )
+        DemandForecast.objects.create(
+            business=self.business,
+            product=self.products[0],
+            avg_daily_demand=Decimal("2"),
+            demand_std=Decimal("0"),
+            reorder_point=Decimal("12"),
+            reorder_quantity=Decimal("35"),
+        )
+
+    def test_drafts_one_order_per_last_supplier(self):
+        orders, unassigned = draft_replenishment_orders(self.business, cover_days=14)
+
+        self.assertEqual(
+            sorted(order.supplier.name for order in orders), ["Acme", "Globex"]
+        )
+        acme = next(order for order in orders if order.supplier == self.supplier)
+        self.assertEqual(acme.status, "pending")
+        self.assertEqual(
+            sorted(acme.items.values_list("product__sku", "quantity", "unit_price")),
+            [
+                # 12 + 2 x 14 - 5 in stock
+                ("ITEM000", Decimal("35"), Decimal("0.80")),
+                # Twice the reorder level without demand history
+                ("ITEM001", Decimal("15"), Decimal("0.80")),
+            ],
+        )
+        self.assertEqual(acme.total_amount, Decimal("40.00"))
+        self.assertEqual([row["sku"] for row in unassigned], ["ITEM003"])
+
+    def test_drafting_again_does_not_order_twice(self):
+        draft_replenishment_orders(self.business)
+        orders, _ = draft_replenishment_orders(self.business)
+
+        self.assertEqual(orders, [])
+
+    def test_suggestions_are_one_query(self):
+        with self.assertNumQueries(2):
+            by_supplier, unassigned = replenishment_suggestions(self.business)
+        self.assertEqual(sum(len(rows) for rows in by_supplier.values()), 3)
+
+    def test_replenish_view(self):
+        user = User.objects.create_user(
+            username="replenish", password="testpass123", role="admin"
+        )
+        self.client.force_login(user)
+        set_current_business(self.business)
+        self.addCleanup(clear_current_business)
+        url = reverse("purchases:replenish")
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["product_count"], 3)
 
-# Create your tests here.
+        set_current_business(self.business)
+        response = self.client.post(url, {"cover_days": "7"})
+        self.assertRedirects(
+            response, reverse("purchases:list"), fetch_redirect_response=False
+        )
+        self.assertEqual(PurchaseOrder.objects.filter(status="pending").count(), 2)
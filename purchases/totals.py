@@ -0,0 +1,37 @@
+"""
+Stored purchase order totals.
+
+``PurchaseOrder.total_amount`` (ordered quantity times unit price) and
+``received_amount`` (received quantity times unit price) are recomputed
+from the items with one UPDATE whenever items change: item saves and
+deletes through the receivers in purchases.signals, bulk writes such as
+purchases.receiving by calling ``update_order_totals`` themselves.
+"""
+
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import PurchaseItem, PurchaseOrder
+
+
+def _item_sum(quantity_field):
+    items = (
+        PurchaseItem._base_manager.filter(purchase_order=OuterRef("pk"))
+        .order_by()
+        .values("purchase_order")
+        .annotate(total=Sum(F(quantity_field) * F("unit_price")))
+        .values("total")
+    )
+    return Coalesce(
+        Subquery(items),
+        Value(0),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+
+
+def update_order_totals(order_ids):
+    """Recompute the stored totals of the purchase orders in ``order_ids``"""
+    return PurchaseOrder._base_manager.filter(pk__in=order_ids).update(
+        total_amount=_item_sum("quantity"),
+        received_amount=_item_sum("received_quantity"),
+    )
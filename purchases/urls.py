@@ -6,6 +6,7 @@ app_name = "purchases"
 urlpatterns = [
     path("", views.purchase_order_list, name="list"),
     path("create/", views.purchase_order_create, name="create"),
+    path("replenish/", views.replenish, name="replenish"),
     path("<int:pk>/", views.purchase_order_detail, name="detail"),
     path("<int:pk>/update/", views.purchase_order_update, name="update"),
     path("<int:pk>/delete/", views.purchase_order_delete, name="delete"),
@@ -1,17 +1,44 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.urls import reverse
+from datetime import date
+from decimal import Decimal, InvalidOperation
 from typing import TYPE_CHECKING
+from django.core.exceptions import ValidationError
 from .models import PurchaseOrder, PurchaseItem
 from .forms import PurchaseOrderForm, PurchaseItemFormSet
+from .receiving import receive_purchase_items
+from .replenishment import draft_replenishment_orders, replenishment_suggestions
+from products.forecasting import DEFAULT_REVIEW_DAYS
 from products.models import Product
 from authentication.utils import check_user_permission
+from utils.pagination import page_json_response, paginate, wants_json
 
 
 @login_required
 def purchase_order_list(request):
-    purchase_orders = PurchaseOrder.objects.business_specific().all()
-    return render(request, "purchases/list.html", {"purchase_orders": purchase_orders})
+    purchase_orders = PurchaseOrder.objects.business_specific().select_related(
+        "supplier"
+    )
+    page = paginate(request, purchase_orders, ["-order_date", "-id"])
+    if wants_json(request):
+        return page_json_response(page, _purchase_order_row)
+    return render(
+        request, "purchases/list.html", {"purchase_orders": page, "page": page}
+    )
+
+
+def _purchase_order_row(purchase_order):
+    return {
+        "id": purchase_order.id,
+        "supplier": purchase_order.supplier.name,
+        "order_date": purchase_order.order_date.isoformat(),
+        "status": purchase_order.status,
+        "total_amount": float(purchase_order.total_amount),
+        "received_amount": float(purchase_order.received_amount),
+        "url": reverse("purchases:detail", args=[purchase_order.pk]),
+    }
 
 
 @login_required
@@ -65,8 +92,7 @@ def purchase_order_create(request):
             # Delete any instances marked for deletion
             for obj in formset.deleted_objects:
                 obj.delete()
-            # Note: total_amount is a calculated property, so we don't need to set it
-            purchase_order.save()
+            # The item receivers keep the order's stored totals up to date
             messages.success(request, "Purchase order created successfully!")
             return redirect("purchases:detail", pk=purchase_order.pk)
     else:
@@ -141,8 +167,7 @@ def purchase_order_update(request, pk):
             # Delete any instances marked for deletion
             for obj in formset.deleted_objects:
                 obj.delete()
-            # Note: total_amount is a calculated property, so we don't need to set it
-            purchase_order.save()
+            # The item receivers keep the order's stored totals up to date
             messages.success(request, "Purchase order updated successfully!")
             return redirect("purchases:detail", pk=purchase_order.pk)
     else:
@@ -202,30 +227,108 @@ def receive_items(request, pk):
     purchase_order = get_object_or_404(PurchaseOrder.objects.business_specific(), pk=pk)
 
     if request.method == "POST":
-        # Process received items
-        # The 'items' attribute is created by Django's related_name feature
-        for item in purchase_order.items.all():  # type: ignore
-            received_qty = request.POST.get(f"received_{item.pk}", 0)
+        # Everything received is booked at once (see purchases.receiving)
+        quantities = {}
+        lot_numbers = {}
+        expiry_dates = {}
+        invalid = False
+        for key, value in request.POST.items():
+            if not key.startswith("received_") or not value.strip():
+                continue
             try:
-                received_qty = float(received_qty)
-            except ValueError:
-                received_qty = 0
-
-            if received_qty > 0:
-                # Update received quantity
-                # The stock will be automatically updated by signals
-                item.received_quantity += received_qty
-                item.save()
-
-        # Update purchase order status
-        # The 'items' attribute is created by Django's related_name feature
-        if all(item.is_fully_received for item in purchase_order.items.all()):  # type: ignore
-            purchase_order.status = "received"
+                item_id = int(key[len("received_") :])
+                quantities[item_id] = Decimal(value)
+                expiry_date = request.POST.get(f"expiry_{item_id}", "").strip()
+                if expiry_date:
+                    expiry_dates[item_id] = date.fromisoformat(expiry_date)
+            except (ValueError, InvalidOperation):
+                invalid = True
+                continue
+            lot_numbers[item_id] = request.POST.get(f"lot_{item_id}", "").strip()[:100]
+        if invalid:
+            messages.error(request, "Enter valid received quantities and expiry dates.")
         else:
-            purchase_order.status = "partially_received"
-        purchase_order.save()
-
-        messages.success(request, "Items received successfully!")
-        return redirect("purchases:detail", pk=purchase_order.pk)
+            try:
+                receive_purchase_items(
+                    purchase_order,
+                    quantities,
+                    user=request.user,
+                    lot_numbers=lot_numbers,
+                    expiry_dates=expiry_dates,
+                )
+                messages.success(request, "Items received successfully!")
+                return redirect("purchases:detail", pk=purchase_order.pk)
+            except ValidationError as e:
+                for error in e.messages:
+                    messages.error(request, error)
 
     return render(request, "purchases/receive.html", {"purchase_order": purchase_order})
+
+
+# Days of demand drafted orders may cover
+MAX_COVER_DAYS = 365
+
+
+@login_required
+def replenish(request):
+    """Preview the products to reorder and draft purchase orders for them"""
+    # Account owners have access to everything
+    if request.user.role != "admin" and not check_user_permission(
+        request.user, "can_create"
+    ):
+        messages.error(request, "You do not have permission to create purchase orders.")
+        return redirect("purchases:list")
+
+    # Get the current business from the request
+    from superadmin.middleware import get_current_business
+
+    current_business = get_current_business()
+    if not current_business:
+        messages.error(
+            request,
+            "No business context found. Please select a business before creating purchase orders.",
+        )
+        return redirect("purchases:list")
+
+    try:
+        cover_days = int(
+            request.POST.get("cover_days") or request.GET.get("cover_days")
+        )
+    except (TypeError, ValueError):
+        cover_days = DEFAULT_REVIEW_DAYS
+    cover_days = min(max(cover_days, 1), MAX_COVER_DAYS)
+
+    if request.method == "POST":
+        orders, unassigned = draft_replenishment_orders(current_business, cover_days)
+        if orders:
+            messages.success(
+                request,
+                f"Drafted {len(orders)} purchase orders. Review them and mark "
+                "them ordered when sent.",
+            )
+        else:
+            messages.info(request, "No products need reordering.")
+        if unassigned:
+            messages.warning(
+                request,
+                f"{len(unassigned)} products to reorder have never been ordered "
+                "from a supplier and were left out.",
+            )
+        return redirect("purchases:list")
+
+    by_supplier, unassigned = replenishment_suggestions(current_business, cover_days)
+    groups = [
+        {
+            "supplier": supplier,
+            "rows": rows,
+            "total": sum(row["order_quantity"] * row["unit_price"] for row in rows),
+        }
+        for supplier, rows in sorted(by_supplier.items(), key=lambda item: item[0].name)
+    ]
+    context = {
+        "groups": groups,
+        "unassigned": unassigned,
+        "cover_days": cover_days,
+        "product_count": sum(len(group["rows"]) for group in groups),
+    }
+    return render(request, "purchases/replenish.html", context)
@@ -0,0 +1,165 @@
+"""
+Report result cache.
+
+Report results are stored in the ``reports`` cache alias (see ``CACHES`` in
+settings) under a key built from the report name, business, branch, period
+and any extra parameters. Every key also contains the business' current data
+version. Writes to sales, expenses, stock movements and purchases bump that
+version once they commit (see ``reports.signals``), so entries computed
+before the write are never read again and simply expire.
+"""
+
+import hashlib
+import json
+import logging
+import uuid
+
+from django.core.cache import caches
+from django.core.cache.backends.base import InvalidCacheBackendError
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+CACHE_ALIAS = "reports"
+KEY_PREFIX = "reports"
+STATS_KEYS = ("hits", "misses")
+
+
+def get_report_cache():
+    """Return the cache backend used for report results"""
+    try:
+        return caches[CACHE_ALIAS]
+    except InvalidCacheBackendError:
+        return caches["default"]
+
+
+def _business_id(business):
+    return getattr(business, "pk", business)
+
+
+def _version_key(business_id):
+    return f"{KEY_PREFIX}:version:{business_id}"
+
+
+def get_data_version(business):
+    """Get the current data version token for a business"""
+    cache = get_report_cache()
+    key = _version_key(_business_id(business))
+    version = cache.get(key)
+    if version is None:
+        # add() only succeeds if no other process set a version meanwhile
+        cache.add(key, uuid.uuid4().hex, timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_data_version(business):
+    """
+    Invalidate every cached report for a business by issuing a new data
+    version. Call this after writes that bypass model signals, such as
+    ``bulk_create`` or ``QuerySet.update``.
+
+    Inside a transaction the version is only bumped once it commits. A
+    report computed meanwhile still reads the old data version, so
+    anything it stores from uncommitted rows is discarded by the bump.
+    """
+    business_id = _business_id(business)
+    if business_id is None:
+        return
+
+    def bump():
+        try:
+            get_report_cache().set(
+                _version_key(business_id), uuid.uuid4().hex, timeout=None
+            )
+        except Exception:
+            # A cache outage must never break the write that triggered it
+            logger.exception("Failed to bump report data version for %s", business_id)
+
+    transaction.on_commit(bump)
+
+
+def make_report_key(report, business, branch=None, period=None, params=None):
+    """Build the cache key for a report result"""
+    business_id = _business_id(business)
+    branch_id = _business_id(branch)
+    raw = json.dumps(
+        {
+            "report": report,
+            "business": business_id,
+            "branch": branch_id,
+            "period": period,
+            "params": params or {},
+        },
+        sort_keys=True,
+        default=str,
+    )
+    digest = hashlib.sha1(raw.encode("utf-8")).hexdigest()
+    version = get_data_version(business_id)
+    return f"{KEY_PREFIX}:{report}:{business_id}:{version}:{digest}"
+
+
+def _record(stat):
+    cache = get_report_cache()
+    key = f"{KEY_PREFIX}:stats:{stat}"
+    try:
+        cache.incr(key)
+    except ValueError:
+        # incr() raises ValueError when the counter does not exist yet
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+
+
+def get_or_compute(report, business, compute, branch=None, period=None, params=None):
+    """
+    Return the cached result for a report, computing and storing it on a miss.
+
+    Args:
+        report: Name of the report, e.g. ``"profit_loss"``
+        business: Business (or business id) the report is for
+        compute: Callable returning a picklable result
+        branch: Optional branch (or branch id) the report is filtered by
+        period: Period identifier, e.g. ``"monthly"`` or ``(start, end)``
+        params: Any other parameters that change the result
+
+    Returns:
+        The report result
+    """
+    if business is None:
+        return compute()
+
+    try:
+        cache = get_report_cache()
+        key = make_report_key(report, business, branch, period, params)
+        result = cache.get(key)
+    except Exception:
+        logger.exception("Report cache lookup failed for %s", report)
+        return compute()
+
+    if result is not None:
+        _record("hits")
+        return result
+
+    _record("misses")
+    result = compute()
+    try:
+        cache.set(key, result)
+    except Exception:
+        logger.exception("Failed to store %s in the report cache", report)
+    return result
+
+
+def get_cache_stats():
+    """Return hit/miss counters and the hit rate for the report cache"""
+    cache = get_report_cache()
+    stats = {stat: cache.get(f"{KEY_PREFIX}:stats:{stat}", 0) for stat in STATS_KEYS}
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = (stats["hits"] / lookups * 100) if lookups else 0.0
+    return stats
+
+
+def reset_cache_stats():
+    """Reset the hit/miss counters"""
+    get_report_cache().delete_many(
+        [f"{KEY_PREFIX}:stats:{stat}" for stat in STATS_KEYS]
+    )
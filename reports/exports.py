@@ -0,0 +1,376 @@
+"""
+CSV exports of the reports.
+
+Each writer streams one report into a ``csv.writer`` from plain queries
+filtered by business and branch, so the report pages' CSV exports and the
+background report jobs (see reports.jobs) produce the same file. Row-level
+sections (individual sales, expenses and daily totals) are read one date
+chunk at a time with ``iterator()``, while summaries and totals are single
+aggregates over the whole range. A year-long export is one report, with one
+header and one set of totals, whatever the number of chunks.
+
+Writers take ``chunks``, the inclusive ``(start, end)`` date ranges to read
+the rows in (the whole range by default), and ``progress``, called with the
+percentage done after each chunk.
+"""
+
+from decimal import Decimal
+
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from expenses.models import Expense
+from products.models import DemandForecast, Product
+from sales.models import Sale, SaleItem
+from .utils import date_range_filter
+
+# Share of sales revenue the profit & loss report counts as cost of goods
+ESTIMATED_COGS_RATE = Decimal("0.6")
+
+ROW_CHUNK_SIZE = 2000
+
+
+def _money(value):
+    return f"${float(value or 0):.2f}"
+
+
+def _sales(business, branch):
+    sales = Sale._base_manager.filter(business=business)
+    if branch:
+        sales = sales.filter(branch=branch)
+    return sales
+
+
+def _sale_items(business, branch, start_date, end_date):
+    items = SaleItem._base_manager.filter(
+        sale__business=business,
+        **date_range_filter("sale__sale_date", start_date, end_date),
+    )
+    if branch:
+        items = items.filter(sale__branch=branch)
+    return items
+
+
+def _expenses(business, branch):
+    expenses = Expense._base_manager.filter(business=business)
+    if branch:
+        expenses = expenses.filter(branch=branch)
+    return expenses
+
+
+def _stream(chunks, rows_for, progress):
+    """Yield the rows of every chunk in turn, reporting progress per chunk"""
+    for index, (chunk_start, chunk_end) in enumerate(chunks, start=1):
+        yield from rows_for(chunk_start, chunk_end)
+        if progress:
+            progress(int(index * 100 / len(chunks)))
+
+
+def _write_top_products(writer, business, branch, start_date, end_date, order_by):
+    writer.writerow(["Top Selling Products"])
+    writer.writerow(["Product", "Quantity Sold", "Total Revenue"])
+    top_products = (
+        _sale_items(business, branch, start_date, end_date)
+        .values("product__name")
+        .annotate(total_sold=Sum("quantity"), total_revenue=Sum("total_price"))
+        .order_by(order_by)[:10]
+    )
+    for product in top_products:
+        writer.writerow(
+            [
+                product["product__name"],
+                product["total_sold"],
+                _money(product["total_revenue"]),
+            ]
+        )
+
+
+def write_sales_report(
+    writer, business, branch, start_date, end_date, chunks=None, progress=None
+):
+    chunks = chunks or [(start_date, end_date)]
+    sales = _sales(business, branch)
+    in_range = sales.filter(**date_range_filter("sale_date", start_date, end_date))
+    totals = in_range.aggregate(total=Sum("total_amount"), count=Count("id"))
+
+    writer.writerow(["Sales Report", f"From {start_date} to {end_date}"])
+    writer.writerow([])
+
+    writer.writerow(["Summary"])
+    writer.writerow(["Metric", "Value"])
+    writer.writerow(["Total Sales", _money(totals["total"])])
+    writer.writerow(["Total Orders", totals["count"]])
+    writer.writerow([])
+
+    writer.writerow(["Daily Sales"])
+    writer.writerow(["Date", "Total Sales", "Total Orders"])
+    daily_sales = (
+        in_range.annotate(day=TruncDate("sale_date"))
+        .values("day")
+        .annotate(total=Sum("total_amount"), count=Count("id"))
+        .order_by("day")
+    )
+    for day in daily_sales:
+        writer.writerow([day["day"], _money(day["total"]), day["count"]])
+    writer.writerow([])
+
+    _write_top_products(
+        writer, business, branch, start_date, end_date, order_by="-total_sold"
+    )
+    writer.writerow([])
+
+    def sale_rows(chunk_start, chunk_end):
+        chunk = (
+            sales.filter(**date_range_filter("sale_date", chunk_start, chunk_end))
+            .select_related("customer")
+            .order_by("sale_date", "id")
+        )
+        for sale in chunk.iterator(chunk_size=ROW_CHUNK_SIZE):
+            yield [
+                sale.id,
+                timezone.localtime(sale.sale_date).strftime("%Y-%m-%d"),
+                sale.customer.full_name if sale.customer else "Walk-in",
+                _money(sale.total_amount),
+            ]
+
+    writer.writerow(["Sales"])
+    writer.writerow(["ID", "Date", "Customer", "Total Amount"])
+    writer.writerows(_stream(chunks, sale_rows, progress))
+
+
+def write_profit_loss_report(
+    writer, business, branch, start_date, end_date, chunks=None, progress=None
+):
+    chunks = chunks or [(start_date, end_date)]
+    sales = _sales(business, branch)
+    in_range = sales.filter(**date_range_filter("sale_date", start_date, end_date))
+    expenses = _expenses(business, branch).filter(
+        date__gte=start_date, date__lte=end_date
+    )
+    sale_totals = in_range.aggregate(total=Sum("total_amount"), count=Count("id"))
+    expense_totals = expenses.aggregate(total=Sum("amount"), count=Count("id"))
+
+    total_sales = sale_totals["total"] or Decimal("0")
+    total_expenses = expense_totals["total"] or Decimal("0")
+    estimated_cogs = total_sales * ESTIMATED_COGS_RATE
+    gross_profit = total_sales - estimated_cogs
+    net_profit = gross_profit - total_expenses
+    if total_sales > 0:
+        gross_margin = float(gross_profit) / float(total_sales) * 100
+        net_margin = float(net_profit) / float(total_sales) * 100
+    else:
+        gross_margin = net_margin = 0
+
+    writer.writerow(["Profit & Loss Report", f"From {start_date} to {end_date}"])
+    writer.writerow([])
+
+    writer.writerow(["Financial Summary"])
+    writer.writerow(["Metric", "Value"])
+    writer.writerow(["Sales Revenue", _money(total_sales)])
+    writer.writerow(["Number of Orders", sale_totals["count"]])
+    writer.writerow(["Operating Expenses", _money(total_expenses)])
+    writer.writerow(["Expense Entries", expense_totals["count"]])
+    writer.writerow(["Estimated COGS", _money(estimated_cogs)])
+    writer.writerow(["Gross Profit", _money(gross_profit)])
+    writer.writerow(["Net Profit", _money(net_profit)])
+    writer.writerow(["Gross Profit Margin", f"{gross_margin:.2f}%"])
+    writer.writerow(["Net Profit Margin", f"{net_margin:.2f}%"])
+    writer.writerow([])
+
+    writer.writerow(["Expenses by Category"])
+    writer.writerow(["Category", "Total Amount", "Number of Entries"])
+    by_category = (
+        expenses.values("category__name")
+        .annotate(total=Sum("amount"), count=Count("id"))
+        .order_by("-total")
+    )
+    for category in by_category:
+        writer.writerow(
+            [
+                category["category__name"] or "Uncategorized",
+                _money(category["total"]),
+                category["count"],
+            ]
+        )
+    writer.writerow([])
+
+    _write_top_products(
+        writer, business, branch, start_date, end_date, order_by="-total_revenue"
+    )
+    writer.writerow([])
+
+    def daily_rows(chunk_start, chunk_end):
+        days = (
+            sales.filter(**date_range_filter("sale_date", chunk_start, chunk_end))
+            .annotate(day=TruncDate("sale_date"))
+            .values("day")
+            .annotate(total=Sum("total_amount"))
+            .order_by("day")
+        )
+        for day in days:
+            yield [day["day"], _money(day["total"])]
+
+    writer.writerow(["Daily Sales"])
+    writer.writerow(["Date", "Total Sales"])
+    writer.writerows(_stream(chunks, daily_rows, progress))
+
+
+def write_expenses_report(
+    writer, business, branch, start_date, end_date, chunks=None, progress=None
+):
+    chunks = chunks or [(start_date, end_date)]
+    expenses = _expenses(business, branch)
+    in_range = expenses.filter(date__gte=start_date, date__lte=end_date)
+    totals = in_range.aggregate(total=Sum("amount"), count=Count("id"))
+
+    writer.writerow(["Expenses Report", f"From {start_date} to {end_date}"])
+    writer.writerow([])
+
+    writer.writerow(["Summary"])
+    writer.writerow(["Metric", "Value"])
+    writer.writerow(["Total Expenses", _money(totals["total"])])
+    writer.writerow(["Number of Expenses", totals["count"]])
+    writer.writerow([])
+
+    writer.writerow(["Expenses by Category"])
+    writer.writerow(["Category", "Total Amount", "Number of Expenses"])
+    by_category = (
+        in_range.values("category__name")
+        .annotate(total=Sum("amount"), count=Count("id"))
+        .order_by("-total")
+    )
+    for category in by_category:
+        writer.writerow(
+            [
+                category["category__name"] or "Uncategorized",
+                _money(category["total"]),
+                category["count"],
+            ]
+        )
+    writer.writerow([])
+
+    writer.writerow(["Daily Expenses"])
+    writer.writerow(["Date", "Total Amount"])
+    daily = in_range.values("date").annotate(total=Sum("amount")).order_by("date")
+    for day in daily:
+        writer.writerow([day["date"].strftime("%Y-%m-%d"), _money(day["total"])])
+    writer.writerow([])
+
+    def expense_rows(chunk_start, chunk_end):
+        chunk = (
+            expenses.filter(date__gte=chunk_start, date__lte=chunk_end)
+            .select_related("category", "branch")
+            .order_by("date", "id")
+        )
+        for expense in chunk.iterator(chunk_size=ROW_CHUNK_SIZE):
+            yield [
+                expense.date.strftime("%Y-%m-%d"),
+                expense.category.name if expense.category else "Uncategorized",
+                expense.description,
+                _money(expense.amount),
+                expense.branch.name if expense.branch else "",
+            ]
+
+    writer.writerow(["Expenses"])
+    writer.writerow(["Date", "Category", "Description", "Amount", "Branch"])
+    writer.writerows(_stream(chunks, expense_rows, progress))
+
+
+def write_inventory_report(
+    writer, business, branch, start_date, end_date, chunks=None, progress=None
+):
+    # The inventory report is a snapshot of current stock; the range only
+    # labels the report
+    products = Product._base_manager.filter(business=business, is_active=True)
+    if branch:
+        products = products.filter(branch=branch)
+    products = products.select_related("category")
+
+    writer.writerow(["Inventory Report"])
+    writer.writerow([])
+
+    writer.writerow(["Low Stock Products (Below Reorder Level)"])
+    writer.writerow(["Product", "SKU", "Current Stock", "Reorder Level", "Category"])
+    for product in products.filter(quantity__lte=F("reorder_level")).order_by(
+        "quantity"
+    ):
+        writer.writerow(
+            [
+                product.name,
+                product.sku,
+                product.quantity,
+                product.reorder_level,
+                product.category.name if product.category else "",
+            ]
+        )
+    writer.writerow([])
+
+    writer.writerow(["Out of Stock Products"])
+    writer.writerow(["Product", "SKU", "Category"])
+    for product in products.filter(quantity=0):
+        writer.writerow(
+            [
+                product.name,
+                product.sku,
+                product.category.name if product.category else "",
+            ]
+        )
+    writer.writerow([])
+
+    writer.writerow(["Expired Products"])
+    writer.writerow(["Product", "SKU", "Expiry Date", "Current Stock", "Category"])
+    for product in products.filter(expiry_date__lt=timezone.localdate()):
+        writer.writerow(
+            [
+                product.name,
+                product.sku,
+                product.expiry_date,
+                product.quantity,
+                product.category.name if product.category else "",
+            ]
+        )
+    writer.writerow([])
+
+    writer.writerow(["Reorder Suggestions"])
+    writer.writerow(
+        [
+            "Product",
+            "SKU",
+            "Current Stock",
+            "Avg Daily Demand",
+            "Days of Cover",
+            "Reorder Point",
+            "Suggested Quantity",
+        ]
+    )
+    forecasts = DemandForecast._base_manager.filter(
+        business=business, reorder_quantity__gt=0, product__is_active=True
+    )
+    if branch:
+        forecasts = forecasts.filter(product__branch=branch)
+    forecasts = forecasts.select_related("product").order_by(
+        F("days_of_cover").asc(nulls_last=True)
+    )[:50]
+    for forecast in forecasts:
+        writer.writerow(
+            [
+                forecast.product.name,
+                forecast.product.sku,
+                forecast.product.quantity,
+                forecast.avg_daily_demand,
+                forecast.days_of_cover if forecast.days_of_cover is not None else "",
+                forecast.reorder_point,
+                forecast.reorder_quantity,
+            ]
+        )
+    if progress:
+        progress(100)
+
+
+REPORT_WRITERS = {
+    "sales": write_sales_report,
+    "inventory": write_inventory_report,
+    "profit_loss": write_profit_loss_report,
+    "expenses": write_expenses_report,
+}
@@ -0,0 +1,224 @@
+"""
+Background report jobs.
+
+Long-range reports are queued as ``ReportJob`` rows by the web process and
+computed by the ``run_report_jobs`` worker command. The worker splits the
+requested range into chunks of ``REPORT_JOB_CHUNK_DAYS`` days and writes the
+report with the same CSV writer the report pages export with (see
+reports.exports): the rows are read one chunk at a time into a single file
+with one header and one set of totals, and progress is recorded after every
+chunk. Finished files are kept under ``MEDIA_ROOT/report_jobs/`` until
+``expires_at``.
+
+A running job's ``heartbeat_at`` is refreshed with its progress. Jobs whose
+worker died are left "running" with a heartbeat that stops moving;
+``requeue_stale_jobs`` puts them back in the queue after
+``REPORT_JOB_STALE_MINUTES``, or fails them once they have been tried
+``MAX_JOB_ATTEMPTS`` times.
+"""
+
+import csv
+import io
+import logging
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .exports import REPORT_WRITERS
+from .models import ReportJob
+
+logger = logging.getLogger(__name__)
+
+# Reports whose rows only depend on the range are read chunk by chunk. The
+# inventory report is a stock snapshot, so it is written in one pass.
+CHUNKED_REPORTS = ("sales", "profit_loss", "expenses")
+
+MAX_JOB_ATTEMPTS = 3
+
+
+def split_date_range(start_date, end_date, chunk_days=None):
+    """Split an inclusive date range into consecutive inclusive chunks"""
+    if chunk_days is None:
+        chunk_days = getattr(settings, "REPORT_JOB_CHUNK_DAYS", 31)
+    chunk_days = max(int(chunk_days), 1)
+
+    chunks = []
+    chunk_start = start_date
+    while chunk_start <= end_date:
+        chunk_end = min(chunk_start + timedelta(days=chunk_days - 1), end_date)
+        chunks.append((chunk_start, chunk_end))
+        chunk_start = chunk_end + timedelta(days=1)
+    return chunks
+
+
+def submit_report_job(
+    business, report_type, start_date, end_date, user=None, branch=None
+):
+    """Queue a report for the worker and return the job"""
+    if report_type not in dict(ReportJob.REPORT_TYPE_CHOICES):
+        raise ValueError(f"Unknown report type: {report_type}")
+    if start_date > end_date:
+        raise ValueError("Start date must be on or before the end date")
+
+    return ReportJob.objects.create(
+        business=business,
+        branch=branch,
+        requested_by=user,
+        report_type=report_type,
+        start_date=start_date,
+        end_date=end_date,
+    )
+
+
+def claim_next_job():
+    """
+    Atomically claim the oldest pending job.
+
+    The claim is a conditional UPDATE, so several workers can poll the same
+    table without picking up the same job.
+    """
+    queryset = ReportJob._base_manager.filter(status="pending").order_by("created_at")
+    for job_id in queryset.values_list("id", flat=True)[:10]:
+        now = timezone.now()
+        claimed = ReportJob._base_manager.filter(id=job_id, status="pending").update(
+            status="running",
+            started_at=now,
+            heartbeat_at=now,
+            progress=0,
+            attempts=F("attempts") + 1,
+        )
+        if claimed:
+            return ReportJob._base_manager.get(id=job_id)
+    return None
+
+
+def requeue_stale_jobs():
+    """
+    Requeue running jobs whose heartbeat is older than
+    ``REPORT_JOB_STALE_MINUTES``, failing those out of attempts. Returns
+    the number of jobs requeued.
+    """
+    now = timezone.now()
+    stale_before = now - timedelta(
+        minutes=getattr(settings, "REPORT_JOB_STALE_MINUTES", 15)
+    )
+    stale = ReportJob._base_manager.filter(
+        Q(heartbeat_at__lt=stale_before)
+        | Q(heartbeat_at=None, started_at__lt=stale_before),
+        status="running",
+    )
+    failed = stale.filter(attempts__gte=MAX_JOB_ATTEMPTS).update(
+        status="failed",
+        error="The worker stopped before finishing the report.",
+        completed_at=now,
+    )
+    if failed:
+        logger.warning("Failed %s report job(s) out of attempts", failed)
+    requeued = stale.update(
+        status="pending", started_at=None, heartbeat_at=None, progress=0
+    )
+    if requeued:
+        logger.warning("Requeued %s stale report job(s)", requeued)
+    return requeued
+
+
+def _update_progress(job, progress):
+    job.progress = progress
+    ReportJob._base_manager.filter(id=job.id).update(
+        progress=progress, heartbeat_at=timezone.now()
+    )
+
+
+def run_report_job(job):
+    """Compute a claimed job and store its result file"""
+    if job.report_type in CHUNKED_REPORTS:
+        chunks = split_date_range(job.start_date, job.end_date)
+    else:
+        chunks = [(job.start_date, job.end_date)]
+
+    with tempfile.TemporaryFile() as output:
+        text = io.TextIOWrapper(output, encoding="utf-8", newline="")
+        REPORT_WRITERS[job.report_type](
+            csv.writer(text),
+            job.business,
+            job.branch,
+            job.start_date,
+            job.end_date,
+            chunks=chunks,
+            progress=lambda progress: _update_progress(job, progress),
+        )
+        text.flush()
+        text.detach()
+
+        output.seek(0)
+        filename = (
+            f"{job.business_id}/{job.report_type}_report_"
+            f"{job.start_date}_to_{job.end_date}_{job.id}.csv"
+        )
+        job.result_file.save(filename, File(output), save=False)
+
+    now = timezone.now()
+    job.status = "completed"
+    job.progress = 100
+    job.completed_at = now
+    job.expires_at = now + timedelta(
+        hours=getattr(settings, "REPORT_JOB_RETENTION_HOURS", 72)
+    )
+    job.save(
+        update_fields=[
+            "status",
+            "progress",
+            "result_file",
+            "completed_at",
+            "expires_at",
+        ]
+    )
+    _notify(job, "Report ready", f"Your {job} is ready to download.")
+    return job
+
+
+def process_job(job):
+    """Run a claimed job, marking it failed instead of raising"""
+    try:
+        return run_report_job(job)
+    except Exception as e:
+        logger.exception("Report job %s failed", job.id)
+        job.status = "failed"
+        job.error = str(e)
+        job.completed_at = timezone.now()
+        job.save(update_fields=["status", "error", "completed_at"])
+        _notify(job, "Report failed", f"Your {job} could not be generated: {e}")
+        return job
+
+
+def _notify(job, title, message):
+    if not job.requested_by_id:
+        return
+    try:
+        from notifications.models import Notification
+
+        Notification.objects.create(
+            recipient_id=job.requested_by_id,
+            business_id=job.business_id,
+            title=title,
+            message=message,
+            notification_type="system",
+        )
+    except Exception:
+        logger.exception("Failed to create notification for report job %s", job.id)
+
+
+def cleanup_expired_jobs():
+    """Delete expired jobs together with their result files"""
+    expired = ReportJob._base_manager.filter(expires_at__lte=timezone.now())
+    count = 0
+    for job in expired.iterator():
+        if job.result_file:
+            job.result_file.delete(save=False)
+        job.delete()
+        count += 1
+    return count
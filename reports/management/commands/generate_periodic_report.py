@@ -1,10 +1,12 @@
 from django.core.management.base import BaseCommand
 from django.test import RequestFactory
 from authentication.models import User
+from reports.jobs import submit_report_job
+from reports.utils import get_period_range
 from reports.views import sales_report, profit_loss_report, expenses_report
 from superadmin.middleware import set_current_business
 from superadmin.models import Business
-from datetime import date, timedelta
+from datetime import date
 from django.utils import timezone
 
 
@@ -25,6 +27,11 @@ class Command(BaseCommand):
             help="Specific date for the report (YYYY-MM-DD). Defaults to today.",
             required=False,
         )
+        parser.add_argument(
+            "--queue",
+            action="store_true",
+            help="Queue the reports as background jobs for run_report_jobs instead of generating them now",
+        )
 
     def handle(self, *args, **options):
         # Create a request factory
@@ -73,35 +80,20 @@ class Command(BaseCommand):
         self.stdout.write("=" * 60)
 
         # Calculate date ranges based on period
-        if period == "daily":
-            start_date = report_date
-            end_date = report_date
-            period_name = f"{report_date}"
-        elif period == "weekly":
-            # Get the start of the week (Monday)
-            start_date = report_date - timedelta(days=report_date.weekday())
-            end_date = start_date + timedelta(days=6)
-            period_name = f"Week of {start_date}"
-        elif period == "monthly":
-            # Get the first day of the month
-            start_date = report_date.replace(day=1)
-            # Get the last day of the month
-            if report_date.month == 12:
-                end_date = report_date.replace(day=31)
-            else:
-                # Get the first day of next month and subtract one day
-                next_month = report_date.replace(day=1, month=report_date.month + 1)
-                end_date = next_month - timedelta(days=1)
-            period_name = f'{report_date.strftime("%B %Y")}'
-        elif period == "yearly":
-            # Get the first day of the year
-            start_date = report_date.replace(month=1, day=1)
-            # Get the last day of the year
-            end_date = report_date.replace(month=12, day=31)
-            period_name = f"{report_date.year}"
+        start_date, end_date, period_name = get_period_range(period, report_date)
 
         self.stdout.write(f"Report period: {start_date} to {end_date}")
 
+        if options.get("queue"):
+            for report_type in ("sales", "profit_loss", "expenses"):
+                job = submit_report_job(
+                    business, report_type, start_date, end_date, user=user
+                )
+                self.stdout.write(
+                    self.style.SUCCESS(f"    ✓ Queued report job #{job.id}: {job}")
+                )
+            return
+
         # Test each report
         reports_to_test = [
             ("Sales Report", "/reports/sales/", sales_report),
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from reports.cache import get_cache_stats, reset_cache_stats
+
+
+class Command(BaseCommand):
+    help = "Show hit-rate metrics for the report result cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset",
+            action="store_true",
+            help="Reset the hit/miss counters after printing them",
+        )
+
+    def handle(self, *args, **options):
+        stats = get_cache_stats()
+
+        self.stdout.write(f"Hits:     {stats['hits']}")
+        self.stdout.write(f"Misses:   {stats['misses']}")
+        self.stdout.write(f"Hit rate: {stats['hit_rate']:.1f}%")
+
+        if options.get("reset"):
+            reset_cache_stats()
+            self.stdout.write(self.style.SUCCESS("Report cache counters reset"))
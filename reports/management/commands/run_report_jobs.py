@@ -0,0 +1,65 @@
+import time
+from django.core.management.base import BaseCommand
+from reports.jobs import (
+    claim_next_job,
+    cleanup_expired_jobs,
+    process_job,
+    requeue_stale_jobs,
+)
+
+
+class Command(BaseCommand):
+    help = "Run queued background report jobs and remove expired report files"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Process the jobs currently queued and exit instead of polling",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=5.0,
+            help="Seconds to wait between polls when the queue is empty (default: 5)",
+        )
+        parser.add_argument(
+            "--max-jobs",
+            type=int,
+            default=0,
+            help="Exit after processing this many jobs (default: no limit)",
+        )
+
+    def handle(self, *args, **options):
+        processed = 0
+        max_jobs = options["max_jobs"]
+
+        while True:
+            removed = cleanup_expired_jobs()
+            if removed:
+                self.stdout.write(f"Removed {removed} expired report job(s)")
+            requeued = requeue_stale_jobs()
+            if requeued:
+                self.stdout.write(f"Requeued {requeued} stale report job(s)")
+
+            job = claim_next_job()
+            if job is None:
+                if options["once"]:
+                    break
+                time.sleep(options["poll_interval"])
+                continue
+
+            self.stdout.write(f"Running report job #{job.id}: {job}")
+            job = process_job(job)
+            if job.status == "completed":
+                self.stdout.write(
+                    self.style.SUCCESS(f"  ✓ Stored {job.result_file.name}")
+                )
+            else:
+                self.stdout.write(self.style.ERROR(f"  ✗ Failed: {job.error}"))
+
+            processed += 1
+            if max_jobs and processed >= max_jobs:
+                break
+
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} report job(s)"))
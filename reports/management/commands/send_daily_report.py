@@ -72,7 +72,7 @@ class Command(BaseCommand):
     def generate_all_business_reports(self):
         """Generate daily report data for all businesses"""
         from datetime import date
-        from reports.views import get_date_ranges
+        from reports.utils import get_date_ranges, date_range_filter
 
         # Get today's date range
         date_ranges = get_date_ranges()
@@ -95,7 +95,7 @@ class Command(BaseCommand):
                 from decimal import Decimal
 
                 sales = Sale.objects.filter(business=business).filter(
-                    sale_date__date__gte=start_date, sale_date__date__lte=end_date
+                    **date_range_filter("sale_date", start_date, end_date)
                 )
 
                 total_sales = sales.aggregate(total=Sum("total_amount"))[
@@ -124,8 +124,7 @@ class Command(BaseCommand):
                 top_products = (
                     SaleItem.objects.filter(sale__business=business)
                     .filter(
-                        sale__sale_date__date__gte=start_date,
-                        sale__sale_date__date__lte=end_date,
+                        **date_range_filter("sale__sale_date", start_date, end_date)
                     )
                     .values("product__name")
                     .annotate(
@@ -1,4 +1,80 @@
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
+from superadmin.models import Business, Branch
+from superadmin.managers import BusinessSpecificManager
 
 # The reports app will primarily use views and functions rather than models
 # Most reports will be generated from existing data in other models
+
+
+class ReportJob(models.Model):
+    """A report or export computed off the request cycle by a worker"""
+
+    objects = BusinessSpecificManager()
+
+    REPORT_TYPE_CHOICES = [
+        ("sales", "Sales Report"),
+        ("inventory", "Inventory Report"),
+        ("profit_loss", "Profit & Loss Report"),
+        ("expenses", "Expenses Report"),
+    ]
+
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("running", "Running"),
+        ("completed", "Completed"),
+        ("failed", "Failed"),
+    ]
+
+    business = models.ForeignKey(
+        Business, on_delete=models.CASCADE, related_name="report_jobs"
+    )
+    branch = models.ForeignKey(
+        Branch,
+        on_delete=models.SET_NULL,
+        related_name="report_jobs",
+        null=True,
+        blank=True,
+    )
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        related_name="report_jobs",
+        null=True,
+        blank=True,
+    )
+    report_type = models.CharField(max_length=20, choices=REPORT_TYPE_CHOICES)
+    start_date = models.DateField()
+    end_date = models.DateField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
+    progress = models.PositiveSmallIntegerField(default=0)  # type: ignore
+    result_file = models.FileField(upload_to="report_jobs/", blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # Touched by the worker at every progress update; a running job whose
+    # heartbeat stops is requeued (see reports.jobs.requeue_stale_jobs)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)  # type: ignore
+    completed_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(
+                fields=["status", "created_at"], name="reports_job_status_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.get_report_type_display()} {self.start_date} to {self.end_date} ({self.status})"
+
+    @property
+    def is_finished(self):
+        return self.status in ("completed", "failed")
+
+    @property
+    def is_expired(self):
+        return self.expires_at is not None and self.expires_at <= timezone.now()
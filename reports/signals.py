@@ -0,0 +1,34 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from expenses.models import Expense
+from products.models import StockMovement
+from purchases.models import PurchaseOrder, PurchaseItem
+from sales.models import Sale, SaleItem
+from .cache import bump_data_version
+
+
+@receiver(post_save, sender=Sale)
+@receiver(post_delete, sender=Sale)
+@receiver(post_save, sender=SaleItem)
+@receiver(post_delete, sender=SaleItem)
+@receiver(post_save, sender=Expense)
+@receiver(post_delete, sender=Expense)
+@receiver(post_save, sender=StockMovement)
+@receiver(post_delete, sender=StockMovement)
+@receiver(post_save, sender=PurchaseOrder)
+@receiver(post_delete, sender=PurchaseOrder)
+def invalidate_report_cache(sender, instance, **kwargs):
+    """Bump the business data version so cached reports are recomputed"""
+    bump_data_version(instance.business_id)
+
+
+@receiver(post_save, sender=PurchaseItem)
+@receiver(post_delete, sender=PurchaseItem)
+def invalidate_report_cache_on_purchase_item(sender, instance, **kwargs):
+    """Purchase items only reach their business through the purchase order"""
+    business_id = (
+        PurchaseOrder._base_manager.filter(pk=instance.purchase_order_id)
+        .values_list("business_id", flat=True)
+        .first()
+    )
+    bump_data_version(business_id)
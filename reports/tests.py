@@ -1,3 +1,352 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from authentication.models import User
+from expenses.models import Expense, ExpenseCategory
+from notifications.models import Notification
+from products.models import Product
+from reports import cache as report_cache
+from reports.jobs import (
+    MAX_JOB_ATTEMPTS,
+    claim_next_job,
+    cleanup_expired_jobs,
+    process_job,
+    requeue_stale_jobs,
+    split_date_range,
+    submit_report_job,
+)
+from reports.models import ReportJob
+from reports.utils import date_range_filter, local_day_bounds
+from reports.views import get_branch_performance
+from sales.models import Sale, SaleItem
+from superadmin.models import Business, Branch
 
-# Create your tests here.
+
+class DateRangeFilterTestCase(TestCase):
+    def setUp(self):
+        self.business = Business.objects.create(
+            company_name="Report Business",
+            email="reports@example.com",
+            business_type="retail",
+        )
+
+    def test_bounds_are_aware_and_half_open(self):
+        """Local date ranges become [start midnight, day-after-end midnight)"""
+        with timezone.override("Africa/Kigali"):
+            start, end = local_day_bounds(date(2024, 3, 1), date(2024, 3, 31))
+
+            self.assertTrue(timezone.is_aware(start))
+            self.assertTrue(timezone.is_aware(end))
+            self.assertEqual(timezone.localtime(start).date(), date(2024, 3, 1))
+            self.assertEqual(timezone.localtime(end).date(), date(2024, 4, 1))
+            self.assertEqual(timezone.localtime(end).hour, 0)
+
+    def test_generated_sql_does_not_cast_column(self):
+        """The filter compares the raw column so an index on it can be used"""
+        today = timezone.localdate()
+        sales_sql = str(
+            Sale.objects.filter(**date_range_filter("sale_date", today)).query
+        )
+        items_sql = str(
+            SaleItem.objects.filter(
+                **date_range_filter("sale__sale_date", today, today)
+            ).query
+        )
+
+        for sql in (sales_sql, items_sql):
+            self.assertNotIn("cast_date", sql.lower())
+            self.assertNotIn("::date", sql.lower())
+            self.assertIn('"sale_date" >=', sql)
+            self.assertIn('"sale_date" <', sql)
+
+    def test_filter_matches_local_day(self):
+        """Sales are bucketed by local calendar day, not by UTC date"""
+        with timezone.override("Africa/Kigali"):
+            tz = timezone.get_current_timezone()
+            inside = Sale.objects.create(
+                business=self.business,
+                sale_date=timezone.make_aware(datetime(2024, 3, 1, 23, 30), tz),
+                total_amount=Decimal("10.00"),
+            )
+            Sale.objects.create(
+                business=self.business,
+                sale_date=timezone.make_aware(datetime(2024, 3, 2, 0, 0), tz),
+                total_amount=Decimal("20.00"),
+            )
+
+            sales = Sale.objects.filter(
+                business=self.business,
+                **date_range_filter("sale_date", date(2024, 3, 1)),
+            )
+
+            self.assertEqual(list(sales), [inside])
+
+
+class BranchPerformanceTestCase(TestCase):
+    def setUp(self):
+        self.business = Business.objects.create(
+            company_name="Chain Business",
+            email="chain@example.com",
+            business_type="retail",
+        )
+        self.branches = [
+            Branch.objects.create(
+                business=self.business, name=f"Branch {i}", address="Main St"
+            )
+            for i in range(3)
+        ]
+        self.product = Product.objects.create(
+            business=self.business,
+            name="Widget",
+            sku="W001",
+            quantity=Decimal("100"),
+            cost_price=Decimal("4.00"),
+            selling_price=Decimal("10.00"),
+        )
+        self.category = ExpenseCategory.objects.create(
+            business=self.business, name="Rent"
+        )
+        self.today = timezone.localdate()
+
+        for branch, quantity in zip(self.branches[:2], (Decimal("2"), Decimal("5"))):
+            sale = Sale.objects.create(business=self.business, branch=branch)
+            SaleItem.objects.create(
+                business=self.business,
+                sale=sale,
+                product=self.product,
+                quantity=quantity,
+                unit_price=Decimal("10.00"),
+                total_price=quantity * Decimal("10.00"),
+            )
+
+        Expense.objects.create(
+            business=self.business,
+            branch=self.branches[0],
+            category=self.category,
+            amount=Decimal("3.00"),
+            date=self.today,
+        )
+
+    def test_query_count_is_independent_of_branch_count(self):
+        with self.assertNumQueries(3):
+            performance = get_branch_performance(
+                self.business, self.branches, self.today, self.today
+            )
+
+        self.assertEqual(len(performance), 3)
+
+    def test_uses_real_cost_of_goods_sold(self):
+        performance = {
+            item["branch"].id: item
+            for item in get_branch_performance(
+                self.business, self.branches, self.today, self.today
+            )
+        }
+
+        first = performance[self.branches[0].id]
+        self.assertEqual(first["total_sales"], 20.0)
+        self.assertEqual(first["total_orders"], 1)
+        self.assertEqual(first["cogs"], 8.0)
+        self.assertEqual(first["total_expenses"], 3.0)
+        self.assertEqual(first["net_profit"], 9.0)
+
+        second = performance[self.branches[1].id]
+        self.assertEqual(second["total_sales"], 50.0)
+        self.assertEqual(second["net_profit"], 30.0)
+
+        empty = performance[self.branches[2].id]
+        self.assertEqual(empty["total_sales"], 0.0)
+        self.assertEqual(empty["profit_margin"], 0)
+
+
+class ReportCacheTestCase(TestCase):
+    def setUp(self):
+        report_cache.get_report_cache().clear()
+        self.business = Business.objects.create(
+            company_name="Cached Business",
+            email="cached@example.com",
+            business_type="retail",
+        )
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return {"total": Sale.objects.filter(business=self.business).count()}
+
+    def get_report(self, **kwargs):
+        return report_cache.get_or_compute(
+            "test_report",
+            self.business,
+            self.compute,
+            period=("2024-01-01", "2024-01-31"),
+            **kwargs,
+        )
+
+    def test_repeat_loads_are_served_from_cache(self):
+        self.assertEqual(self.get_report(), {"total": 0})
+        self.assertEqual(self.get_report(), {"total": 0})
+
+        self.assertEqual(self.calls, 1)
+        stats = report_cache.get_cache_stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["hit_rate"], 50.0)
+
+    def test_params_are_part_of_the_key(self):
+        self.get_report(params={"branch_id": 1})
+        self.get_report(params={"branch_id": 2})
+
+        self.assertEqual(self.calls, 2)
+
+    def test_sale_write_invalidates_cached_results(self):
+        self.get_report()
+        with self.captureOnCommitCallbacks(execute=True):
+            Sale.objects.create(business=self.business)
+
+        self.assertEqual(self.get_report(), {"total": 1})
+        self.assertEqual(self.calls, 2)
+
+    def test_results_computed_before_commit_are_not_served(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Sale.objects.create(business=self.business)
+            # Computed from the uncommitted write under the old version
+            self.get_report()
+
+        self.get_report()
+        self.assertEqual(self.calls, 2)
+
+
+class ReportJobTestCase(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+
+        self.user = User.objects.create_user(
+            username="reporter", password="testpass123", role="admin"
+        )
+        self.business = Business.objects.create(
+            company_name="Job Business",
+            email="jobs@example.com",
+            business_type="retail",
+            owner=self.user,
+        )
+        category = ExpenseCategory.objects.create(business=self.business, name="Rent")
+        for expense_date, amount in (
+            (date(2024, 1, 15), Decimal("100.00")),
+            (date(2024, 2, 20), Decimal("250.00")),
+        ):
+            Expense.objects.create(
+                business=self.business,
+                category=category,
+                amount=amount,
+                date=expense_date,
+                description=f"Rent {expense_date}",
+            )
+
+    def test_split_date_range_covers_range_without_gaps(self):
+        chunks = split_date_range(date(2024, 1, 1), date(2024, 3, 1), chunk_days=31)
+
+        self.assertEqual(
+            chunks,
+            [
+                (date(2024, 1, 1), date(2024, 1, 31)),
+                (date(2024, 2, 1), date(2024, 3, 1)),
+            ],
+        )
+
+    def test_worker_computes_job_in_chunks_and_stores_file(self):
+        with override_settings(MEDIA_ROOT=self.media_root, REPORT_JOB_CHUNK_DAYS=31):
+            submit_report_job(
+                self.business,
+                "expenses",
+                date(2024, 1, 1),
+                date(2024, 3, 1),
+                user=self.user,
+            )
+
+            job = process_job(claim_next_job())
+
+            self.assertEqual(job.status, "completed", job.error)
+            self.assertEqual(job.progress, 100)
+            self.assertIsNotNone(job.expires_at)
+            with job.result_file.open("rb") as result:
+                content = result.read().decode("utf-8")
+            # One report over both chunks, with totals for the whole range
+            self.assertEqual(content.count("Expenses Report"), 1)
+            self.assertEqual(content.count("Total Expenses"), 1)
+            self.assertIn("Total Expenses,$350.00", content)
+            self.assertLess(
+                content.index("Rent 2024-01-15"), content.index("Rent 2024-02-20")
+            )
+            self.assertTrue(
+                Notification.objects.filter(
+                    recipient=self.user, title="Report ready"
+                ).exists()
+            )
+            self.assertIsNone(claim_next_job())
+
+    def test_every_report_type_is_written_without_a_request(self):
+        with override_settings(MEDIA_ROOT=self.media_root, REPORT_JOB_CHUNK_DAYS=31):
+            for report_type, title in (
+                ("sales", "Sales Report"),
+                ("inventory", "Inventory Report"),
+                ("profit_loss", "Profit & Loss Report"),
+            ):
+                submit_report_job(
+                    self.business, report_type, date(2024, 1, 1), date(2024, 12, 31)
+                )
+                job = process_job(claim_next_job())
+
+                self.assertEqual(job.status, "completed", job.error)
+                with job.result_file.open("rb") as result:
+                    content = result.read().decode("utf-8")
+                self.assertEqual(content.count(title), 1)
+
+    def test_expired_jobs_are_removed_with_their_files(self):
+        with override_settings(MEDIA_ROOT=self.media_root):
+            submit_report_job(
+                self.business,
+                "expenses",
+                date(2024, 1, 1),
+                date(2024, 1, 31),
+                user=self.user,
+            )
+            job = process_job(claim_next_job())
+            storage = job.result_file.storage
+            name = job.result_file.name
+
+            ReportJob._base_manager.filter(id=job.id).update(
+                expires_at=timezone.now() - timedelta(minutes=1)
+            )
+
+            self.assertEqual(cleanup_expired_jobs(), 1)
+            self.assertFalse(storage.exists(name))
+            self.assertFalse(ReportJob._base_manager.filter(id=job.id).exists())
+
+    def test_jobs_left_running_by_a_dead_worker_are_requeued(self):
+        job = submit_report_job(
+            self.business, "expenses", date(2024, 1, 1), date(2024, 1, 31)
+        )
+        self.assertEqual(claim_next_job().id, job.id)
+        self.assertIsNone(claim_next_job())
+
+        # A live heartbeat keeps the job with its worker
+        self.assertEqual(requeue_stale_jobs(), 0)
+
+        stale = timezone.now() - timedelta(minutes=30)
+        ReportJob._base_manager.filter(id=job.id).update(heartbeat_at=stale)
+        with override_settings(REPORT_JOB_STALE_MINUTES=15):
+            self.assertEqual(requeue_stale_jobs(), 1)
+        self.assertEqual(claim_next_job().id, job.id)
+
+        # A job that keeps killing its worker is failed after its last attempt
+        ReportJob._base_manager.filter(id=job.id).update(
+            heartbeat_at=stale, attempts=MAX_JOB_ATTEMPTS
+        )
+        self.assertEqual(requeue_stale_jobs(), 0)
+        job.refresh_from_db()
+        self.assertEqual(job.status, "failed")
+        self.assertIsNone(claim_next_job())
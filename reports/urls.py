@@ -15,6 +15,13 @@ urlpatterns = [
         views.multi_branch_dashboard,
         name="multi_branch_dashboard",
     ),
+    path("jobs/", views.report_jobs, name="jobs"),
+    path("jobs/<int:job_id>/status/", views.report_job_status, name="job_status"),
+    path(
+        "jobs/<int:job_id>/download/",
+        views.report_job_download,
+        name="job_download",
+    ),
     path(
         "test-charts/", views.test_charts, name="test_charts"
     ),  # Added test charts URL
@@ -0,0 +1,98 @@
+from datetime import datetime, time, timedelta
+from django.utils import timezone
+
+
+def get_date_ranges():
+    """Get predefined date ranges for quick reporting"""
+    today = timezone.localdate()
+
+    # Daily
+    daily_start = today
+    daily_end = today
+
+    # Weekly (Monday to Sunday)
+    days_since_monday = today.weekday()
+    weekly_start = today - timedelta(days=days_since_monday)
+    weekly_end = weekly_start + timedelta(days=6)
+
+    # Monthly
+    monthly_start = today.replace(day=1)
+    if today.month == 12:
+        monthly_end = today.replace(day=31)
+    else:
+        next_month = today.replace(day=1, month=today.month + 1)
+        monthly_end = next_month - timedelta(days=1)
+
+    # Yearly
+    yearly_start = today.replace(month=1, day=1)
+    yearly_end = today.replace(month=12, day=31)
+
+    return {
+        "daily": {"start": daily_start, "end": daily_end},
+        "weekly": {"start": weekly_start, "end": weekly_end},
+        "monthly": {"start": monthly_start, "end": monthly_end},
+        "yearly": {"start": yearly_start, "end": yearly_end},
+    }
+
+
+def get_period_range(period, report_date):
+    """
+    Get the inclusive ``(start_date, end_date, period_name)`` for the daily,
+    weekly, monthly or yearly period containing ``report_date``.
+    """
+    if period == "daily":
+        return report_date, report_date, f"{report_date}"
+    if period == "weekly":
+        # Get the start of the week (Monday)
+        start_date = report_date - timedelta(days=report_date.weekday())
+        return start_date, start_date + timedelta(days=6), f"Week of {start_date}"
+    if period == "monthly":
+        start_date = report_date.replace(day=1)
+        if report_date.month == 12:
+            end_date = report_date.replace(day=31)
+        else:
+            # Get the first day of next month and subtract one day
+            next_month = report_date.replace(day=1, month=report_date.month + 1)
+            end_date = next_month - timedelta(days=1)
+        return start_date, end_date, report_date.strftime("%B %Y")
+    if period == "yearly":
+        return (
+            report_date.replace(month=1, day=1),
+            report_date.replace(month=12, day=31),
+            f"{report_date.year}",
+        )
+    raise ValueError(f"Unknown period: {period}")
+
+
+def local_day_bounds(start_date, end_date=None):
+    """
+    Convert an inclusive range of local dates into aware datetime bounds.
+
+    Returns a ``(start, end)`` tuple where ``start`` is local midnight of
+    ``start_date`` and ``end`` is local midnight of the day after
+    ``end_date``, so the range is half-open: ``start <= value < end``.
+    """
+    if end_date is None:
+        end_date = start_date
+
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(datetime.combine(start_date, time.min), tz)
+    end = timezone.make_aware(
+        datetime.combine(end_date + timedelta(days=1), time.min), tz
+    )
+    return start, end
+
+
+def date_range_filter(field, start_date, end_date=None):
+    """
+    Build queryset filter kwargs that select rows whose datetime ``field``
+    falls on a local date between ``start_date`` and ``end_date`` (inclusive).
+
+    Unlike ``field__date__gte``/``field__date__lte`` the column is compared
+    directly against datetime bounds, so the database can use an index on it.
+
+    Example:
+        Sale.objects.filter(**date_range_filter("sale_date", start, end))
+    """
+    start, end = local_day_bounds(start_date, end_date)
+    return {f"{field}__gte": start, f"{field}__lt": end}
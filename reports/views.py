@@ -2,7 +2,13 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.db.models import Sum, F, Q, Count
-from products.models import Product, StockMovement, StockAlert, InventoryTransfer
+from products.models import (
+    Product,
+    StockMovement,
+    StockAlert,
+    InventoryTransfer,
+    DemandForecast,
+)
 from sales.models import Sale, SaleItem
 from expenses.models import Expense
 from customers.models import Customer
@@ -13,8 +19,19 @@ from django.utils import timezone
 import json
 from decimal import Decimal
 import csv
-from django.http import HttpResponse
+from django.http import HttpResponse, JsonResponse, FileResponse, Http404
+from django.urls import reverse
+from django.views.decorators.http import require_http_methods
 from authentication.utils import check_user_permission
+from .utils import get_date_ranges, date_range_filter
+from . import cache as report_cache
+from .models import ReportJob
+from .exports import (
+    write_expenses_report,
+    write_inventory_report,
+    write_profit_loss_report,
+    write_sales_report,
+)
 
 
 @login_required
@@ -47,39 +64,6 @@ def report_list(request):
     return render(request, "reports/list.html", context)
 
 
-def get_date_ranges():
-    """Get predefined date ranges for quick reporting"""
-    today = timezone.now().date()
-
-    # Daily
-    daily_start = today
-    daily_end = today
-
-    # Weekly (Monday to Sunday)
-    days_since_monday = today.weekday()
-    weekly_start = today - timedelta(days=days_since_monday)
-    weekly_end = weekly_start + timedelta(days=6)
-
-    # Monthly
-    monthly_start = today.replace(day=1)
-    if today.month == 12:
-        monthly_end = today.replace(day=31)
-    else:
-        next_month = today.replace(day=1, month=today.month + 1)
-        monthly_end = next_month - timedelta(days=1)
-
-    # Yearly
-    yearly_start = today.replace(month=1, day=1)
-    yearly_end = today.replace(month=12, day=31)
-
-    return {
-        "daily": {"start": daily_start, "end": daily_end},
-        "weekly": {"start": weekly_start, "end": weekly_end},
-        "monthly": {"start": monthly_start, "end": monthly_end},
-        "yearly": {"start": yearly_start, "end": yearly_end},
-    }
-
-
 @login_required
 def quick_report(request, period):
     # Account owners have access to everything
@@ -99,7 +83,7 @@ def quick_report(request, period):
     end_date = date_ranges[period]["end"]
 
     # Get current branch from middleware if specified
-    from superadmin.middleware import get_current_branch
+    from superadmin.middleware import get_current_branch, get_current_business
 
     current_branch = get_current_branch()
     branch_id = request.GET.get("branch_id")
@@ -116,42 +100,72 @@ def quick_report(request, period):
     else:
         selected_branch = current_branch
 
-    # Get sales data
-    sales_queryset = Sale.objects.business_specific()
-    if selected_branch:
-        sales_queryset = sales_queryset.filter(branch=selected_branch)
-    sales = sales_queryset.filter(
-        sale_date__date__gte=start_date, sale_date__date__lte=end_date
-    )
-
-    total_sales = sales.aggregate(total=Sum("total_amount"))["total"] or Decimal("0")
-    total_orders = sales.count()
-
-    # Get expenses data
-    expenses_queryset = Expense.objects.business_specific()
-    if selected_branch:
-        expenses_queryset = expenses_queryset.filter(branch=selected_branch)
-    expenses = expenses_queryset.filter(date__gte=start_date, date__lte=end_date)
-    total_expenses = expenses.aggregate(total=Sum("amount"))["total"] or Decimal("0")
+    def compute_summary():
+        # Get sales data
+        sales_queryset = Sale.objects.business_specific()
+        if selected_branch:
+            sales_queryset = sales_queryset.filter(branch=selected_branch)
+        sales = sales_queryset.filter(
+            **date_range_filter("sale_date", start_date, end_date)
+        )
 
-    # Calculate profit
-    # For simplicity, we'll use a rough estimate of COGS as 60% of sales
-    estimated_cogs = total_sales * Decimal("0.6")
-    gross_profit = total_sales - estimated_cogs
-    net_profit = gross_profit - total_expenses
+        total_sales = sales.aggregate(total=Sum("total_amount"))["total"] or Decimal(
+            "0"
+        )
+        total_orders = sales.count()
+
+        # Get expenses data
+        expenses_queryset = Expense.objects.business_specific()
+        if selected_branch:
+            expenses_queryset = expenses_queryset.filter(branch=selected_branch)
+        expenses = expenses_queryset.filter(date__gte=start_date, date__lte=end_date)
+        total_expenses = expenses.aggregate(total=Sum("amount"))["total"] or Decimal(
+            "0"
+        )
 
-    # Get top selling products
-    sale_items_queryset = SaleItem.objects.business_specific()
-    if selected_branch:
-        sale_items_queryset = sale_items_queryset.filter(sale__branch=selected_branch)
-    top_products = (
-        sale_items_queryset.filter(
-            sale__sale_date__date__gte=start_date, sale__sale_date__date__lte=end_date
+        # Calculate profit
+        # For simplicity, we'll use a rough estimate of COGS as 60% of sales
+        estimated_cogs = total_sales * Decimal("0.6")
+        gross_profit = total_sales - estimated_cogs
+        net_profit = gross_profit - total_expenses
+
+        # Get top selling products
+        sale_items_queryset = SaleItem.objects.business_specific()
+        if selected_branch:
+            sale_items_queryset = sale_items_queryset.filter(
+                sale__branch=selected_branch
+            )
+        top_products = (
+            sale_items_queryset.filter(
+                **date_range_filter("sale__sale_date", start_date, end_date)
+            )
+            .values("product__name")
+            .annotate(total_sold=Sum("quantity"), total_revenue=Sum("total_price"))
+            .order_by("-total_sold")[:5]
         )
-        .values("product__name")
-        .annotate(total_sold=Sum("quantity"), total_revenue=Sum("total_price"))
-        .order_by("-total_sold")[:5]
+
+        return {
+            "total_sales": total_sales,
+            "total_orders": total_orders,
+            "total_expenses": total_expenses,
+            "gross_profit": gross_profit,
+            "net_profit": net_profit,
+            "top_products": list(top_products),
+        }
+
+    summary = report_cache.get_or_compute(
+        "quick_report",
+        get_current_business(),
+        compute_summary,
+        branch=selected_branch,
+        period=(start_date, end_date),
     )
+    total_sales = summary["total_sales"]
+    total_orders = summary["total_orders"]
+    total_expenses = summary["total_expenses"]
+    gross_profit = summary["gross_profit"]
+    net_profit = summary["net_profit"]
+    top_products = summary["top_products"]
 
     # Generate recommendations based on the data
     recommendations = generate_recommendations(
@@ -392,7 +406,7 @@ def export_quick_report_csv(
 @login_required
 def sales_report(request):
     # Get date range from request or use defaults
-    end_date = timezone.now().date()
+    end_date = timezone.localdate()
     start_date = end_date - timedelta(days=30)
 
     if "start_date" in request.GET and request.GET["start_date"]:
@@ -429,42 +443,68 @@ def sales_report(request):
         sales_queryset = sales_queryset.filter(branch=selected_branch)
 
     sales = sales_queryset.filter(
-        sale_date__date__gte=start_date, sale_date__date__lte=end_date
+        **date_range_filter("sale_date", start_date, end_date)
     )
 
-    # Group sales by date for chart data
-    daily_sales = (
-        sales.extra(select={"date": "date(sale_date)"})
-        .values("date")
-        .annotate(total=Sum("total_amount"), count=Count("id"))
-        .order_by("date")
-    )
+    def compute_summary():
+        # Group sales by date for chart data
+        daily_sales = (
+            sales.extra(select={"date": "date(sale_date)"})
+            .values("date")
+            .annotate(total=Sum("total_amount"), count=Count("id"))
+            .order_by("date")
+        )
 
-    # Calculate totals
-    total_sales = sales.aggregate(total=Sum("total_amount"))["total"] or Decimal("0")
-    total_orders = sales.count()
+        # Calculate totals
+        total_sales = sales.aggregate(total=Sum("total_amount"))["total"] or Decimal(
+            "0"
+        )
+        total_orders = sales.count()
 
-    # Get top selling products
-    sale_items_queryset = SaleItem.objects.business_specific()
-    if selected_branch:
-        sale_items_queryset = sale_items_queryset.filter(sale__branch=selected_branch)
+        # Get top selling products
+        sale_items_queryset = SaleItem.objects.business_specific()
+        if selected_branch:
+            sale_items_queryset = sale_items_queryset.filter(
+                sale__branch=selected_branch
+            )
 
-    top_products = (
-        sale_items_queryset.filter(
-            sale__sale_date__date__gte=start_date, sale__sale_date__date__lte=end_date
+        top_products = (
+            sale_items_queryset.filter(
+                **date_range_filter("sale__sale_date", start_date, end_date)
+            )
+            .values("product__name")
+            .annotate(total_sold=Sum("quantity"), total_revenue=Sum("total_price"))
+            .order_by("-total_sold")[:10]
+        )
+
+        # Get hourly sales data for peak hours analysis
+        hourly_sales = (
+            sales.extra(select={"hour": "extract(hour from sale_date)"})
+            .values("hour")
+            .annotate(count=Count("id"), total=Sum("total_amount"))
+            .order_by("hour")
         )
-        .values("product__name")
-        .annotate(total_sold=Sum("quantity"), total_revenue=Sum("total_price"))
-        .order_by("-total_sold")[:10]
-    )
 
-    # Get hourly sales data for peak hours analysis
-    hourly_sales = (
-        sales.extra(select={"hour": "extract(hour from sale_date)"})
-        .values("hour")
-        .annotate(count=Count("id"), total=Sum("total_amount"))
-        .order_by("hour")
+        return {
+            "daily_sales": list(daily_sales),
+            "total_sales": total_sales,
+            "total_orders": total_orders,
+            "top_products": list(top_products),
+            "hourly_sales": list(hourly_sales),
+        }
+
+    summary = report_cache.get_or_compute(
+        "sales",
+        current_business,
+        compute_summary,
+        branch=selected_branch,
+        period=(start_date, end_date),
     )
+    daily_sales = summary["daily_sales"]
+    total_sales = summary["total_sales"]
+    total_orders = summary["total_orders"]
+    top_products = summary["top_products"]
+    hourly_sales = summary["hourly_sales"]
 
     # Get business settings
     from settings.models import BusinessSettings
@@ -499,70 +539,35 @@ def sales_report(request):
     return render(request, "reports/sales.html", context)
 
 
-def export_sales_report_csv(request, context):
-    """Export sales report data to CSV with recommendations"""
-    # Create the HttpResponse object with CSV header
+def _csv_export(filename, write_report, context):
+    """CSV download of a report written by one of the reports.exports writers"""
+    from superadmin.middleware import get_current_business
+
     response = HttpResponse(content_type="text/csv")
-    response["Content-Disposition"] = (
-        f'attachment; filename="sales_report_{context["start_date"]}_to_{context["end_date"]}.csv"'
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    write_report(
+        csv.writer(response),
+        get_current_business(),
+        context["current_branch"],
+        context["start_date"],
+        context["end_date"],
     )
+    return response
 
-    writer = csv.writer(response)
 
-    # Write header
-    writer.writerow(
-        ["Sales Report", f"From {context['start_date']} to {context['end_date']}"]
+def export_sales_report_csv(request, context):
+    """Export sales report data to CSV"""
+    return _csv_export(
+        f'sales_report_{context["start_date"]}_to_{context["end_date"]}.csv',
+        write_sales_report,
+        context,
     )
-    writer.writerow([])
-
-    # Write sales data
-    writer.writerow(["Sales"])
-    writer.writerow(["ID", "Date", "Customer", "Total Amount"])
-    for sale in context["sales"]:
-        writer.writerow(
-            [
-                sale.id,
-                sale.sale_date.strftime("%Y-%m-%d"),
-                sale.customer.name if sale.customer else "Walk-in",
-                f"${float(sale.total_amount):.2f}",
-            ]
-        )
-
-    writer.writerow([])
-
-    # Write daily sales summary
-    writer.writerow(["Daily Sales"])
-    writer.writerow(["Date", "Total Sales", "Total Orders"])
-    for item in context["daily_sales"]:
-        writer.writerow(
-            [
-                item["date"],
-                f"${float(item['total']):.2f}",
-                item["count"],
-            ]
-        )
-
-    writer.writerow([])
-
-    # Write top selling products
-    writer.writerow(["Top Selling Products"])
-    writer.writerow(["Product", "Quantity Sold", "Total Revenue"])
-    for product in context["top_products"]:
-        writer.writerow(
-            [
-                product["product__name"],
-                product["total_sold"],
-                f"${float(product['total_revenue']):.2f}",
-            ]
-        )
-
-    return response
 
 
 @login_required
 def inventory_report(request):
     # Get date range from request or use defaults
-    end_date = timezone.now().date()
+    end_date = timezone.localdate()
     start_date = end_date - timedelta(days=30)
 
     if "start_date" in request.GET and request.GET["start_date"]:
@@ -611,7 +616,7 @@ def inventory_report(request):
 
     recent_movements = (
         stock_movements_queryset.filter(
-            created_at__date__gte=start_date, created_at__date__lte=end_date
+            **date_range_filter("created_at", start_date, end_date)
         )
         .select_related("product", "created_by")
         .order_by("-created_at")[:50]
@@ -626,7 +631,7 @@ def inventory_report(request):
 
     recent_alerts = (
         stock_alerts_queryset.filter(
-            created_at__date__gte=start_date, created_at__date__lte=end_date
+            **date_range_filter("created_at", start_date, end_date)
         )
         .select_related("product")
         .order_by("-created_at")[:20]
@@ -642,14 +647,24 @@ def inventory_report(request):
 
     recent_transfers = (
         transfers_queryset.filter(
-            created_at__date__gte=start_date, created_at__date__lte=end_date
-        )
-        .select_related(
-            "from_branch", "to_branch", "product", "product_variant", "created_by"
+            **date_range_filter("created_at", start_date, end_date)
         )
+        .select_related("from_branch", "to_branch", "created_by")
+        .annotate(line_count=Count("lines"))
         .order_by("-created_at")[:20]
     )
 
+    # Get reorder suggestions from the nightly demand forecast
+    forecasts_queryset = DemandForecast.objects.business_specific()
+    if selected_branch:
+        forecasts_queryset = forecasts_queryset.filter(product__branch=selected_branch)
+
+    reorder_suggestions = (
+        forecasts_queryset.filter(reorder_quantity__gt=0, product__is_active=True)
+        .select_related("product", "product__unit")
+        .order_by(F("days_of_cover").asc(nulls_last=True))[:50]
+    )
+
     # Calculate inventory statistics
     total_products = products_queryset.count()
     low_stock_count = low_stock_products.count()
@@ -676,6 +691,7 @@ def inventory_report(request):
         "recent_movements": recent_movements,
         "recent_alerts": recent_alerts,
         "recent_transfers": recent_transfers,
+        "reorder_suggestions": reorder_suggestions,
         "total_products": total_products,
         "low_stock_count": low_stock_count,
         "inventory_value": float(inventory_value),
@@ -694,90 +710,14 @@ def inventory_report(request):
 
 
 def export_inventory_report_csv(request, context):
-    """Export inventory report data to CSV with recommendations"""
-    # Create the HttpResponse object with CSV header
-    response = HttpResponse(content_type="text/csv")
-    response["Content-Disposition"] = 'attachment; filename="inventory_report.csv"'
-
-    writer = csv.writer(response)
-
-    # Write header
-    writer.writerow(["Inventory Report"])
-    writer.writerow([])
-
-    # Write low stock products
-    writer.writerow(["Low Stock Products (Below Reorder Level)"])
-    writer.writerow(["Product", "SKU", "Current Stock", "Reorder Level", "Category"])
-
-    low_stock_products = (
-        Product.objects.business_specific()
-        .filter(quantity__lte=F("reorder_level"), is_active=True)
-        .select_related("category")
-    )
-
-    for product in low_stock_products:
-        writer.writerow(
-            [
-                product.name,
-                product.sku,
-                product.quantity,
-                product.reorder_level,
-                product.category.name if product.category else "",
-            ]
-        )
-
-    writer.writerow([])
-
-    # Write out of stock products
-    writer.writerow(["Out of Stock Products"])
-    writer.writerow(["Product", "SKU", "Category"])
-
-    out_of_stock_products = (
-        Product.objects.business_specific()
-        .filter(quantity=0, is_active=True)
-        .select_related("category")
-    )
-
-    for product in out_of_stock_products:
-        writer.writerow(
-            [
-                product.name,
-                product.sku,
-                product.category.name if product.category else "",
-            ]
-        )
-
-    writer.writerow([])
-
-    # Write expired products
-    writer.writerow(["Expired Products"])
-    writer.writerow(["Product", "SKU", "Expiry Date", "Current Stock", "Category"])
-
-    today = timezone.now().date()
-    expired_products = (
-        Product.objects.business_specific()
-        .filter(expiry_date__lt=today, is_active=True)
-        .select_related("category")
-    )
-
-    for product in expired_products:
-        writer.writerow(
-            [
-                product.name,
-                product.sku,
-                product.expiry_date,
-                product.quantity,
-                product.category.name if product.category else "",
-            ]
-        )
-
-    return response
+    """Export inventory report data to CSV"""
+    return _csv_export("inventory_report.csv", write_inventory_report, context)
 
 
 @login_required
 def profit_loss_report(request):
     # Get date range from request or use defaults
-    end_date = timezone.now().date()
+    end_date = timezone.localdate()
     start_date = end_date - timedelta(days=30)
 
     if "start_date" in request.GET and request.GET["start_date"]:
@@ -814,7 +754,7 @@ def profit_loss_report(request):
         sales_queryset = sales_queryset.filter(branch=selected_branch)
 
     sales = sales_queryset.filter(
-        sale_date__date__gte=start_date, sale_date__date__lte=end_date
+        **date_range_filter("sale_date", start_date, end_date)
     )
 
     # Get expenses data
@@ -824,58 +764,102 @@ def profit_loss_report(request):
 
     expenses = expenses_queryset.filter(date__gte=start_date, date__lte=end_date)
 
-    # Calculate sales totals
-    total_sales = sales.aggregate(total=Sum("total_amount"))["total"] or Decimal("0")
-    total_orders = sales.count()
+    def compute_summary():
+        # Calculate sales totals
+        total_sales = sales.aggregate(total=Sum("total_amount"))["total"] or Decimal(
+            "0"
+        )
+        total_orders = sales.count()
 
-    # Calculate expense totals
-    total_expenses = expenses.aggregate(total=Sum("amount"))["total"] or Decimal("0")
-    expense_count = expenses.count()
+        # Calculate expense totals
+        total_expenses = expenses.aggregate(total=Sum("amount"))["total"] or Decimal(
+            "0"
+        )
+        expense_count = expenses.count()
 
-    # Calculate profit metrics
-    # For simplicity, we'll use a rough estimate of COGS as 60% of sales
-    estimated_cogs = total_sales * Decimal("0.6")
-    gross_profit = total_sales - estimated_cogs
-    net_profit = gross_profit - total_expenses
+        # Calculate profit metrics
+        # For simplicity, we'll use a rough estimate of COGS as 60% of sales
+        estimated_cogs = total_sales * Decimal("0.6")
+        gross_profit = total_sales - estimated_cogs
+        net_profit = gross_profit - total_expenses
 
-    # Calculate profit margins
-    profit_margin = (
-        (float(net_profit) / float(total_sales) * 100) if float(total_sales) > 0 else 0
-    )
-    gross_profit_margin = (
-        (float(gross_profit) / float(total_sales) * 100)
-        if float(total_sales) > 0
-        else 0
-    )
+        # Calculate profit margins
+        profit_margin = (
+            (float(net_profit) / float(total_sales) * 100)
+            if float(total_sales) > 0
+            else 0
+        )
+        gross_profit_margin = (
+            (float(gross_profit) / float(total_sales) * 100)
+            if float(total_sales) > 0
+            else 0
+        )
 
-    # Group sales by date for chart data
-    daily_sales = (
-        sales.extra(select={"date": "date(sale_date)"})
-        .values("date")
-        .annotate(total=Sum("total_amount"))
-        .order_by("date")
-    )
+        # Group sales by date for chart data
+        daily_sales = (
+            sales.extra(select={"date": "date(sale_date)"})
+            .values("date")
+            .annotate(total=Sum("total_amount"))
+            .order_by("date")
+        )
 
-    # Group expenses by category
-    expense_categories = (
-        expenses.values("category")
-        .annotate(total=Sum("amount"), count=Count("id"))
-        .order_by("-total")
-    )
+        # Group expenses by category
+        expense_categories = (
+            expenses.values("category")
+            .annotate(total=Sum("amount"), count=Count("id"))
+            .order_by("-total")
+        )
 
-    # Get top selling products
-    sale_items_queryset = SaleItem.objects.business_specific()
-    if selected_branch:
-        sale_items_queryset = sale_items_queryset.filter(sale__branch=selected_branch)
+        # Get top selling products
+        sale_items_queryset = SaleItem.objects.business_specific()
+        if selected_branch:
+            sale_items_queryset = sale_items_queryset.filter(
+                sale__branch=selected_branch
+            )
 
-    top_products = (
-        sale_items_queryset.filter(
-            sale__sale_date__date__gte=start_date, sale__sale_date__date__lte=end_date
+        top_products = (
+            sale_items_queryset.filter(
+                **date_range_filter("sale__sale_date", start_date, end_date)
+            )
+            .values("product__name")
+            .annotate(total_sold=Sum("quantity"), total_revenue=Sum("total_price"))
+            .order_by("-total_revenue")[:10]
         )
-        .values("product__name")
-        .annotate(total_sold=Sum("quantity"), total_revenue=Sum("total_price"))
-        .order_by("-total_revenue")[:10]
+
+        return {
+            "total_sales": total_sales,
+            "total_orders": total_orders,
+            "total_expenses": total_expenses,
+            "expense_count": expense_count,
+            "estimated_cogs": estimated_cogs,
+            "gross_profit": gross_profit,
+            "net_profit": net_profit,
+            "profit_margin": profit_margin,
+            "gross_profit_margin": gross_profit_margin,
+            "daily_sales": list(daily_sales),
+            "expense_categories": list(expense_categories),
+            "top_products": list(top_products),
+        }
+
+    summary = report_cache.get_or_compute(
+        "profit_loss",
+        current_business,
+        compute_summary,
+        branch=selected_branch,
+        period=(start_date, end_date),
     )
+    total_sales = summary["total_sales"]
+    total_orders = summary["total_orders"]
+    total_expenses = summary["total_expenses"]
+    expense_count = summary["expense_count"]
+    estimated_cogs = summary["estimated_cogs"]
+    gross_profit = summary["gross_profit"]
+    net_profit = summary["net_profit"]
+    profit_margin = summary["profit_margin"]
+    gross_profit_margin = summary["gross_profit_margin"]
+    daily_sales = summary["daily_sales"]
+    expense_categories = summary["expense_categories"]
+    top_products = summary["top_products"]
 
     # Get business settings
     from settings.models import BusinessSettings
@@ -918,131 +902,21 @@ def profit_loss_report(request):
 
 def export_profit_loss_report_csv(request, context):
     """Export profit/loss report data to CSV"""
-    # Create the HttpResponse object with CSV header
-    response = HttpResponse(content_type="text/csv")
-    response["Content-Disposition"] = (
-        f'attachment; filename="profit_loss_report_{context["start_date"]}_to_{context["end_date"]}.csv"'
+    return _csv_export(
+        f'profit_loss_report_{context["start_date"]}_to_{context["end_date"]}.csv',
+        write_profit_loss_report,
+        context,
     )
 
-    writer = csv.writer(response)
-
-    # Write header
-    writer.writerow(
-        [
-            "Profit & Loss Report",
-            f"From {context['start_date']} to {context['end_date']}",
-        ]
-    )
-    writer.writerow([])
-
-    # Write summary data
-    writer.writerow(["Financial Summary"])
-    writer.writerow(["Metric", "Value"])
-    writer.writerow(["Sales Revenue", f"${context['total_sales']:.2f}"])
-    writer.writerow(["Number of Orders", context["total_orders"]])
-    writer.writerow(["Operating Expenses", f"${context['total_expenses']:.2f}"])
-    writer.writerow(["Expense Entries", context["expense_count"]])
-    writer.writerow(["Estimated COGS", f"${context['estimated_cogs']:.2f}"])
-    writer.writerow(["Gross Profit", f"${context['gross_profit']:.2f}"])
-    writer.writerow(["Net Profit", f"${context['net_profit']:.2f}"])
-    writer.writerow(["Gross Profit Margin", f"{context['gross_profit_margin']:.2f}%"])
-    writer.writerow(["Net Profit Margin", f"{context['profit_margin']:.2f}%"])
-    writer.writerow([])
-
-    # Write daily sales data
-    writer.writerow(["Daily Sales"])
-    writer.writerow(["Date", "Total Sales"])
-    for item in context["daily_sales"]:
-        writer.writerow([item["date"], f"${float(item['total']):.2f}"])
-    writer.writerow([])
-
-    # Write expenses by category
-    writer.writerow(["Expenses by Category"])
-    writer.writerow(["Category", "Total Amount", "Number of Entries"])
-    for category in context["expense_categories"]:
-        writer.writerow(
-            [
-                category["category"] or "Uncategorized",
-                f"${float(category['total']):.2f}",
-                category["count"],
-            ]
-        )
-    writer.writerow([])
-
-    # Write top selling products
-    writer.writerow(["Top Selling Products"])
-    writer.writerow(["Product", "Quantity Sold", "Total Revenue"])
-    for product in context["top_products"]:
-        writer.writerow(
-            [
-                product["product__name"],
-                product["total_sold"],
-                f"${float(product['total_revenue']):.2f}",
-            ]
-        )
-
-    return response
-
 
 def export_expenses_report_csv(request, context):
     """Export expenses report data to CSV"""
-    # Create the HttpResponse object with CSV header
-    response = HttpResponse(content_type="text/csv")
-    response["Content-Disposition"] = (
-        f'attachment; filename="expenses_report_{context["start_date"]}_to_{context["end_date"]}.csv"'
+    return _csv_export(
+        f'expenses_report_{context["start_date"]}_to_{context["end_date"]}.csv',
+        write_expenses_report,
+        context,
     )
 
-    writer = csv.writer(response)
-
-    # Write header
-    writer.writerow(
-        ["Expenses Report", f"From {context['start_date']} to {context['end_date']}"]
-    )
-    writer.writerow([])
-
-    # Write summary data
-    writer.writerow(["Summary"])
-    writer.writerow(["Metric", "Value"])
-    writer.writerow(["Total Expenses", f"${context['total_expenses']:.2f}"])
-    writer.writerow(["Number of Expenses", context["expense_count"]])
-    writer.writerow([])
-
-    # Write expenses by category
-    writer.writerow(["Expenses by Category"])
-    writer.writerow(["Category", "Total Amount", "Number of Expenses"])
-    for category in context["expense_categories"]:
-        writer.writerow(
-            [
-                category["category"] or "Uncategorized",
-                f"${float(category['total']):.2f}",
-                category["count"],
-            ]
-        )
-    writer.writerow([])
-
-    # Write daily expenses
-    writer.writerow(["Daily Expenses"])
-    writer.writerow(["Date", "Total Amount"])
-    for item in context["daily_expenses"]:
-        writer.writerow([item["date"], f"${float(item['total']):.2f}"])
-    writer.writerow([])
-
-    # Write recent expenses
-    writer.writerow(["Recent Expenses"])
-    writer.writerow(["Date", "Category", "Description", "Amount", "Branch"])
-    for expense in context["recent_expenses"]:
-        writer.writerow(
-            [
-                expense.date.strftime("%Y-%m-%d") if expense.date else "",
-                expense.category.name if expense.category else "Uncategorized",
-                expense.description,
-                f"${float(expense.amount):.2f}",
-                expense.branch.name if expense.branch else "",
-            ]
-        )
-
-    return response
-
 
 def export_profit_loss_report_csv_with_recommendations(request, start_date, end_date):
     """Export profit & loss report data to CSV with recommendations"""
@@ -1060,13 +934,13 @@ def export_profit_loss_report_csv_with_recommendations(request, start_date, end_
 
     # Calculate sales revenue
     sales = Sale.objects.business_specific().filter(
-        sale_date__date__gte=start_date, sale_date__date__lte=end_date
+        **date_range_filter("sale_date", start_date, end_date)
     )
     sales_revenue = sales.aggregate(total=Sum("total_amount"))["total"] or Decimal("0")
 
     # Calculate cost of goods sold (COGS)
     sale_items = SaleItem.objects.business_specific().filter(
-        sale__sale_date__date__gte=start_date, sale__sale_date__date__lte=end_date
+        **date_range_filter("sale__sale_date", start_date, end_date)
     )
 
     cogs = Decimal("0")
@@ -1131,15 +1005,14 @@ def export_profit_loss_report_csv_with_recommendations(request, start_date, end_
 
         # Calculate monthly data
         monthly_sales = Sale.objects.business_specific().filter(
-            sale_date__date__gte=current_month, sale_date__date__lte=month_end
+            **date_range_filter("sale_date", current_month, month_end)
         )
         monthly_revenue = monthly_sales.aggregate(total=Sum("total_amount"))[
             "total"
         ] or Decimal("0")
 
         monthly_items = SaleItem.objects.business_specific().filter(
-            sale__sale_date__date__gte=current_month,
-            sale__sale_date__date__lte=month_end,
+            **date_range_filter("sale__sale_date", current_month, month_end),
         )
         monthly_cogs = Decimal("0")
         for monthly_item in monthly_items:
@@ -1296,7 +1169,7 @@ def generate_profit_loss_recommendations(
 @login_required
 def expenses_report(request):
     # Get date range from request or use defaults
-    end_date = timezone.now().date()
+    end_date = timezone.localdate()
     start_date = end_date - timedelta(days=30)
 
     if "start_date" in request.GET and request.GET["start_date"]:
@@ -1333,47 +1206,75 @@ def expenses_report(request):
         expenses_queryset = expenses_queryset.filter(branch=selected_branch)
     expenses = expenses_queryset.filter(date__gte=start_date, date__lte=end_date)
 
-    # Calculate total expenses
-    total_expenses = expenses.aggregate(total=Sum("amount"))["total"] or Decimal("0")
-    expense_count = expenses.count()
-
-    # Group expenses by category with count
-    expense_by_category = (
-        expenses.values("category__name")
-        .annotate(total=Sum("amount"), count=Count("id"))
-        .order_by("-total")
-    )
-
-    # Prepare data for expense trend chart
-    expense_trend_data = (
-        expenses.extra({"date": "date(date)"})
-        .values("date")
-        .annotate(total=Sum("amount"))
-        .order_by("date")
-    )
-
-    # Fix: Handle the case where item['date'] might already be a string
-    expense_dates = []
-    expense_amounts = []
+    def compute_summary():
+        # Calculate total expenses
+        total_expenses = expenses.aggregate(total=Sum("amount"))["total"] or Decimal(
+            "0"
+        )
+        expense_count = expenses.count()
 
-    for item in expense_trend_data:
-        if isinstance(item["date"], str):
-            # Already a string, use as is
-            expense_dates.append(item["date"])
-        else:
-            # Convert date object to string
-            expense_dates.append(item["date"].strftime("%Y-%m-%d"))
-        expense_amounts.append(float(item["total"]))
+        # Group expenses by category with count
+        expense_by_category = (
+            expenses.values("category__name")
+            .annotate(total=Sum("amount"), count=Count("id"))
+            .order_by("-total")
+        )
 
-    # Prepare data for category chart
-    category_names = [item["category__name"] for item in expense_by_category]
-    category_amounts = [float(item["total"]) for item in expense_by_category]
+        # Prepare data for expense trend chart
+        expense_trend_data = (
+            expenses.extra({"date": "date(date)"})
+            .values("date")
+            .annotate(total=Sum("amount"))
+            .order_by("date")
+        )
 
-    # Convert to JSON for JavaScript
-    expense_dates_json = json.dumps(expense_dates)
-    expense_amounts_json = json.dumps(expense_amounts)
-    category_names_json = json.dumps(category_names)
-    category_amounts_json = json.dumps(category_amounts)
+        # Fix: Handle the case where item['date'] might already be a string
+        expense_dates = []
+        expense_amounts = []
+
+        for item in expense_trend_data:
+            if isinstance(item["date"], str):
+                # Already a string, use as is
+                expense_dates.append(item["date"])
+            else:
+                # Convert date object to string
+                expense_dates.append(item["date"].strftime("%Y-%m-%d"))
+            expense_amounts.append(float(item["total"]))
+
+        # Prepare data for category chart
+        category_names = [item["category__name"] for item in expense_by_category]
+        category_amounts = [float(item["total"]) for item in expense_by_category]
+
+        # Convert to JSON for JavaScript
+        expense_dates_json = json.dumps(expense_dates)
+        expense_amounts_json = json.dumps(expense_amounts)
+        category_names_json = json.dumps(category_names)
+        category_amounts_json = json.dumps(category_amounts)
+
+        return {
+            "total_expenses": total_expenses,
+            "expense_count": expense_count,
+            "expense_by_category": list(expense_by_category),
+            "expense_dates_json": expense_dates_json,
+            "expense_amounts_json": expense_amounts_json,
+            "category_names_json": category_names_json,
+            "category_amounts_json": category_amounts_json,
+        }
+
+    summary = report_cache.get_or_compute(
+        "expenses",
+        current_business,
+        compute_summary,
+        branch=selected_branch,
+        period=(start_date, end_date),
+    )
+    total_expenses = summary["total_expenses"]
+    expense_count = summary["expense_count"]
+    expense_by_category = summary["expense_by_category"]
+    expense_dates_json = summary["expense_dates_json"]
+    expense_amounts_json = summary["expense_amounts_json"]
+    category_names_json = summary["category_names_json"]
+    category_amounts_json = summary["category_amounts_json"]
 
     # Get business settings
     from settings.models import BusinessSettings
@@ -1388,6 +1289,7 @@ def expenses_report(request):
     )
 
     context = {
+        "expenses": expenses,
         "start_date": start_date,
         "end_date": end_date,
         "total_expenses": float(total_expenses),
@@ -1466,67 +1368,64 @@ def generate_expense_recommendations(
     return recommendations
 
 
-# Centralized dashboard for multi-branch monitoring
-@login_required
-def multi_branch_dashboard(request):
-    """Centralized dashboard showing performance across all branches"""
-    # Account owners have access to everything
-    if request.user.role != "admin" and not check_user_permission(
-        request.user, "can_access_reports"
-    ):
-        messages.error(request, "You do not have permission to access reports.")
-        return redirect("dashboard:index")
-
-    # Get current business from middleware
-    from superadmin.middleware import get_current_business
-
-    current_business = get_current_business()
-
-    if not current_business:
-        messages.error(request, "No business context found.")
-        return redirect("dashboard:index")
-
-    # Get all active branches for this business
-    branches = Branch.objects.filter(business=current_business, is_active=True)
-
-    # Get date range (last 30 days)
-    end_date = timezone.now().date()
-    start_date = end_date - timedelta(days=30)
-
-    # Collect branch performance data
-    branch_performance = []
-    total_sales_all_branches = Decimal("0")
-    total_expenses_all_branches = Decimal("0")
-    total_net_profit_all_branches = Decimal("0")
-
-    for branch in branches:
-        # Get sales data for this branch
-        branch_sales = Sale.objects.filter(
-            business=current_business,
-            branch=branch,
-            sale_date__date__gte=start_date,
-            sale_date__date__lte=end_date,
+def get_branch_performance(business, branches, start_date, end_date):
+    """
+    Compute sales, orders, COGS, expenses and profit for each branch.
+
+    Uses a fixed number of grouped queries (sales, cost of goods sold and
+    expenses, each grouped by branch) regardless of how many branches the
+    business has, and merges the results in Python.
+    """
+    # Use the base managers so the current branch context does not restrict
+    # a dashboard that is meant to compare every branch.
+    branch_ids = [branch.id for branch in branches]
+
+    sales_by_branch = {
+        row["branch"]: row
+        for row in Sale._base_manager.filter(
+            business=business,
+            branch__in=branch_ids,
+            **date_range_filter("sale_date", start_date, end_date),
         )
+        .values("branch")
+        .annotate(total=Sum("total_amount"), orders=Count("id"))
+        .order_by()
+    }
 
-        branch_total_sales = branch_sales.aggregate(total=Sum("total_amount"))[
-            "total"
-        ] or Decimal("0")
-        branch_total_orders = branch_sales.count()
+    cogs_by_branch = {
+        row["sale__branch"]: row["cogs"]
+        for row in SaleItem._base_manager.filter(
+            sale__business=business,
+            sale__branch__in=branch_ids,
+            **date_range_filter("sale__sale_date", start_date, end_date),
+        )
+        .values("sale__branch")
+        .annotate(cogs=Sum(F("quantity") * F("product__cost_price")))
+        .order_by()
+    }
 
-        # Get expenses data for this branch
-        branch_expenses = Expense.objects.filter(
-            business=current_business,
-            branch=branch,
+    expenses_by_branch = {
+        row["branch"]: row["total"]
+        for row in Expense._base_manager.filter(
+            business=business,
+            branch__in=branch_ids,
             date__gte=start_date,
             date__lte=end_date,
         )
-        branch_total_expenses = branch_expenses.aggregate(total=Sum("amount"))[
-            "total"
-        ] or Decimal("0")
+        .values("branch")
+        .annotate(total=Sum("amount"))
+        .order_by()
+    }
 
-        # Calculate profit
-        estimated_cogs = branch_total_sales * Decimal("0.6")
-        branch_gross_profit = branch_total_sales - estimated_cogs
+    branch_performance = []
+    for branch in branches:
+        sales_row = sales_by_branch.get(branch.id, {})
+        branch_total_sales = sales_row.get("total") or Decimal("0")
+        branch_total_orders = sales_row.get("orders") or 0
+        branch_cogs = cogs_by_branch.get(branch.id) or Decimal("0")
+        branch_total_expenses = expenses_by_branch.get(branch.id) or Decimal("0")
+
+        branch_gross_profit = branch_total_sales - branch_cogs
         branch_net_profit = branch_gross_profit - branch_total_expenses
 
         # Calculate profit margin
@@ -1541,29 +1440,84 @@ def multi_branch_dashboard(request):
                 "branch": branch,
                 "total_sales": float(branch_total_sales),
                 "total_orders": branch_total_orders,
+                "cogs": float(branch_cogs),
                 "total_expenses": float(branch_total_expenses),
+                "gross_profit": float(branch_gross_profit),
                 "net_profit": float(branch_net_profit),
                 "profit_margin": profit_margin,
             }
         )
 
-        total_sales_all_branches += branch_total_sales
-        total_expenses_all_branches += branch_total_expenses
-        total_net_profit_all_branches += branch_net_profit
+    return branch_performance
+
+
+# Centralized dashboard for multi-branch monitoring
+@login_required
+def multi_branch_dashboard(request):
+    """Centralized dashboard showing performance across all branches"""
+    # Account owners have access to everything
+    if request.user.role != "admin" and not check_user_permission(
+        request.user, "can_access_reports"
+    ):
+        messages.error(request, "You do not have permission to access reports.")
+        return redirect("dashboard:index")
+
+    # Get current business from middleware
+    from superadmin.middleware import get_current_business
+
+    current_business = get_current_business()
+
+    if not current_business:
+        messages.error(request, "No business context found.")
+        return redirect("dashboard:index")
+
+    # Get all active branches for this business
+    branches = list(Branch.objects.filter(business=current_business, is_active=True))
+
+    # Get date range from request or default to the last 30 days
+    end_date = timezone.localdate()
+    start_date = end_date - timedelta(days=30)
+
+    if "start_date" in request.GET and request.GET["start_date"]:
+        start_date = datetime.strptime(request.GET["start_date"], "%Y-%m-%d").date()
+    if "end_date" in request.GET and request.GET["end_date"]:
+        end_date = datetime.strptime(request.GET["end_date"], "%Y-%m-%d").date()
+
+    # Collect branch performance data
+    branch_performance = report_cache.get_or_compute(
+        "multi_branch_dashboard",
+        current_business,
+        lambda: get_branch_performance(
+            current_business, branches, start_date, end_date
+        ),
+        period=(start_date, end_date),
+        params={"branches": [branch.id for branch in branches]},
+    )
+    total_sales_all_branches = sum(item["total_sales"] for item in branch_performance)
+    total_expenses_all_branches = sum(
+        item["total_expenses"] for item in branch_performance
+    )
+    total_net_profit_all_branches = sum(
+        item["net_profit"] for item in branch_performance
+    )
 
     # Sort branches by sales performance
     branch_performance.sort(key=lambda x: x["total_sales"], reverse=True)
 
     # Get top selling products across all branches
-    top_products = (
-        SaleItem.objects.filter(
-            sale__business=current_business,
-            sale__sale_date__date__gte=start_date,
-            sale__sale_date__date__lte=end_date,
-        )
-        .values("product__name")
-        .annotate(total_sold=Sum("quantity"), total_revenue=Sum("total_price"))
-        .order_by("-total_sold")[:10]
+    top_products = report_cache.get_or_compute(
+        "multi_branch_top_products",
+        current_business,
+        lambda: list(
+            SaleItem._base_manager.filter(
+                sale__business=current_business,
+                **date_range_filter("sale__sale_date", start_date, end_date),
+            )
+            .values("product__name")
+            .annotate(total_sold=Sum("quantity"), total_revenue=Sum("total_price"))
+            .order_by("-total_sold")[:10]
+        ),
+        period=(start_date, end_date),
     )
 
     # Prepare data for charts
@@ -1611,6 +1565,141 @@ def multi_branch_dashboard(request):
     return render(request, "reports/multi_branch_dashboard.html", context)
 
 
+def _can_access_reports(user):
+    return user.role == "admin" or check_user_permission(user, "can_access_reports")
+
+
+def _report_job_json(job):
+    return {
+        "id": job.id,
+        "report_type": job.report_type,
+        "report_name": job.get_report_type_display(),
+        "start_date": job.start_date.isoformat(),
+        "end_date": job.end_date.isoformat(),
+        "status": job.status,
+        "progress": job.progress,
+        "error": job.error,
+        "download_url": (
+            reverse("reports:job_download", args=[job.id])
+            if job.status == "completed" and job.result_file
+            else None
+        ),
+        "expires_at": job.expires_at.isoformat() if job.expires_at else None,
+    }
+
+
+@login_required
+@require_http_methods(["GET", "POST"])
+def report_jobs(request):
+    """List background report jobs and queue new ones"""
+    if not _can_access_reports(request.user):
+        messages.error(request, "You do not have permission to access reports.")
+        return redirect("dashboard:index")
+
+    from superadmin.middleware import get_current_business, get_current_branch
+    from .jobs import submit_report_job
+
+    current_business = get_current_business()
+
+    if request.method == "POST":
+        if not current_business:
+            messages.error(request, "Select a business before queuing a report.")
+            return redirect("reports:jobs")
+
+        report_type = request.POST.get("report_type")
+        try:
+            start_date = datetime.strptime(
+                request.POST.get("start_date", ""), "%Y-%m-%d"
+            ).date()
+            end_date = datetime.strptime(
+                request.POST.get("end_date", ""), "%Y-%m-%d"
+            ).date()
+        except ValueError:
+            messages.error(request, "Please enter valid start and end dates.")
+            return redirect("reports:jobs")
+
+        branch = None
+        branch_id = request.POST.get("branch_id")
+        if branch_id:
+            branch = Branch.objects.filter(
+                id=branch_id, business=current_business
+            ).first()
+        else:
+            branch = get_current_branch()
+
+        try:
+            job = submit_report_job(
+                current_business,
+                report_type,
+                start_date,
+                end_date,
+                user=request.user,
+                branch=branch,
+            )
+        except ValueError as e:
+            messages.error(request, str(e))
+            return redirect("reports:jobs")
+
+        messages.success(
+            request,
+            f"{job.get_report_type_display()} queued. You will be notified when it is ready.",
+        )
+        return redirect("reports:jobs")
+
+    jobs = (
+        ReportJob.objects.filter(business=current_business)
+        .select_related("branch")
+        .order_by("-created_at")[:50]
+        if current_business
+        else ReportJob.objects.none()
+    )
+    branches = (
+        Branch.objects.filter(business=current_business, is_active=True)
+        if current_business
+        else Branch.objects.none()
+    )
+
+    context = {
+        "jobs": jobs,
+        "branches": branches,
+        "report_types": ReportJob.REPORT_TYPE_CHOICES,
+        "default_start_date": timezone.localdate() - timedelta(days=365),
+        "default_end_date": timezone.localdate(),
+    }
+    return render(request, "reports/jobs.html", context)
+
+
+@login_required
+def report_job_status(request, job_id):
+    """Polling endpoint returning the progress of a background report job"""
+    if not _can_access_reports(request.user):
+        return JsonResponse({"error": "Permission denied"}, status=403)
+
+    from superadmin.middleware import get_current_business
+
+    job = get_object_or_404(ReportJob, id=job_id, business=get_current_business())
+    return JsonResponse(_report_job_json(job))
+
+
+@login_required
+def report_job_download(request, job_id):
+    """Download the stored result of a completed report job"""
+    if not _can_access_reports(request.user):
+        messages.error(request, "You do not have permission to access reports.")
+        return redirect("dashboard:index")
+
+    from superadmin.middleware import get_current_business
+
+    job = get_object_or_404(ReportJob, id=job_id, business=get_current_business())
+    if job.status != "completed" or not job.result_file or job.is_expired:
+        raise Http404("Report file is not available")
+
+    filename = f"{job.report_type}_report_{job.start_date}_to_{job.end_date}.csv"
+    return FileResponse(
+        job.result_file.open("rb"), as_attachment=True, filename=filename
+    )
+
+
 # Test charts view
 def test_charts(request):
     """Test view to verify chart background removal"""
@@ -11,6 +11,7 @@ from .models import Cart, CartItem, Sale, SaleItem
 from products.models import Product
 from customers.models import Customer
 from superadmin.models import Business
+from superadmin.middleware import get_current_branch
 
 logger = logging.getLogger(__name__)
 
@@ -590,6 +591,7 @@ def process_sale_from_cart(request):
                 "total_amount": total_amount,
                 "payment_method": payment_method,
                 "business": current_business,
+                "branch": get_current_branch() or current_business.get_main_branch(),
             }
 
             logger.info(f"Preparing sale data: {sale_data}")
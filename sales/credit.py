@@ -0,0 +1,116 @@
+"""
+Customer credit ledger.
+
+A credit sale stores what has been paid against it (``amount_paid``),
+what is left (``balance``) and whether it is settled (``is_fully_paid``)
+so the credit lists filter and sort on indexed columns instead of adding
+up payments. Payments change these columns with one conditional UPDATE
+computed in the database:
+
+    amount_paid = amount_paid + delta
+    balance = total_amount - (amount_paid + delta)
+
+so two payments posted at once both count and re-saving a payment only
+applies the change in its amount. Deleting a payment, one at a time, in
+a queryset or through a cascade, takes its amount back. Saving a credit
+sale never writes these columns back. ``update_credit_balances``
+recomputes them from the payments for repairs and backfills.
+"""
+
+import logging
+
+from django.db.models import (
+    BooleanField,
+    Case,
+    Count,
+    DecimalField,
+    F,
+    Min,
+    OuterRef,
+    Subquery,
+    Sum,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from customers.models import Customer
+from .models import CreditPayment, CreditSale
+
+logger = logging.getLogger(__name__)
+
+
+def apply_credit_payment(credit_sale_id, amount):
+    """
+    Add ``amount`` (negative to take a payment back) to what has been
+    paid against a credit sale, atomically.
+    """
+    if not amount:
+        return
+    CreditSale._base_manager.filter(pk=credit_sale_id).update(
+        amount_paid=F("amount_paid") + amount,
+        balance=F("total_amount") - F("amount_paid") - amount,
+        is_fully_paid=Case(
+            When(total_amount__lte=F("amount_paid") + amount, then=Value(True)),
+            default=Value(False),
+            output_field=BooleanField(),
+        ),
+        updated_at=timezone.now(),
+    )
+
+
+def update_credit_balances(credit_sale_ids=None):
+    """
+    Recompute the paid amount, balance and settled flag of credit sales
+    from their payments in one UPDATE. Returns the number of credit
+    sales updated.
+    """
+    paid = Coalesce(
+        Subquery(
+            CreditPayment._base_manager.filter(credit_sale=OuterRef("pk"))
+            .order_by()
+            .values("credit_sale")
+            .annotate(total=Sum("amount"))
+            .values("total")
+        ),
+        Value(0),
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    )
+    credit_sales = CreditSale._base_manager.all()
+    if credit_sale_ids is not None:
+        credit_sales = credit_sales.filter(pk__in=list(credit_sale_ids))
+    updated = credit_sales.update(
+        amount_paid=paid,
+        balance=F("total_amount") - paid,
+        is_fully_paid=Case(
+            When(total_amount__lte=paid, then=Value(True)),
+            default=Value(False),
+            output_field=BooleanField(),
+        ),
+    )
+    logger.info("Recomputed the balances of %s credit sales", updated)
+    return updated
+
+
+def customer_credit_balances(business):
+    """
+    Customers with unpaid credit sales, each annotated with its
+    ``outstanding`` balance, its number of ``open_sales`` and the
+    ``oldest_due_date``, largest balance first.
+    """
+    # Filtering before annotating restricts the aggregates to the joined
+    # open credit sales
+    return (
+        Customer._base_manager.filter(
+            business=business,
+            credit_sales__business=business,
+            credit_sales__is_fully_paid=False,
+        )
+        .annotate(
+            outstanding=Sum("credit_sales__balance"),
+            open_sales=Count("credit_sales"),
+            oldest_due_date=Min("credit_sales__due_date"),
+        )
+        .order_by("-outstanding", "id")
+    )
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.8 on 2026-10-19 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sales", "0003_saleitem_is_product_variant_saleitem_product_variant"),
+        ("superadmin", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="sale",
+            index=models.Index(
+                fields=["business", "sale_date"], name="sales_sale_biz_date_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-19 10:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sales", "0004_sale_business_sale_date_index"),
+        ("superadmin", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="sale",
+            name="branch",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="sales",
+                to="superadmin.branch",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="sale",
+            index=models.Index(
+                fields=["business", "branch", "sale_date"],
+                name="sales_sale_biz_branch_idx",
+            ),
+        ),
+    ]
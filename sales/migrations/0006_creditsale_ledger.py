@@ -0,0 +1,65 @@
+# Generated by Django 5.2.8 on 2026-10-19 16:00
+
+from django.db import migrations, models
+from django.db.models import Case, DecimalField, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+
+def recompute_balances(apps, schema_editor):
+    # Payments used to be added to amount_paid again each time they were
+    # saved, so the stored amounts are rebuilt from the payments
+    CreditSale = apps.get_model("sales", "CreditSale")
+    CreditPayment = apps.get_model("sales", "CreditPayment")
+    paid = Coalesce(
+        Subquery(
+            CreditPayment.objects.filter(credit_sale=OuterRef("pk"))
+            .order_by()
+            .values("credit_sale")
+            .annotate(total=Sum("amount"))
+            .values("total")
+        ),
+        Value(0),
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    )
+    CreditSale.objects.update(
+        amount_paid=paid,
+        balance=F("total_amount") - paid,
+        is_fully_paid=Case(
+            When(total_amount__lte=paid, then=Value(True)),
+            default=Value(False),
+            output_field=models.BooleanField(),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sales", "0005_sale_branch"),
+        ("superadmin", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="creditsale",
+            index=models.Index(
+                fields=["business", "created_at", "id"],
+                name="sales_credit_list_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="creditsale",
+            index=models.Index(
+                fields=["business", "is_fully_paid", "due_date", "id"],
+                name="sales_credit_due_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="creditsale",
+            index=models.Index(
+                fields=["business", "customer", "is_fully_paid"],
+                name="sales_credit_customer_idx",
+            ),
+        ),
+        migrations.RunPython(recompute_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 5.2.8 on 2026-10-19 17:00
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("customers", "0002_customer_list_index"),
+        ("sales", "0006_creditsale_ledger"),
+        ("superadmin", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CreditReminder",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("phone", models.CharField(max_length=20)),
+                ("message", models.TextField()),
+                ("balance", models.DecimalField(decimal_places=2, max_digits=12)),
+                ("credit_sale_count", models.PositiveIntegerField(default=1)),
+                ("sent_at", models.DateTimeField(blank=True, null=True)),
+                ("attempts", models.PositiveIntegerField(default=0)),
+                ("last_error", models.TextField(blank=True)),
+                (
+                    "created_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                (
+                    "business",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="credit_reminders",
+                        to="superadmin.business",
+                    ),
+                ),
+                (
+                    "customer",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="credit_reminders",
+                        to="customers.customer",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-created_at"],
+                "indexes": [
+                    models.Index(
+                        fields=["sent_at", "created_at"],
+                        name="sales_reminder_pending_idx",
+                    ),
+                    models.Index(
+                        fields=["business", "customer", "created_at"],
+                        name="sales_reminder_customer_idx",
+                    ),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.8 on 2026-10-19 18:00
+
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_branch(apps, schema_editor):
+    # Sales recorded before branches were tracked belong to the main branch
+    # (or the first active one, as Business.get_main_branch picks), so they
+    # stay visible once a branch is selected
+    Branch = apps.get_model("superadmin", "Branch")
+    Sale = apps.get_model("sales", "Sale")
+    main_branch = (
+        Branch.objects.filter(business=OuterRef("business"))
+        .order_by("-is_main", "-is_active", "id")
+        .values("id")[:1]
+    )
+    Sale.objects.filter(branch=None, business__isnull=False).update(
+        branch=Subquery(main_branch)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sales", "0007_creditreminder"),
+        ("superadmin", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_branch, migrations.RunPython.noop),
+    ]
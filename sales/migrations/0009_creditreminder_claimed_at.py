@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 15:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sales", "0008_backfill_sale_branch"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="creditreminder",
+            name="claimed_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
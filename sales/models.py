@@ -1,8 +1,8 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 from products.models import Product, ProductVariant
 from customers.models import Customer
-from superadmin.models import Business
+from superadmin.models import Business, Branch
 from superadmin.managers import BusinessSpecificManager
 from authentication.models import User
 from decimal import Decimal
@@ -67,6 +67,11 @@ class Sale(models.Model):
         Business, on_delete=models.CASCADE, related_name="sales", null=True
     )
 
+    # Add branch relationship for multi-branch support
+    branch = models.ForeignKey(
+        Branch, on_delete=models.SET_NULL, related_name="sales", null=True, blank=True
+    )
+
     customer = models.ForeignKey(
         Customer, on_delete=models.SET_NULL, null=True, blank=True
     )
@@ -85,6 +90,15 @@ class Sale(models.Model):
 
     class Meta:
         ordering = ["-sale_date"]
+        indexes = [
+            models.Index(
+                fields=["business", "sale_date"], name="sales_sale_biz_date_idx"
+            ),
+            models.Index(
+                fields=["business", "branch", "sale_date"],
+                name="sales_sale_biz_branch_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"Sale #{self.id} - {self.total_amount}"
@@ -178,19 +192,72 @@ class CreditSale(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            # Keyset pages of the credit sale list
+            models.Index(
+                fields=["business", "created_at", "id"],
+                name="sales_credit_list_idx",
+            ),
+            # Overdue list and reminders: unpaid sales by due date
+            models.Index(
+                fields=["business", "is_fully_paid", "due_date", "id"],
+                name="sales_credit_due_idx",
+            ),
+            # Outstanding balance per customer
+            models.Index(
+                fields=["business", "customer", "is_fully_paid"],
+                name="sales_credit_customer_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"Credit Sale #{self.sale.id} - {self.customer.full_name}"
 
+    # Columns only payments change, in the database (see sales.credit)
+    LEDGER_FIELDS = ("amount_paid", "balance", "is_fully_paid")
+
     def save(self, *args, **kwargs):
-        # Calculate balance automatically
-        self.balance = self.total_amount - self.amount_paid
-        self.is_fully_paid = self.balance <= 0
-        super().save(*args, **kwargs)
+        if self._state.adding or kwargs.get("force_insert"):
+            self.balance = self.total_amount - self.amount_paid
+            self.is_fully_paid = self.balance <= 0
+            super().save(*args, **kwargs)
+            return
+
+        # An existing credit sale never writes the ledger columns back, so
+        # a payment applied since it was read is not lost; the balance is
+        # recomputed from the stored amount paid in the same UPDATE
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None:
+            update_fields = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key
+            ]
+        kwargs["update_fields"] = [
+            name for name in update_fields if name not in self.LEDGER_FIELDS
+        ]
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            CreditSale._base_manager.filter(pk=self.pk).update(
+                balance=models.F("total_amount") - models.F("amount_paid"),
+                is_fully_paid=models.Case(
+                    models.When(
+                        total_amount__lte=models.F("amount_paid"),
+                        then=models.Value(True),
+                    ),
+                    default=models.Value(False),
+                    output_field=models.BooleanField(),
+                ),
+            )
+        self.refresh_from_db(fields=list(self.LEDGER_FIELDS))
 
     @property
     def outstanding_balance(self):
-        return self.total_amount - self.amount_paid
+        return self.balance
+
+    @property
+    def days_overdue(self):
+        return max((timezone.localdate() - self.due_date).days, 0)
 
 
 class CreditPayment(models.Model):
@@ -225,8 +292,73 @@ class CreditPayment(models.Model):
     def __str__(self):
         return f"Payment of {self.amount} for Credit Sale #{self.credit_sale.sale.id}"
 
+    # Deleted payments are taken back by a post_delete receiver (see
+    # sales.signals), so queryset and cascade deletes are covered too
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        # Update the credit sale balance
-        self.credit_sale.amount_paid += self.amount
-        self.credit_sale.save()
+        from .credit import apply_credit_payment
+
+        with transaction.atomic():
+            # Only the change in amount is applied when a payment is edited;
+            # a payment moved to another credit sale leaves the previous one
+            previous = None
+            if not self._state.adding:
+                previous = (
+                    CreditPayment._base_manager.select_for_update()
+                    .filter(pk=self.pk)
+                    .values_list("credit_sale_id", "amount")
+                    .first()
+                )
+            super().save(*args, **kwargs)
+            amount = Decimal(str(self.amount))
+            if previous is None:
+                apply_credit_payment(self.credit_sale_id, amount)
+            elif previous[0] != self.credit_sale_id:
+                apply_credit_payment(previous[0], -previous[1])
+                apply_credit_payment(self.credit_sale_id, amount)
+            else:
+                apply_credit_payment(self.credit_sale_id, amount - previous[1])
+
+
+class CreditReminder(models.Model):
+    """
+    Overdue payment reminder sent to a customer, covering all of their
+    overdue credit sales. Unsent reminders are retried by
+    ``send_credit_reminders`` (see sales.reminders).
+    """
+
+    objects = BusinessSpecificManager()
+    business = models.ForeignKey(
+        Business, on_delete=models.CASCADE, related_name="credit_reminders", null=True
+    )
+
+    customer = models.ForeignKey(
+        Customer, on_delete=models.CASCADE, related_name="credit_reminders"
+    )
+    phone = models.CharField(max_length=20)
+    message = models.TextField()
+    balance = models.DecimalField(max_digits=12, decimal_places=2)
+    credit_sale_count = models.PositiveIntegerField(default=1)
+
+    # Delivery state. A sender holds a reminder from ``claimed_at`` until it
+    # is sent or the claim lease runs out.
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(
+                fields=["sent_at", "created_at"], name="sales_reminder_pending_idx"
+            ),
+            models.Index(
+                fields=["business", "customer", "created_at"],
+                name="sales_reminder_customer_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"Reminder to {self.customer.full_name} for {self.balance}"
@@ -0,0 +1,206 @@
+"""
+Overdue credit sale reminders.
+
+``queue_credit_reminders`` reads every overdue, unpaid credit sale with its
+customer in one query and writes one ``CreditReminder`` per customer,
+covering all of their overdue invoices. Customers reminded in the last
+``CREDIT_REMINDER_INTERVAL_DAYS`` days, or with a reminder still waiting
+to be sent, are skipped.
+
+``send_pending_reminders`` sends the unsent reminders through the SMS
+gateway (see sales.sms) from a thread pool. Each business is limited to
+``CREDIT_REMINDER_RATE_PER_MINUTE`` messages, so one tenant's backlog
+does not exhaust a shared gateway account. Like the stock alert outbox
+(products.stock_events), reminders are claimed with a lease before they
+are sent, marked sent only once the gateway accepted them and released
+when sending fails, to be retried up to ``MAX_SEND_ATTEMPTS`` times.
+Reminders claimed by a sender that died are sent by a later run once
+``CLAIM_LEASE`` has passed. Only the gateway calls run in the threads;
+all database work is done in the calling thread.
+"""
+
+import logging
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from itertools import zip_longest
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import CreditReminder, CreditSale
+from .sms import RateLimiter, get_gateway
+
+logger = logging.getLogger(__name__)
+
+MAX_SEND_ATTEMPTS = 3
+SEND_BATCH_SIZE = 500
+# Long enough to send a whole batch at the default rate limit
+CLAIM_LEASE = timedelta(minutes=30)
+
+
+def build_reminder_message(business, credit_sales):
+    """Reminder text for a customer's overdue credit sales, oldest first"""
+    balance = sum((credit_sale.balance for credit_sale in credit_sales), Decimal("0"))
+    oldest = credit_sales[0].due_date.strftime("%Y-%m-%d")
+    sender = f"Reminder from {business.company_name}" if business else "Reminder"
+    if len(credit_sales) == 1:
+        return (
+            f"{sender}: Your account has an outstanding balance of {balance} "
+            f"for invoice #{credit_sales[0].sale_id}. The payment was due on "
+            f"{oldest}. Please arrange payment at your earliest convenience."
+        )
+    invoices = ", ".join(f"#{credit_sale.sale_id}" for credit_sale in credit_sales)
+    return (
+        f"{sender}: Your account has an outstanding balance of {balance} for "
+        f"{len(credit_sales)} invoices ({invoices}). The oldest payment was due "
+        f"on {oldest}. Please arrange payment at your earliest convenience."
+    )
+
+
+def queue_credit_reminders(businesses=None, days_overdue=1, dry_run=False):
+    """
+    Write a reminder for each customer with credit sales overdue by
+    ``days_overdue`` days or more. Returns the reminders, unsaved when
+    ``dry_run``, and a Counter of customers skipped per reason.
+    """
+    today = timezone.localdate()
+    overdue = (
+        CreditSale._base_manager.filter(
+            is_fully_paid=False, due_date__lte=today - timedelta(days=days_overdue)
+        )
+        .select_related("business", "customer")
+        .order_by("business_id", "customer_id", "due_date", "id")
+    )
+    recent = CreditReminder._base_manager.filter(
+        Q(
+            created_at__gte=timezone.now()
+            - timedelta(days=settings.CREDIT_REMINDER_INTERVAL_DAYS)
+        )
+        | Q(sent_at=None, attempts__lt=MAX_SEND_ATTEMPTS)
+    )
+    if businesses is not None:
+        overdue = overdue.filter(business__in=businesses)
+        recent = recent.filter(business__in=businesses)
+    reminded = set(recent.values_list("customer_id", flat=True))
+
+    by_customer = defaultdict(list)
+    for credit_sale in overdue:
+        by_customer[credit_sale.customer].append(credit_sale)
+
+    reminders = []
+    skipped = Counter()
+    for customer, credit_sales in by_customer.items():
+        if customer.pk in reminded:
+            skipped["recently_reminded"] += 1
+            continue
+        if not customer.phone:
+            skipped["no_phone"] += 1
+            continue
+        business = credit_sales[0].business
+        reminders.append(
+            CreditReminder(
+                business=business,
+                customer=customer,
+                phone=customer.phone,
+                message=build_reminder_message(business, credit_sales),
+                balance=sum(
+                    (credit_sale.balance for credit_sale in credit_sales),
+                    Decimal("0"),
+                ),
+                credit_sale_count=len(credit_sales),
+            )
+        )
+
+    if reminders and not dry_run:
+        reminders = CreditReminder._base_manager.bulk_create(reminders)
+    logger.info(
+        "Queued %s credit reminders, skipped %s",
+        len(reminders),
+        dict(skipped),
+    )
+    return reminders, skipped
+
+
+def _claim_pending(businesses, limit):
+    """Claim up to ``limit`` unsent reminders and return them"""
+    now = timezone.now()
+    with transaction.atomic():
+        pending = CreditReminder._base_manager.select_for_update(
+            skip_locked=True
+        ).filter(
+            Q(claimed_at=None) | Q(claimed_at__lt=now - CLAIM_LEASE),
+            sent_at=None,
+            attempts__lt=MAX_SEND_ATTEMPTS,
+        )
+        if businesses is not None:
+            pending = pending.filter(business__in=businesses)
+        ids = list(pending.order_by("created_at").values_list("id", flat=True)[:limit])
+        CreditReminder._base_manager.filter(id__in=ids).update(
+            claimed_at=now, attempts=F("attempts") + 1
+        )
+    return list(
+        CreditReminder._base_manager.filter(id__in=ids).select_related("business")
+    )
+
+
+def send_pending_reminders(
+    businesses=None, gateway=None, workers=None, limit=SEND_BATCH_SIZE
+):
+    """
+    Send up to ``limit`` unsent reminders. Returns a dict of business to
+    a Counter of reminders ``sent`` and ``failed``.
+    """
+    gateway = gateway or get_gateway()
+    workers = workers or settings.CREDIT_REMINDER_WORKERS
+    reminders = _claim_pending(businesses, limit)
+    if not reminders:
+        return {}
+
+    limiters = {
+        business_id: RateLimiter(settings.CREDIT_REMINDER_RATE_PER_MINUTE)
+        for business_id in {reminder.business_id for reminder in reminders}
+    }
+
+    def send(reminder):
+        limiters[reminder.business_id].wait()
+        try:
+            gateway.send(reminder.phone, reminder.message)
+        except Exception as e:
+            logger.warning("Failed to send credit reminder %s: %s", reminder.pk, e)
+            return str(e) or e.__class__.__name__
+        return None
+
+    # Reminders are interleaved across businesses so a business waiting
+    # for its rate limit does not hold up every thread
+    by_business = defaultdict(list)
+    for reminder in reminders:
+        by_business[reminder.business_id].append(reminder)
+    reminders = [
+        reminder
+        for batch in zip_longest(*by_business.values())
+        for reminder in batch
+        if reminder is not None
+    ]
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        errors = list(executor.map(send, reminders))
+
+    results = defaultdict(Counter)
+    sent = []
+    failed = []
+    for reminder, error in zip(reminders, errors):
+        if error is None:
+            sent.append(reminder.pk)
+            results[reminder.business]["sent"] += 1
+            continue
+        reminder.claimed_at = None
+        reminder.last_error = error
+        failed.append(reminder)
+        results[reminder.business]["failed"] += 1
+    CreditReminder._base_manager.filter(id__in=sent).update(sent_at=timezone.now())
+    # Failed reminders are released for the next run
+    CreditReminder._base_manager.bulk_update(failed, ["claimed_at", "last_error"])
+    return dict(results)
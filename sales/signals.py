@@ -1,7 +1,8 @@
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.db import transaction
-from sales.models import SaleItem, Sale
+from sales.models import CreditPayment, SaleItem, Sale
+from sales.credit import apply_credit_payment
 from decimal import Decimal
 import logging
 
@@ -37,3 +38,12 @@ def update_sale_total(sender, instance, **kwargs):
     except Exception as e:
         # Log the error but don't fail the operation
         logger.error(f"Error updating sale total: {str(e)}")
+
+
+@receiver(post_delete, sender=CreditPayment)
+def reverse_credit_payment(sender, instance, **kwargs):
+    """
+    Take a deleted payment back off its credit sale. Queryset deletes and
+    deletes cascading from the credit sale send this signal too.
+    """
+    apply_credit_payment(instance.credit_sale_id, -Decimal(str(instance.amount)))
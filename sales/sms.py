@@ -0,0 +1,69 @@
+"""
+SMS gateways.
+
+The gateway used is the class named by ``settings.SMS_GATEWAY``. A gateway
+is any class with a ``send(phone, message)`` method that raises when the
+message could not be sent. ``LogGateway`` only logs messages and
+``FileGateway`` appends them as JSON lines to ``settings.SMS_FILE_PATH``
+so reminders can be checked without a provider account.
+"""
+
+import json
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+class LogGateway:
+    def send(self, phone, message):
+        logger.info("SMS to %s: %s", phone, message)
+
+
+class FileGateway:
+    # Gateways are shared by the sending threads
+    _lock = threading.Lock()
+
+    def __init__(self, path=None):
+        self.path = path or settings.SMS_FILE_PATH
+
+    def send(self, phone, message):
+        line = json.dumps(
+            {"to": phone, "message": message, "sent_at": timezone.now().isoformat()}
+        )
+        with self._lock, open(self.path, "a", encoding="utf-8") as outbox:
+            outbox.write(line + "\n")
+
+
+def get_gateway():
+    """An instance of the configured SMS gateway"""
+    return import_string(settings.SMS_GATEWAY)()
+
+
+class RateLimiter:
+    """
+    Spaces calls to ``wait`` at least ``60 / per_minute`` seconds apart,
+    across threads. A ``per_minute`` of 0 does not limit.
+    """
+
+    def __init__(self, per_minute, clock=time.monotonic, sleep=time.sleep):
+        self.interval = 60 / per_minute if per_minute > 0 else 0
+        self.clock = clock
+        self.sleep = sleep
+        self._lock = threading.Lock()
+        self._next_slot = 0
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = self.clock()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            self.sleep(slot - now)
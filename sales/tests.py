@@ -1,8 +1,41 @@
-from django.test import TestCase, Client
+import importlib
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.apps import apps
+from django.core.management import call_command
+from django.db.models.signals import pre_save
+from django.test import TestCase, Client, override_settings
 from django.contrib.auth import get_user_model
 from django.urls import reverse
+from django.utils import timezone
 from products.models import Product, Category, Unit
 from customers.models import Customer
+from sales.credit import (
+    apply_credit_payment,
+    customer_credit_balances,
+    update_credit_balances,
+)
+from sales.models import CreditPayment, CreditReminder, CreditSale, Sale
+from sales.reminders import (
+    CLAIM_LEASE,
+    MAX_SEND_ATTEMPTS,
+    queue_credit_reminders,
+    send_pending_reminders,
+)
+from sales.sms import FileGateway, RateLimiter
+from superadmin.middleware import (
+    clear_current_branch,
+    clear_current_business,
+    set_current_branch,
+    set_current_business,
+)
+from superadmin.models import Branch, Business
 
 User = get_user_model()
 
@@ -102,3 +135,323 @@ class POSTestCase(TestCase):
         data = response.json()
         self.assertTrue(data["success"])
         self.assertIn("sale_id", data)
+
+
+class CreditTestCase(TestCase):
+    def setUp(self):
+        self.business = Business.objects.create(
+            company_name="Credit Business",
+            email="credit@example.com",
+            business_type="retail",
+        )
+        self.customer = Customer.objects.create(
+            business=self.business,
+            first_name="Jane",
+            last_name="Roe",
+            phone="+250700000001",
+        )
+
+    def create_credit_sale(self, total, due_in_days=-5, customer=None):
+        customer = customer or self.customer
+        sale = Sale.objects.create(
+            business=self.business, customer=customer, total_amount=total
+        )
+        return CreditSale.objects.create(
+            business=self.business,
+            customer=customer,
+            sale=sale,
+            total_amount=Decimal(total),
+            due_date=timezone.localdate() + timedelta(days=due_in_days),
+        )
+
+    def pay(self, credit_sale, amount):
+        return CreditPayment.objects.create(
+            business=self.business, credit_sale=credit_sale, amount=Decimal(amount)
+        )
+
+
+class CreditLedgerTestCase(CreditTestCase):
+    def test_payments_update_the_balance_in_the_database(self):
+        credit_sale = self.create_credit_sale("100.00")
+        # A stale instance must not overwrite payments made through another
+        stale = CreditSale.objects.get(pk=credit_sale.pk)
+        self.pay(credit_sale, "30.00")
+        self.pay(stale, "20.00")
+
+        credit_sale.refresh_from_db()
+        self.assertEqual(credit_sale.amount_paid, Decimal("50.00"))
+        self.assertEqual(credit_sale.balance, Decimal("50.00"))
+        self.assertFalse(credit_sale.is_fully_paid)
+
+        stale.notes = "Called the customer"
+        stale.save()
+        credit_sale.refresh_from_db()
+        self.assertEqual(credit_sale.amount_paid, Decimal("50.00"))
+
+    def test_saving_a_credit_sale_keeps_a_payment_made_during_the_save(self):
+        credit_sale = self.create_credit_sale("100.00")
+        self.pay(credit_sale, "30.00")
+
+        def pay_concurrently(sender, instance, **kwargs):
+            pre_save.disconnect(pay_concurrently, sender=CreditSale)
+            apply_credit_payment(instance.pk, Decimal("20.00"))
+
+        # The payment commits while the credit sale is being saved
+        pre_save.connect(pay_concurrently, sender=CreditSale)
+        self.addCleanup(pre_save.disconnect, pay_concurrently, sender=CreditSale)
+        credit_sale.total_amount = Decimal("120.00")
+        credit_sale.save()
+
+        self.assertEqual(credit_sale.amount_paid, Decimal("50.00"))
+        credit_sale.refresh_from_db()
+        self.assertEqual(credit_sale.total_amount, Decimal("120.00"))
+        self.assertEqual(credit_sale.amount_paid, Decimal("50.00"))
+        self.assertEqual(credit_sale.balance, Decimal("70.00"))
+        self.assertFalse(credit_sale.is_fully_paid)
+
+    def test_resaving_or_deleting_a_payment_applies_the_difference(self):
+        credit_sale = self.create_credit_sale("100.00")
+        payment = self.pay(credit_sale, "60.00")
+        payment.notes = "Receipt 12"
+        payment.save()
+        payment.amount = Decimal("100.00")
+        payment.save()
+
+        credit_sale.refresh_from_db()
+        self.assertEqual(credit_sale.amount_paid, Decimal("100.00"))
+        self.assertTrue(credit_sale.is_fully_paid)
+
+        payment.delete()
+        credit_sale.refresh_from_db()
+        self.assertEqual(credit_sale.balance, Decimal("100.00"))
+        self.assertFalse(credit_sale.is_fully_paid)
+
+    def test_moving_or_bulk_deleting_payments_updates_every_balance(self):
+        first = self.create_credit_sale("100.00")
+        second = self.create_credit_sale("100.00")
+        payment = self.pay(first, "40.00")
+        self.pay(second, "10.00")
+
+        payment.credit_sale = second
+        payment.amount = Decimal("50.00")
+        payment.save()
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.amount_paid, Decimal("0.00"))
+        self.assertEqual(second.amount_paid, Decimal("60.00"))
+
+        CreditPayment._base_manager.filter(credit_sale=second).delete()
+        second.refresh_from_db()
+        self.assertEqual(second.amount_paid, Decimal("0.00"))
+        self.assertEqual(second.balance, Decimal("100.00"))
+
+    def test_update_credit_balances_rebuilds_from_payments(self):
+        credit_sale = self.create_credit_sale("100.00")
+        self.pay(credit_sale, "40.00")
+        CreditSale._base_manager.filter(pk=credit_sale.pk).update(
+            amount_paid=Decimal("80.00"), balance=Decimal("20.00")
+        )
+
+        self.assertEqual(update_credit_balances([credit_sale.pk]), 1)
+        credit_sale.refresh_from_db()
+        self.assertEqual(credit_sale.balance, Decimal("60.00"))
+
+    def test_customer_balances_and_overdue_list(self):
+        first = self.create_credit_sale("100.00", due_in_days=-10)
+        self.create_credit_sale("50.00", due_in_days=3)
+        settled = self.create_credit_sale("20.00")
+        self.pay(first, "25.00")
+        self.pay(settled, "20.00")
+
+        customer = customer_credit_balances(self.business).get()
+        self.assertEqual(customer.outstanding, Decimal("125.00"))
+        self.assertEqual(customer.open_sales, 2)
+        self.assertEqual(customer.oldest_due_date, first.due_date)
+
+        user = User.objects.create_user(
+            username="credit", password="testpass123", role="admin"
+        )
+        self.client.force_login(user)
+        set_current_business(self.business)
+        self.addCleanup(clear_current_business)
+        response = self.client.get(reverse("sales:overdue_credit_sales"))
+
+        self.assertEqual(
+            [credit_sale.pk for credit_sale in response.context["overdue_sales"]],
+            [first.pk],
+        )
+        self.assertContains(response, "<td>10</td>", html=True)
+
+
+class FailingGateway:
+    def send(self, phone, message):
+        raise ConnectionError("Gateway unavailable")
+
+
+class CreditReminderTestCase(CreditTestCase):
+    def setUp(self):
+        super().setUp()
+        self.outbox = os.path.join(tempfile.mkdtemp(), "sms.jsonl")
+        self.addCleanup(shutil.rmtree, os.path.dirname(self.outbox))
+        self.gateway = FileGateway(self.outbox)
+
+    def sent_messages(self):
+        with open(self.outbox, encoding="utf-8") as outbox:
+            return [json.loads(line) for line in outbox]
+
+    def test_one_reminder_per_customer_covers_all_overdue_sales(self):
+        first = self.create_credit_sale("100.00", due_in_days=-10)
+        second = self.create_credit_sale("50.00", due_in_days=-3)
+        self.create_credit_sale("30.00", due_in_days=5)
+        no_phone = Customer.objects.create(
+            business=self.business, first_name="No", last_name="Phone"
+        )
+        self.create_credit_sale("10.00", customer=no_phone)
+
+        with self.assertNumQueries(3):
+            reminders, skipped = queue_credit_reminders()
+
+        self.assertEqual(len(reminders), 1)
+        self.assertEqual(skipped["no_phone"], 1)
+        reminder = reminders[0]
+        self.assertEqual(reminder.balance, Decimal("150.00"))
+        self.assertEqual(reminder.credit_sale_count, 2)
+        self.assertIn(f"#{first.sale_id}, #{second.sale_id}", reminder.message)
+
+        # Queued and recently sent reminders are not repeated
+        self.assertEqual(queue_credit_reminders()[0], [])
+        with override_settings(CREDIT_REMINDER_RATE_PER_MINUTE=0):
+            results = send_pending_reminders(gateway=self.gateway)
+        self.assertEqual(results[self.business]["sent"], 1)
+        self.assertEqual(queue_credit_reminders()[1]["recently_reminded"], 1)
+
+        self.assertEqual(
+            self.sent_messages()[0]["message"],
+            CreditReminder.objects.get().message,
+        )
+        self.assertIsNotNone(CreditReminder.objects.get().sent_at)
+
+    def test_failed_reminders_are_retried_until_the_attempt_limit(self):
+        self.create_credit_sale("100.00")
+        queue_credit_reminders()
+
+        for _ in range(MAX_SEND_ATTEMPTS):
+            results = send_pending_reminders(gateway=FailingGateway())
+            self.assertEqual(results[self.business]["failed"], 1)
+
+        reminder = CreditReminder.objects.get()
+        self.assertIsNone(reminder.sent_at)
+        self.assertEqual(reminder.attempts, MAX_SEND_ATTEMPTS)
+        self.assertEqual(reminder.last_error, "Gateway unavailable")
+        self.assertEqual(send_pending_reminders(gateway=self.gateway), {})
+
+    def test_reminders_claimed_by_a_dead_sender_are_sent_after_the_lease(self):
+        self.create_credit_sale("100.00")
+        queue_credit_reminders()
+        # Another sender claimed the reminder and died before sending it
+        CreditReminder.objects.update(claimed_at=timezone.now(), attempts=1)
+
+        self.assertEqual(send_pending_reminders(gateway=self.gateway), {})
+        self.assertIsNone(CreditReminder.objects.get().sent_at)
+
+        CreditReminder.objects.update(
+            claimed_at=timezone.now() - CLAIM_LEASE - timedelta(minutes=1)
+        )
+        with override_settings(CREDIT_REMINDER_RATE_PER_MINUTE=0):
+            results = send_pending_reminders(gateway=self.gateway)
+        self.assertEqual(results[self.business]["sent"], 1)
+        reminder = CreditReminder.objects.get()
+        self.assertIsNotNone(reminder.sent_at)
+        self.assertEqual(reminder.attempts, 2)
+        self.assertEqual(len(self.sent_messages()), 1)
+
+    def test_rate_limiter_spaces_calls(self):
+        now = [0.0]
+        sleeps = []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+            now[0] += seconds
+
+        limiter = RateLimiter(30, clock=lambda: now[0], sleep=sleep)
+        for _ in range(3):
+            limiter.wait()
+
+        self.assertEqual(sleeps, [2.0, 2.0])
+
+    def test_command_dry_run_sends_nothing(self):
+        self.create_credit_sale("100.00")
+        out = StringIO()
+
+        call_command("send_credit_reminders", "--dry-run", stdout=out)
+
+        self.assertIn("[DRY RUN] Would send to +250700000001", out.getvalue())
+        self.assertFalse(CreditReminder.objects.exists())
+
+
+class SaleBranchBackfillTestCase(TestCase):
+    def test_sales_from_before_branches_stay_visible_in_the_main_branch(self):
+        business = Business.objects.create(
+            company_name="Branch Business",
+            email="branches@example.com",
+            business_type="retail",
+        )
+        Branch.objects.create(business=business, name="Annex", address="2 Side St")
+        main = Branch.objects.create(
+            business=business, name="Main", address="1 High St", is_main=True
+        )
+        sale = Sale.objects.create(business=business, total_amount=Decimal("10.00"))
+
+        migration = importlib.import_module(
+            "sales.migrations.0008_backfill_sale_branch"
+        )
+        migration.backfill_branch(apps, None)
+
+        set_current_business(business)
+        set_current_branch(main)
+        self.addCleanup(clear_current_business)
+        self.addCleanup(clear_current_branch)
+        self.assertEqual(list(Sale.objects.all()), [sale])
+        self.assertEqual(Sale.objects.get().branch, main)
+
+    def test_pos_checkout_without_a_branch_goes_to_the_main_branch(self):
+        user = User.objects.create_user(
+            username="cashier", password="testpass123", role="admin"
+        )
+        business = Business.objects.create(
+            company_name="Checkout Business",
+            email="checkout@example.com",
+            business_type="retail",
+            owner=user,
+        )
+        main = Branch.objects.create(
+            business=business, name="Main", address="1 High St", is_main=True
+        )
+        product = Product.objects.create(
+            business=business,
+            name="Checkout Product",
+            sku="CHK001",
+            quantity=10,
+            cost_price=Decimal("5.00"),
+            selling_price=Decimal("10.00"),
+        )
+        self.client.force_login(user)
+        session = self.client.session
+        session["current_business_id"] = business.id
+        session.save()
+
+        response = self.client.post(
+            reverse("sales:process_pos_sale"),
+            data={
+                "payment_method": "cash",
+                "discount": 0,
+                "cart_items": [
+                    {"id": product.id, "price": "10.00", "quantity": 1},
+                ],
+            },
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, 200, response.content)
+        sale = Sale._base_manager.get(pk=response.json()["sale_id"])
+        self.assertEqual(sale.branch, main)
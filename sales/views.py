@@ -4,6 +4,8 @@ from django.contrib import messages
 from django.http import JsonResponse
 from django.db import transaction
 from django.views.decorators.http import require_http_methods
+from django.urls import reverse
+from utils.pagination import page_json_response, paginate, wants_json
 from django.views.decorators.csrf import csrf_exempt
 from django.db.models import F, Sum
 from django.utils import timezone
@@ -19,18 +21,43 @@ if TYPE_CHECKING:
 
 from .models import Sale, SaleItem, Refund, CreditSale, CreditPayment
 from .forms import SaleForm, CreditSaleForm, CreditPaymentForm
+from .credit import customer_credit_balances
 from products.models import Product, ProductVariant
 from customers.models import Customer
 from superadmin.models import Business
-from superadmin.middleware import get_current_business
+from superadmin.middleware import get_current_business, get_current_branch
 from authentication.utils import check_user_permission
 import json
 
+# Customers listed in the outstanding balance summary of the credit sales
+CUSTOMER_BALANCES_SHOWN = 10
+
 
 @login_required
 def sale_list(request):
-    sales = Sale.objects.business_specific().all().prefetch_related("items__product")
-    return render(request, "sales/list.html", {"sales": sales})
+    # Items are prefetched for the rows of the page only
+    sales = (
+        Sale.objects.business_specific()
+        .select_related("customer")
+        .prefetch_related("items__product")
+    )
+    page = paginate(request, sales, ["-sale_date", "-id"])
+    if wants_json(request):
+        return page_json_response(page, _sale_row)
+    return render(request, "sales/list.html", {"sales": page, "page": page})
+
+
+def _sale_row(sale):
+    return {
+        "id": sale.id,
+        "customer": sale.customer.full_name if sale.customer else "",
+        "sale_date": sale.sale_date.isoformat(),
+        "payment_method": sale.get_payment_method_display(),
+        "total_amount": float(sale.total_amount),
+        "total_profit": float(sale.total_profit),
+        "is_refunded": sale.is_refunded,
+        "url": reverse("sales:detail", args=[sale.pk]),
+    }
 
 
 @login_required
@@ -62,6 +89,8 @@ def sale_create(request):
             # Save the sale with business context
             sale = form.save(commit=False)
             sale.business = current_business
+            # Sales without a branch would drop out of every branch's lists
+            sale.branch = get_current_branch() or current_business.get_main_branch()
             sale.save()
             messages.success(request, "Sale created successfully!")
             return redirect("sales:detail", pk=sale.pk)
@@ -481,6 +510,8 @@ def process_pos_sale(request):
                 "total_amount": total_amount,
                 "payment_method": payment_method,
                 "business": current_business,  # Associate with current business
+                "branch": get_current_branch()
+                or (current_business.get_main_branch() if current_business else None),
             }
 
             logger.info(f"Preparing sale data: {sale_data}")
@@ -731,15 +762,27 @@ def credit_sales_list(request):
         messages.error(request, "You do not have permission to view credit sales.")
         return redirect("dashboard:index")
 
-    # Get credit sales with related data
-    credit_sales = (
-        CreditSale.objects.business_specific()
-        .select_related("customer", "sale")
-        .prefetch_related("payments")
+    # Balances are stored on the credit sales, so the payments are not loaded
+    credit_sales = CreditSale.objects.business_specific().select_related(
+        "customer", "sale"
+    )
+    page = paginate(request, credit_sales, ["-created_at", "-id"])
+
+    current_business = get_current_business()
+    customer_balances = (
+        customer_credit_balances(current_business)[:CUSTOMER_BALANCES_SHOWN]
+        if current_business
+        else []
     )
 
     return render(
-        request, "sales/credit_sales_list.html", {"credit_sales": credit_sales}
+        request,
+        "sales/credit_sales_list.html",
+        {
+            "credit_sales": page,
+            "page": page,
+            "customer_balances": customer_balances,
+        },
     )
 
 
@@ -794,7 +837,10 @@ def credit_sale_create(request):
 def credit_sale_detail(request, pk):
     """View details of a specific credit sale"""
     credit_sale = get_object_or_404(
-        CreditSale.objects.business_specific().select_related("customer", "sale"), pk=pk
+        CreditSale.objects.business_specific()
+        .select_related("customer", "sale")
+        .prefetch_related("payments"),
+        pk=pk,
     )
 
     return render(
@@ -868,10 +914,12 @@ def overdue_credit_sales(request):
     overdue_sales = (
         CreditSale.objects.business_specific()
         .select_related("customer", "sale")
-        .prefetch_related("payments")
         .filter(due_date__lt=today, is_fully_paid=False)
     )
+    page = paginate(request, overdue_sales, ["due_date", "id"])
 
     return render(
-        request, "sales/overdue_credit_sales.html", {"overdue_sales": overdue_sales}
+        request,
+        "sales/overdue_credit_sales.html",
+        {"overdue_sales": page, "page": page},
     )
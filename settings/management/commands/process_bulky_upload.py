@@ -1,8 +1,8 @@
-import csv
 import os
 from django.core.management.base import BaseCommand, CommandError
 from django.conf import settings
-from products.models import Product, Category, Unit
+from products.bulk_load import BulkProductLoader
+from products.imports import ProductImporter, read_rows
 from superadmin.models import Business
 from superadmin.middleware import set_current_business
 from authentication.models import User
@@ -23,6 +23,24 @@ class Command(BaseCommand):
             type=int,
             help="User ID to associate with the upload (optional)",
         )
+        parser.add_argument(
+            "--bulk",
+            action="store_true",
+            help=(
+                "Load through a staging table with parallel parsing "
+                "(for catalogues of millions of rows)"
+            ),
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            help="Parser processes for --bulk (default: one per CPU)",
+        )
+        parser.add_argument(
+            "--errors-file",
+            type=str,
+            help="Where to write the failed rows (default: <filename>.errors.csv)",
+        )
 
     def handle(self, *args, **options):
         filename = options["filename"]
@@ -64,161 +82,41 @@ class Command(BaseCommand):
         self.stdout.write(f"Business: {business}")
         self.stdout.write(f"User: {user}")
 
-        # Process the CSV file
-        try:
-            with open(file_path, "r", encoding="utf-8") as csv_file:
-                reader = csv.reader(csv_file)
-
-                # Skip header row
-                header = next(reader)
-                self.stdout.write(f'CSV Header: {", ".join(header)}')
-
-                success_count = 0
-                error_count = 0
-
-                for row_num, row in enumerate(reader, start=2):
-                    try:
-                        # Process each row
-                        if len(row) < 11:
-                            self.stdout.write(
-                                self.style.WARNING(
-                                    f"Row {row_num}: Insufficient columns, skipping"
-                                )
-                            )
-                            error_count += 1
-                            continue
-
-                        # Extract data from CSV row
-                        # Expected columns: name, sku, barcode, category_name, unit_name,
-                        # description, cost_price, selling_price, quantity, reorder_level, expiry_date
-                        (
-                            name,
-                            sku,
-                            barcode,
-                            category_name,
-                            unit_name,
-                            description,
-                            cost_price,
-                            selling_price,
-                            quantity,
-                            reorder_level,
-                            expiry_date,
-                        ) = row
-
-                        # Validate required fields
-                        if not name or not sku or not category_name or not unit_name:
-                            self.stdout.write(
-                                self.style.WARNING(
-                                    f"Row {row_num}: Missing required fields (name, sku, category, unit), skipping"
-                                )
-                            )
-                            error_count += 1
-                            continue
-
-                        # Get or create category
-                        category, created = Category.objects.get_or_create(
-                            business=business,
-                            name=category_name,
-                            defaults={"description": f"Category for {category_name}"},
-                        )
-                        if created:
-                            self.stdout.write(
-                                self.style.SUCCESS(f"Created category: {category_name}")
-                            )
-
-                        # Get or create unit
-                        unit, created = Unit.objects.get_or_create(
-                            business=business,
-                            name=unit_name,
-                            defaults={"symbol": unit_name[:3].upper()},
-                        )
-                        if created:
-                            self.stdout.write(
-                                self.style.SUCCESS(f"Created unit: {unit_name}")
-                            )
-
-                        # Parse numeric values
-                        try:
-                            cost_price = float(cost_price) if cost_price else 0.0
-                            selling_price = (
-                                float(selling_price) if selling_price else 0.0
-                            )
-                            quantity = float(quantity) if quantity else 0.0
-                            reorder_level = (
-                                float(reorder_level) if reorder_level else 0.0
-                            )
-                        except ValueError as e:
-                            self.stdout.write(
-                                self.style.WARNING(
-                                    f"Row {row_num}: Invalid numeric values, skipping - {e}"
-                                )
-                            )
-                            error_count += 1
-                            continue
-
-                        # Parse expiry date if provided
-                        expiry_date_parsed = None
-                        if expiry_date:
-                            try:
-                                from datetime import datetime
-
-                                expiry_date_parsed = datetime.strptime(
-                                    expiry_date, "%Y-%m-%d"
-                                ).date()
-                            except ValueError:
-                                self.stdout.write(
-                                    self.style.WARNING(
-                                        f"Row {row_num}: Invalid expiry date format (expected YYYY-MM-DD), ignoring"
-                                    )
-                                )
-
-                        # Create or update product
-                        product, created = Product.objects.update_or_create(
-                            business=business,
-                            sku=sku,
-                            defaults={
-                                "name": name,
-                                "barcode": barcode if barcode else None,
-                                "category": category,
-                                "unit": unit,
-                                "description": description,
-                                "cost_price": cost_price,
-                                "selling_price": selling_price,
-                                "quantity": quantity,
-                                "reorder_level": reorder_level,
-                                "expiry_date": expiry_date_parsed,
-                            },
-                        )
-
-                        if created:
-                            self.stdout.write(
-                                self.style.SUCCESS(
-                                    f"Created product: {name} (SKU: {sku})"
-                                )
-                            )
-                        else:
-                            self.stdout.write(
-                                self.style.SUCCESS(
-                                    f"Updated product: {name} (SKU: {sku})"
-                                )
-                            )
-
-                        success_count += 1
-
-                    except Exception as e:
-                        self.stdout.write(
-                            self.style.ERROR(
-                                f"Row {row_num}: Error processing row - {e}"
-                            )
-                        )
-                        error_count += 1
-
-                # Summary
-                self.stdout.write(
-                    self.style.SUCCESS(
-                        f"\nUpload completed. Success: {success_count}, Errors: {error_count}"
-                    )
-                )
+        def report_progress(importer):
+            self.stdout.write(
+                f"Processed {importer.rows_processed} rows "
+                f"({importer.created} created, {importer.updated} updated)"
+            )
 
+        try:
+            if options["bulk"]:
+                # Rows are merged at the end, so progress counts only rows read
+                importer = BulkProductLoader(business, workers=options["workers"])
+                importer.load(file_path, on_chunk=report_progress)
+            else:
+                # Stream the CSV through the chunked product importer
+                importer = ProductImporter(business)
+                with open(file_path, "rb") as csv_file:
+                    importer.import_rows(read_rows(csv_file), on_chunk=report_progress)
+            importer.finish(user=user)
         except Exception as e:
             raise CommandError(f"Error processing file: {e}")
+
+        if importer.errors:
+            errors_path = options.get("errors_file") or f"{file_path}.errors.csv"
+            with open(errors_path, "wb") as errors_file:
+                importer.write_error_report(errors_file)
+            self.stdout.write(
+                self.style.WARNING(
+                    f"{len(importer.errors)} rows were not imported, "
+                    f"see {errors_path}"
+                )
+            )
+
+        # Summary
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"\nUpload completed. Created: {importer.created}, "
+                f"Updated: {importer.updated}, Errors: {len(importer.errors)}"
+            )
+        )
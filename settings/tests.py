@@ -1,4 +1,7 @@
-from django.test import TestCase
+import shutil
+import tempfile
+
+from django.test import TestCase, override_settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from .models import BusinessSettings
 from .forms import BusinessSettingsForm
@@ -6,6 +9,12 @@ from .forms import BusinessSettingsForm
 
 class BusinessSettingsTestCase(TestCase):
     def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
         self.business_settings = BusinessSettings.objects.create(
             business_name="Test Business",
             business_address="123 Test St",
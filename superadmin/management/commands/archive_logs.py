@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from superadmin.retention import RETENTION_TABLES, apply_retention
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Archive and delete log rows older than their retention period"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--table",
+            choices=sorted(RETENTION_TABLES),
+            action="append",
+            help="Table to process (repeatable - processes all if not provided)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            help="Rows archived and deleted per batch (default: LOG_ARCHIVE_BATCH_SIZE)",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only count the rows that would be archived",
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'[{timezone.now().strftime("%Y-%m-%d %H:%M:%S")}] Starting log retention...'
+            )
+        )
+
+        for table in options["table"] or RETENTION_TABLES:
+            try:
+                stats = apply_retention(
+                    table,
+                    batch_size=options["batch_size"],
+                    dry_run=options["dry_run"],
+                )
+            except Exception as e:
+                logger.error(f"Error applying retention to {table}: {e}")
+                self.stdout.write(self.style.ERROR(f"{table}: {e}"))
+                continue
+
+            if options["dry_run"]:
+                self.stdout.write(f"{table}: {stats['deleted']} rows would be archived")
+            else:
+                self.stdout.write(
+                    f"{table}: {stats['archived']} rows archived, "
+                    f"{stats['deleted']} rows deleted"
+                )
+
+        self.stdout.write(self.style.SUCCESS("Log retention completed"))
@@ -0,0 +1,50 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from superadmin.retention import RETENTION_TABLES, search_archive
+
+
+class Command(BaseCommand):
+    help = "Search archived log rows and print them as JSON lines"
+
+    def add_arguments(self, parser):
+        parser.add_argument("table", choices=sorted(RETENTION_TABLES))
+        parser.add_argument("--business-id", type=int, help="Only this business")
+        parser.add_argument("--from", dest="start_month", help="First month (YYYY-MM)")
+        parser.add_argument("--to", dest="end_month", help="Last month (YYYY-MM)")
+        parser.add_argument("--contains", help="Text the row must contain")
+        parser.add_argument(
+            "--field",
+            action="append",
+            default=[],
+            help="Exact field match as name=value (repeatable), e.g. --field action=DELETE",
+        )
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=100,
+            help="Maximum rows to print (default: 100)",
+        )
+
+    def handle(self, *args, **options):
+        filters = {}
+        for field in options["field"]:
+            name, sep, value = field.partition("=")
+            if not sep:
+                raise CommandError(f"Invalid --field {field!r}. Use name=value")
+            filters[name] = value
+
+        count = 0
+        for row in search_archive(
+            options["table"],
+            business_id=options["business_id"],
+            start_month=options["start_month"],
+            end_month=options["end_month"],
+            contains=options["contains"],
+            filters=filters,
+        ):
+            self.stdout.write(json.dumps(row))
+            count += 1
+            if count >= options["limit"]:
+                break
+
+        self.stderr.write(f"{count} rows found")
@@ -0,0 +1,76 @@
+# Generated by Django 5.2.8 on 2026-10-19 14:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("superadmin", "0004_subscriptionplan_can_access_customers_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RetentionPolicy",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "table",
+                    models.CharField(
+                        choices=[
+                            ("audit_log", "Audit Logs"),
+                            ("stock_movement", "Stock Movements"),
+                            ("notification", "Notifications"),
+                            ("system_log", "System Logs"),
+                            ("security_event", "Security Events"),
+                            ("api_request_log", "API Request Logs"),
+                        ],
+                        max_length=30,
+                    ),
+                ),
+                ("retention_days", models.PositiveIntegerField()),
+                (
+                    "archive",
+                    models.BooleanField(
+                        default=True,
+                        help_text="Write rows to the archive before deleting them",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "plan",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="retention_policies",
+                        to="superadmin.subscriptionplan",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "Retention policies",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("table", "plan"),
+                        name="superadmin_retention_table_plan",
+                    ),
+                    models.UniqueConstraint(
+                        condition=models.Q(("plan", None)),
+                        fields=("table",),
+                        name="superadmin_retention_table_default",
+                    ),
+                ],
+            },
+        ),
+    ]
@@ -368,3 +368,52 @@ class APIRequestLog(models.Model):
 
     def __str__(self):
         return f"{self.api_client.business.company_name} - {self.endpoint}"
+
+
+class RetentionPolicy(models.Model):
+    """
+    How long rows of a high-volume log table stay in the database before
+    they are archived and deleted (see superadmin.retention). A policy
+    without a plan applies to every business whose plan has none.
+    """
+
+    TABLE_CHOICES = (
+        ("audit_log", "Audit Logs"),
+        ("stock_movement", "Stock Movements"),
+        ("notification", "Notifications"),
+        ("system_log", "System Logs"),
+        ("security_event", "Security Events"),
+        ("api_request_log", "API Request Logs"),
+    )
+
+    table = models.CharField(max_length=30, choices=TABLE_CHOICES)
+    plan = models.ForeignKey(
+        SubscriptionPlan,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="retention_policies",
+    )
+    retention_days = models.PositiveIntegerField()
+    archive = models.BooleanField(
+        default=True, help_text="Write rows to the archive before deleting them"
+    )  # type: ignore
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "Retention policies"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["table", "plan"], name="superadmin_retention_table_plan"
+            ),
+            models.UniqueConstraint(
+                fields=["table"],
+                condition=models.Q(plan=None),
+                name="superadmin_retention_table_default",
+            ),
+        ]
+
+    def __str__(self):
+        plan_name = self.plan.name if self.plan else "All plans"
+        return f"{self.get_table_display()} - {plan_name}: {self.retention_days} days"
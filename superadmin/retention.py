@@ -0,0 +1,278 @@
+"""
+Retention and archival of high-volume log tables.
+
+Rows older than their retention period are moved out of the hot tables in
+batches: each batch is appended to gzip JSONL archive files, one file per
+table, tenant and month (``LOG_ARCHIVE_ROOT/<table>/<tenant>/<YYYY-MM>.jsonl.gz``),
+and then deleted by primary key so every DELETE is short and only touches
+old rows.
+
+Retention periods come from ``RetentionPolicy`` rows (per table, optionally
+per subscription plan) and fall back to ``settings.LOG_RETENTION_DAYS``.
+Run ``python manage.py archive_logs`` nightly and search archived rows with
+``python manage.py search_log_archive``.
+
+A batch is archived before it is deleted, so an interrupted run can archive
+a few rows twice but never loses them; searches skip the duplicates.
+"""
+
+import gzip
+import json
+import logging
+import os
+from collections import defaultdict
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import RetentionPolicy, Subscription
+
+logger = logging.getLogger(__name__)
+
+# How each table is archived: its model, the timestamp rows age by, the
+# field holding the business the rows belong to and rows that must never
+# be archived (unread notifications, unresolved security events).
+RETENTION_TABLES = {
+    "audit_log": {
+        "model": "settings.AuditLog",
+        "date_field": "timestamp",
+        "tenant_field": "business_id",
+    },
+    "stock_movement": {
+        "model": "products.StockMovement",
+        "date_field": "created_at",
+        "tenant_field": "business_id",
+        "invalidates_reports": True,
+    },
+    "notification": {
+        "model": "notifications.Notification",
+        "date_field": "created_at",
+        "tenant_field": "business_id",
+        "filters": {"is_read": True},
+    },
+    "system_log": {
+        "model": "superadmin.SystemLog",
+        "date_field": "timestamp",
+    },
+    "security_event": {
+        "model": "superadmin.SecurityEvent",
+        "date_field": "timestamp",
+        "filters": {"is_resolved": True},
+    },
+    "api_request_log": {
+        "model": "superadmin.APIRequestLog",
+        "date_field": "timestamp",
+        "tenant_field": "api_client__business_id",
+    },
+}
+
+# Archive directory of rows without a business
+SYSTEM_TENANT = "system"
+
+
+def get_archive_root():
+    return getattr(
+        settings, "LOG_ARCHIVE_ROOT", os.path.join(settings.BASE_DIR, "archives")
+    )
+
+
+def get_business_plans():
+    """Map business ids to the plan of their newest active subscription"""
+    rows = (
+        Subscription.objects.filter(is_active=True)
+        .order_by("business_id", "created_at")
+        .values_list("business_id", "plan_id")
+    )
+    # Newer subscriptions come later and win
+    return dict(rows)
+
+
+def get_policies(table):
+    """
+    Return ``(default, by_plan)`` for a table, where ``default`` is the
+    ``(retention_days, archive)`` applying to businesses without a plan
+    specific policy and ``by_plan`` maps plan ids to their own.
+    """
+    default = (getattr(settings, "LOG_RETENTION_DAYS", {}).get(table, 365), True)
+    by_plan = {}
+    for policy in RetentionPolicy.objects.filter(table=table):
+        if policy.plan_id is None:
+            default = (policy.retention_days, policy.archive)
+        else:
+            by_plan[policy.plan_id] = (policy.retention_days, policy.archive)
+    return default, by_plan
+
+
+def get_retention_groups(table):
+    """
+    Split the rows of a table into groups sharing a retention policy.
+
+    Returns a list of ``(retention_days, archive, condition)`` where
+    ``condition`` is a ``Q`` selecting the group's rows. Businesses are
+    grouped by policy rather than handled one by one, so the number of
+    queries depends on the number of distinct policies, not of tenants.
+    """
+    spec = RETENTION_TABLES[table]
+    default, by_plan = get_policies(table)
+    tenant_field = spec.get("tenant_field")
+    if not tenant_field or not by_plan:
+        return [(*default, Q())]
+
+    businesses_by_policy = defaultdict(list)
+    for business_id, plan_id in get_business_plans().items():
+        if plan_id in by_plan:
+            businesses_by_policy[by_plan[plan_id]].append(business_id)
+
+    groups = []
+    specific = []
+    for (days, archive), business_ids in businesses_by_policy.items():
+        groups.append((days, archive, Q(**{f"{tenant_field}__in": business_ids})))
+        specific.extend(business_ids)
+    groups.append((*default, ~Q(**{f"{tenant_field}__in": specific})))
+    return groups
+
+
+def _archive_path(root, table, tenant, month):
+    return os.path.join(root, table, str(tenant), f"{month}.jsonl.gz")
+
+
+def write_archive(table, rows, root=None):
+    """
+    Append rows (dicts with ``archive_tenant`` and the table's date field)
+    to the archive files of their tenant and month. Each call adds a new
+    gzip member, which readers see as one continuous file.
+    """
+    root = root or get_archive_root()
+    date_field = RETENTION_TABLES[table]["date_field"]
+
+    files = defaultdict(list)
+    for row in rows:
+        tenant = row.pop("archive_tenant", None) or SYSTEM_TENANT
+        month = row[date_field].strftime("%Y-%m")
+        files[(tenant, month)].append(json.dumps(row, cls=DjangoJSONEncoder))
+
+    for (tenant, month), lines in files.items():
+        path = _archive_path(root, table, tenant, month)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with gzip.open(path, "at", encoding="utf-8") as archive:
+            archive.write("\n".join(lines) + "\n")
+
+
+def apply_retention(table, batch_size=None, dry_run=False, root=None, now=None):
+    """
+    Archive and delete the expired rows of one table.
+
+    Returns ``{"archived": n, "deleted": n}``; with ``dry_run`` only the
+    number of expired rows is counted (as ``deleted``) and nothing changes.
+    """
+    spec = RETENTION_TABLES[table]
+    model = apps.get_model(spec["model"])
+    date_field = spec["date_field"]
+    tenant_field = spec.get("tenant_field")
+    batch_size = batch_size or getattr(settings, "LOG_ARCHIVE_BATCH_SIZE", 5000)
+    now = now or timezone.now()
+
+    stats = {"archived": 0, "deleted": 0}
+    for days, archive, condition in get_retention_groups(table):
+        expired = model._base_manager.filter(
+            condition,
+            **spec.get("filters", {}),
+            **{f"{date_field}__lt": now - timedelta(days=days)},
+        )
+        if dry_run:
+            stats["deleted"] += expired.count()
+            continue
+
+        while True:
+            batch = expired.order_by("pk")
+            if tenant_field:
+                batch = batch.annotate(archive_tenant=F(tenant_field))
+            rows = list(batch.values()[:batch_size])
+            if not rows:
+                break
+
+            ids = [row["id"] for row in rows]
+            tenants = {row.get("archive_tenant") for row in rows}
+            if archive:
+                write_archive(table, rows, root)
+                stats["archived"] += len(rows)
+
+            # Deleting by primary key keeps each statement short. Log rows
+            # have no dependent rows or delete signals that need to run.
+            deleted = model._base_manager.filter(pk__in=ids)
+            stats["deleted"] += deleted._raw_delete(deleted.db)
+
+            if spec.get("invalidates_reports"):
+                from reports.cache import bump_data_version
+
+                for business_id in tenants - {None}:
+                    bump_data_version(business_id)
+
+    logger.info("Retention for %s: %s", table, stats)
+    return stats
+
+
+def _month_in_range(month, start_month, end_month):
+    return (not start_month or month >= start_month) and (
+        not end_month or month <= end_month
+    )
+
+
+def search_archive(
+    table,
+    business_id=None,
+    start_month=None,
+    end_month=None,
+    contains=None,
+    filters=None,
+    root=None,
+):
+    """
+    Yield archived rows of a table, oldest month first.
+
+    ``start_month``/``end_month`` (``YYYY-MM``) limit the files read,
+    ``contains`` matches a case-insensitive substring anywhere in the row
+    and ``filters`` maps field names to values the row must have.
+    """
+    if table not in RETENTION_TABLES:
+        raise ValueError(f"Unknown table: {table}")
+
+    table_root = os.path.join(root or get_archive_root(), table)
+    if not os.path.isdir(table_root):
+        return
+
+    if business_id is not None:
+        tenants = [str(business_id)]
+    else:
+        tenants = sorted(os.listdir(table_root))
+    needle = contains.lower() if contains else None
+    filters = {key: str(value) for key, value in (filters or {}).items()}
+
+    for tenant in tenants:
+        tenant_root = os.path.join(table_root, tenant)
+        if not os.path.isdir(tenant_root):
+            continue
+        for filename in sorted(os.listdir(tenant_root)):
+            month = filename.split(".")[0]
+            if not _month_in_range(month, start_month, end_month):
+                continue
+
+            seen = set()
+            with gzip.open(
+                os.path.join(tenant_root, filename), "rt", encoding="utf-8"
+            ) as archive:
+                for line in archive:
+                    if needle and needle not in line.lower():
+                        continue
+                    row = json.loads(line)
+                    if row.get("id") in seen:
+                        continue
+                    seen.add(row.get("id"))
+                    if all(
+                        str(row.get(key)) == value for key, value in filters.items()
+                    ):
+                        yield row
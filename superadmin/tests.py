@@ -0,0 +1,176 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from authentication.models import User
+from notifications.models import Notification
+from settings.models import AuditLog
+from superadmin.models import (
+    Business,
+    RetentionPolicy,
+    Subscription,
+    SubscriptionPlan,
+    SystemLog,
+)
+from superadmin.retention import apply_retention, search_archive
+
+
+class LogRetentionTestCase(TestCase):
+    def setUp(self):
+        self.archive_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.archive_root)
+        self.now = timezone.now()
+
+        self.user = User.objects.create_user(
+            username="retention", email="retention@example.com", password="testpass123"
+        )
+        self.business = Business.objects.create(
+            company_name="Retention Business",
+            email="retention@example.com",
+            business_type="retail",
+        )
+        self.premium = Business.objects.create(
+            company_name="Premium Business",
+            email="premium@example.com",
+            business_type="retail",
+        )
+
+    def audit_log(self, business, days_ago, action="UPDATE"):
+        log = AuditLog.objects.create(
+            user=self.user,
+            business=business,
+            action=action,
+            model_name="Product",
+            object_repr=f"{business.company_name} {days_ago}",
+        )
+        AuditLog.objects.filter(id=log.id).update(
+            timestamp=self.now - timedelta(days=days_ago)
+        )
+        return log
+
+    def create_plan(self, name):
+        # The plan table still has the feature flag columns added by
+        # migration 0004, which the model no longer declares, so the row is
+        # inserted directly with every flag set
+        table = SubscriptionPlan._meta.db_table
+        now = connection.ops.adapt_datetimefield_value(self.now)
+        with connection.cursor() as cursor:
+            flags = [
+                column.name
+                for column in connection.introspection.get_table_description(
+                    cursor, table
+                )
+                if column.name.startswith("can_")
+            ]
+            columns = [
+                "name",
+                "price",
+                "duration_days",
+                "max_products",
+                "max_users",
+                "max_branches",
+                "is_active",
+                "created_at",
+                "updated_at",
+                *flags,
+            ]
+            values = [name, 0, 30, 100, 5, 1, True, now, now, *[True] * len(flags)]
+            cursor.execute(
+                f"INSERT INTO {table} ({', '.join(columns)}) "
+                f"VALUES ({', '.join(['%s'] * len(columns))})",
+                values,
+            )
+        return SubscriptionPlan.objects.get(name=name)
+
+    def retain(self, table, **kwargs):
+        return apply_retention(table, root=self.archive_root, now=self.now, **kwargs)
+
+    def test_expired_rows_are_archived_per_tenant_and_month_then_deleted(self):
+        old = self.audit_log(self.business, 400, action="DELETE")
+        recent = self.audit_log(self.business, 10)
+
+        stats = self.retain("audit_log", batch_size=1)
+
+        self.assertEqual(stats, {"archived": 1, "deleted": 1})
+        self.assertEqual(
+            list(AuditLog.objects.values_list("id", flat=True)), [recent.id]
+        )
+
+        month = (self.now - timedelta(days=400)).strftime("%Y-%m")
+        path = os.path.join(
+            self.archive_root, "audit_log", str(self.business.id), f"{month}.jsonl.gz"
+        )
+        with gzip.open(path, "rt") as archive:
+            rows = [json.loads(line) for line in archive]
+        self.assertEqual([row["id"] for row in rows], [old.id])
+
+        found = list(
+            search_archive(
+                "audit_log",
+                business_id=self.business.id,
+                filters={"action": "DELETE"},
+                root=self.archive_root,
+            )
+        )
+        self.assertEqual([row["object_repr"] for row in found], [old.object_repr])
+
+    def test_plan_policies_override_the_default(self):
+        plan = self.create_plan("Premium")
+        Subscription.objects.create(
+            business=self.premium, plan=plan, end_date=self.now + timedelta(days=30)
+        )
+        RetentionPolicy.objects.create(table="audit_log", retention_days=30)
+        RetentionPolicy.objects.create(table="audit_log", plan=plan, retention_days=90)
+
+        self.audit_log(self.business, 60)
+        kept = self.audit_log(self.premium, 60)
+
+        self.assertEqual(self.retain("audit_log", dry_run=True)["deleted"], 1)
+        self.retain("audit_log")
+
+        self.assertEqual(list(AuditLog.objects.values_list("id", flat=True)), [kept.id])
+
+    @override_settings(LOG_RETENTION_DAYS={"notification": 30})
+    def test_unread_notifications_are_kept(self):
+        for is_read in (True, False):
+            notification = Notification.objects.create(
+                recipient=self.user,
+                business=self.business,
+                title="Old",
+                message="Old notification",
+                notification_type="system",
+                is_read=is_read,
+            )
+            Notification.objects.filter(id=notification.id).update(
+                created_at=self.now - timedelta(days=60)
+            )
+
+        self.retain("notification")
+
+        self.assertEqual(Notification.objects.count(), 1)
+        self.assertFalse(Notification.objects.get().is_read)
+
+
+class SystemLogsViewTestCase(TestCase):
+    def test_logs_are_paginated(self):
+        admin = User.objects.create_superuser(
+            username="admin", email="admin@example.com", password="testpass123"
+        )
+        SystemLog.objects.bulk_create(
+            [SystemLog(level="info", message=f"Log {i}") for i in range(60)]
+        )
+        self.client.force_login(admin)
+
+        response = self.client.get(reverse("superadmin:system_logs"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["logs"]), 50)
+        self.assertEqual(response.context["logs"].paginator.count, 60)
@@ -147,8 +147,16 @@ class SystemLogsView(TemplateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context["logs"] = SystemLog.objects.all()
-        context["security_events"] = SecurityEvent.objects.all()
+        # Log tables are large; only one page of each is loaded. Rows past
+        # their retention period are in the archive (search_log_archive).
+        from django.core.paginator import Paginator
+
+        logs = SystemLog.objects.select_related("user")
+        events = SecurityEvent.objects.select_related("user")
+        context["logs"] = Paginator(logs, 50).get_page(self.request.GET.get("page"))
+        context["security_events"] = Paginator(events, 50).get_page(
+            self.request.GET.get("events_page")
+        )
         return context
 
 
@@ -182,7 +190,9 @@ class APIMonitoringView(TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context["api_clients"] = APIClient.objects.all()
-        context["api_logs"] = APIRequestLog.objects.all()
+        context["api_logs"] = APIRequestLog.objects.select_related(
+            "api_client__business"
+        )[:100]
         return context
 
 
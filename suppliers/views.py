@@ -1,9 +1,12 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.db.models import Sum
 from django.http import JsonResponse
+from decimal import Decimal
 from .models import Supplier
 from .forms import SupplierForm
+from purchases.models import PurchaseOrder
 from superadmin.middleware import get_current_business
 from authentication.utils import check_user_permission
 
@@ -50,7 +53,26 @@ def supplier_create(request):
 @login_required
 def supplier_detail(request, pk):
     supplier = get_object_or_404(Supplier.objects.business_specific(), pk=pk)
-    return render(request, "suppliers/detail.html", {"supplier": supplier})
+    # Statement of the supplier's purchase orders, from their stored totals
+    purchase_orders = PurchaseOrder.objects.business_specific().filter(
+        supplier=supplier
+    )
+    totals = purchase_orders.exclude(status="cancelled").aggregate(
+        ordered=Sum("total_amount"), received=Sum("received_amount")
+    )
+    ordered = totals["ordered"] or Decimal("0")
+    received = totals["received"] or Decimal("0")
+    return render(
+        request,
+        "suppliers/detail.html",
+        {
+            "supplier": supplier,
+            "purchase_orders": purchase_orders.order_by("-order_date", "-id")[:50],
+            "total_ordered": ordered,
+            "total_received": received,
+            "total_outstanding": ordered - received,
+        },
+    )
 
 
 @login_required
@@ -0,0 +1,192 @@
+"""
+Keyset pagination for the list pages.
+
+Pages are selected with a ``WHERE`` on the sort key of the last (or first)
+row of the current page rather than an ``OFFSET``, so every page costs
+one index range scan of ``per_page + 1`` rows however large the table is
+and however deep the user scrolls. The sort key must end in a unique
+column (normally ``id``) so rows with equal values are never skipped or
+repeated, and every column in it must be non-null.
+
+Cursors are opaque, URL-safe strings passed as ``?after=`` and
+``?before=``. The total row count is cached for a short while instead of
+being counted on every page. The same page backs the HTML lists and the
+``?format=json`` responses used for infinite scroll.
+"""
+
+import base64
+import datetime
+import hashlib
+import json
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Q
+from django.http import JsonResponse
+from django.utils.functional import cached_property
+
+DEFAULT_PER_PAGE = 50
+MAX_PER_PAGE = 200
+# Seconds a list's total count is reused
+COUNT_CACHE_TIMEOUT = 60
+
+
+def _encode_value(value):
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        # isoformat keeps microseconds, which the cursor must not lose
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def encode_cursor(values):
+    payload = json.dumps([_encode_value(value) for value in values])
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor, length):
+    """Values of a cursor, or None if it is malformed"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, TypeError, UnicodeError):
+        return None
+    if not isinstance(values, list) or len(values) != length:
+        return None
+    return values
+
+
+def keyset_filter(ordering, values, forward=True):
+    """
+    ``Q`` selecting the rows after (``forward``) or before the row whose
+    sort key is ``values``, for an ordering such as ``["-sale_date", "-id"]``
+    """
+    condition = Q()
+    equal = Q()
+    for field, value in zip(ordering, values):
+        descending = field.startswith("-")
+        name = field.lstrip("-")
+        lookup = "lt" if descending == forward else "gt"
+        condition |= equal & Q(**{f"{name}__{lookup}": value})
+        equal &= Q(**{name: value})
+    return condition
+
+
+def _reverse(ordering):
+    return [field[1:] if field.startswith("-") else f"-{field}" for field in ordering]
+
+
+class KeysetPaginator:
+    def __init__(self, queryset, ordering, per_page=DEFAULT_PER_PAGE):
+        self.queryset = queryset
+        self.ordering = list(ordering)
+        self.per_page = max(1, min(int(per_page), MAX_PER_PAGE))
+
+    def cursor_for(self, obj):
+        return encode_cursor(
+            [getattr(obj, field.lstrip("-")) for field in self.ordering]
+        )
+
+    @cached_property
+    def count(self):
+        """Total rows, cached for ``COUNT_CACHE_TIMEOUT`` seconds"""
+        sql, params = self.queryset.order_by().query.sql_with_params()
+        digest = hashlib.sha1(repr((sql, params)).encode("utf-8")).hexdigest()
+        key = f"list-count:{digest}"
+        count = cache.get(key)
+        if count is None:
+            count = self.queryset.order_by().count()
+            cache.set(key, count, COUNT_CACHE_TIMEOUT)
+        return count
+
+    def get_page(self, after=None, before=None):
+        """The page after cursor ``after``, before cursor ``before``, or the first"""
+        size = len(self.ordering)
+        after = decode_cursor(after, size) if after else None
+        before = decode_cursor(before, size) if before and not after else None
+
+        if before is not None:
+            rows = list(
+                self.queryset.filter(
+                    keyset_filter(self.ordering, before, False)
+                ).order_by(*_reverse(self.ordering))[: self.per_page + 1]
+            )
+            has_more = len(rows) > self.per_page
+            rows = rows[: self.per_page][::-1]
+            return KeysetPage(self, rows, has_next=True, has_previous=has_more)
+
+        queryset = self.queryset
+        if after is not None:
+            queryset = queryset.filter(keyset_filter(self.ordering, after))
+        rows = list(queryset.order_by(*self.ordering)[: self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        return KeysetPage(
+            self,
+            rows[: self.per_page],
+            has_next=has_more,
+            has_previous=after is not None,
+        )
+
+
+class KeysetPage:
+    def __init__(self, paginator, object_list, has_next, has_previous):
+        self.paginator = paginator
+        self.object_list = object_list
+        self.has_next = has_next and bool(object_list)
+        self.has_previous = has_previous and bool(object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    @property
+    def next_cursor(self):
+        if self.has_next:
+            return self.paginator.cursor_for(self.object_list[-1])
+        return None
+
+    @property
+    def previous_cursor(self):
+        if self.has_previous:
+            return self.paginator.cursor_for(self.object_list[0])
+        return None
+
+    @property
+    def count(self):
+        return self.paginator.count
+
+
+def paginate(request, queryset, ordering, per_page=DEFAULT_PER_PAGE):
+    """Keyset page of ``queryset`` selected by the request's cursor parameters"""
+    try:
+        per_page = int(request.GET.get("per_page", per_page))
+    except ValueError:
+        pass
+    return KeysetPaginator(queryset, ordering, per_page).get_page(
+        after=request.GET.get("after"), before=request.GET.get("before")
+    )
+
+
+def wants_json(request):
+    return request.GET.get("format") == "json"
+
+
+def page_json_response(page, serialize):
+    """JSON for infinite scroll: the rows and the cursors of the next pages"""
+    return JsonResponse(
+        {
+            "results": [serialize(obj) for obj in page],
+            "next": page.next_cursor,
+            "previous": page.previous_cursor,
+            "count": page.count,
+        }
+    )